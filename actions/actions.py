@@ -12,10 +12,18 @@ import re
 from urllib.parse import quote, unquote
 import unicodedata
 
+from actions import admissao, captura_trafego, perfilamento
+from actions.balanceador import api_get, api_post
+from actions.cache_respostas import CacheRespostas
+from actions.calendario_avaliacoes import CalendarioAvaliacoes, intervalo_de_datas
+from actions.decodificacao_json import iterar_lista_json, ler_json
+from actions.feed_avisos import FeedAvisos
+from actions.indice_bm25 import BaseConhecimentoLocal
+from actions.indice_vetorial import IndiceVetorial, construir_indice
+
 if platform.system() == "Windows":
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
-API_URL = "http://127.0.0.1:8000"
 
 # ===================================================================
 # CONFIGURAÇÃO DE LOGGING
@@ -30,6 +38,51 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Gravação das chamadas ao /webhook para o replay (desligada sem CAPTURA_TRAFEGO)
+captura_trafego.instalar()
+
+# Perfilamento sob demanda das actions lentas (desligado sem PERFIL_ATIVO ou arquivo de controle)
+perfilamento.instalar()
+
+# Respostas prontas de cronograma, atendimento e material, invalidadas
+# quando os dados de origem são recarregados
+cache_respostas = CacheRespostas.do_ambiente()
+
+# Actions que guardam a resposta com o texto da pergunta como chave. As outras
+# usam a disciplina ou o docente (e o marcador de termo), que o texto não acha
+ACOES_COM_RESERVA = {"action_gerar_resposta_com_ia", "action_listar_todas_provas"}
+
+
+def _reserva_admissao(acao: str, texto: str):
+    if acao not in ACOES_COM_RESERVA:
+        return None
+    return cache_respostas.obter(acao, texto)
+
+
+# Limites por action e por remetente; quem passa deles recebe a última resposta
+# guardada da mesma pergunta ou um "tente de novo" (depois dos outros ganchos)
+admissao.instalar(reserva=_reserva_admissao)
+
+
+def _ao_atualizar_base_conhecimento(documentos):
+    construir_indice(documentos)
+    cache_respostas.invalidar("base_conhecimento")
+
+
+# Índices locais da base de conhecimento (a API fica como fallback).
+# Quem sincroniza vetoriza só os documentos novos ou alterados; os outros
+# workers só mapeiam os arquivos publicados
+indice_vetorial = IndiceVetorial()
+base_conhecimento_local = BaseConhecimentoLocal(
+    ao_atualizar=_ao_atualizar_base_conhecimento,
+    ao_recarregar=lambda: cache_respostas.invalidar("base_conhecimento"))
+
+# Calendário de todas as avaliações, recarregado em segundo plano
+calendario_avaliacoes = CalendarioAvaliacoes()
+
+# Avisos mais recentes em memória, atualizados por marca d'água
+feed_avisos = FeedAvisos()
+
 # ===================================================================
 # CACHE HELPER
 # ===================================================================
@@ -87,13 +140,13 @@ class CacheHelper:
             
             # CORREÇÃO: Codificar o nome na URL corretamente
             nome_codificado = quote(nome_busca, safe='')
-            url = f"{API_URL}/disciplinas/get_diciplina_nome/{nome_codificado}/cronograma"
-            logger.debug(f"URL da busca: {url}")
+            caminho = f"/disciplinas/get_diciplina_nome/{nome_codificado}/cronograma"
+            logger.debug(f"URL da busca: {caminho}")
             
-            response = requests.get(url, timeout=10)
+            response = api_get(caminho, timeout=10)
             
             if response.ok:
-                cronogramas = response.json()
+                cronogramas = ler_json(response)
                 if cronogramas and isinstance(cronogramas, list) and len(cronogramas) > 0:
                     id_disciplina = cronogramas[0].get('id_disciplina')
                     if id_disciplina:
@@ -115,11 +168,11 @@ class CacheHelper:
         """
         try:
             # Buscar lista de todas as disciplinas
-            response = requests.get(f"{API_URL}/disciplinas/lista_disciplina/", timeout=10)
+            response = api_get("/disciplinas/lista_disciplina/", timeout=10)
             if not response.ok:
                 return None
             
-            disciplinas = response.json()
+            disciplinas = ler_json(response)
             if not disciplinas or not isinstance(disciplinas, list):
                 return None
             
@@ -197,10 +250,12 @@ class CacheHelper:
         
         try:
             logger.info("Cache MISS: buscando lista de professores na API")
-            response = requests.get(f"{API_URL}/professores/lista_professores/", timeout=10)
+            response = api_get("/professores/lista_professores/", timeout=10)
             response.raise_for_status()
-            professores = response.json()
+            professores = ler_json(response)
             
+            if CacheHelper._cache_professores.get(cache_key) != professores:
+                cache_respostas.invalidar("docentes")
             CacheHelper._cache_professores[cache_key] = professores
             CacheHelper._cache_timestamp[cache_key] = datetime.now()
             logger.info(f"Cache SET: {len(professores)} professores")
@@ -223,10 +278,12 @@ class CacheHelper:
         
         try:
             logger.info("Cache MISS: buscando lista de coordenadores na API")
-            response = requests.get(f"{API_URL}/coordenador/get_list_coordenador/", timeout=10)
+            response = api_get("/coordenador/get_list_coordenador/", timeout=10)
             response.raise_for_status()
-            coordenadores = response.json()
+            coordenadores = ler_json(response)
             
+            if CacheHelper._cache_coordenadores.get(cache_key) != coordenadores:
+                cache_respostas.invalidar("docentes")
             CacheHelper._cache_coordenadores[cache_key] = coordenadores
             CacheHelper._cache_timestamp[cache_key] = datetime.now()
             logger.info(f"Cache SET: {len(coordenadores)} coordenadores")
@@ -243,6 +300,7 @@ class CacheHelper:
         CacheHelper._cache_professores.clear()
         CacheHelper._cache_coordenadores.clear()
         CacheHelper._cache_timestamp.clear()
+        cache_respostas.invalidar()
         logger.info("Cache limpo")
 
 # ===================================================================
@@ -320,7 +378,7 @@ class ResponseValidator:
                               expected_keys: List[str] = None) -> Optional[Dict]:
         """Valida se a resposta é JSON válido e tem as chaves esperadas"""
         try:
-            data = response.json()
+            data = ler_json(response)
             
             if expected_keys:
                 missing_keys = [key for key in expected_keys if key not in data]
@@ -337,7 +395,7 @@ class ResponseValidator:
     def validate_list_response(response: requests.Response) -> List:
         """Valida se a resposta é uma lista válida"""
         try:
-            data = response.json()
+            data = ler_json(response)
             
             if isinstance(data, list):
                 return data
@@ -368,8 +426,8 @@ def salvar_pergunta_aluno(pergunta: str, topico: list[str] = None) -> bool:
             "data_hora": datetime.now().isoformat()
         }
         
-        response = requests.post(
-            f"{API_URL}/mensagens_aluno/",
+        response = api_post(
+            "/mensagens_aluno/",
             json=payload,
             timeout=10
         )
@@ -413,23 +471,37 @@ def extrair_topicos_da_pergunta(pergunta: str) -> list[str]:
     # Buscar na base de conhecimento para ver se há palavras-chave correspondentes
     if not topicos:
         try:
-            response = requests.get(
-                f"{API_URL}/baseconhecimento/get_buscar",
-                params={"q": pergunta},
-                timeout=10
-            )
-            if response.ok:
-                dados = response.json()
-                contextos = dados.get("contextos", [])
-                if contextos and len(contextos) > 0:
-                    # É dúvida de conteúdo - adicionar marcador
-                    topicos.append("Conteúdo")
+            contextos = buscar_contextos_base_conhecimento(pergunta, limite=1)
+            if contextos:
+                # É dúvida de conteúdo - adicionar marcador
+                topicos.append("Conteúdo")
         except Exception as e:
             logger.debug(f"Erro ao verificar conteudo na base de conhecimento: {e}")
             pass
     
     return topicos if topicos else ["Geral"]
 
+def buscar_contextos_base_conhecimento(consulta: str, limite: int = 3) -> list[str]:
+    """
+    Busca trechos da base de conhecimento.
+    Primeiro no índice BM25 local (sem rede); se ele não tiver resposta,
+    usa /baseconhecimento/get_buscar como fallback. Erros da API são propagados.
+    """
+    contextos = base_conhecimento_local.buscar_contextos(consulta, limite)
+    if contextos:
+        logger.info(f"Indice local: {len(contextos)} contexto(s) para '{consulta[:50]}'")
+        return contextos
+
+    response = api_get(
+        "/baseconhecimento/get_buscar",
+        params={"q": consulta},
+        timeout=10
+    )
+    response.raise_for_status()
+    dados = ResponseValidator.validate_json_response(response, expected_keys=["contextos"])
+    contextos = dados.get("contextos", []) if dados else []
+    return contextos if isinstance(contextos, list) else []
+
 def get_disciplina_id_by_name(disciplina_nome: Text) -> str | None:
     """
     Busca ID de disciplina usando cache.
@@ -439,8 +511,9 @@ def get_disciplina_id_by_name(disciplina_nome: Text) -> str | None:
 
 def buscar_urls_documentos_relacionados(termo_busca: str, limite: int = 3) -> list[str]:
     """
-    Busca URLs de documentos relacionados a um termo usando endpoints existentes da API.
-    Usa /baseconhecimento/get_baseconhecimento_url_documento/{termo} para buscar documentos.
+    Busca URLs de documentos relacionados a um termo.
+    Tenta primeiro o índice vetorial local; se não houver resultado, usa
+    /baseconhecimento/get_baseconhecimento_url_documento/{termo} na API.
     
     Args:
         termo_busca: Termo para buscar documentos
@@ -451,6 +524,15 @@ def buscar_urls_documentos_relacionados(termo_busca: str, limite: int = 3) -> li
     """
     urls_encontradas = []
     
+    # PRIMEIRO: busca semântica no índice vetorial local (sem rede)
+    try:
+        urls_encontradas = indice_vetorial.buscar_urls(termo_busca, limite)
+        if urls_encontradas:
+            logger.info(f"Indice vetorial: {len(urls_encontradas)} URL(s) de documento(s) para '{termo_busca}'")
+            return urls_encontradas
+    except Exception as e:
+        logger.warning(f"Erro na busca vetorial local: {e}")
+    
     try:
         # Extrair palavras-chave do termo de busca (palavras com mais de 3 caracteres)
         palavras_chave = re.findall(r'\b\w{4,}\b', termo_busca.lower())
@@ -464,13 +546,13 @@ def buscar_urls_documentos_relacionados(termo_busca: str, limite: int = 3) -> li
             try:
                 # Codificar a palavra na URL
                 palavra_codificada = quote(palavra, safe='')
-                response = requests.get(
-                    f"{API_URL}/baseconhecimento/get_baseconhecimento_url_documento/{palavra_codificada}",
+                response = api_get(
+                    f"/baseconhecimento/get_baseconhecimento_url_documento/{palavra_codificada}",
                     timeout=10
                 )
                 
                 if response.ok:
-                    dados = response.json()
+                    dados = ler_json(response)
                     url_doc = dados.get("url_documento")
                     if url_doc and url_doc not in urls_encontradas:
                         urls_encontradas.append(url_doc)
@@ -486,12 +568,12 @@ def buscar_urls_documentos_relacionados(termo_busca: str, limite: int = 3) -> li
         if not urls_encontradas and termo_busca:
             try:
                 termo_codificado = quote(termo_busca[:50], safe='')
-                response = requests.get(
-                    f"{API_URL}/baseconhecimento/get_baseconhecimento_url_documento/{termo_codificado}",
+                response = api_get(
+                    f"/baseconhecimento/get_baseconhecimento_url_documento/{termo_codificado}",
                     timeout=10
                 )
                 if response.ok:
-                    dados = response.json()
+                    dados = ler_json(response)
                     url_doc = dados.get("url_documento")
                     if url_doc:
                         urls_encontradas.append(url_doc)
@@ -518,24 +600,21 @@ class ActionBuscarUltimosAvisos(Action):
         dispatcher.utter_message(text="Consultando mural de avisos...")
         
         try:
-            response = requests.get(f"{API_URL}/aviso/get_lista_aviso/", timeout=10)
-            response.raise_for_status()
-            
-            # VALIDAÇÃO ADICIONADA
-            avisos = ResponseValidator.validate_list_response(response)
+            # Feed local: só os avisos novos são buscados na API, em segundo plano
+            avisos = feed_avisos.consultar(3)
             
             if not avisos:
                 dispatcher.utter_message(text="Nao ha avisos recentes.")
                 logger.info(f"[{self.name()}] Nenhum aviso encontrado")
             else:
                 mensagem = "Ultimos Avisos:\n\n"
-                for aviso in avisos[:3]:
+                for aviso in avisos:
                     if isinstance(aviso, dict):
                         titulo = aviso.get('titulo', 'Aviso')
                         conteudo = aviso.get('conteudo', '')
                         mensagem += f"Titulo: {titulo}\nConteudo: {conteudo}\n----------------\n"
                 dispatcher.utter_message(text=mensagem)
-                logger.info(f"[{self.name()}] {len(avisos[:3])} avisos retornados")
+                logger.info(f"[{self.name()}] {len(avisos)} avisos retornados")
         except Exception as e:
             ErrorHandler.handle_api_error(
                 dispatcher, e,
@@ -567,8 +646,13 @@ class ActionBuscarCronograma(Action):
             logger.warning(f"[{self.name()}] Disciplina '{disciplina_nome}' nao encontrada")
             return []
 
+        resposta = cache_respostas.obter(self.name(), disciplina_id, termo=disciplina_nome)
+        if resposta:
+            return resposta.reproduzir(dispatcher)
+
         try:
-            response = requests.get(f"{API_URL}/cronograma/disciplina/{disciplina_id}", timeout=10)
+            inicio_mensagens = len(dispatcher.messages)
+            response = api_get(f"/cronograma/disciplina/{disciplina_id}", timeout=10)
             response.raise_for_status()
             
             # VALIDAÇÃO ADICIONADA
@@ -616,6 +700,9 @@ class ActionBuscarCronograma(Action):
                 
                 dispatcher.utter_message(text=msg)
                 logger.info(f"[{self.name()}] {len(cronogramas)} cronograma(s) retornado(s) para '{disciplina_nome}'")
+                # Só guarda horários de verdade: o "Sem horarios" pode mudar assim que cadastrarem
+                cache_respostas.guardar(self.name(), disciplina_id, dispatcher.messages[inicio_mensagens:], [],
+                                        termo=disciplina_nome)
 
         except Exception as e:
             ErrorHandler.handle_api_error(
@@ -651,7 +738,7 @@ class ActionGerarRespostaComIA(Action):
             # ---------------------------
 
             logger.info(f"[{self.name()}] Gerando resposta da IA para: {pergunta_aluno[:50]}...")
-            response = requests.post(f"{API_URL}/ia/gerar-resposta", json=payload, timeout=30)
+            response = api_post("/ia/gerar-resposta", json=payload, timeout=30)
             response.raise_for_status()
             
             # VALIDAÇÃO ADICIONADA
@@ -679,6 +766,9 @@ class ActionGerarRespostaComIA(Action):
                 # Se falhar, não interrompe a resposta principal
             
             dispatcher.utter_message(text=texto_resposta)
+            # Reserva para quando o controle de admissão recusar a mesma pergunta
+            cache_respostas.guardar(self.name(), pergunta_aluno, dispatcher.messages[-1:], [],
+                                    fontes=("base_conhecimento",))
             logger.info(f"[{self.name()}] Resposta da IA gerada com sucesso")
 
         except Exception as e:
@@ -703,8 +793,10 @@ class ActionBuscarDataAvaliacao(Action):
         pergunta_lower = pergunta_aluno.lower()
         palavras_todas_provas = ["quais sao as provas", "lista todas as provas", "quais provas estao marcadas", 
                                   "todas as provas", "provas marcadas", "lista de avaliacoes", "quais avaliacoes tem"]
-        if any(palavra in pergunta_lower for palavra in palavras_todas_provas):
-            # Chamar action para listar todas as provas
+        pergunta_por_periodo = intervalo_de_datas(pergunta_aluno) is not None \
+            and not next(tracker.get_latest_entity_values("disciplina"), None)
+        if pergunta_por_periodo or any(palavra in pergunta_lower for palavra in palavras_todas_provas):
+            # Chamar action para listar todas as provas (ex.: "provas da proxima semana")
             action_listar = ActionListarTodasProvas()
             return action_listar.run(dispatcher, tracker, domain)
         
@@ -741,46 +833,14 @@ class ActionBuscarDataAvaliacao(Action):
         logger.info(f"[{self.name()}] Buscando avaliacoes para disciplina: {disciplina_nome}, tipo: {termo_busca}")
         
         try:
-            response = requests.get(f"{API_URL}/avaliacao/disciplina/{id_disciplina}", timeout=10)
-            response.raise_for_status()
-            
-            # VALIDAÇÃO ADICIONADA
-            avaliacoes = ResponseValidator.validate_list_response(response)
-            
-            encontradas = []
-            termo_busca_lower = termo_busca.lower()
-            
-            for aval in avaliacoes:
-                if not isinstance(aval, dict):
-                    logger.warning(f"[{self.name()}] Item de avaliacao nao e dict: {type(aval)}")
-                    continue
-                    
-                tipo_aval = aval.get('tipo_avaliacao', '')
-                data_aval = aval.get('data_prova', '')  # CORREÇÃO: campo correto da API
-                
-                # Pular se tipo ou data forem None
-                if not tipo_aval or not data_aval:
-                    continue
-                
-                tipo_aval_lower = tipo_aval.lower()
-                
-                # Melhorar filtro de busca
-                if termo_busca_lower in ["prova", "provas", "avaliacao", "avaliação"]:
-                    # Se busca genérica "prova", retorna todas
-                    data_fmt = data_aval.split('T')[0] if 'T' in data_aval else data_aval
-                    encontradas.append(f"- {tipo_aval}: {data_fmt}")
-                elif termo_busca_lower == "np1" and tipo_aval_lower == "np1":
-                    data_fmt = data_aval.split('T')[0] if 'T' in data_aval else data_aval
-                    encontradas.append(f"- {tipo_aval}: {data_fmt}")
-                elif termo_busca_lower == "np2" and tipo_aval_lower == "np2":
-                    data_fmt = data_aval.split('T')[0] if 'T' in data_aval else data_aval
-                    encontradas.append(f"- {tipo_aval}: {data_fmt}")
-                elif termo_busca_lower in ["sub", "substitutiva"] and tipo_aval_lower == "sub":
-                    data_fmt = data_aval.split('T')[0] if 'T' in data_aval else data_aval
-                    encontradas.append(f"- {tipo_aval}: {data_fmt}")
-                elif termo_busca_lower == "exame" and tipo_aval_lower == "exame":
-                    data_fmt = data_aval.split('T')[0] if 'T' in data_aval else data_aval
-                    encontradas.append(f"- {tipo_aval}: {data_fmt}")
+            indice = calendario_avaliacoes.obter_indice()
+            # Disciplina que falhou na última carga do calendário vai direto à API
+            if indice is not None and id_disciplina not in indice.incompletas:
+                inicio, fim = intervalo_de_datas(pergunta_aluno) or (None, None)
+                encontradas = [f"- {aval.tipo}: {aval.data_texto}"
+                               for aval in indice.buscar(id_disciplina, termo_busca, inicio, fim)]
+            else:
+                encontradas = self._buscar_na_api(id_disciplina, termo_busca)
 
             if encontradas:
                 dispatcher.utter_message(text=f"Datas:\n" + "\n".join(encontradas))
@@ -797,6 +857,50 @@ class ActionBuscarDataAvaliacao(Action):
             )
         return []
 
+    def _buscar_na_api(self, id_disciplina: str, termo_busca: str) -> List[str]:
+        """Caminho antigo, usado enquanto o calendário local não carregou."""
+        response = api_get(f"/avaliacao/disciplina/{id_disciplina}", timeout=10)
+        response.raise_for_status()
+
+        # VALIDAÇÃO ADICIONADA
+        avaliacoes = ResponseValidator.validate_list_response(response)
+
+        encontradas = []
+        termo_busca_lower = termo_busca.lower()
+
+        for aval in avaliacoes:
+            if not isinstance(aval, dict):
+                logger.warning(f"[{self.name()}] Item de avaliacao nao e dict: {type(aval)}")
+                continue
+
+            tipo_aval = aval.get('tipo_avaliacao', '')
+            data_aval = aval.get('data_prova', '')  # CORREÇÃO: campo correto da API
+
+            # Pular se tipo ou data forem None
+            if not tipo_aval or not data_aval:
+                continue
+
+            tipo_aval_lower = tipo_aval.lower()
+
+            # Melhorar filtro de busca
+            if termo_busca_lower in ["prova", "provas", "avaliacao", "avaliação"]:
+                # Se busca genérica "prova", retorna todas
+                data_fmt = data_aval.split('T')[0] if 'T' in data_aval else data_aval
+                encontradas.append(f"- {tipo_aval}: {data_fmt}")
+            elif termo_busca_lower == "np1" and tipo_aval_lower == "np1":
+                data_fmt = data_aval.split('T')[0] if 'T' in data_aval else data_aval
+                encontradas.append(f"- {tipo_aval}: {data_fmt}")
+            elif termo_busca_lower == "np2" and tipo_aval_lower == "np2":
+                data_fmt = data_aval.split('T')[0] if 'T' in data_aval else data_aval
+                encontradas.append(f"- {tipo_aval}: {data_fmt}")
+            elif termo_busca_lower in ["sub", "substitutiva"] and tipo_aval_lower == "sub":
+                data_fmt = data_aval.split('T')[0] if 'T' in data_aval else data_aval
+                encontradas.append(f"- {tipo_aval}: {data_fmt}")
+            elif termo_busca_lower == "exame" and tipo_aval_lower == "exame":
+                data_fmt = data_aval.split('T')[0] if 'T' in data_aval else data_aval
+                encontradas.append(f"- {tipo_aval}: {data_fmt}")
+        return encontradas
+
 class ActionListarTodasProvas(Action):
     def name(self) -> Text:
         return "action_listar_todas_provas"
@@ -810,69 +914,25 @@ class ActionListarTodasProvas(Action):
         dispatcher.utter_message(text="Buscando todas as provas agendadas...")
         
         try:
-            # SOLUÇÃO: Buscar lista de disciplinas e depois buscar avaliações para cada uma
-            disciplinas_map = {}  # Map id -> nome
-            avaliacoes_por_disciplina = {}
-            
-            # 1. Buscar lista de todas as disciplinas
-            logger.info(f"[{self.name()}] Buscando lista de disciplinas")
-            response_disciplinas = requests.get(f"{API_URL}/disciplinas/lista_disciplina/", timeout=10)
-            
-            if not response_disciplinas.ok:
-                dispatcher.utter_message(text="Nao foi possivel buscar a lista de disciplinas no momento.")
-                logger.warning(f"[{self.name()}] Erro ao buscar lista de disciplinas: {response_disciplinas.status_code}")
-                return []
-            
-            disciplinas = ResponseValidator.validate_list_response(response_disciplinas)
-            
-            if not disciplinas:
-                dispatcher.utter_message(text="Nao ha disciplinas cadastradas no momento.")
-                logger.info(f"[{self.name()}] Nenhuma disciplina encontrada")
-                return []
-            
-            # Criar map de disciplinas
-            for disc in disciplinas:
-                if isinstance(disc, dict):
-                    id_disc = disc.get('id_disciplina')
-                    nome_disc = disc.get('nome_disciplina')
-                    if id_disc and nome_disc:
-                        disciplinas_map[id_disc] = nome_disc
-            
-            logger.info(f"[{self.name()}] {len(disciplinas_map)} disciplina(s) encontrada(s)")
-            
-            # 2. Buscar avaliações para cada disciplina
-            total_avaliacoes = 0
-            for id_disciplina, nome_disciplina in disciplinas_map.items():
-                try:
-                    response_aval = requests.get(
-                        f"{API_URL}/avaliacao/disciplina/{id_disciplina}",
-                        timeout=10
-                    )
-                    
-                    if response_aval.ok:
-                        avaliacoes = ResponseValidator.validate_list_response(response_aval)
-                        
-                        if avaliacoes:
-                            if nome_disciplina not in avaliacoes_por_disciplina:
-                                avaliacoes_por_disciplina[nome_disciplina] = []
-                            
-                            for aval in avaliacoes:
-                                if isinstance(aval, dict):
-                                    tipo_aval = aval.get('tipo_avaliacao', '')
-                                    data_prova = aval.get('data_prova', '')
-                                    
-                                    if tipo_aval and data_prova:
-                                        data_fmt = data_prova.split('T')[0] if 'T' in data_prova else data_prova
-                                        avaliacoes_por_disciplina[nome_disciplina].append({
-                                            'tipo': tipo_aval,
-                                            'data': data_fmt
-                                        })
-                                        total_avaliacoes += 1
-                except Exception as e:
-                    logger.debug(f"[{self.name()}] Erro ao buscar avaliacoes para disciplina {nome_disciplina}: {e}")
-                    continue
+            periodo = intervalo_de_datas(pergunta_aluno)
+            indice = calendario_avaliacoes.obter_indice()
+            if indice is not None:
+                avaliacoes_por_disciplina = {}
+                inicio, fim = periodo or (None, None)
+                for aval in indice.buscar(inicio=inicio, fim=fim):
+                    avaliacoes_por_disciplina.setdefault(aval.nome_disciplina, []).append({
+                        'tipo': aval.tipo,
+                        'data': aval.data_texto
+                    })
+                total_avaliacoes = sum(len(v) for v in avaliacoes_por_disciplina.values())
+            else:
+                periodo = None  # O caminho antigo não filtra por datas
+                resultado = self._buscar_na_api(dispatcher)
+                if resultado is None:
+                    return []
+                avaliacoes_por_disciplina, total_avaliacoes = resultado
             
-            # 3. Montar mensagem
+            # Montar mensagem
             if avaliacoes_por_disciplina:
                 msg = "📚 **Provas Agendadas:**\n\n"
                 for disc_nome in sorted(avaliacoes_por_disciplina.keys()):
@@ -880,9 +940,14 @@ class ActionListarTodasProvas(Action):
                     for aval in avaliacoes_por_disciplina[disc_nome]:
                         msg += f"  • {aval['tipo']}: {aval['data']}\n"
                     msg += "\n"
+                if indice is not None and indice.incompletas:
+                    msg += "Obs.: algumas disciplinas nao puderam ser consultadas agora; a lista pode estar incompleta.\n"
                 
                 dispatcher.utter_message(text=msg)
+                cache_respostas.guardar(self.name(), pergunta_aluno, dispatcher.messages[-1:], [])  # Reserva
                 logger.info(f"[{self.name()}] {total_avaliacoes} avaliacao(oes) listada(s) de {len(avaliacoes_por_disciplina)} disciplina(s)")
+            elif periodo:
+                dispatcher.utter_message(text="Nao ha provas agendadas nesse periodo.")
             else:
                 dispatcher.utter_message(text="Nao ha provas agendadas no momento.")
                 logger.info(f"[{self.name()}] Nenhuma avaliacao encontrada")
@@ -896,6 +961,75 @@ class ActionListarTodasProvas(Action):
         
         return []
 
+    def _buscar_na_api(self, dispatcher: CollectingDispatcher) -> Optional[tuple]:
+        """
+        Caminho antigo (uma chamada por disciplina), usado enquanto o calendário
+        local não carregou. Retorna None quando já respondeu ao usuário.
+        """
+        # SOLUÇÃO: Buscar lista de disciplinas e depois buscar avaliações para cada uma
+        disciplinas_map = {}  # Map id -> nome
+        avaliacoes_por_disciplina = {}
+
+        # 1. Buscar lista de todas as disciplinas
+        logger.info(f"[{self.name()}] Buscando lista de disciplinas")
+        response_disciplinas = api_get("/disciplinas/lista_disciplina/", timeout=10)
+
+        if not response_disciplinas.ok:
+            dispatcher.utter_message(text="Nao foi possivel buscar a lista de disciplinas no momento.")
+            logger.warning(f"[{self.name()}] Erro ao buscar lista de disciplinas: {response_disciplinas.status_code}")
+            return None
+
+        disciplinas = ResponseValidator.validate_list_response(response_disciplinas)
+
+        if not disciplinas:
+            dispatcher.utter_message(text="Nao ha disciplinas cadastradas no momento.")
+            logger.info(f"[{self.name()}] Nenhuma disciplina encontrada")
+            return None
+
+        # Criar map de disciplinas
+        for disc in disciplinas:
+            if isinstance(disc, dict):
+                id_disc = disc.get('id_disciplina')
+                nome_disc = disc.get('nome_disciplina')
+                if id_disc and nome_disc:
+                    disciplinas_map[id_disc] = nome_disc
+
+        logger.info(f"[{self.name()}] {len(disciplinas_map)} disciplina(s) encontrada(s)")
+
+        # 2. Buscar avaliações para cada disciplina
+        total_avaliacoes = 0
+        for id_disciplina, nome_disciplina in disciplinas_map.items():
+            try:
+                response_aval = api_get(
+                    f"/avaliacao/disciplina/{id_disciplina}",
+                    timeout=10
+                )
+
+                if response_aval.ok:
+                    avaliacoes = ResponseValidator.validate_list_response(response_aval)
+
+                    if avaliacoes:
+                        if nome_disciplina not in avaliacoes_por_disciplina:
+                            avaliacoes_por_disciplina[nome_disciplina] = []
+
+                        for aval in avaliacoes:
+                            if isinstance(aval, dict):
+                                tipo_aval = aval.get('tipo_avaliacao', '')
+                                data_prova = aval.get('data_prova', '')
+
+                                if tipo_aval and data_prova:
+                                    data_fmt = data_prova.split('T')[0] if 'T' in data_prova else data_prova
+                                    avaliacoes_por_disciplina[nome_disciplina].append({
+                                        'tipo': tipo_aval,
+                                        'data': data_fmt
+                                    })
+                                    total_avaliacoes += 1
+            except Exception as e:
+                logger.debug(f"[{self.name()}] Erro ao buscar avaliacoes para disciplina {nome_disciplina}: {e}")
+                continue
+
+        return avaliacoes_por_disciplina, total_avaliacoes
+
 class ActionBuscarInfoAtividadeAcademica(Action):
     def name(self) -> Text:
         return "action_buscar_info_atividade_academica"
@@ -922,25 +1056,16 @@ class ActionBuscarInfoAtividadeAcademica(Action):
         dispatcher.utter_message(text=f"Buscando informacoes sobre {atividade}...")
         
         try:
-            response = requests.get(f"{API_URL}/baseconhecimento/get_buscar", params={"q": atividade}, timeout=10)
-            response.raise_for_status()
-            
-            # VALIDAÇÃO ADICIONADA
-            dados = ResponseValidator.validate_json_response(response, expected_keys=["contextos"])
+            # Índice local primeiro, API como fallback
+            contextos = buscar_contextos_base_conhecimento(atividade, limite=1)
             
-            if dados:
-                contextos = dados.get("contextos", [])
-                
-                if contextos and isinstance(contextos, list) and len(contextos) > 0:
-                    # Pega o primeiro contexto (resumo)
-                    dispatcher.utter_message(text=f"Sobre {atividade}:\n{contextos[0]}")
-                    logger.info(f"[{self.name()}] Informacoes encontradas para '{atividade}'")
-                else:
-                    dispatcher.utter_message(text=f"Nao encontrei informacoes detalhadas sobre {atividade}.")
-                    logger.info(f"[{self.name()}] Nenhuma informacao encontrada para '{atividade}'")
+            if contextos:
+                # Pega o primeiro contexto (resumo)
+                dispatcher.utter_message(text=f"Sobre {atividade}:\n{contextos[0]}")
+                logger.info(f"[{self.name()}] Informacoes encontradas para '{atividade}'")
             else:
-                dispatcher.utter_message(text="Erro ao buscar informacoes do curso.")
-                logger.warning(f"[{self.name()}] Resposta invalida da API para '{atividade}'")
+                dispatcher.utter_message(text=f"Nao encontrei informacoes detalhadas sobre {atividade}.")
+                logger.info(f"[{self.name()}] Nenhuma informacao encontrada para '{atividade}'")
                 
         except Exception as e:
             ErrorHandler.handle_api_error(
@@ -969,6 +1094,10 @@ class ActionBuscarAtendimentoDocente(Action):
 
         logger.info(f"[{self.name()}] Buscando atendimento do docente: {nome_docente}")
         
+        resposta = cache_respostas.obter(self.name(), nome_docente)
+        if resposta:
+            return resposta.reproduzir(dispatcher)
+
         try:
             # USAR CACHE
             todos = []
@@ -991,25 +1120,23 @@ class ActionBuscarAtendimentoDocente(Action):
                     nome_completo = f"{nome} {sobrenome}".strip() if sobrenome else nome
                     nome_lower = nome_completo.lower().strip()
                     
-                    # Busca mais flexível
-                    if nome_docente_lower in nome_lower or nome_lower in nome_docente_lower:
-                        horario = doc.get('horario_atendimento', 'Horario nao informado no cadastro.')
-                        dispatcher.utter_message(text=f"Atendimento {nome_completo}:\n{horario}")
-                        logger.info(f"[{self.name()}] Atendimento encontrado para '{nome_completo}'")
-                        return [SlotSet("nome_docente", None)] # Limpa o slot
-                    # Verifica palavras individuais
                     nome_parts = nome_lower.split()
-                    if any(part == nome_docente_lower or nome_docente_lower in part for part in nome_parts):
-                        horario = doc.get('horario_atendimento', 'Horario nao informado no cadastro.')
-                        dispatcher.utter_message(text=f"Atendimento {nome_completo}:\n{horario}")
-                        logger.info(f"[{self.name()}] Atendimento encontrado para '{nome_completo}'")
-                        return [SlotSet("nome_docente", None)] # Limpa o slot
-                    # Verifica sobrenome separadamente
-                    if sobrenome and nome_docente_lower in sobrenome.lower():
+                    encontrado = (
+                        # Busca mais flexível
+                        nome_docente_lower in nome_lower or nome_lower in nome_docente_lower
+                        # Verifica palavras individuais
+                        or any(part == nome_docente_lower or nome_docente_lower in part for part in nome_parts)
+                        # Verifica sobrenome separadamente
+                        or (sobrenome and nome_docente_lower in sobrenome.lower())
+                    )
+                    if encontrado:
                         horario = doc.get('horario_atendimento', 'Horario nao informado no cadastro.')
                         dispatcher.utter_message(text=f"Atendimento {nome_completo}:\n{horario}")
                         logger.info(f"[{self.name()}] Atendimento encontrado para '{nome_completo}'")
-                        return [SlotSet("nome_docente", None)] # Limpa o slot
+                        eventos = [SlotSet("nome_docente", None)] # Limpa o slot
+                        cache_respostas.guardar(self.name(), nome_docente, dispatcher.messages[-1:], eventos,
+                                                fontes=("docentes",))
+                        return eventos
             
             dispatcher.utter_message(text=f"Professor(a) {nome_docente} nao encontrado(a).")
             logger.warning(f"[{self.name()}] Docente '{nome_docente}' nao encontrado")
@@ -1041,23 +1168,21 @@ class ActionBuscarMaterial(Action):
             return []
         
         logger.info(f"[{self.name()}] Buscando materiais para disciplina: {disciplina_nome}")
+        resposta = cache_respostas.obter(self.name(), disciplina_nome, termo=disciplina_nome)
+        if resposta:
+            return resposta.reproduzir(dispatcher)
+
+        inicio_mensagens = len(dispatcher.messages)
         dispatcher.utter_message(text=f"Buscando materiais para {disciplina_nome}...")
 
         try:
-            # SOLUÇÃO: Usar endpoint de busca de base de conhecimento e buscar URLs relacionadas
+            # SOLUÇÃO: Usar busca na base de conhecimento e buscar URLs relacionadas
             # Primeiro verificar se há conteúdo relacionado
-            response = requests.get(
-                f"{API_URL}/baseconhecimento/get_buscar",
-                params={"q": disciplina_nome},
-                timeout=10
-            )
-            
             contextos_encontrados = 0
-            if response.ok:
-                dados = ResponseValidator.validate_json_response(response)
-                if dados:
-                    contextos = dados.get("contextos", [])
-                    contextos_encontrados = len(contextos) if contextos else 0
+            try:
+                contextos_encontrados = len(buscar_contextos_base_conhecimento(disciplina_nome, limite=10))
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"[{self.name()}] Erro ao buscar contextos para '{disciplina_nome}': {e}")
             
             # Buscar URLs de documentos relacionados
             urls_documentos = buscar_urls_documentos_relacionados(disciplina_nome, limite=5)
@@ -1078,6 +1203,9 @@ class ActionBuscarMaterial(Action):
                 
                 dispatcher.utter_message(text=mensagem)
                 logger.info(f"[{self.name()}] {len(urls_documentos)} documento(s) e {contextos_encontrados} contexto(s) encontrado(s) para '{disciplina_nome}'")
+                cache_respostas.guardar(self.name(), disciplina_nome, dispatcher.messages[inicio_mensagens:],
+                                        [SlotSet("disciplina", None)], fontes=("base_conhecimento",),
+                                        termo=disciplina_nome)
             else:
                 # Nenhum material encontrado
                 dispatcher.utter_message(text=f"Nao encontrei material disponivel para {disciplina_nome} no momento.")
@@ -1178,17 +1306,15 @@ class ActionBuscarDuvidasFrequentes(Action):
         Agrupa por tipo (Institucional vs Conteúdo) e por categoria/palavras-chave.
         """
         try:
-            # 1. Buscar todas as mensagens dos alunos
-            response_msg = requests.get(
-                f"{API_URL}/mensagens_aluno/get_lista_msg/",
-                timeout=10
+            # 1. Buscar todas as mensagens dos alunos (lidas aos poucos: a lista só cresce)
+            response_msg = api_get(
+                "/mensagens_aluno/get_lista_msg/",
+                timeout=10,
+                stream=True
             )
             
             response_msg.raise_for_status()
             
-            # VALIDAÇÃO ADICIONADA
-            mensagens = ResponseValidator.validate_list_response(response_msg)
-            
             # 2. Agrupar perguntas por tópicos (Dúvidas Institucionais)
             topicos_institucionais = {
                 "TCC": 0,
@@ -1200,27 +1326,28 @@ class ActionBuscarDuvidasFrequentes(Action):
                 "Disciplina": 0
             }
             
-            for msg in mensagens:
-                topicos = msg.get('topico', [])
-                for topico in topicos:
-                    if topico in topicos_institucionais:
-                        topicos_institucionais[topico] += 1
-            
             # 3. Buscar categorias e palavras-chave da base de conhecimento (Dúvidas de Conteúdo)
             categorias_conteudo = {}
             palavras_chave_frequentes = {}
             
-            # Buscar todas as mensagens classificadas como "Conteúdo"
-            mensagens_conteudo = [msg for msg in mensagens if "Conteúdo" in msg.get('topico', [])]
-            
-            # Agrupar por palavras-chave mais frequentes nas perguntas de conteúdo
-            for msg in mensagens_conteudo:
-                pergunta = msg.get('primeira_pergunta', '').lower()
-                
-                # Extrair palavras-chave da pergunta (palavras com mais de 4 caracteres)
-                palavras = [p for p in pergunta.split() if len(p) > 4]
-                for palavra in palavras:
-                    palavras_chave_frequentes[palavra] = palavras_chave_frequentes.get(palavra, 0) + 1
+            # Uma passada só, guardando de cada mensagem apenas os dois campos usados
+            with response_msg:
+                for msg in iterar_lista_json(response_msg, campos=("topico", "primeira_pergunta")):
+                    if not isinstance(msg, dict):
+                        continue
+                    topicos = msg.get('topico') or []
+                    for topico in topicos:
+                        if topico in topicos_institucionais:
+                            topicos_institucionais[topico] += 1
+                    
+                    # Agrupar por palavras-chave mais frequentes nas perguntas de conteúdo
+                    if "Conteúdo" in topicos:
+                        pergunta = (msg.get('primeira_pergunta') or '').lower()
+                        
+                        # Extrair palavras-chave da pergunta (palavras com mais de 4 caracteres)
+                        palavras = [p for p in pergunta.split() if len(p) > 4]
+                        for palavra in palavras:
+                            palavras_chave_frequentes[palavra] = palavras_chave_frequentes.get(palavra, 0) + 1
             
             # NOTA: Para agrupar por categorias da base de conhecimento (ex: "Algoritmos", "Banco de Dados"),
             # precisaríamos de um endpoint que retorne essas informações agrupadas.
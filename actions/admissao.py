@@ -0,0 +1,360 @@
+import asyncio
+import contextvars
+import functools
+import heapq
+import inspect
+import itertools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from actions import perfilamento
+
+logger = logging.getLogger(__name__)
+
+# ===================================================================
+# CONTROLE DE ADMISSÃO DO SERVIDOR DE AÇÕES
+# ===================================================================
+# Em semana de prova, uma turma inteira chama action_gerar_resposta_com_ia e
+# action_listar_todas_provas ao mesmo tempo; cada chamada pode levar até 30 s
+# esperando a API, e as actions baratas (info de docente) ficavam atrás.
+#  - as actions síncronas rodam num pool de threads (ADMISSAO_THREADS), e não
+#    mais na thread do loop de eventos: uma action lenta não segura as outras
+#    nem o batimento do worker (run_actions.py). O contexto é copiado para a
+#    thread (captura de tráfego) e o perfilamento amostra a thread da action;
+#  - cada action tem um limite de chamadas simultâneas por worker
+#    (ADMISSAO_LIMITES). Quem passa do limite espera numa fila com prioridade
+#    (primeiro quem tem menos chamadas em andamento, depois a ordem de
+#    chegada), limitada em tamanho (ADMISSAO_FILA) e em tempo (ADMISSAO_ESPERA);
+#  - cada remetente tem um balde de fichas (ADMISSAO_TAXA por segundo, até
+#    ADMISSAO_RAJADA acumuladas): uma ficha por chamada;
+#  - chamada recusada (fila cheia, espera esgotada ou sem ficha) responde na
+#    hora: com a última resposta boa da mesma pergunta, se a action a guardou
+#    no cache de respostas (cache_respostas.py, chave = texto da pergunta; só
+#    as actions que a `reserva` aceita), ou com ADMISSAO_MENSAGEM. Nunca fica
+#    pendurada até o timeout do Rasa.
+#
+# Configuração (.env):
+#   ADMISSAO_ATIVA         - 1 liga (padrão 1)
+#   ADMISSAO_LIMITES       - simultâneas por action, "action=n" separados por vírgula
+#                            (padrão em LIMITES_PADRAO_ACOES)
+#   ADMISSAO_LIMITE_PADRAO - simultâneas das actions não listadas (padrão 16)
+#   ADMISSAO_FILA          - chamadas esperando por action (padrão 10)
+#   ADMISSAO_ESPERA        - segundos máximos na fila (padrão 5)
+#   ADMISSAO_TAXA          - chamadas por segundo por remetente, em média (padrão 0.5; 0 desliga)
+#   ADMISSAO_RAJADA        - chamadas seguidas permitidas por remetente (padrão 5)
+#   ADMISSAO_THREADS       - threads para as actions síncronas (padrão 32)
+#   ADMISSAO_MENSAGEM      - resposta quando a chamada é recusada sem reserva
+
+LIMITES_PADRAO_ACOES = {
+    "action_gerar_resposta_com_ia": 4,
+    "action_listar_todas_provas": 2,
+}
+ATIVA = os.getenv("ADMISSAO_ATIVA", "1") == "1"
+LIMITE_PADRAO = int(os.getenv("ADMISSAO_LIMITE_PADRAO", "16"))
+FILA_MAXIMA = int(os.getenv("ADMISSAO_FILA", "10"))
+ESPERA_MAXIMA_S = float(os.getenv("ADMISSAO_ESPERA", "5"))
+TAXA_REMETENTE = float(os.getenv("ADMISSAO_TAXA", "0.5"))
+RAJADA_REMETENTE = float(os.getenv("ADMISSAO_RAJADA", "5"))
+THREADS = int(os.getenv("ADMISSAO_THREADS", "32"))
+MENSAGEM_RECUSA = os.getenv(
+    "ADMISSAO_MENSAGEM",
+    "Estou recebendo muitas perguntas agora. Tente novamente em alguns instantes, por favor.")
+MAXIMO_REMETENTES = 10000  # Baldes em memória antes de descartar os cheios
+LOG_A_CADA_S = 10  # Intervalo mínimo entre dois avisos de recusa da mesma action
+
+
+def ler_limites(texto: str) -> Dict[str, int]:
+    limites = {}
+    for regra in texto.split(","):
+        acao, separador, valor = regra.partition("=")
+        if not separador:
+            continue
+        try:
+            limites[acao.strip()] = int(valor)
+        except ValueError:
+            logger.warning(f"Limite invalido em ADMISSAO_LIMITES: {regra!r}")
+    return limites
+
+
+class Recusada(Exception):
+    """Chamada não admitida; `motivo` vai para as métricas e o log."""
+
+    def __init__(self, motivo: str):
+        super().__init__(motivo)
+        self.motivo = motivo
+
+
+# ===================================================================
+# FILA COM PRIORIDADE POR ACTION
+# ===================================================================
+
+class FilaAcao:
+    """Limite de chamadas simultâneas de uma action, com fila de espera limitada."""
+
+    def __init__(self, limite: int, fila_maxima: int, espera_maxima_s: float):
+        self.limite = max(1, limite)
+        self.fila_maxima = fila_maxima
+        self.espera_maxima_s = espera_maxima_s
+        self.em_execucao = 0
+        self._espera: List[list] = []  # heap de [prioridade, ordem, futuro]
+        self._ordem = itertools.count()
+        self.contadores = {"admitidas": 0, "esperaram": 0, "fila_cheia": 0, "espera_esgotada": 0,
+                           "espera_total_ms": 0.0, "espera_max_ms": 0.0}
+
+    @property
+    def esperando(self) -> int:
+        return sum(1 for _, _, futuro in self._espera if not futuro.done())
+
+    async def entrar(self, prioridade: int):
+        if self.em_execucao < self.limite and not self.esperando:
+            self.em_execucao += 1
+            self.contadores["admitidas"] += 1
+            return
+        if self.esperando >= self.fila_maxima:
+            self.contadores["fila_cheia"] += 1
+            raise Recusada("fila_cheia")
+
+        futuro = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._espera, [prioridade, next(self._ordem), futuro])
+        inicio = time.perf_counter()
+        try:
+            # A vaga é passada direto por sair(): em_execucao já conta esta chamada
+            await asyncio.wait_for(futuro, self.espera_maxima_s)
+        except asyncio.TimeoutError:
+            self.contadores["espera_esgotada"] += 1
+            raise Recusada("espera_esgotada")
+        espera_ms = (time.perf_counter() - inicio) * 1000
+        self.contadores["admitidas"] += 1
+        self.contadores["esperaram"] += 1
+        self.contadores["espera_total_ms"] += espera_ms
+        self.contadores["espera_max_ms"] = max(self.contadores["espera_max_ms"], espera_ms)
+
+    def sair(self):
+        while self._espera:
+            _, _, futuro = heapq.heappop(self._espera)
+            if not futuro.done():  # Quem desistiu (espera esgotada, conexão fechada) fica cancelado
+                futuro.set_result(None)
+                return
+        self.em_execucao -= 1
+
+    def metricas(self) -> Dict[str, Any]:
+        return {**self.contadores, "espera_total_ms": round(self.contadores["espera_total_ms"], 1),
+                "espera_max_ms": round(self.contadores["espera_max_ms"], 1),
+                "em_execucao": self.em_execucao, "esperando": self.esperando, "limite": self.limite}
+
+
+# ===================================================================
+# BALDE DE FICHAS POR REMETENTE
+# ===================================================================
+
+class BaldesRemetentes:
+    """Uma ficha por chamada; as fichas voltam a `taxa` por segundo, até `rajada`."""
+
+    def __init__(self, taxa: float, rajada: float, maximo: int = MAXIMO_REMETENTES):
+        self.taxa = taxa
+        self.rajada = max(1.0, rajada)
+        self.maximo = maximo
+        self._baldes: Dict[str, List[float]] = {}  # remetente -> [fichas, instante]
+
+    def consumir(self, remetente: Optional[str]) -> bool:
+        if self.taxa <= 0 or not remetente:
+            return True
+        agora = time.monotonic()
+        balde = self._baldes.get(remetente)
+        if balde is None:
+            if len(self._baldes) >= self.maximo:
+                self._descartar_cheios(agora)
+            balde = self._baldes[remetente] = [self.rajada, agora]
+        else:
+            balde[0] = min(self.rajada, balde[0] + (agora - balde[1]) * self.taxa)
+            balde[1] = agora
+        if balde[0] < 1:
+            return False
+        balde[0] -= 1
+        return True
+
+    def _descartar_cheios(self, agora: float):
+        """Um balde que já voltou a encher é igual a um novo: não precisa ficar em memória."""
+        cheios = [r for r, (fichas, instante) in self._baldes.items()
+                  if fichas + (agora - instante) * self.taxa >= self.rajada]
+        for remetente in cheios:
+            del self._baldes[remetente]
+        if len(self._baldes) >= self.maximo:  # Todos ativos: descarta os mais antigos
+            for remetente in list(self._baldes)[:len(self._baldes) // 10 or 1]:
+                del self._baldes[remetente]
+
+
+# ===================================================================
+# CONTROLADOR
+# ===================================================================
+
+class ControleAdmissao:
+    def __init__(self, limites: Optional[Dict[str, int]] = None, limite_padrao: int = LIMITE_PADRAO,
+                 fila_maxima: int = FILA_MAXIMA, espera_maxima_s: float = ESPERA_MAXIMA_S,
+                 taxa: float = TAXA_REMETENTE, rajada: float = RAJADA_REMETENTE):
+        self.limites = dict(LIMITES_PADRAO_ACOES, **(limites or {}))
+        self.limite_padrao = limite_padrao
+        self.fila_maxima = fila_maxima
+        self.espera_maxima_s = espera_maxima_s
+        self.baldes = BaldesRemetentes(taxa, rajada)
+        self.filas: Dict[str, FilaAcao] = {}
+        self.em_andamento: Dict[str, int] = {}  # remetente -> chamadas admitidas ou na fila
+        self.recusas = {"sem_ficha": 0, "reserva": 0}
+        self._ultimo_aviso: Dict[str, float] = {}
+
+    @classmethod
+    def do_ambiente(cls) -> "ControleAdmissao":
+        return cls(ler_limites(os.getenv("ADMISSAO_LIMITES", "")))
+
+    def fila(self, acao: str) -> FilaAcao:
+        fila = self.filas.get(acao)
+        if fila is None:
+            fila = self.filas[acao] = FilaAcao(self.limites.get(acao, self.limite_padrao), self.fila_maxima,
+                                               self.espera_maxima_s)
+        return fila
+
+    async def executar(self, acao: str, remetente: Optional[str], chamada: Callable):
+        """Roda `chamada()` quando houver vaga; levanta Recusada se não der."""
+        if not self.baldes.consumir(remetente):
+            self.recusas["sem_ficha"] += 1
+            raise Recusada("sem_ficha")
+        fila = self.fila(acao)
+        chave = remetente or ""
+        prioridade = self.em_andamento.get(chave, 0)
+        self.em_andamento[chave] = prioridade + 1
+        try:
+            await fila.entrar(prioridade)
+            try:
+                return await chamada()
+            finally:
+                fila.sair()
+        finally:
+            restantes = self.em_andamento[chave] - 1
+            if restantes:
+                self.em_andamento[chave] = restantes
+            else:
+                del self.em_andamento[chave]
+
+    def avisar_recusa(self, acao: str, motivo: str, remetente: Optional[str]):
+        agora = time.monotonic()
+        if agora - self._ultimo_aviso.get(acao, 0.0) < LOG_A_CADA_S:
+            return
+        self._ultimo_aviso[acao] = agora
+        logger.warning(f"Admissao: {acao} recusada ({motivo}, remetente {remetente}). {self.metricas()}")
+
+    def metricas(self) -> Dict[str, Any]:
+        return {**self.recusas, "remetentes_ativos": len(self.em_andamento),
+                "por_acao": {acao: fila.metricas() for acao, fila in self.filas.items()}}
+
+
+# ===================================================================
+# ACTIONS SÍNCRONAS FORA DO LOOP
+# ===================================================================
+
+_executor: Optional[ThreadPoolExecutor] = None
+_pid_executor: Optional[int] = None
+_lock_executor = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    """Pool de threads do processo (recriado no worker, se o processo foi criado por fork)."""
+    global _executor, _pid_executor
+    if _pid_executor != os.getpid():
+        with _lock_executor:
+            if _pid_executor != os.getpid():
+                _executor = ThreadPoolExecutor(max_workers=THREADS, thread_name_prefix="Action")
+                _pid_executor = os.getpid()
+    return _executor
+
+
+def em_thread(run: Callable) -> Callable:
+    """Versão assíncrona de um `run` síncrono, que roda no pool com o contexto atual."""
+
+    def executar(*args):
+        with perfilamento.na_thread_atual():
+            return run(*args)
+
+    @functools.wraps(run)
+    async def run_em_thread(dispatcher, tracker, domain):
+        contexto = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            _pool(), functools.partial(contexto.run, executar, dispatcher, tracker, domain))
+
+    return run_em_thread
+
+
+# ===================================================================
+# GANCHO NO SERVIDOR DE AÇÕES
+# ===================================================================
+
+controle: Optional[ControleAdmissao] = None
+_reserva: Optional[Callable[[str, str], Optional[Any]]] = None
+
+
+def _resposta_recusada(executor, acao: str, action_call: Dict) -> Dict:
+    from rasa_sdk.executor import CollectingDispatcher
+
+    dispatcher = CollectingDispatcher()
+    texto = ((action_call.get("tracker") or {}).get("latest_message") or {}).get("text")
+    resposta = _reserva(acao, texto) if _reserva is not None and texto else None
+    if resposta is not None:
+        controle.recusas["reserva"] += 1
+        eventos = resposta.reproduzir(dispatcher)
+    else:
+        dispatcher.utter_message(text=MENSAGEM_RECUSA)
+        eventos = []
+    return executor._create_api_response(executor.validate_events(eventos, acao), dispatcher.messages)
+
+
+def _instalar_no_executor():
+    from rasa_sdk.executor import ActionExecutor
+
+    if getattr(ActionExecutor.run, "_com_admissao", False):
+        return
+    run_original = ActionExecutor.run
+    register_original = ActionExecutor.register_function
+
+    def register_function(self, name, f):
+        if not inspect.iscoroutinefunction(f):
+            f = em_thread(f)
+        return register_original(self, name, f)
+
+    # Por fora dos outros ganchos: chamada recusada não é capturada nem perfilada
+    async def run(self, action_call):
+        acao = action_call.get("next_action")
+        if controle is None or not acao or acao not in self.actions:
+            return await run_original(self, action_call)
+        remetente = action_call.get("sender_id")
+        try:
+            return await controle.executar(acao, remetente, lambda: run_original(self, action_call))
+        except Recusada as e:
+            controle.avisar_recusa(acao, e.motivo, remetente)
+            return _resposta_recusada(self, acao, action_call)
+
+    run._com_admissao = True
+    ActionExecutor.run = run
+    ActionExecutor.register_function = register_function
+
+
+def instalar(reserva: Optional[Callable[[str, str], Optional[Any]]] = None) -> bool:
+    """
+    Liga o controle de admissão (se ADMISSAO_ATIVA). `reserva(acao, texto)`
+    devolve a resposta guardada para a pergunta (com reproduzir(dispatcher))
+    ou None; deve devolver None para as actions cuja chave no cache não é o
+    texto da pergunta. Chamar depois dos outros ganchos do ActionExecutor.
+    """
+    global controle, _reserva
+    if not ATIVA:
+        return False
+    if controle is None:
+        controle = ControleAdmissao.do_ambiente()
+    _reserva = reserva
+    _instalar_no_executor()
+    logger.info(f"Controle de admissao ativo: limites {controle.limites} (demais {controle.limite_padrao}), "
+                f"fila {controle.fila_maxima}, espera {controle.espera_maxima_s:.0f}s, "
+                f"{controle.baldes.taxa}/s por remetente (rajada {controle.baldes.rajada:.0f})")
+    return True
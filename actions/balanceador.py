@@ -0,0 +1,268 @@
+import logging
+import os
+import random
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# ===================================================================
+# BALANCEAMENTO DE CARGA ENTRE RÉPLICAS DA API FASTAPI (LADO CLIENTE)
+# ===================================================================
+# Duas pools de nós:
+#  - "primario": API_URL, recebe as escritas (POST/PUT/PATCH/DELETE);
+#  - "leitura": API_REPLICAS (+ o primário, se API_LEITURA_NO_PRIMARIO=1),
+#    recebe os GETs.
+# A escolha do nó é "power of two choices": sorteia dois nós saudáveis e
+# fica com o que tem menos requisições em andamento (empate: menor latência
+# média). Nós que falham seguidamente ou ficam lentos demais são ejetados
+# por um tempo (ejeção passiva); com mais de um nó, uma thread confere a
+# saúde de cada um periodicamente (checagem ativa).
+#
+# A latência média é separada por classe de rota: as rotas longas
+# (API_ROTAS_LONGAS, como a geração com IA, que leva até 30s) têm média
+# própria, usada só no desempate, e não ejetam o nó por lentidão. Assim uma
+# chamada de IA não contamina a média dos GETs curtos.
+#
+# Configuração (.env):
+#   API_URL                 - primário (padrão http://127.0.0.1:8000)
+#   API_REPLICAS            - réplicas de leitura, separadas por vírgula (padrão vazio)
+#   API_LEITURA_NO_PRIMARIO - 1 inclui o primário na pool de leitura (padrão 1)
+#   API_ROTAS               - exceções "METODO /prefixo=pool", separadas por vírgula
+#                             (padrão "POST /ia/=leitura": a geração com IA não grava nada)
+#   API_HEALTH_PATH         - caminho da checagem ativa (padrão /docs)
+#   API_HEALTH_INTERVALO    - segundos entre checagens (padrão 10)
+#   API_FALHAS_EJECAO       - falhas seguidas que ejetam um nó (padrão 3)
+#   API_LATENCIA_EJECAO_MS  - latência média (rotas curtas) que ejeta um nó (padrão 2000)
+#   API_ROTAS_LONGAS        - prefixos de rotas demoradas, separados por vírgula,
+#                             fora da ejeção por latência (padrão "/ia/")
+#   API_EJECAO_S            - tempo da primeira ejeção; dobra a cada reincidência (padrão 15)
+
+API_URL = os.getenv("API_URL", "http://127.0.0.1:8000")
+API_REPLICAS = os.getenv("API_REPLICAS", "")
+LEITURA_NO_PRIMARIO = os.getenv("API_LEITURA_NO_PRIMARIO", "1") == "1"
+API_ROTAS = os.getenv("API_ROTAS", "POST /ia/=leitura")
+HEALTH_PATH = os.getenv("API_HEALTH_PATH", "/docs")
+HEALTH_INTERVALO = float(os.getenv("API_HEALTH_INTERVALO", "10"))
+FALHAS_EJECAO = int(os.getenv("API_FALHAS_EJECAO", "3"))
+LATENCIA_EJECAO_MS = float(os.getenv("API_LATENCIA_EJECAO_MS", "2000"))
+API_ROTAS_LONGAS = os.getenv("API_ROTAS_LONGAS", "/ia/")
+EJECAO_S = float(os.getenv("API_EJECAO_S", "15"))
+EJECAO_MAXIMA_S = 300
+PESO_EWMA = 0.2  # Peso da amostra nova na latência média
+METODOS_ESCRITA = {"POST", "PUT", "PATCH", "DELETE"}
+
+
+class No:
+    """Uma réplica da API e o estado observado dela."""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.em_andamento = 0
+        self.latencias_ms: Dict[str, float] = {}  # Média móvel exponencial por classe de rota
+        self.falhas_seguidas = 0
+        self.ejecoes = 0
+        self.ejetado_ate = 0.0
+        self.saudavel = True  # Resultado da última checagem ativa
+        self.requisicoes = 0
+        self.erros = 0
+
+    def disponivel(self, agora: float) -> bool:
+        return self.saudavel and agora >= self.ejetado_ate
+
+    def ejetar(self, motivo: str):
+        duracao = min(EJECAO_S * (2 ** self.ejecoes), EJECAO_MAXIMA_S)
+        self.ejecoes += 1
+        self.ejetado_ate = time.monotonic() + duracao
+        self.falhas_seguidas = 0
+        logger.warning(f"Balanceador: {self.url} ejetado por {duracao:.0f}s ({motivo})")
+
+    def estado(self) -> Dict:
+        return {
+            "url": self.url,
+            "em_andamento": self.em_andamento,
+            "latencia_ms": {classe: round(valor, 1) for classe, valor in self.latencias_ms.items()},
+            "saudavel": self.saudavel,
+            "ejetado": time.monotonic() < self.ejetado_ate,
+            "requisicoes": self.requisicoes,
+            "erros": self.erros,
+        }
+
+
+class Balanceador:
+    """Escolhe o nó de cada requisição e registra o resultado (ver cabeçalho do módulo)."""
+
+    def __init__(self, primario: str, replicas: List[str] = (), leitura_no_primario: bool = True,
+                 rotas: Optional[List[Tuple[str, str, str]]] = None, checagem_ativa: bool = True,
+                 rotas_longas: Tuple[str, ...] = ("/ia/",)):
+        no_primario = No(primario)
+        nos_leitura = [No(url) for url in replicas if url.rstrip("/") != no_primario.url]
+        if leitura_no_primario or not nos_leitura:
+            nos_leitura.append(no_primario)
+        self.pools: Dict[str, List[No]] = {"primario": [no_primario], "leitura": nos_leitura}
+        self.rotas = rotas or []  # (metodo, prefixo, pool), a primeira que casar vale
+        self.rotas_longas = tuple(rotas_longas)
+        self.sessao = requests.Session()  # Reaproveita conexões com cada réplica
+        self._lock = threading.Lock()
+        self._thread_saude: Optional[threading.Thread] = None
+        self._pid_thread: Optional[int] = None
+        self.checagem_ativa = checagem_ativa and len(self.nos()) > 1
+
+    @classmethod
+    def do_ambiente(cls) -> "Balanceador":
+        replicas = [url.strip() for url in API_REPLICAS.split(",") if url.strip()]
+        rotas_longas = tuple(prefixo.strip() for prefixo in API_ROTAS_LONGAS.split(",") if prefixo.strip())
+        return cls(API_URL, replicas, LEITURA_NO_PRIMARIO, cls.ler_rotas(API_ROTAS), rotas_longas=rotas_longas)
+
+    @staticmethod
+    def ler_rotas(texto: str) -> List[Tuple[str, str, str]]:
+        rotas = []
+        for regra in texto.split(","):
+            if "=" not in regra:
+                continue
+            alvo, pool = regra.rsplit("=", 1)
+            metodo, _, prefixo = alvo.strip().partition(" ")
+            rotas.append((metodo.upper(), prefixo.strip(), pool.strip()))
+        return rotas
+
+    def nos(self) -> List[No]:
+        vistos = {}
+        for pool in self.pools.values():
+            for no in pool:
+                vistos[id(no)] = no
+        return list(vistos.values())
+
+    def pool_para(self, metodo: str, caminho: str) -> str:
+        for metodo_regra, prefixo, pool in self.rotas:
+            if metodo_regra in (metodo, "*") and caminho.startswith(prefixo) and pool in self.pools:
+                return pool
+        return "primario" if metodo in METODOS_ESCRITA else "leitura"
+
+    def classe_rota(self, caminho: str) -> str:
+        """"longa" para as rotas de API_ROTAS_LONGAS, "curta" para o resto."""
+        return "longa" if caminho.startswith(self.rotas_longas) else "curta"
+
+    def escolher(self, pool: str, excluir: Optional[No] = None, classe: str = "curta") -> No:
+        agora = time.monotonic()
+        candidatos = [no for no in self.pools[pool] if no is not excluir and no.disponivel(agora)]
+        if not candidatos:
+            # Tudo ejetado/fora: melhor tentar algum nó do que falhar sem tentar
+            candidatos = [no for no in self.pools[pool] if no is not excluir] or self.pools[pool]
+        if len(candidatos) == 1:
+            return candidatos[0]
+        a, b = random.sample(candidatos, 2)
+        chave = lambda no: (no.em_andamento, no.latencias_ms.get(classe, 0.0))
+        return a if chave(a) <= chave(b) else b
+
+    def _registrar(self, no: No, duracao_ms: float, sucesso: bool, classe: str = "curta"):
+        with self._lock:
+            no.em_andamento -= 1
+            no.requisicoes += 1
+            if not sucesso:
+                no.erros += 1
+                no.falhas_seguidas += 1
+                if no.falhas_seguidas >= FALHAS_EJECAO and self._tem_alternativa(no):
+                    no.ejetar(f"{FALHAS_EJECAO} falhas seguidas")
+                return
+            no.falhas_seguidas = 0
+            anterior = no.latencias_ms.get(classe)
+            latencia = duracao_ms if anterior is None else (1 - PESO_EWMA) * anterior + PESO_EWMA * duracao_ms
+            no.latencias_ms[classe] = latencia
+            if classe == "curta" and latencia > LATENCIA_EJECAO_MS and self._tem_alternativa(no):
+                no.ejetar(f"latência média {latencia:.0f}ms")
+                no.latencias_ms.pop(classe, None)  # Volta sem o histórico ruim
+
+    def _tem_alternativa(self, no: No) -> bool:
+        """Só ejeta se sobrar outro nó disponível em todas as pools do nó."""
+        agora = time.monotonic()
+        return all(
+            any(outro is not no and outro.disponivel(agora) for outro in pool)
+            for pool in self.pools.values() if no in pool
+        )
+
+    def requisitar(self, metodo: str, caminho: str, **kwargs) -> requests.Response:
+        """
+        Envia a requisição ao nó escolhido. GETs que falham (conexão, timeout
+        ou 5xx) são repetidos uma vez em outro nó; escritas não são repetidas.
+        """
+        self._garantir_checagem()
+        metodo = metodo.upper()
+        pool = self.pool_para(metodo, caminho)
+        classe = self.classe_rota(caminho)
+        tentativas = 2 if metodo == "GET" and len(self.pools[pool]) > 1 else 1
+        no_anterior = None
+        for tentativa in range(tentativas):
+            no = self.escolher(pool, excluir=no_anterior, classe=classe)
+            with self._lock:
+                no.em_andamento += 1
+            inicio = time.perf_counter()
+            try:
+                resposta = self.sessao.request(metodo, no.url + caminho, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                self._registrar(no, (time.perf_counter() - inicio) * 1000, sucesso=False, classe=classe)
+                if tentativa + 1 >= tentativas:
+                    raise
+                no_anterior = no
+                continue
+            except Exception:
+                self._registrar(no, (time.perf_counter() - inicio) * 1000, sucesso=False, classe=classe)
+                raise
+            sucesso = resposta.status_code < 500
+            self._registrar(no, (time.perf_counter() - inicio) * 1000, sucesso=sucesso, classe=classe)
+            if sucesso or tentativa + 1 >= tentativas:
+                return resposta
+            resposta.close()  # Devolve a conexão ao pool (importa com stream=True)
+            no_anterior = no
+
+    # ------------------------------------------------------------------
+    # Checagem ativa
+    # ------------------------------------------------------------------
+
+    def _garantir_checagem(self):
+        """Inicia a thread de checagem no processo atual (também depois de um fork)."""
+        if not self.checagem_ativa or self._pid_thread == os.getpid():
+            return
+        with self._lock:
+            if self._pid_thread == os.getpid():
+                return
+            self._pid_thread = os.getpid()
+            self._thread_saude = threading.Thread(target=self._loop_saude, daemon=True, name="SaudeApi")
+            self._thread_saude.start()
+
+    def checar_saude(self):
+        for no in self.nos():
+            try:
+                resposta = requests.get(no.url + HEALTH_PATH, timeout=2)
+                saudavel = resposta.status_code < 500
+            except requests.exceptions.RequestException:
+                saudavel = False
+            if saudavel != no.saudavel:
+                logger.warning(f"Balanceador: {no.url} {'voltou' if saudavel else 'falhou na checagem de saúde'}")
+            no.saudavel = saudavel
+
+    def _loop_saude(self):
+        while True:
+            try:
+                self.checar_saude()
+            except Exception as e:
+                logger.error(f"Erro na checagem de saúde das réplicas: {e}")
+            time.sleep(HEALTH_INTERVALO)
+
+    def estado(self) -> Dict[str, List[Dict]]:
+        return {nome: [no.estado() for no in pool] for nome, pool in self.pools.items()}
+
+
+balanceador = Balanceador.do_ambiente()
+
+
+def api_get(caminho: str, **kwargs) -> requests.Response:
+    """GET em `caminho` (ex.: "/aviso/get_lista_aviso/") numa réplica de leitura."""
+    return balanceador.requisitar("GET", caminho, **kwargs)
+
+
+def api_post(caminho: str, **kwargs) -> requests.Response:
+    """POST em `caminho`; vai para o primário, salvo exceção em API_ROTAS."""
+    return balanceador.requisitar("POST", caminho, **kwargs)
@@ -0,0 +1,199 @@
+import copy
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from rasa_sdk.executor import CollectingDispatcher
+
+logger = logging.getLogger(__name__)
+
+# ===================================================================
+# CACHE DAS RESPOSTAS PRONTAS DAS ACTIONS
+# ===================================================================
+# Várias respostas são iguais para todos os alunos (cronograma de uma
+# disciplina, horário de atendimento de um docente, materiais de uma
+# disciplina). Em vez de buscar os dados e montar o texto a cada pergunta,
+# a action guarda as mensagens finais do dispatcher e os eventos que
+# devolveu, com a chave (nome da action, entidade resolvida e normalizada).
+#
+# - Cada entrada registra de quais fontes de dados veio ("docentes",
+#   "base_conhecimento", ...). Quando uma fonte é recarregada, invalidar(fonte)
+#   aumenta a geração dela e as entradas antigas deixam de valer (O(1)).
+# - O nome que o aluno digitou pode aparecer na resposta ("Horario de calculo 1");
+#   com `termo`, ele é trocado por um marcador ao guardar e pelo nome da
+#   pergunta atual ao reproduzir, para a mesma entrada servir a todas as grafias.
+# - Só entram respostas de sucesso: erros e "não encontrado" nunca são guardados.
+# - A resposta da IA e a lista de provas também são guardadas (chave = texto da
+#   pergunta), mas não são lidas no caminho normal: são a reserva que o
+#   controle de admissão (admissao.py) devolve quando recusa a chamada.
+#
+# Configuração (.env):
+#   RESPOSTAS_CACHE_TTL        - TTL por action, "action=segundos" separados por vírgula
+#                                (0 desliga a action; padrão abaixo em TTL_PADRAO_ACOES)
+#   RESPOSTAS_CACHE_TTL_PADRAO - TTL das actions não listadas (padrão 300)
+#   RESPOSTAS_CACHE_MAXIMO     - entradas em memória, descartando as menos usadas (padrão 2000)
+
+TTL_PADRAO_ACOES = {
+    "action_buscar_cronograma": 600,
+    "action_buscar_atendimento_docente": 300,  # Igual ao CacheHelper.CACHE_TTL das listas de docentes
+    "action_buscar_material": 900,
+    "action_gerar_resposta_com_ia": 1800,  # Só reserva (ver acima)
+    "action_listar_todas_provas": 600,  # Só reserva
+}
+TTL_PADRAO = float(os.getenv("RESPOSTAS_CACHE_TTL_PADRAO", "300"))
+MAXIMO_ENTRADAS = int(os.getenv("RESPOSTAS_CACHE_MAXIMO", "2000"))
+LOG_A_CADA = 100  # Consultas entre um registro da taxa de acerto e o próximo
+MARCADOR_TERMO = "\x00termo\x00"
+
+
+def normalizar_chave(valor: Any) -> str:
+    """Sem acentos, minúsculas e espaços simples: "Cálculo  I" e "calculo i" dão a mesma chave."""
+    texto = unicodedata.normalize('NFD', str(valor or ''))
+    texto = ''.join(c for c in texto if unicodedata.category(c) != 'Mn')
+    return ' '.join(texto.lower().split())
+
+
+def ler_ttls(texto: str) -> Dict[str, float]:
+    ttls = {}
+    for regra in texto.split(","):
+        acao, separador, segundos = regra.partition("=")
+        if not separador:
+            continue
+        try:
+            ttls[acao.strip()] = float(segundos)
+        except ValueError:
+            logger.warning(f"TTL invalido em RESPOSTAS_CACHE_TTL: {regra!r}")
+    return ttls
+
+
+def _trocar_termo(mensagens: List[Dict], de: str, para: str) -> List[Dict]:
+    """
+    Cópia das mensagens com a primeira ocorrência de `de` (palavra inteira)
+    trocada por `para` em cada texto; o nome digitado só aparece no cabeçalho
+    das respostas, e o resto do texto (salas, títulos) fica intacto.
+    """
+    trocadas = copy.deepcopy(mensagens)
+    if de:
+        padrao = re.compile(rf"(?<!\w){re.escape(de)}(?!\w)")
+        for mensagem in trocadas:
+            if isinstance(mensagem.get("text"), str):
+                mensagem["text"] = padrao.sub(lambda _: para, mensagem["text"], count=1)
+    return trocadas
+
+
+class _Entrada(NamedTuple):
+    mensagens: List[Dict]
+    eventos: List[Dict]
+    expira: float
+    geracoes: Tuple[Tuple[str, int], ...]
+
+
+class RespostaCacheada(NamedTuple):
+    mensagens: List[Dict]
+    eventos: List[Dict]
+
+    def reproduzir(self, dispatcher: CollectingDispatcher) -> List[Dict]:
+        """Envia as mensagens guardadas e devolve os eventos, como a action faria."""
+        dispatcher.messages.extend(self.mensagens)
+        return self.eventos
+
+
+class CacheRespostas:
+    """Cache LRU com TTL por action e invalidação por fonte (ver cabeçalho do módulo)."""
+
+    def __init__(self, ttls: Optional[Dict[str, float]] = None, ttl_padrao: float = TTL_PADRAO,
+                 maximo: int = MAXIMO_ENTRADAS):
+        self.ttls = dict(TTL_PADRAO_ACOES, **(ttls or {}))
+        self.ttl_padrao = ttl_padrao
+        self.maximo = maximo
+        self._entradas: "OrderedDict[Tuple[str, str], _Entrada]" = OrderedDict()
+        self._geracoes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._contadores: Dict[str, Dict[str, int]] = {}
+        self._consultas = 0
+
+    @classmethod
+    def do_ambiente(cls) -> "CacheRespostas":
+        return cls(ler_ttls(os.getenv("RESPOSTAS_CACHE_TTL", "")))
+
+    def ttl(self, acao: str) -> float:
+        return self.ttls.get(acao, self.ttl_padrao)
+
+    def _contar(self, acao: str, evento: str):
+        contadores = self._contadores.setdefault(acao, {"acertos": 0, "falhas": 0, "gravacoes": 0})
+        contadores[evento] += 1
+
+    def obter(self, acao: str, chave: Any, termo: Optional[str] = None) -> Optional[RespostaCacheada]:
+        """Resposta guardada para (acao, chave), ou None se não houver, expirou ou a fonte mudou."""
+        if self.ttl(acao) <= 0:
+            return None
+        chave = (acao, normalizar_chave(chave))
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is not None and (entrada.expira <= time.monotonic() or any(
+                    self._geracoes.get(fonte, 0) != geracao for fonte, geracao in entrada.geracoes)):
+                del self._entradas[chave]
+                entrada = None
+            self._consultas += 1
+            if self._consultas % LOG_A_CADA == 0:
+                logger.info(f"Cache de respostas: {self._resumo()}")
+            if entrada is None:
+                self._contar(acao, "falhas")
+                return None
+            self._entradas.move_to_end(chave)
+            self._contar(acao, "acertos")
+        logger.info(f"Cache de respostas HIT: {acao} '{chave[1]}'")
+        return RespostaCacheada(_trocar_termo(entrada.mensagens, MARCADOR_TERMO, termo or ""),
+                                copy.deepcopy(entrada.eventos))
+
+    def guardar(self, acao: str, chave: Any, mensagens: List[Dict], eventos: List[Dict],
+                fontes: Iterable[str] = (), termo: Optional[str] = None):
+        """Guarda as mensagens (como em dispatcher.messages) e os eventos de uma resposta de sucesso."""
+        ttl = self.ttl(acao)
+        if ttl <= 0:
+            return
+        chave = (acao, normalizar_chave(chave))
+        mensagens = _trocar_termo(mensagens, termo or "", MARCADOR_TERMO)
+        with self._lock:
+            geracoes = tuple((fonte, self._geracoes.get(fonte, 0)) for fonte in fontes)
+            self._entradas[chave] = _Entrada(mensagens, copy.deepcopy(eventos), time.monotonic() + ttl, geracoes)
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.maximo:
+                self._entradas.popitem(last=False)
+            self._contar(acao, "gravacoes")
+
+    def invalidar(self, fonte: Optional[str] = None):
+        """Descarta as respostas que vieram de `fonte` (todas, se None)."""
+        with self._lock:
+            if fonte is None:
+                self._entradas.clear()
+            else:
+                self._geracoes[fonte] = self._geracoes.get(fonte, 0) + 1
+        logger.info(f"Cache de respostas invalidado: {fonte or 'tudo'}")
+
+    def _resumo(self) -> str:
+        return ", ".join(
+            f"{acao} {c['acertos']}/{c['acertos'] + c['falhas']}" for acao, c in self._contadores.items()
+        ) + f" ({len(self._entradas)} entradas)"
+
+    def metricas(self) -> Dict[str, Any]:
+        with self._lock:
+            por_acao = {}
+            for acao, contadores in self._contadores.items():
+                consultas = contadores["acertos"] + contadores["falhas"]
+                por_acao[acao] = {
+                    **contadores,
+                    "taxa_acerto": round(contadores["acertos"] / consultas, 4) if consultas else 0.0,
+                }
+            acertos = sum(c["acertos"] for c in self._contadores.values())
+            consultas = acertos + sum(c["falhas"] for c in self._contadores.values())
+            return {
+                "entradas": len(self._entradas),
+                "taxa_acerto": round(acertos / consultas, 4) if consultas else 0.0,
+                "por_acao": por_acao,
+            }
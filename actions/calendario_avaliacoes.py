@@ -0,0 +1,266 @@
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, bisect_right
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from actions.balanceador import api_get
+from actions.captura_trafego import em_segundo_plano
+from actions.decodificacao_json import ler_json
+
+logger = logging.getLogger(__name__)
+
+# ===================================================================
+# CALENDÁRIO LOCAL DAS AVALIAÇÕES
+# ===================================================================
+# Todas as avaliações de todas as disciplinas, ordenadas por data, com a
+# data já convertida. Uma thread recarrega o calendário da API em segundo
+# plano e troca o índice inteiro de uma vez; as consultas por disciplina,
+# tipo e intervalo de datas são feitas com bisect, sem rede.
+#
+# Disciplina cuja listagem falha não derruba o índice: ficam as avaliações
+# dela da carga anterior, e ela é marcada em `incompletas` (a busca por ela
+# volta para a API). Sem índice nenhum (API fora na partida), a carga na
+# hora é tentada uma vez só; depois, quem tenta de novo é a thread, com
+# espera crescente até CALENDARIO_INTERVALO.
+#
+# Configuração (.env):
+#   CALENDARIO_INTERVALO - segundos entre recargas (padrão 300)
+
+INTERVALO_SINCRONIZACAO = int(os.getenv("CALENDARIO_INTERVALO", "300"))
+ESPERA_INICIAL_FALHA_S = 5  # Primeira nova tentativa quando ainda não há índice
+
+# Termos genéricos: qualquer tipo de avaliação serve
+TERMOS_GENERICOS = {"prova", "provas", "avaliacao", "avaliacoes"}
+SINONIMOS_TIPO = {"substitutiva": "sub"}
+
+
+def _sem_acentos(texto: str) -> str:
+    texto = unicodedata.normalize('NFD', texto or '')
+    return ''.join(c for c in texto if unicodedata.category(c) != 'Mn').lower().strip()
+
+
+def normalizar_tipo(termo: Optional[str]) -> Optional[str]:
+    """Tipo canônico para filtrar ("NP1" -> "np1", "substitutiva" -> "sub"); None = todos."""
+    termo = _sem_acentos(termo or "")
+    if not termo or termo in TERMOS_GENERICOS:
+        return None
+    return SINONIMOS_TIPO.get(termo, termo)
+
+
+def converter_data(texto: Optional[str]) -> Optional[date]:
+    try:
+        return date.fromisoformat((texto or "")[:10])
+    except ValueError:
+        return None
+
+
+class Avaliacao(NamedTuple):
+    data: Optional[date]
+    id_disciplina: str
+    nome_disciplina: str
+    tipo: str           # Como veio da API ("NP1")
+    tipo_normalizado: str
+    data_texto: str     # Data exibida ("2025-11-12"), igual à resposta antiga
+
+    @classmethod
+    def da_api(cls, aval: Dict, id_disciplina: str, nome_disciplina: str) -> Optional["Avaliacao"]:
+        tipo = aval.get('tipo_avaliacao') or ''
+        data_prova = aval.get('data_prova') or ''
+        if not tipo or not data_prova:
+            return None
+        data_texto = data_prova.split('T')[0] if 'T' in data_prova else data_prova
+        return cls(converter_data(data_prova), id_disciplina, nome_disciplina, tipo,
+                   normalizar_tipo(tipo) or _sem_acentos(tipo), data_texto)
+
+
+class _ListaPorData:
+    """Avaliações ordenadas por data, com as datas em paralelo para o bisect."""
+    __slots__ = ("avaliacoes", "ordinais")
+
+    def __init__(self, avaliacoes: List[Avaliacao]):
+        self.avaliacoes = avaliacoes
+        self.ordinais = [a.data.toordinal() for a in avaliacoes]
+
+    def entre(self, inicio: Optional[date], fim: Optional[date]) -> List[Avaliacao]:
+        esquerda = bisect_left(self.ordinais, inicio.toordinal()) if inicio else 0
+        direita = bisect_right(self.ordinais, fim.toordinal()) if fim else len(self.ordinais)
+        return self.avaliacoes[esquerda:direita]
+
+
+class IndiceCalendario:
+    """Índice imutável: uma lista geral e uma por disciplina e por tipo, todas por data."""
+
+    def __init__(self, avaliacoes: List[Avaliacao], incompletas: Iterable[str] = ()):
+        self.incompletas = frozenset(incompletas)  # Disciplinas que falharam na última carga
+        com_data = sorted((a for a in avaliacoes if a.data), key=lambda a: (a.data, a.nome_disciplina, a.tipo))
+        self.sem_data = [a for a in avaliacoes if not a.data]  # Só aparecem sem filtro de datas
+        self.todas = _ListaPorData(com_data)
+        agrupado_disciplina: Dict[str, List[Avaliacao]] = {}
+        agrupado_tipo: Dict[str, List[Avaliacao]] = {}
+        for aval in com_data:
+            agrupado_disciplina.setdefault(aval.id_disciplina, []).append(aval)
+            agrupado_tipo.setdefault(aval.tipo_normalizado, []).append(aval)
+        self.por_disciplina = {k: _ListaPorData(v) for k, v in agrupado_disciplina.items()}
+        self.por_tipo = {k: _ListaPorData(v) for k, v in agrupado_tipo.items()}
+
+    def __len__(self):
+        return len(self.todas.avaliacoes) + len(self.sem_data)
+
+    def buscar(self, id_disciplina: Optional[str] = None, tipo: Optional[str] = None,
+               inicio: Optional[date] = None, fim: Optional[date] = None) -> List[Avaliacao]:
+        """
+        Avaliações que atendem a todos os filtros informados, por data.
+        Parte da menor lista indexada (disciplina ou tipo) e recorta o intervalo com bisect.
+        """
+        tipo = normalizar_tipo(tipo)
+        candidatas = [self.todas]
+        if id_disciplina is not None:
+            candidatas.append(self.por_disciplina.get(id_disciplina, _ListaPorData([])))
+        if tipo is not None:
+            candidatas.append(self.por_tipo.get(tipo, _ListaPorData([])))
+        base = min(candidatas, key=lambda lista: len(lista.avaliacoes))
+        resultado = [
+            a for a in base.entre(inicio, fim)
+            if (id_disciplina is None or a.id_disciplina == id_disciplina)
+            and (tipo is None or a.tipo_normalizado == tipo)
+        ]
+        if inicio is None and fim is None:
+            resultado += [a for a in self.sem_data
+                          if (id_disciplina is None or a.id_disciplina == id_disciplina)
+                          and (tipo is None or a.tipo_normalizado == tipo)]
+        return resultado
+
+
+# ===================================================================
+# INTERVALOS DE DATAS NA PERGUNTA
+# ===================================================================
+
+def intervalo_de_datas(texto: str, hoje: Optional[date] = None) -> Optional[Tuple[date, date]]:
+    """
+    Reconhece "hoje", "amanhã", "esta semana", "próxima semana"/"semana que vem",
+    "este mês" e "próximo mês". Semanas vão de segunda a domingo.
+    """
+    hoje = hoje or date.today()
+    texto = _sem_acentos(texto)
+    segunda = hoje - timedelta(days=hoje.weekday())
+    if re.search(r"\b(proxima semana|semana que vem)\b", texto):
+        return segunda + timedelta(days=7), segunda + timedelta(days=13)
+    if re.search(r"\b(esta|essa|nesta|nessa) semana\b", texto):
+        return hoje, segunda + timedelta(days=6)
+    if re.search(r"\b(proximo mes|mes que vem)\b", texto):
+        inicio = (hoje.replace(day=1) + timedelta(days=32)).replace(day=1)
+        return inicio, (inicio + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    if re.search(r"\b(este|esse|neste|nesse) mes\b", texto):
+        return hoje, (hoje.replace(day=1) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    if re.search(r"\bamanha\b", texto):
+        return hoje + timedelta(days=1), hoje + timedelta(days=1)
+    if re.search(r"\bhoje\b", texto):
+        return hoje, hoje
+    return None
+
+
+# ===================================================================
+# SINCRONIZAÇÃO COM A API
+# ===================================================================
+
+class CalendarioAvaliacoes:
+    """Mantém o IndiceCalendario atualizado a partir da API, em segundo plano."""
+
+    def __init__(self, intervalo: int = INTERVALO_SINCRONIZACAO):
+        self.intervalo = intervalo
+        self.indice: Optional[IndiceCalendario] = None
+        self.nomes_disciplinas: Dict[str, str] = {}
+        self.ultima_sincronizacao: Optional[float] = None
+        self._pid_thread: Optional[int] = None
+        self._lock_thread = threading.Lock()
+        self._lock_sincronizacao = threading.Lock()
+        self._carga_tentada = False
+
+    def sincronizar(self) -> int:
+        """Recarrega todas as avaliações e troca o índice. Retorna quantas foram carregadas."""
+        with self._lock_sincronizacao, em_segundo_plano("calendario de avaliacoes"):
+            inicio = time.perf_counter()
+            response = api_get("/disciplinas/lista_disciplina/", timeout=10)
+            response.raise_for_status()
+            nomes = {}
+            for disc in ler_json(response) or []:
+                if isinstance(disc, dict) and disc.get('id_disciplina') and disc.get('nome_disciplina'):
+                    nomes[disc['id_disciplina']] = disc['nome_disciplina']
+
+            avaliacoes, incompletas = [], []
+            for id_disciplina, nome in nomes.items():
+                try:
+                    resposta = api_get(f"/avaliacao/disciplina/{id_disciplina}", timeout=10)
+                    if resposta.status_code == 404:
+                        continue
+                    resposta.raise_for_status()
+                    dados = ler_json(resposta)
+                except Exception as e:
+                    # Só esta disciplina fica com os dados da carga anterior
+                    logger.warning(f"Calendario: avaliacoes de {nome} ({id_disciplina}) indisponiveis: {e}")
+                    incompletas.append(id_disciplina)
+                    avaliacoes.extend(self._anteriores(id_disciplina))
+                    continue
+                for aval in (dados if isinstance(dados, list) else []):
+                    registro = Avaliacao.da_api(aval, id_disciplina, nome) if isinstance(aval, dict) else None
+                    if registro:
+                        avaliacoes.append(registro)
+
+            self.indice = IndiceCalendario(avaliacoes, incompletas)
+            self.nomes_disciplinas = nomes
+            self.ultima_sincronizacao = time.time()
+            logger.info(f"Calendario de avaliacoes sincronizado: {len(avaliacoes)} avaliacao(oes) de "
+                        f"{len(nomes)} disciplina(s) ({len(incompletas)} incompleta(s)) "
+                        f"em {(time.perf_counter() - inicio) * 1000:.0f}ms")
+            return len(avaliacoes)
+
+    def _anteriores(self, id_disciplina: str) -> List[Avaliacao]:
+        indice = self.indice
+        if indice is None:
+            return []
+        com_data = indice.por_disciplina.get(id_disciplina)
+        return (com_data.avaliacoes if com_data else []) + \
+            [a for a in indice.sem_data if a.id_disciplina == id_disciplina]
+
+    def _loop_sincronizacao(self):
+        espera = self.intervalo if self.indice is not None else ESPERA_INICIAL_FALHA_S
+        while True:
+            time.sleep(espera)
+            try:
+                self.sincronizar()
+                espera = self.intervalo
+            except Exception as e:
+                logger.warning(f"Falha ao sincronizar calendario de avaliacoes (mantendo versao local): {e}")
+                # Sem índice, tenta de novo antes, dobrando a espera até o intervalo normal
+                espera = self.intervalo if self.indice is not None else min(espera * 2, self.intervalo)
+
+    def garantir_sincronizacao(self):
+        """Inicia a thread de recarga (de novo, se o processo foi criado por fork)."""
+        if self._pid_thread == os.getpid():
+            return
+        with self._lock_thread:
+            if self._pid_thread == os.getpid():
+                return
+            threading.Thread(target=self._loop_sincronizacao, daemon=True, name="SincronizacaoCalendario").start()
+            self._pid_thread = os.getpid()
+
+    def obter_indice(self) -> Optional[IndiceCalendario]:
+        """
+        Índice atual. Na primeira consulta do processo carrega na hora (uma vez
+        só, mesmo se falhar); sem índice, devolve None e a action usa a API.
+        """
+        self.garantir_sincronizacao()
+        if self.indice is None and not self._carga_tentada:
+            with self._lock_thread:
+                tentar, self._carga_tentada = not self._carga_tentada, True
+            if tentar:
+                try:
+                    self.sincronizar()
+                except Exception as e:
+                    logger.warning(f"Calendario de avaliacoes indisponivel (a thread tenta de novo): {e}")
+        return self.indice
@@ -0,0 +1,222 @@
+import contextvars
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# ===================================================================
+# CAPTURA DE TRÁFEGO DO SERVIDOR DE AÇÕES (RECORD)
+# ===================================================================
+# Grava em JSONL cada chamada ao /webhook (tracker, ação, domain), a
+# resposta devolvida ao Rasa e as respostas da API consultadas durante a
+# ação. O arquivo é reexecutado por benchmarks/replay_trafego.py contra
+# qualquer build, com a API substituída por um stub local. Respostas com
+# stream=True não são lidas pela captura: os blocos que a ação consome são
+# copiados e o corpo é montado só ao gravar o registro.
+#
+# As recargas feitas fora de uma ação (aquecimento do run_actions.py,
+# sincronização do índice BM25, calendário de avaliações, feed de avisos)
+# também são gravadas, sempre, num registro com "origem" e sem
+# "action_call": o replay serve essas respostas pelo stub para o build
+# carregar os mesmos dados, mas não as reexecuta.
+#
+# Configuração (.env):
+#   CAPTURA_TRAFEGO     - caminho do JSONL (vazio desativa; padrão vazio)
+#   CAPTURA_AMOSTRAGEM  - fração das chamadas gravadas, de 0 a 1 (padrão 1)
+
+CAMINHO_CAPTURA = os.getenv("CAPTURA_TRAFEGO", "")
+AMOSTRAGEM = float(os.getenv("CAPTURA_AMOSTRAGEM", "1"))
+VERSAO_FORMATO = 1
+
+# Chamadas à API feitas pela ação em andamento (None fora de uma chamada amostrada).
+# Ações síncronas rodam na mesma task (ou em thread com o contexto copiado).
+_chamadas_upstream: contextvars.ContextVar[Optional[List[Dict]]] = contextvars.ContextVar(
+    "chamadas_upstream", default=None)
+
+
+class GravadorTrafego:
+    """Acrescenta registros ao JSONL de captura, um por linha."""
+
+    def __init__(self, caminho: str, amostragem: float = 1.0):
+        self.caminho = caminho
+        self.amostragem = max(0.0, min(1.0, amostragem))
+        self._lock = threading.Lock()
+        self.gravados = 0
+        self.ignorados = 0
+        pasta = os.path.dirname(os.path.abspath(caminho))
+        os.makedirs(pasta, exist_ok=True)
+
+    def sortear(self) -> bool:
+        if self.amostragem >= 1.0 or random.random() < self.amostragem:
+            return True
+        self.ignorados += 1
+        return False
+
+    def gravar(self, registro: Dict):
+        linha = json.dumps(registro, ensure_ascii=False, separators=(',', ':'), default=str)
+        with self._lock:
+            with open(self.caminho, "a", encoding="utf-8") as f:
+                f.write(linha + "\n")
+            self.gravados += 1
+
+
+gravador: Optional[GravadorTrafego] = None
+
+
+def _espelhar_stream(resposta, chamada: Dict):
+    """Copia os blocos lidos pela ação (iter_content, iter_lines, .json()...) sem antecipar a leitura."""
+    espelho = {"blocos": [], "completo": False, "encoding": resposta.encoding}
+    iter_original = resposta.iter_content
+
+    def iter_content(*args, **kwargs):
+        for bloco in iter_original(*args, **kwargs):
+            espelho["blocos"].append(bloco.encode("utf-8") if isinstance(bloco, str) else bloco)
+            # Quem lê a lista para no "]" sem pedir o próximo bloco: o corpo acabou se a conexão já fechou
+            espelho["completo"] = bool(getattr(resposta.raw, "closed", False))
+            yield bloco
+        espelho["completo"] = True
+
+    resposta.iter_content = iter_content
+    chamada["_espelho"] = espelho
+
+
+def _finalizar_upstream(chamadas: List[Dict]):
+    """Monta o corpo das respostas em stream com o que a ação leu."""
+    for chamada in chamadas:
+        espelho = chamada.pop("_espelho", None)
+        if espelho is None:
+            continue
+        chamada["conteudo"] = b"".join(espelho["blocos"]).decode(espelho["encoding"] or "utf-8", errors="replace")
+        if not espelho["completo"]:
+            chamada["conteudo_parcial"] = True  # A ação parou antes do fim do corpo
+
+
+def _registrar_upstream(metodo: str, url: str, kwargs: Dict, resposta, duracao_ms: float):
+    chamadas = _chamadas_upstream.get()
+    if chamadas is None:
+        return
+    corpo = kwargs.get("json")
+    chamada = {
+        "metodo": metodo.upper(),
+        "url": getattr(resposta, "url", None) or url,
+        "corpo": corpo,
+        "status": getattr(resposta, "status_code", None),
+        "content_type": resposta.headers.get("Content-Type") if resposta is not None else None,
+        "conteudo": None,
+        "duracao_ms": round(duracao_ms, 3),
+    }
+    if resposta is not None:
+        if kwargs.get("stream"):
+            _espelhar_stream(resposta, chamada)
+        else:
+            chamada["conteudo"] = resposta.text
+    chamadas.append(chamada)
+
+
+@contextmanager
+def em_segundo_plano(origem: str) -> Iterator[None]:
+    """
+    Grava as chamadas à API feitas no bloco num registro próprio (sem
+    amostragem). Dentro de uma ação já capturada, as chamadas ficam na ação.
+    """
+    if gravador is None or _chamadas_upstream.get() is not None:
+        yield
+        return
+    chamadas: List[Dict] = []
+    token = _chamadas_upstream.set(chamadas)
+    registro = {"versao": VERSAO_FORMATO, "ts": time.time(), "origem": origem}
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        _chamadas_upstream.reset(token)
+        if chamadas:
+            registro["duracao_ms"] = round((time.perf_counter() - inicio) * 1000, 3)
+            registro["upstream"] = chamadas
+            try:
+                _finalizar_upstream(chamadas)
+                gravador.gravar(registro)
+            except Exception as e:
+                logger.error(f"Erro ao gravar captura de tráfego: {e}")
+
+
+def _instalar_em_requests():
+    if getattr(requests.sessions.Session.request, "_com_captura", False):
+        return
+    request_original = requests.sessions.Session.request
+
+    def request(self, method, url, *args, **kwargs):
+        if _chamadas_upstream.get() is None:
+            return request_original(self, method, url, *args, **kwargs)
+        inicio = time.perf_counter()
+        resposta = None
+        try:
+            resposta = request_original(self, method, url, *args, **kwargs)
+            return resposta
+        finally:
+            _registrar_upstream(method, url, kwargs, resposta, (time.perf_counter() - inicio) * 1000)
+
+    request._com_captura = True
+    requests.sessions.Session.request = request
+
+
+def _instalar_no_executor():
+    from rasa_sdk.executor import ActionExecutor
+
+    if getattr(ActionExecutor.run, "_com_captura", False):
+        return
+    run_original = ActionExecutor.run
+
+    async def run(self, action_call):
+        if gravador is None or not action_call.get("next_action") or not gravador.sortear():
+            return await run_original(self, action_call)
+        chamadas: List[Dict] = []
+        token = _chamadas_upstream.set(chamadas)
+        registro = {
+            "versao": VERSAO_FORMATO,
+            "ts": time.time(),
+            "acao": action_call.get("next_action"),
+            "sender_id": action_call.get("sender_id"),
+            "action_call": action_call,
+        }
+        inicio = time.perf_counter()
+        try:
+            resultado = await run_original(self, action_call)
+            registro["resposta"] = resultado
+            return resultado
+        except Exception as e:
+            registro["erro"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _chamadas_upstream.reset(token)
+            registro["duracao_ms"] = round((time.perf_counter() - inicio) * 1000, 3)
+            registro["upstream"] = chamadas
+            try:
+                _finalizar_upstream(chamadas)
+                gravador.gravar(registro)
+            except Exception as e:
+                logger.error(f"Erro ao gravar captura de tráfego: {e}")
+
+    run._com_captura = True
+    ActionExecutor.run = run
+
+
+def instalar(caminho: str = CAMINHO_CAPTURA, amostragem: float = AMOSTRAGEM) -> bool:
+    """Ativa a captura se houver caminho configurado. Pode ser chamada mais de uma vez."""
+    global gravador
+    if not caminho:
+        return False
+    if gravador is None:
+        gravador = GravadorTrafego(caminho, amostragem)
+    _instalar_em_requests()
+    _instalar_no_executor()
+    logger.info(f"Captura de tráfego ativa: {caminho} (amostragem {gravador.amostragem:.0%})")
+    return True
@@ -0,0 +1,158 @@
+import codecs
+import json
+import logging
+from typing import Any, Iterable, Iterator, Optional, Sequence, Union
+
+import requests
+
+try:
+    import ujson
+except ImportError:  # ujson está no requirements.txt, mas o json da stdlib resolve
+    ujson = None
+
+logger = logging.getLogger(__name__)
+
+# ===================================================================
+# DECODIFICAÇÃO DAS RESPOSTAS JSON DA API
+# ===================================================================
+# - ler_json(response): corpo inteiro com ujson (bem mais rápido que o
+#   json da stdlib usado por response.json()), com o mesmo erro
+#   (requests.exceptions.JSONDecodeError) em caso de JSON inválido.
+# - iterar_lista_json(response, campos): percorre um array JSON enquanto
+#   ele chega pela rede (requisição com stream=True), guardando só o
+#   elemento atual e, opcionalmente, só os campos pedidos. Listas que
+#   crescem sem limite (/mensagens_aluno/get_lista_msg/) são agregadas com
+#   memória constante.
+
+TAMANHO_BLOCO = 64 * 1024
+_decodificador = json.JSONDecoder()
+
+
+def carregar_json(dados: Union[str, bytes]) -> Any:
+    """Decodifica um documento JSON completo (str ou bytes UTF-8)."""
+    try:
+        if ujson is not None:
+            return ujson.loads(dados)
+        return json.loads(dados)
+    except ValueError as e:
+        texto = dados.decode("utf-8", errors="replace") if isinstance(dados, bytes) else dados
+        raise requests.exceptions.JSONDecodeError(str(e), texto[:200], 0) from None
+
+
+def ler_json(response: requests.Response) -> Any:
+    """Substituto de response.json() usando o codec rápido."""
+    return carregar_json(response.content)
+
+
+def _projetar(elemento: Any, campos: Optional[Sequence[str]]) -> Any:
+    if campos is None or not isinstance(elemento, dict):
+        return elemento
+    return {campo: elemento.get(campo) for campo in campos}
+
+
+def _elementos_do_array(blocos: Iterable[bytes]) -> Iterator[Any]:
+    """
+    Decodifica os elementos de um array JSON um a um, lendo os blocos sob
+    demanda. Cada elemento é decodificado com o raw_decode (em C) da stdlib;
+    se o bloco acabar no meio de um elemento, lê mais e tenta de novo.
+    """
+    decodificador_utf8 = codecs.getincrementaldecoder("utf-8")()
+    blocos = iter(blocos)
+    buffer = ""
+    posicao = 0
+    fim_dos_dados = False
+
+    def ler_mais() -> bool:
+        nonlocal buffer, posicao, fim_dos_dados
+        for bloco in blocos:
+            if not bloco:
+                continue
+            if posicao > TAMANHO_BLOCO:  # Descarta o que já foi consumido
+                buffer, posicao = buffer[posicao:], 0
+            buffer += decodificador_utf8.decode(bloco)
+            return True
+        buffer += decodificador_utf8.decode(b"", final=True)
+        fim_dos_dados = True
+        return False
+
+    def pular_espacos():
+        nonlocal posicao
+        while True:
+            while posicao < len(buffer) and buffer[posicao] in " \t\r\n":
+                posicao += 1
+            if posicao < len(buffer) or fim_dos_dados or not ler_mais():
+                return
+
+    pular_espacos()
+    if posicao >= len(buffer) or buffer[posicao] != "[":
+        raise ValueError("o corpo não começa com um array JSON")
+    posicao += 1
+    pular_espacos()
+    if posicao < len(buffer) and buffer[posicao] == "]":
+        return
+
+    while True:
+        pular_espacos()
+        try:
+            elemento, fim = _decodificador.raw_decode(buffer, posicao)
+        except json.JSONDecodeError:
+            elemento, fim = None, None
+        # Número no fim do buffer pode estar cortado ("12" de "123", "-4" de "-4.5"):
+        # só vale se o que vem depois já é separador
+        completo = fim is not None and (fim_dos_dados or (fim < len(buffer) and buffer[fim] in " \t\r\n,]"))
+        if not completo:
+            if fim_dos_dados:
+                raise ValueError(f"array JSON incompleto na posição {posicao}")
+            # Elemento grande: espera o buffer dobrar antes de tentar de novo (evita custo quadrático)
+            tamanho_na_ultima_falha = max(1, len(buffer) - posicao)
+            while not fim_dos_dados and len(buffer) - posicao < 2 * tamanho_na_ultima_falha:
+                ler_mais()
+            continue
+        posicao = fim
+        yield elemento
+        pular_espacos()
+        if posicao >= len(buffer):
+            raise ValueError("array JSON incompleto")
+        separador = buffer[posicao]
+        posicao += 1
+        if separador == "]":
+            return
+        if separador != ",":
+            raise ValueError(f"separador inesperado {separador!r} no array JSON")
+
+
+def iterar_lista_json(response: requests.Response, campos: Optional[Sequence[str]] = None) -> Iterator[Any]:
+    """
+    Percorre os elementos de uma resposta em lista, projetando só `campos`
+    quando informados. Com stream=True na requisição, o corpo é lido aos
+    poucos; sem, o corpo já baixado é percorrido do mesmo jeito.
+    Respostas no formato {"value": [...]} são decodificadas inteiras.
+    """
+    blocos = response.iter_content(chunk_size=TAMANHO_BLOCO)
+    primeiro = b""
+    for bloco in blocos:
+        primeiro = bloco.lstrip()
+        if primeiro:
+            break
+    if not primeiro:
+        return
+    if not primeiro.startswith(b"["):
+        dados = carregar_json(primeiro + b"".join(blocos))
+        lista = dados.get("value") if isinstance(dados, dict) else None
+        if not isinstance(lista, list):
+            logger.warning(f"Resposta nao e uma lista: {type(dados)}")
+            return
+        for elemento in lista:
+            yield _projetar(elemento, campos)
+        return
+
+    def todos_os_blocos():
+        yield primeiro
+        yield from blocos
+
+    try:
+        for elemento in _elementos_do_array(todos_os_blocos()):
+            yield _projetar(elemento, campos)
+    except ValueError as e:
+        raise requests.exceptions.JSONDecodeError(str(e), "", 0) from None
+
@@ -0,0 +1,219 @@
+import hashlib
+import heapq
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from actions.balanceador import api_get
+from actions.captura_trafego import em_segundo_plano
+from actions.decodificacao_json import iterar_lista_json
+
+logger = logging.getLogger(__name__)
+
+# ===================================================================
+# FEED LOCAL DE AVISOS
+# ===================================================================
+# Mantém em memória os avisos mais recentes, em vez de baixar a lista
+# inteira a cada "últimos avisos":
+#  - uma thread busca novidades a cada AVISOS_FRESCOR_S segundos, mandando
+#    a marca d'água (maior data/id já visto) no parâmetro AVISOS_PARAMETRO_DESDE.
+#    Se a API ignorar o parâmetro, a lista vem inteira, mas é lida em stream
+#    e só o que passa da marca d'água (ou ainda não foi visto) entra no buffer;
+#  - o buffer é um heap limitado a AVISOS_MAXIMO avisos, ordenado por data
+#    (ou id numérico); no empate, e para avisos sem nenhum dos dois, vale a
+#    ordem da API: busca mais recente primeiro e, dentro dela, o começo da
+#    lista é o mais novo;
+#  - a consulta devolve os K mais recentes com heapq.nlargest;
+#  - a cada AVISOS_RESSINCRONIZAR_S o feed é refeito do zero, para refletir
+#    avisos apagados ou editados.
+#
+# Configuração (.env):
+#   AVISOS_FRESCOR_S          - atraso máximo para um aviso novo aparecer (padrão 60)
+#   AVISOS_MAXIMO             - avisos guardados em memória (padrão 200)
+#   AVISOS_RESSINCRONIZAR_S   - recarga completa (padrão 3600)
+#   AVISOS_PARAMETRO_DESDE    - nome do parâmetro de filtro na API (padrão "desde"; vazio desativa)
+
+FRESCOR_S = float(os.getenv("AVISOS_FRESCOR_S", "60"))
+MAXIMO_AVISOS = int(os.getenv("AVISOS_MAXIMO", "200"))
+RESSINCRONIZAR_S = float(os.getenv("AVISOS_RESSINCRONIZAR_S", "3600"))
+PARAMETRO_DESDE = os.getenv("AVISOS_PARAMETRO_DESDE", "desde")
+
+CAMPOS_ID = ("id_aviso", "id")
+CAMPOS_DATA = ("data_aviso", "data_publicacao", "data_criacao", "created_at", "data")
+SEM_ORDEM = (0.0, 0)  # Aviso sem data nem id numérico
+
+
+def _primeiro_campo(aviso: Dict, campos: Tuple[str, ...]) -> Any:
+    for campo in campos:
+        if aviso.get(campo) not in (None, ""):
+            return aviso[campo]
+    return None
+
+
+def _converter_data(valor: Any) -> Optional[float]:
+    if not isinstance(valor, str):
+        return None
+    try:
+        return datetime.fromisoformat(valor.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def chave_aviso(aviso: Dict) -> Tuple[str, Tuple]:
+    """
+    (id, ordem) do aviso. A ordem é a data de publicação quando existe; sem
+    data, o id numérico; sem nenhum dos dois, fica SEM_ORDEM e o FeedAvisos
+    desempata pela ordem da API. Sem id, o id é um hash do conteúdo.
+    """
+    id_aviso = _primeiro_campo(aviso, CAMPOS_ID)
+    if id_aviso is None:
+        texto = f"{aviso.get('titulo')}\x1f{aviso.get('conteudo')}"
+        id_aviso = hashlib.sha1(texto.encode("utf-8")).hexdigest()[:16]
+    data = _converter_data(_primeiro_campo(aviso, CAMPOS_DATA))
+    numero = id_aviso if isinstance(id_aviso, (int, float)) else 0
+    return str(id_aviso), (data or 0.0, numero)
+
+
+class FeedAvisos:
+    """Buffer limitado dos avisos mais recentes, atualizado por marca d'água."""
+
+    def __init__(self, maximo: int = MAXIMO_AVISOS, frescor_s: float = FRESCOR_S,
+                 ressincronizar_s: float = RESSINCRONIZAR_S):
+        self.maximo = maximo
+        self.frescor_s = frescor_s
+        self.ressincronizar_s = ressincronizar_s
+        self._heap: List[Tuple[Tuple, Tuple, str]] = []  # (ordem, desempate, id) - menor no topo
+        self._avisos: Dict[str, Dict] = {}
+        self._ordem: Dict[str, Tuple] = {}
+        self._vistos: set = set()  # Ids vistos desde a última recarga, inclusive os que saíram do buffer
+        self._lote = 0  # Cada busca na API é um lote; desempate = (lote, -posição na lista)
+        self.sem_ordem = 0  # Avisos sem data nem id numérico (ordenados só pela API)
+        self.marca_dagua: Optional[Tuple] = None
+        self.marca_dagua_api: Optional[str] = None  # Valor cru da maior data/id, enviado à API
+        self.ultima_atualizacao: Optional[float] = None
+        self.ultima_ressincronizacao = 0.0
+        self._lock = threading.Lock()
+        self._lock_atualizacao = threading.Lock()
+        self._pid_thread: Optional[int] = None
+        self._lock_thread = threading.Lock()
+
+    def __len__(self):
+        return len(self._avisos)
+
+    # ------------------------------------------------------------------
+    # Buffer
+    # ------------------------------------------------------------------
+
+    def _inserir(self, aviso: Dict, posicao: int = 0) -> bool:
+        """Insere ou atualiza um aviso (`posicao` na lista da API). Retorna se o buffer mudou."""
+        id_aviso, ordem = chave_aviso(aviso)
+        if id_aviso in self._avisos:
+            if self._avisos[id_aviso] == aviso:
+                return False
+            self._avisos[id_aviso] = aviso  # Editado: a ordem fica a da primeira vez
+            return True
+        if id_aviso in self._vistos:
+            return False  # Já saiu do buffer por ser antigo
+        self._vistos.add(id_aviso)
+        if ordem == SEM_ORDEM:
+            self.sem_ordem += 1
+        desempate = (self._lote, -posicao)
+        if len(self._heap) >= self.maximo and (ordem, desempate) <= self._heap[0][:2]:
+            return False  # Mais antigo que tudo o que cabe no buffer
+        item = (ordem, desempate, id_aviso)
+        if len(self._heap) >= self.maximo:
+            _, _, id_removido = heapq.heapreplace(self._heap, item)
+            del self._avisos[id_removido]
+            del self._ordem[id_removido]
+        else:
+            heapq.heappush(self._heap, item)
+        self._avisos[id_aviso] = aviso
+        self._ordem[id_aviso] = ordem
+        if ordem != SEM_ORDEM and (self.marca_dagua is None or ordem > self.marca_dagua):
+            self.marca_dagua = ordem
+            self.marca_dagua_api = str(_primeiro_campo(aviso, CAMPOS_DATA) or _primeiro_campo(aviso, CAMPOS_ID) or "")
+        return True
+
+    def ultimos(self, k: int = 3) -> List[Dict]:
+        """Os k avisos mais recentes, do mais novo para o mais antigo."""
+        with self._lock:
+            return [self._avisos[id_aviso] for _, _, id_aviso in heapq.nlargest(k, self._heap)]
+
+    # ------------------------------------------------------------------
+    # Sincronização
+    # ------------------------------------------------------------------
+
+    def atualizar(self, completo: bool = False) -> int:
+        """Busca avisos novos na API. Retorna quantos entraram ou mudaram no buffer."""
+        with self._lock_atualizacao, em_segundo_plano("feed de avisos"):
+            inicio = time.perf_counter()
+            completo = completo or self.ultima_atualizacao is None \
+                or time.time() - self.ultima_ressincronizacao >= self.ressincronizar_s
+            params = {}
+            if not completo and PARAMETRO_DESDE and self.marca_dagua_api:
+                params[PARAMETRO_DESDE] = self.marca_dagua_api
+            response = api_get("/aviso/get_lista_aviso/", params=params or None, timeout=10, stream=True)
+            response.raise_for_status()
+
+            if completo:
+                novo = FeedAvisos(self.maximo, self.frescor_s, self.ressincronizar_s)
+                novo._lote = self._lote + 1
+                with response:
+                    for posicao, aviso in enumerate(iterar_lista_json(response)):
+                        if isinstance(aviso, dict):
+                            novo._inserir(aviso, posicao)
+                with self._lock:
+                    self._heap, self._avisos, self._ordem, self._vistos = \
+                        novo._heap, novo._avisos, novo._ordem, novo._vistos
+                    self._lote, self.sem_ordem, self.marca_dagua, self.marca_dagua_api = \
+                        novo._lote, novo.sem_ordem, novo.marca_dagua, novo.marca_dagua_api
+                alterados = len(novo)
+                self.ultima_ressincronizacao = time.time()
+                if novo.sem_ordem:
+                    logger.warning(f"Feed de avisos: {novo.sem_ordem} aviso(s) sem data nem id numerico; "
+                                   f"esses ficam na ordem da API (inicio da lista = mais novo)")
+            else:
+                alterados = 0
+                with self._lock:
+                    self._lote += 1
+                with response:
+                    for posicao, aviso in enumerate(iterar_lista_json(response)):
+                        if isinstance(aviso, dict):
+                            with self._lock:
+                                alterados += int(self._inserir(aviso, posicao))
+            self.ultima_atualizacao = time.time()
+            if alterados:
+                logger.info(f"Feed de avisos {'recarregado' if completo else 'atualizado'}: {alterados} aviso(s), "
+                            f"{len(self)} em memoria, {(time.perf_counter() - inicio) * 1000:.0f}ms")
+            return alterados
+
+    def _loop_atualizacao(self):
+        while True:
+            time.sleep(self.frescor_s)
+            try:
+                self.atualizar()
+            except Exception as e:
+                logger.warning(f"Falha ao atualizar feed de avisos (mantendo versao local): {e}")
+
+    def garantir_atualizacao(self):
+        """Inicia a thread de atualização (de novo, se o processo foi criado por fork)."""
+        if self._pid_thread == os.getpid():
+            return
+        with self._lock_thread:
+            if self._pid_thread == os.getpid():
+                return
+            threading.Thread(target=self._loop_atualizacao, daemon=True, name="FeedAvisos").start()
+            self._pid_thread = os.getpid()
+
+    def consultar(self, k: int = 3) -> List[Dict]:
+        """
+        Os k avisos mais recentes. Na primeira consulta carrega o feed na hora;
+        erros dessa primeira carga são propagados para a action tratar.
+        """
+        self.garantir_atualizacao()
+        if self.ultima_atualizacao is None:
+            self.atualizar(completo=True)
+        return self.ultimos(k)
@@ -0,0 +1,362 @@
+import logging
+import os
+import pickle
+import threading
+import time
+import hashlib
+import heapq
+import math
+import re
+import unicodedata
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from actions.balanceador import api_get
+from actions.captura_trafego import em_segundo_plano
+from actions.decodificacao_json import ler_json
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava entre processos (desenvolvimento local, um processo só)
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# ===================================================================
+# ÍNDICE BM25 LOCAL DA BASE DE CONHECIMENTO
+# ===================================================================
+# Índice léxico sobre os resumos e palavras-chave gerados pelos conectores
+# de ingestão. Evita uma chamada de rede + busca no servidor a cada pergunta;
+# o endpoint /baseconhecimento/get_buscar passa a ser só o fallback.
+#
+# Com vários workers (run_actions.py), só um processo por vez sincroniza com a
+# API e grava o índice (trava de arquivo <indice>.lock); a última sincronização
+# fica marcada em <indice>.sincronizado, e quem chega antes de INTERVALO
+# segundos não repete a listagem. Os demais só recarregam o arquivo quando ele
+# muda (verificado a cada INDICE_BM25_RECARGA segundos). A listagem passa pelo
+# balanceador (api_get), como as outras leituras da API.
+#
+# O score BM25 cresce com o tamanho do corpus (idf), então o corte é relativo:
+# INDICE_BM25_SCORE_RELATIVO vezes o score de uma ocorrência do termo mais
+# raro possível no corpus atual. Com 0.2, um documento que só casa termos
+# presentes em metade da base fica de fora; com um corpus de um documento
+# só, qualquer termo em comum basta.
+
+INDICE_BM25_PATH = os.getenv("INDICE_BM25_PATH", os.path.join("indices", "base_conhecimento_bm25.pkl"))
+INTERVALO_SINCRONIZACAO = int(os.getenv("INDICE_BM25_INTERVALO", "600"))  # 10 minutos
+INTERVALO_RECARGA = int(os.getenv("INDICE_BM25_RECARGA", "30"))
+SCORE_RELATIVO_MINIMO = float(os.getenv("INDICE_BM25_SCORE_RELATIVO", "0.2"))
+VERSAO_FORMATO = 1
+
+STOPWORDS = {
+    "a", "o", "as", "os", "um", "uma", "uns", "umas", "de", "do", "da", "dos", "das", "em", "no", "na",
+    "nos", "nas", "por", "para", "pra", "com", "sem", "e", "ou", "que", "qual", "quais", "quando", "como",
+    "onde", "se", "ao", "aos", "me", "eu", "voce", "sobre", "ser", "sao", "e", "tem", "ter", "isso",
+    "esse", "essa", "este", "esta", "meu", "minha", "seu", "sua", "mais", "muito", "ja", "nao", "sim",
+}
+
+
+def tokenizar(texto: str) -> List[str]:
+    """Tokenização em português: sem acentos, minúsculas, sem stopwords."""
+    if not texto:
+        return []
+    texto = unicodedata.normalize('NFD', texto)
+    texto = ''.join(c for c in texto if unicodedata.category(c) != 'Mn').lower()
+    return [t for t in re.findall(r'\w+', texto) if len(t) > 1 and t not in STOPWORDS]
+
+
+@contextmanager
+def trava_arquivo(caminho: str, bloquear: bool = True) -> Iterator[bool]:
+    """Trava exclusiva entre processos (flock). Sem `bloquear`, devolve False se outro a tem."""
+    pasta = os.path.dirname(caminho)
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+    with open(caminho, "a") as arquivo:
+        if fcntl is None:
+            yield True
+            return
+        try:
+            fcntl.flock(arquivo, fcntl.LOCK_EX | (0 if bloquear else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(arquivo, fcntl.LOCK_UN)
+
+
+def _mtime(caminho: str) -> Optional[float]:
+    try:
+        return os.path.getmtime(caminho)
+    except OSError:
+        return None
+
+
+class IndiceBM25:
+    """
+    Índice invertido BM25 com atualização incremental por documento.
+    Os documentos são identificados pelo id_conhecimento da API.
+    """
+    K1 = 1.5
+    B = 0.75
+
+    def __init__(self):
+        self.documentos: Dict[str, Dict] = {}  # id -> {texto, url_documento, palavras_chave, hash, termos, ...}
+        self.postings: Dict[str, Dict[str, int]] = {}  # termo -> {id: frequencia}
+        self.tamanhos: Dict[str, int] = {}  # id -> número de termos
+        self._total_termos = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.documentos)
+
+    @staticmethod
+    def _hash_documento(doc: Dict) -> str:
+        conteudo = f"{doc.get('conteudo_processado')}|{doc.get('palavras_chave')}|{doc.get('url_documento')}"
+        return hashlib.sha1(conteudo.encode('utf-8')).hexdigest()
+
+    def adicionar(self, doc: Dict) -> bool:
+        """Adiciona ou atualiza um documento. Retorna False se nada mudou."""
+        id_doc = str(doc.get('id_conhecimento') or doc.get('id') or doc.get('nome_arquivo_origem'))
+        hash_doc = self._hash_documento(doc)
+        with self._lock:
+            if self.documentos.get(id_doc, {}).get('hash') == hash_doc:
+                return False
+            self.remover(id_doc)
+
+            palavras_chave = doc.get('palavras_chave') or []
+            if isinstance(palavras_chave, str):
+                palavras_chave = [palavras_chave]
+            texto = doc.get('conteudo_processado') or ''
+            # Palavras-chave entram duas vezes: são os termos mais representativos do material
+            termos = tokenizar(texto) + tokenizar(' '.join(palavras_chave)) * 2
+            if not termos:
+                return False
+
+            frequencias: Dict[str, int] = {}
+            for termo in termos:
+                frequencias[termo] = frequencias.get(termo, 0) + 1
+            for termo, freq in frequencias.items():
+                self.postings.setdefault(termo, {})[id_doc] = freq
+
+            self.tamanhos[id_doc] = len(termos)
+            self._total_termos += len(termos)
+            self.documentos[id_doc] = {
+                'texto': texto,
+                'url_documento': doc.get('url_documento'),
+                'nome_arquivo_origem': doc.get('nome_arquivo_origem'),
+                'palavras_chave': palavras_chave,
+                'hash': hash_doc,
+                'termos': list(frequencias),
+            }
+            return True
+
+    def remover(self, id_doc: str):
+        with self._lock:
+            if id_doc not in self.documentos:
+                return
+            for termo in self.documentos[id_doc]['termos']:
+                docs = self.postings.get(termo, {})
+                docs.pop(id_doc, None)
+                if not docs:
+                    self.postings.pop(termo, None)
+            self._total_termos -= self.tamanhos.pop(id_doc, 0)
+            del self.documentos[id_doc]
+
+    def buscar(self, consulta: str, k: int = 3) -> List[Tuple[float, Dict]]:
+        """Retorna os k documentos com maior score BM25 para a consulta."""
+        termos = tokenizar(consulta)
+        with self._lock:
+            n_docs = len(self.documentos)
+            if not termos or not n_docs:
+                return []
+            media_tamanho = self._total_termos / n_docs
+            scores: Dict[str, float] = {}
+            for termo in set(termos):
+                docs = self.postings.get(termo)
+                if not docs:
+                    continue
+                idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+                for id_doc, freq in docs.items():
+                    normalizacao = self.K1 * (1 - self.B + self.B * self.tamanhos[id_doc] / media_tamanho)
+                    scores[id_doc] = scores.get(id_doc, 0.0) + idf * freq * (self.K1 + 1) / (freq + normalizacao)
+            melhores = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            return [(score, {'id': id_doc, **self.documentos[id_doc]}) for id_doc, score in melhores]
+
+    def score_referencia(self) -> float:
+        """Score de uma ocorrência (documento de tamanho médio) de um termo presente num documento só."""
+        n_docs = len(self.documentos)
+        return math.log(1 + (n_docs - 0.5) / 1.5) if n_docs else 0.0
+
+    def salvar(self, caminho: str = INDICE_BM25_PATH):
+        """Grava o índice com pickle (carrega em poucos ms) de forma atômica."""
+        pasta = os.path.dirname(caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        with self._lock:
+            estado = {
+                'versao': VERSAO_FORMATO,
+                'documentos': self.documentos,
+                'postings': self.postings,
+                'tamanhos': self.tamanhos,
+            }
+            # Nome único: vários processos podem salvar ao mesmo tempo
+            temporario = f"{caminho}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+            with open(temporario, 'wb') as f:
+                pickle.dump(estado, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporario, caminho)
+
+    @classmethod
+    def carregar(cls, caminho: str = INDICE_BM25_PATH) -> "IndiceBM25":
+        indice = cls()
+        if not os.path.exists(caminho):
+            return indice
+        try:
+            with open(caminho, 'rb') as f:
+                estado = pickle.load(f)
+            if estado.get('versao') != VERSAO_FORMATO:
+                logger.warning("Indice BM25 em formato antigo; sera reconstruido")
+                return indice
+            indice.documentos = estado['documentos']
+            indice.postings = estado['postings']
+            indice.tamanhos = estado['tamanhos']
+            indice._total_termos = sum(indice.tamanhos.values())
+        except Exception as e:
+            logger.error(f"Erro ao carregar indice BM25 '{caminho}': {e}")
+        return indice
+
+
+class BaseConhecimentoLocal:
+    """
+    Mantém o índice BM25 sincronizado com a API em segundo plano.
+    A sincronização é incremental: só documentos novos ou alterados são reindexados.
+    """
+
+    def __init__(self, caminho: str = INDICE_BM25_PATH,
+                 intervalo: int = INTERVALO_SINCRONIZACAO, ao_atualizar=None, ao_recarregar=None,
+                 intervalo_recarga: int = INTERVALO_RECARGA):
+        self.ao_atualizar = ao_atualizar  # Chamado com a lista de documentos quando este processo muda o índice
+        self.ao_recarregar = ao_recarregar  # Chamado quando o índice gravado por outro processo é recarregado
+        self.caminho = caminho
+        self.intervalo = intervalo
+        self.intervalo_recarga = intervalo_recarga
+        self._caminho_trava = caminho + ".lock"
+        self._caminho_marca = caminho + ".sincronizado"
+        self._mtime_carregado = _mtime(caminho)
+        self.indice = IndiceBM25.carregar(caminho)
+        self.ultima_sincronizacao: Optional[float] = None
+        self._pid_thread: Optional[int] = None
+        self._lock_thread = threading.Lock()
+
+    def _buscar_documentos_api(self) -> Tuple[List[Dict], bool]:
+        """
+        Lista a base de conhecimento por disciplina (a API não tem listagem geral).
+        Retorna também se a listagem veio completa (nenhuma disciplina falhou).
+        """
+        response = api_get("/disciplinas/lista_disciplina/", timeout=10)
+        response.raise_for_status()
+        documentos = []
+        completo = True
+        for disc in ler_json(response) or []:
+            id_disciplina = disc.get('id_disciplina') if isinstance(disc, dict) else None
+            if not id_disciplina:
+                continue
+            resp_docs = api_get(f"/baseconhecimento/disciplina/{id_disciplina}", timeout=10)
+            if resp_docs.ok:
+                dados = ler_json(resp_docs)
+                documentos.extend(d for d in (dados if isinstance(dados, list) else []) if isinstance(d, dict))
+            elif resp_docs.status_code != 404:
+                completo = False
+        return documentos, completo
+
+    def sincronizar(self) -> int:
+        """Atualiza o índice com a API (esperando a vez, se outro processo estiver gravando)."""
+        with trava_arquivo(self._caminho_trava):
+            return self._sincronizar_com_trava()
+
+    def _sincronizacao_vencida(self) -> bool:
+        marca = _mtime(self._caminho_marca)
+        return marca is None or time.time() - marca >= self.intervalo
+
+    def _sincronizar_se_for_a_vez(self) -> bool:
+        """Sincroniza se nenhum outro processo está sincronizando nem o fez há menos de `intervalo` s."""
+        with trava_arquivo(self._caminho_trava, bloquear=False) as obtida:
+            if not obtida or not self._sincronizacao_vencida():
+                return False
+            self._sincronizar_com_trava()
+            return True
+
+    def _sincronizar_com_trava(self) -> int:
+        """Retorna o número de documentos alterados. Chamar com a trava de arquivo."""
+        inicio = time.perf_counter()
+        try:
+            self.recarregar_se_mudou()  # Parte do que outro processo gravou por último
+            with em_segundo_plano("indice BM25"):
+                documentos, completo = self._buscar_documentos_api()
+        finally:
+            # Marca a tentativa mesmo com a API fora: os outros workers não repetem a listagem
+            with open(self._caminho_marca, "a"):
+                pass
+            os.utime(self._caminho_marca)
+        ids_api = set()
+        alterados = 0
+        for doc in documentos:
+            ids_api.add(str(doc.get('id_conhecimento') or doc.get('id') or doc.get('nome_arquivo_origem')))
+            alterados += int(self.indice.adicionar(doc))
+        # Só remove documentos sumidos se a listagem veio inteira
+        for id_removido in (set(self.indice.documentos) - ids_api if completo else ()):
+            self.indice.remover(id_removido)
+            alterados += 1
+        if alterados:
+            self.indice.salvar(self.caminho)
+            self._mtime_carregado = _mtime(self.caminho)
+        if self.ao_atualizar and (alterados or self.ultima_sincronizacao is None):
+            self.ao_atualizar(self.listar_documentos())
+        self.ultima_sincronizacao = time.time()
+        logger.info(f"Indice BM25 sincronizado: {len(self.indice)} documento(s), {alterados} alterado(s) "
+                    f"em {(time.perf_counter() - inicio) * 1000:.0f}ms")
+        return alterados
+
+    def recarregar_se_mudou(self) -> bool:
+        """Relê o índice do disco se outro processo o gravou depois da última carga."""
+        mtime = _mtime(self.caminho)
+        if mtime is None or mtime == self._mtime_carregado:
+            return False
+        self.indice = IndiceBM25.carregar(self.caminho)
+        self._mtime_carregado = mtime
+        logger.info(f"Indice BM25 recarregado do disco: {len(self.indice)} documento(s)")
+        if self.ao_recarregar:
+            self.ao_recarregar()
+        return True
+
+    def listar_documentos(self) -> List[Dict]:
+        with self.indice._lock:
+            return [{'id': id_doc, **doc} for id_doc, doc in self.indice.documentos.items()]
+
+    def _loop_sincronizacao(self):
+        while True:
+            try:
+                if not self._sincronizar_se_for_a_vez():
+                    self.recarregar_se_mudou()
+            except Exception as e:
+                logger.warning(f"Falha ao sincronizar indice BM25 (mantendo versao local): {e}")
+            time.sleep(min(self.intervalo, self.intervalo_recarga))
+
+    def garantir_sincronizacao(self):
+        """Inicia a thread de sincronização (de novo, se o processo foi criado por fork)."""
+        if self._pid_thread == os.getpid():
+            return
+        with self._lock_thread:
+            if self._pid_thread == os.getpid():
+                return
+            threading.Thread(target=self._loop_sincronizacao, daemon=True, name="SincronizacaoBM25").start()
+            self._pid_thread = os.getpid()
+
+    def buscar_contextos(self, consulta: str, limite: int = 3) -> List[str]:
+        """Trechos mais relevantes para a consulta; lista vazia se o índice não tiver resposta."""
+        self.garantir_sincronizacao()
+        indice = self.indice
+        minimo = SCORE_RELATIVO_MINIMO * indice.score_referencia()
+        return [doc['texto'] for score, doc in indice.buscar(consulta, limite) if score >= minimo and doc.get('texto')]
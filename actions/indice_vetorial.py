@@ -0,0 +1,231 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from actions.indice_bm25 import tokenizar, trava_arquivo
+
+logger = logging.getLogger(__name__)
+
+# ===================================================================
+# ÍNDICE VETORIAL (MEMORY-MAPPED) DA BASE DE CONHECIMENTO
+# ===================================================================
+# Busca semântica local: cada documento vira um vetor de n-gramas com
+# hashing (sem modelo para baixar), guardado numa matriz float32 em disco
+# aberta com np.memmap. Vários workers do action server compartilham as
+# mesmas páginas pelo page cache do sistema operacional.
+#
+# Cada geração da matriz tem um arquivo próprio (vetores_conhecimento.<versao>.f32)
+# e o JSON de metadados é o ponteiro para ela: trocar o JSON publica o par
+# (matriz, total) de uma vez só, e quem lê nunca combina a matriz nova com os
+# metadados antigos. Quem grava segura uma trava de arquivo (.vetores.lock), para
+# a limpeza das gerações antigas nunca apagar a matriz que outro processo
+# acabou de publicar.
+#
+# Cada documento é vetorizado uma vez por versão do texto (o hash fica nos
+# metadados): quem sincroniza a base reaproveita as linhas dos documentos que
+# não mudaram, e os outros workers só mapeiam o arquivo publicado. Com o
+# run_actions.py, a primeira geração sai do aquecimento, antes do fork.
+
+PASTA_INDICES = os.getenv("INDICE_VETORIAL_PASTA", "indices")
+DIMENSAO = int(os.getenv("INDICE_VETORIAL_DIMENSAO", "512"))
+SCORE_MINIMO = float(os.getenv("INDICE_VETORIAL_SCORE_MINIMO", "0.25"))
+ARQUIVO_MATRIZ = "vetores_conhecimento.f32"  # Formato antigo, sem versão no nome
+PREFIXO_MATRIZ = "vetores_conhecimento."
+ARQUIVO_METADADOS = "vetores_conhecimento.json"
+GERACOES_MANTIDAS = 2  # Matrizes antigas mantidas para quem ainda leu o ponteiro anterior
+
+
+def _temporario(caminho: str) -> str:
+    """Nome temporário único por processo e chamada (vários workers podem gravar ao mesmo tempo)."""
+    return f"{caminho}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+
+
+def _remover_geracoes_antigas(pasta: str, atual: str):
+    matrizes = sorted((nome for nome in os.listdir(pasta)
+                       if nome.startswith(PREFIXO_MATRIZ) and nome.endswith(".f32") and nome != atual),
+                      key=lambda nome: (nome != ARQUIVO_MATRIZ, nome), reverse=True)
+    for nome in matrizes[GERACOES_MANTIDAS - 1:]:
+        try:
+            os.remove(os.path.join(pasta, nome))  # Quem já tem o memmap aberto continua lendo
+        except OSError:
+            pass
+
+
+def vetorizar(textos: List[str], dimensao: int = DIMENSAO) -> np.ndarray:
+    """
+    Converte textos em vetores L2-normalizados (uma linha por texto).
+    Usa palavras inteiras + trigramas de caracteres, com o "hashing trick"
+    e sinal pelo bit mais alto do hash para reduzir colisões.
+    """
+    matriz = np.zeros((len(textos), dimensao), dtype=np.float32)
+    for linha, texto in enumerate(textos):
+        palavras = tokenizar(texto)  # Mesma normalização do índice BM25 (sem acentos e stopwords)
+        features = list(palavras)
+        for palavra in palavras:
+            marcada = f"<{palavra}>"
+            features.extend(marcada[i:i + 3] for i in range(len(marcada) - 2))
+        for feature in features:
+            h = zlib.crc32(feature.encode('utf-8'))
+            matriz[linha, h % dimensao] += 1.0 if h & 0x80000000 else -1.0
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    normas[normas == 0] = 1.0
+    return matriz / normas
+
+
+def _hash_texto(texto: str) -> str:
+    return hashlib.sha1(texto.encode('utf-8')).hexdigest()
+
+
+def _vetores_anteriores(pasta: str, dimensao: int) -> Dict[str, np.ndarray]:
+    """Vetores da geração publicada, por hash do texto (vazio se não houver ou for de outra dimensão)."""
+    try:
+        with open(os.path.join(pasta, ARQUIVO_METADADOS), 'r', encoding='utf-8') as f:
+            metadados = json.load(f)
+        if metadados["dimensao"] != dimensao or not metadados["total"]:
+            return {}
+        matriz = np.memmap(os.path.join(pasta, metadados.get("arquivo_matriz", ARQUIVO_MATRIZ)),
+                           dtype=np.float32, mode='r', shape=(metadados["total"], dimensao))
+    except (OSError, ValueError, KeyError):
+        return {}
+    return {doc["hash"]: matriz[linha] for linha, doc in enumerate(metadados["documentos"]) if doc.get("hash")}
+
+
+def construir_indice(documentos: List[Dict], pasta: str = PASTA_INDICES, dimensao: int = DIMENSAO) -> int:
+    """
+    Gera a matriz e o mapa de ids a partir dos documentos da base de conhecimento.
+    Só vetoriza os documentos novos ou alterados: os demais reaproveitam a linha
+    da geração publicada, e sem mudança nenhuma nada é gravado (os workers que
+    chamam isto na primeira sincronização só mapeiam o arquivo existente).
+    A matriz vai para um arquivo novo e só depois o ponteiro (metadados) é
+    trocado: leitores antigos continuam com a matriz anterior até recarregarem.
+    Retorna quantos documentos foram vetorizados.
+    """
+    os.makedirs(pasta, exist_ok=True)
+    documentos = [d for d in documentos if d.get('texto')]
+    textos = [f"{d['texto']} {' '.join(d.get('palavras_chave') or [])}" for d in documentos]
+    hashes = [_hash_texto(texto) for texto in textos]
+    entradas = [
+        {"id": d.get('id'), "url_documento": d.get('url_documento'), "trecho": d['texto'][:300], "hash": h}
+        for d, h in zip(documentos, hashes)
+    ]
+    caminho_meta = os.path.join(pasta, ARQUIVO_METADADOS)
+    with trava_arquivo(os.path.join(pasta, ".vetores.lock")):
+        try:
+            with open(caminho_meta, 'r', encoding='utf-8') as f:
+                publicado = json.load(f)
+            if publicado.get("dimensao") == dimensao and publicado.get("documentos") == entradas:
+                return 0  # Mesmos documentos, na mesma ordem: a geração publicada serve
+        except (OSError, ValueError):
+            pass
+
+        anteriores = _vetores_anteriores(pasta, dimensao)
+        matriz = np.zeros((len(textos), dimensao), dtype=np.float32)
+        novos = [linha for linha, h in enumerate(hashes) if h not in anteriores]
+        for linha, h in enumerate(hashes):
+            if h in anteriores:
+                matriz[linha] = anteriores[h]
+        if novos:
+            matriz[novos] = vetorizar([textos[linha] for linha in novos], dimensao)
+        del anteriores  # Solta o memmap da geração anterior antes de removê-la
+
+        arquivo_matriz = f"{PREFIXO_MATRIZ}{time.time_ns()}-{os.getpid()}.f32"
+        caminho_matriz = os.path.join(pasta, arquivo_matriz)
+        temporario = _temporario(caminho_matriz)
+        matriz.tofile(temporario)
+        os.replace(temporario, caminho_matriz)
+        metadados = {"dimensao": dimensao, "total": len(documentos), "documentos": entradas,
+                     "arquivo_matriz": arquivo_matriz}
+        temporario = _temporario(caminho_meta)
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(metadados, f, ensure_ascii=False)
+        os.replace(temporario, caminho_meta)  # Publica o par (matriz, metadados) numa troca só
+        _remover_geracoes_antigas(pasta, arquivo_matriz)
+    logger.info(f"Indice vetorial gerado: {len(documentos)} documento(s), {len(novos)} vetorizado(s), "
+                f"dimensao {dimensao}")
+    return len(novos)
+
+
+class IndiceVetorial:
+    """Leitor da matriz memory-mapped com busca top-k por similaridade de cosseno."""
+
+    def __init__(self, pasta: str = PASTA_INDICES):
+        self.pasta = pasta
+        self.matriz: Optional[np.ndarray] = None
+        self.documentos: List[Dict] = []
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _recarregar_se_mudou(self):
+        caminho_meta = os.path.join(self.pasta, ARQUIVO_METADADOS)
+        try:
+            mtime = os.path.getmtime(caminho_meta)
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            try:
+                with open(caminho_meta, 'r', encoding='utf-8') as f:
+                    metadados = json.load(f)
+                total, dimensao = metadados["total"], metadados["dimensao"]
+                arquivo_matriz = metadados.get("arquivo_matriz", ARQUIVO_MATRIZ)
+                if total:
+                    matriz = np.memmap(os.path.join(self.pasta, arquivo_matriz), dtype=np.float32,
+                                       mode='r', shape=(total, dimensao))
+                else:
+                    matriz = np.zeros((0, dimensao), dtype=np.float32)
+            except (OSError, ValueError, KeyError) as e:
+                # Geração removida entre ler o ponteiro e abrir a matriz: tenta na próxima busca
+                logger.warning(f"Indice vetorial nao recarregado (mantendo o anterior): {e}")
+                return
+            self.matriz, self.documentos = matriz, metadados["documentos"]
+            self._mtime = mtime
+            logger.info(f"Indice vetorial carregado (memmap): {total} documento(s)")
+
+    def buscar_lote(self, consultas: List[str], k: int = 3) -> List[List[Tuple[float, Dict]]]:
+        """Busca várias consultas de uma vez com uma única multiplicação de matrizes."""
+        self._recarregar_se_mudou()
+        matriz, documentos = self.matriz, self.documentos
+        if matriz is None or not len(documentos) or not consultas:
+            return [[] for _ in consultas]
+        k = min(k, len(documentos))
+        vetores = vetorizar(consultas, matriz.shape[1])
+        scores = vetores @ matriz.T  # (consultas x documentos); vetores já normalizados = cosseno
+        melhores = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        resultados = []
+        for linha, indices in enumerate(melhores):
+            ordenados = indices[np.argsort(-scores[linha, indices])]
+            resultados.append([(float(scores[linha, i]), documentos[i]) for i in ordenados])
+        return resultados
+
+    def buscar(self, consulta: str, k: int = 3) -> List[Tuple[float, Dict]]:
+        return self.buscar_lote([consulta], k)[0]
+
+    def buscar_urls(self, consulta: str, limite: int = 3) -> List[str]:
+        """URLs dos documentos mais parecidos com a consulta (acima do score mínimo)."""
+        urls = []
+        for score, doc in self.buscar(consulta, limite * 2):
+            url = doc.get('url_documento')
+            if score >= SCORE_MINIMO and url and url not in urls:
+                urls.append(url)
+            if len(urls) >= limite:
+                break
+        return urls
+
+
+if __name__ == "__main__":
+    # Reconstrói o índice vetorial a partir do índice BM25 já sincronizado
+    from actions.indice_bm25 import IndiceBM25
+    logging.basicConfig(level=logging.INFO)
+    indice_bm25 = IndiceBM25.carregar()
+    construir_indice([{'id': id_doc, **doc} for id_doc, doc in indice_bm25.documentos.items()])
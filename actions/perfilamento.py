@@ -0,0 +1,378 @@
+import contextvars
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import unicodedata
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+# ===================================================================
+# PERFILAMENTO SOB DEMANDA DAS ACTIONS
+# ===================================================================
+# Para descobrir onde vai o tempo de uma action lenta (API, comparação de
+# nomes, log...). Desligado por padrão; quando ligado:
+#  - uma fração das chamadas (amostragem) e toda chamada mais lenta que o
+#    limiar têm a pilha da thread da action amostrada a cada intervalo_ms por
+#    uma thread à parte (custo baixo: sys._current_frames, sem settrace);
+#  - o resultado vai para PERFIL_PASTA no formato "collapsed stacks"
+#    (uma pilha por linha + contagem), aceito por flamegraph.pl e speedscope;
+#  - com memoria=true, as chamadas sorteadas também rodam com tracemalloc:
+#    grava o snapshot do fim (.tracemalloc, lido com tracemalloc.Snapshot.load)
+#    e um resumo do que a chamada alocou (.memoria.txt). Só vale para as
+#    sorteadas: a chamada lenta só é conhecida depois que termina;
+#  - os arquivos levam no nome a action, as entidades da mensagem e a duração,
+#    e um .json ao lado guarda os detalhes.
+#
+# Liga e desliga sem reiniciar: o arquivo PERFIL_CONTROLE é relido quando muda
+# (conferido no máximo uma vez por segundo) e vale para todos os workers, ex.:
+#   {"ativo": true, "amostragem": 0.05, "limiar_ms": 800, "memoria": false,
+#    "intervalo_ms": 5, "acoes": ["action_buscar_material"]}
+# Chaves ausentes (ou o arquivo inteiro) ficam com os valores do .env. Cada
+# valor é convertido para o tipo do campo ("0.05" -> 0.05, "true" -> True);
+# arquivo com valor que não converte é ignorado por inteiro (vale o .env).
+#
+# Configuração (.env):
+#   PERFIL_ATIVO        - 1 liga (padrão 0)
+#   PERFIL_AMOSTRAGEM   - fração das chamadas perfiladas, de 0 a 1 (padrão 0.01)
+#   PERFIL_LIMIAR_MS    - perfila toda chamada mais lenta que isso; 0 desliga (padrão 1000)
+#   PERFIL_MEMORIA      - 1 liga o tracemalloc nas chamadas sorteadas (padrão 0)
+#   PERFIL_INTERVALO_MS - intervalo entre amostras da pilha (padrão 5)
+#   PERFIL_PASTA        - onde gravar os perfis (padrão perfis)
+#   PERFIL_CONTROLE     - arquivo de controle (padrão perfis/controle.json)
+
+PASTA_PERFIS = os.getenv("PERFIL_PASTA", "perfis")
+CAMINHO_CONTROLE = os.getenv("PERFIL_CONTROLE", os.path.join(PASTA_PERFIS, "controle.json"))
+FRAMES_TRACEMALLOC = 15
+LINHAS_RESUMO_MEMORIA = 30
+
+
+class Configuracao(NamedTuple):
+    ativo: bool = os.getenv("PERFIL_ATIVO", "0") == "1"
+    amostragem: float = float(os.getenv("PERFIL_AMOSTRAGEM", "0.01"))
+    limiar_ms: float = float(os.getenv("PERFIL_LIMIAR_MS", "1000"))
+    memoria: bool = os.getenv("PERFIL_MEMORIA", "0") == "1"
+    intervalo_ms: float = float(os.getenv("PERFIL_INTERVALO_MS", "5"))
+    acoes: tuple = ()  # Vazio = todas
+
+
+VERDADEIROS, FALSOS = {"1", "true", "sim", "on"}, {"0", "false", "nao", "não", "off", ""}
+
+
+def _converter_campo(campo: str, valor):
+    """Converte um valor do arquivo de controle para o tipo do campo; ValueError se não der."""
+    if campo == "acoes":
+        if valor is None:
+            return ()
+        if not isinstance(valor, (list, tuple)) or not all(isinstance(acao, str) for acao in valor):
+            raise ValueError(f"'acoes' deve ser uma lista de nomes de actions, veio {valor!r}")
+        return tuple(valor)
+    if isinstance(Configuracao._field_defaults[campo], bool):
+        if isinstance(valor, bool):
+            return valor
+        texto = str(valor).strip().lower()
+        if texto in VERDADEIROS or texto in FALSOS:
+            return texto in VERDADEIROS
+        raise ValueError(f"'{campo}' deve ser true ou false, veio {valor!r}")
+    if isinstance(valor, bool):
+        raise ValueError(f"'{campo}' deve ser um número, veio {valor!r}")
+    numero = float(valor)  # ValueError/TypeError para texto ou lista
+    if numero < 0 or (campo == "amostragem" and numero > 1) or (campo == "intervalo_ms" and numero == 0):
+        raise ValueError(f"'{campo}' fora do intervalo aceito: {valor!r}")
+    return numero
+
+
+class Controle:
+    """Configuração atual, relida do arquivo de controle quando ele muda."""
+
+    def __init__(self, caminho: str = CAMINHO_CONTROLE):
+        self.caminho = caminho
+        self.configuracao = Configuracao()
+        self._mtime: Optional[float] = None
+        self._conferido = 0.0
+
+    def atual(self) -> Configuracao:
+        agora = time.monotonic()
+        if agora - self._conferido < 1.0:
+            return self.configuracao
+        self._conferido = agora
+        try:
+            mtime = os.path.getmtime(self.caminho)
+        except OSError:
+            mtime = None
+        if mtime != self._mtime:
+            self._mtime = mtime
+            self.configuracao = self._ler()
+            logger.info(f"Perfilamento {'ligado' if self.configuracao.ativo else 'desligado'}: {self.configuracao}")
+        return self.configuracao
+
+    def _ler(self) -> Configuracao:
+        if self._mtime is None:
+            return Configuracao()
+        try:
+            with open(self.caminho, "r", encoding="utf-8") as f:
+                dados = json.load(f)
+            if not isinstance(dados, dict):
+                raise ValueError("o arquivo deve conter um objeto JSON")
+            campos = {k: _converter_campo(k, v) for k, v in dados.items() if k in Configuracao._fields}
+            return Configuracao()._replace(**campos)
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"Arquivo de controle do perfilamento invalido ({self.caminho}): {e}")
+            return Configuracao()
+
+
+# ===================================================================
+# AMOSTRAGEM DAS PILHAS
+# ===================================================================
+
+def _nome_frame(frame) -> str:
+    codigo = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}:{codigo.co_name}"
+
+
+def pilha_colapsada(frame) -> str:
+    """Pilha da raiz até `frame`, no formato "modulo:func;modulo:func"."""
+    nomes = []
+    while frame is not None:
+        nomes.append(_nome_frame(frame))
+        frame = frame.f_back
+    return ";".join(reversed(nomes))
+
+
+class Amostrador:
+    """Thread que amostra a pilha das threads com chamadas sendo perfiladas."""
+
+    def __init__(self):
+        self._alvos: Dict[int, List[Counter]] = {}  # thread -> contadores das chamadas em andamento nela
+        self._lock = threading.Lock()
+        self._tem_alvo = threading.Event()
+        self.intervalo_s = Configuracao().intervalo_ms / 1000
+        self._pid_thread: Optional[int] = None
+
+    def _garantir_thread(self):
+        """Inicia a thread de amostragem (de novo, se o processo foi criado por fork)."""
+        if self._pid_thread == os.getpid():
+            return
+        with self._lock:
+            if self._pid_thread == os.getpid():
+                return
+            self._alvos.clear()
+            threading.Thread(target=self._loop, daemon=True, name="AmostradorPerfil").start()
+            self._pid_thread = os.getpid()
+
+    def acompanhar(self, id_thread: int, pilhas: Optional[Counter] = None) -> Counter:
+        self._garantir_thread()
+        pilhas = Counter() if pilhas is None else pilhas
+        with self._lock:
+            self._alvos.setdefault(id_thread, []).append(pilhas)
+            self._tem_alvo.set()
+        return pilhas
+
+    def parar(self, id_thread: int, pilhas: Counter):
+        with self._lock:
+            lista = [contador for contador in self._alvos.get(id_thread, []) if contador is not pilhas]
+            self._alvos[id_thread] = lista
+            if not lista:
+                self._alvos.pop(id_thread, None)
+            if not self._alvos:
+                self._tem_alvo.clear()
+
+    def _loop(self):
+        while True:
+            self._tem_alvo.wait()
+            time.sleep(self.intervalo_s)
+            frames = sys._current_frames()
+            with self._lock:
+                for id_thread, contadores in self._alvos.items():
+                    frame = frames.get(id_thread)
+                    if frame is None:
+                        continue
+                    pilha = pilha_colapsada(frame)
+                    for pilhas in contadores:
+                        pilhas[pilha] += 1
+            del frames
+
+
+# ===================================================================
+# TRACEMALLOC
+# ===================================================================
+
+_chamadas_com_memoria = 0
+_lock_memoria = threading.Lock()
+
+
+def _iniciar_memoria() -> Optional[tracemalloc.Snapshot]:
+    global _chamadas_com_memoria
+    with _lock_memoria:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(FRAMES_TRACEMALLOC)
+        _chamadas_com_memoria += 1
+    return tracemalloc.take_snapshot()
+
+
+def _parar_memoria() -> tracemalloc.Snapshot:
+    global _chamadas_com_memoria
+    snapshot = tracemalloc.take_snapshot()
+    with _lock_memoria:
+        _chamadas_com_memoria -= 1
+        if _chamadas_com_memoria == 0:
+            tracemalloc.stop()
+    return snapshot
+
+
+def _resumo_memoria(inicio: tracemalloc.Snapshot, fim: tracemalloc.Snapshot) -> str:
+    filtros = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap>")]
+    diferencas = fim.filter_traces(filtros).compare_to(inicio.filter_traces(filtros), "traceback")
+    linhas = [f"Alocado durante a chamada (top {LINHAS_RESUMO_MEMORIA}, por pilha, do ponto da alocação para fora):", ""]
+    for estatistica in diferencas[:LINHAS_RESUMO_MEMORIA]:
+        linhas.append(f"{estatistica.size_diff / 1024:+.1f} KiB em {estatistica.count_diff:+d} bloco(s)")
+        linhas.extend(f"    {linha}" for linha in estatistica.traceback.format(most_recent_first=True))
+    return "\n".join(linhas) + "\n"
+
+
+# ===================================================================
+# GRAVAÇÃO
+# ===================================================================
+
+def _para_nome_arquivo(texto: str, limite: int = 40) -> str:
+    texto = unicodedata.normalize('NFD', texto)
+    texto = ''.join(c for c in texto if unicodedata.category(c) != 'Mn').lower()
+    return re.sub(r"[^a-z0-9]+", "-", texto).strip("-")[:limite]
+
+
+def _entidades(action_call: Dict) -> Dict[str, str]:
+    mensagem = (action_call.get("tracker") or {}).get("latest_message") or {}
+    return {e.get("entity"): str(e.get("value")) for e in mensagem.get("entities") or [] if e.get("entity")}
+
+
+def gravar_perfil(pasta: str, action_call: Dict, duracao_ms: float, motivo: str, pilhas: Counter,
+                  memoria: Optional[tuple] = None) -> str:
+    """Grava os arquivos do perfil de uma chamada. Retorna o prefixo dos nomes."""
+    acao = action_call.get("next_action") or "?"
+    entidades = _entidades(action_call)
+    partes = [datetime.now().strftime("%Y%m%d_%H%M%S_%f"), acao, _para_nome_arquivo("_".join(entidades.values())),
+              f"{duracao_ms:.0f}ms"]
+    prefixo = os.path.join(pasta, "_".join(p for p in partes if p))
+    os.makedirs(pasta, exist_ok=True)
+    with open(prefixo + ".folded", "w", encoding="utf-8") as f:
+        for pilha, contagem in pilhas.most_common():
+            f.write(f"{pilha} {contagem}\n")
+    detalhes = {
+        "acao": acao,
+        "sender_id": action_call.get("sender_id"),
+        "entidades": entidades,
+        "texto": ((action_call.get("tracker") or {}).get("latest_message") or {}).get("text"),
+        "duracao_ms": round(duracao_ms, 3),
+        "motivo": motivo,
+        "amostras": sum(pilhas.values()),
+        "pid": os.getpid(),
+    }
+    if memoria is not None:
+        inicio, fim = memoria
+        fim.dump(prefixo + ".tracemalloc")
+        with open(prefixo + ".memoria.txt", "w", encoding="utf-8") as f:
+            f.write(_resumo_memoria(inicio, fim))
+        detalhes["memoria_rastreada_kib"] = round(sum(s.size for s in fim.statistics("filename")) / 1024, 1)
+    with open(prefixo + ".json", "w", encoding="utf-8") as f:
+        json.dump(detalhes, f, ensure_ascii=False, indent=2)
+    return prefixo
+
+
+# ===================================================================
+# GANCHO NO SERVIDOR DE AÇÕES
+# ===================================================================
+
+controle = Controle()
+amostrador = Amostrador()
+# (contador, thread amostrada) da chamada perfilada no contexto atual
+_perfil_atual: contextvars.ContextVar[Optional[tuple]] = contextvars.ContextVar("perfil_atual", default=None)
+
+
+@contextmanager
+def na_thread_atual():
+    """
+    Para quem roda a action em outra thread (admissao.py, com o contexto
+    copiado): enquanto dura, a chamada perfilada é amostrada nesta thread, e
+    não na que recebeu a requisição.
+    """
+    perfil = _perfil_atual.get()
+    if perfil is None:
+        yield
+        return
+    pilhas, id_origem = perfil
+    id_thread = threading.get_ident()
+    amostrador.parar(id_origem, pilhas)
+    amostrador.acompanhar(id_thread, pilhas)
+    try:
+        yield
+    finally:
+        amostrador.parar(id_thread, pilhas)
+        amostrador.acompanhar(id_origem, pilhas)
+
+
+def _gravar_em_segundo_plano(*args):
+    def gravar():
+        try:
+            prefixo = gravar_perfil(*args)
+            logger.warning(f"Perfil gravado: {prefixo}.folded ({args[3]}, {args[2]:.0f}ms)")
+        except Exception as e:
+            logger.error(f"Erro ao gravar perfil: {e}")
+
+    threading.Thread(target=gravar, daemon=True, name="GravacaoPerfil").start()
+
+
+def _instalar_no_executor():
+    from rasa_sdk.executor import ActionExecutor
+
+    if getattr(ActionExecutor.run, "_com_perfil", False):
+        return
+    run_original = ActionExecutor.run
+
+    async def run(self, action_call):
+        configuracao = controle.atual()
+        acao = action_call.get("next_action")
+        if not configuracao.ativo or not acao or (configuracao.acoes and acao not in configuracao.acoes):
+            return await run_original(self, action_call)
+        sorteada = random.random() < configuracao.amostragem
+        if not sorteada and configuracao.limiar_ms <= 0:
+            return await run_original(self, action_call)
+
+        # Amostra a thread do event loop; se a action for para outra thread,
+        # na_thread_atual() leva a amostragem junto
+        amostrador.intervalo_s = max(configuracao.intervalo_ms, 1) / 1000
+        id_thread = threading.get_ident()
+        pilhas = amostrador.acompanhar(id_thread)
+        token = _perfil_atual.set((pilhas, id_thread))
+        memoria_inicio = _iniciar_memoria() if sorteada and configuracao.memoria else None
+        inicio = time.perf_counter()
+        try:
+            return await run_original(self, action_call)
+        finally:
+            duracao_ms = (time.perf_counter() - inicio) * 1000
+            _perfil_atual.reset(token)
+            amostrador.parar(id_thread, pilhas)
+            memoria = (memoria_inicio, _parar_memoria()) if memoria_inicio is not None else None
+            motivo = "amostragem" if sorteada else \
+                ("lenta" if duracao_ms >= configuracao.limiar_ms else None)
+            if motivo:
+                _gravar_em_segundo_plano(PASTA_PERFIS, action_call, duracao_ms, motivo, pilhas, memoria)
+
+    run._com_perfil = True
+    ActionExecutor.run = run
+
+
+def instalar():
+    """Instala o gancho (inativo até PERFIL_ATIVO=1 ou o arquivo de controle ligar)."""
+    _instalar_no_executor()
+    configuracao = controle.atual()
+    if configuracao.ativo:
+        logger.info(f"Perfilamento das actions ativo: {configuracao}")
@@ -0,0 +1,222 @@
+# Arquivo: benchmarks/benchmark_action_server.py
+# Uso: python benchmarks/benchmark_action_server.py [--workers 1 2 4] [--requisicoes 2000] [--concorrencia 32]
+#
+# Vazão do action server (run_actions.py) com 1, 2, 4... workers. Cada
+# rodada sobe o servidor apontando para uma API falsa local, dispara
+# chamadas ao /webhook da action_buscar_cronograma (decodifica um cronograma
+# grande e monta a mensagem: trabalho de CPU) e mede vazão e latência.
+# O cache de respostas fica desligado, senão a partir da segunda chamada só
+# se mede o cache (--com-cache liga).
+#
+# A API falsa e o gerador de carga rodam na mesma máquina e também gastam
+# CPU: para ver a escala por núcleo, use no máximo núcleos - 2 workers.
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import aiohttp
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASTA_RESULTADOS = os.path.join(RAIZ, "benchmarks", "resultados")
+
+
+def _porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _servir_api_falsa(porta: int, itens: int):
+    """API falsa: lista de disciplinas, um cronograma com `itens` horários e o resto vazio."""
+    corpos = {
+        "/disciplinas/lista_disciplina/": [{"id_disciplina": "d1", "nome_disciplina": "Calculo I"}],
+        "/cronograma/disciplina/d1": [
+            {"id_disciplina": "d1", "dia_semana": i % 7 + 1, "hora_inicio": f"{8 + i % 12:02d}:00",
+             "sala": f"B{i % 40}", "observacao": "Turma regular " * 8} for i in range(itens)],
+        "/aviso/get_lista_aviso/": [],
+        "/professores/lista_professores/": [],
+        "/coordenador/get_list_coordenador/": [],
+    }
+    corpos = {caminho: json.dumps(dados).encode() for caminho, dados in corpos.items()}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True  # Cabeçalho e corpo saem em writes separados: sem isso, ~40ms por chamada
+
+        def _responder(self):
+            tamanho = int(self.headers.get("Content-Length") or 0)
+            if tamanho:
+                self.rfile.read(tamanho)
+            caminho = self.path.split("?")[0]
+            corpo = corpos.get(caminho, b"{}")
+            self.send_response(200 if caminho in corpos or self.command == "POST" else 404)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        do_GET = do_POST = _responder
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", porta), Handler)
+    servidor.daemon_threads = True
+    servidor.serve_forever()
+
+
+def _action_call() -> dict:
+    return {
+        "next_action": "action_buscar_cronograma",
+        "sender_id": "benchmark",
+        "version": "3.6.21",
+        "domain": {},
+        "tracker": {
+            "sender_id": "benchmark",
+            "slots": {},
+            "latest_message": {"text": "qual o horario de calculo i",
+                               "entities": [{"entity": "disciplina", "value": "calculo i"}], "intent": {}},
+            "events": [],
+            "paused": False,
+            "followup_action": None,
+            "active_loop": {},
+            "latest_action_name": None,
+        },
+    }
+
+
+def _percentil(valores: list[float], p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+async def disparar(alvo: str, requisicoes: int, concorrencia: int) -> dict:
+    corpo = json.dumps(_action_call())
+    latencias, erros = [], 0
+    fila = iter(range(requisicoes))
+
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=60)) as sessao:
+        async def cliente():
+            nonlocal erros
+            for _ in fila:
+                inicio = time.perf_counter()
+                try:
+                    async with sessao.post(f"{alvo}/webhook", data=corpo,
+                                           headers={"Content-Type": "application/json"}) as resposta:
+                        await resposta.read()
+                        ok = resposta.status == 200
+                except aiohttp.ClientError:
+                    ok = False
+                if ok:
+                    latencias.append((time.perf_counter() - inicio) * 1000)
+                else:
+                    erros += 1
+
+        for _ in range(min(concorrencia, 4)):  # Aquecimento: primeiras chamadas e conexões
+            async with sessao.post(f"{alvo}/webhook", data=corpo,
+                                   headers={"Content-Type": "application/json"}) as resposta:
+                await resposta.read()
+        inicio = time.perf_counter()
+        await asyncio.gather(*(cliente() for _ in range(concorrencia)))
+        total = time.perf_counter() - inicio
+
+    return {
+        "vazao_rps": len(latencias) / total,
+        "p50_ms": statistics.median(latencias) if latencias else None,
+        "p99_ms": _percentil(latencias, 99) if latencias else None,
+        "erros": erros,
+    }
+
+
+def _esperar_saude(alvo: str, processo: subprocess.Popen, limite_s: float = 120):
+    import requests
+    fim = time.monotonic() + limite_s
+    while time.monotonic() < fim:
+        if processo.poll() is not None:
+            raise RuntimeError(f"run_actions.py terminou com código {processo.returncode}")
+        try:
+            if requests.get(f"{alvo}/health", timeout=1).ok:
+                return
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"{alvo} não respondeu em {limite_s:.0f}s")
+
+
+def rodar(workers: int, porta_api: int, args) -> dict:
+    porta = _porta_livre()
+    # Todas as chamadas vêm do mesmo remetente: sem ADMISSAO_TAXA=0 quase todas seriam recusadas na hora
+    ambiente = dict(os.environ, API_URL=f"http://127.0.0.1:{porta_api}", ADMISSAO_TAXA="0")
+    if not args.com_cache:
+        ambiente["RESPOSTAS_CACHE_TTL"] = "action_buscar_cronograma=0"
+    processo = subprocess.Popen(
+        [sys.executable, os.path.join(RAIZ, "run_actions.py"), "--workers", str(workers), "--port", str(porta),
+         "--host", "127.0.0.1"],
+        cwd=RAIZ, env=ambiente, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        alvo = f"http://127.0.0.1:{porta}"
+        _esperar_saude(alvo, processo)
+        resultado = asyncio.run(disparar(alvo, args.requisicoes, args.concorrencia))
+    finally:
+        processo.terminate()
+        processo.wait(timeout=60)
+    return {"workers": workers, **resultado}
+
+
+def tabela_markdown(resultados: list[dict]) -> str:
+    base = resultados[0]["vazao_rps"]
+    linhas = ["| Workers | Vazão (req/s) | Escala | p50 (ms) | p99 (ms) | Erros |", "|---|---|---|---|---|---|"]
+    for r in resultados:
+        linhas.append(f"| {r['workers']} | {r['vazao_rps']:.1f} | {r['vazao_rps'] / base:.2f}x | "
+                      f"{r['p50_ms']:.1f} | {r['p99_ms']:.1f} | {r['erros']} |")
+    return "\n".join(linhas)
+
+
+def main(argv: list[str] | None = None):
+    nucleos = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Vazão do action server por número de workers.")
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({1, *(n for n in (2, 4, 8) if n <= nucleos), nucleos}))
+    parser.add_argument("--requisicoes", type=int, default=2000)
+    parser.add_argument("--concorrencia", type=int, default=32)
+    parser.add_argument("--itens-cronograma", type=int, default=300,
+                        help="Tamanho do cronograma devolvido pela API falsa (mais itens = mais CPU por chamada)")
+    parser.add_argument("--com-cache", action="store_true", help="Mantém o cache de respostas ligado")
+    args = parser.parse_args(argv)
+
+    porta_api = _porta_livre()
+    api = multiprocessing.Process(target=_servir_api_falsa, args=(porta_api, args.itens_cronograma), daemon=True)
+    api.start()
+    resultados = []
+    try:
+        for workers in args.workers:
+            print(f"INFO: === {workers} worker(s) ===", flush=True)
+            resultados.append(rodar(workers, porta_api, args))
+            print(json.dumps(resultados[-1], ensure_ascii=False), flush=True)
+    finally:
+        api.terminate()
+
+    tabela = tabela_markdown(resultados)
+    print("\n" + tabela)
+    os.makedirs(PASTA_RESULTADOS, exist_ok=True)
+    nome = f"action_server_{datetime.now():%Y%m%d_%H%M%S}"
+    with open(os.path.join(PASTA_RESULTADOS, f"{nome}.json"), "w", encoding="utf-8") as f:
+        json.dump({"nucleos": nucleos, "parametros": vars(args), "resultados": resultados}, f,
+                  ensure_ascii=False, indent=2)
+    with open(os.path.join(PASTA_RESULTADOS, f"{nome}.md"), "w", encoding="utf-8") as f:
+        f.write(tabela + "\n")
+    print(f"\nINFO: Resultados em benchmarks/resultados/{nome}.json e .md")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
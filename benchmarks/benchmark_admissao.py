@@ -0,0 +1,289 @@
+# Arquivo: benchmarks/benchmark_admissao.py
+# Uso: python benchmarks/benchmark_admissao.py [--variantes sem_admissao com_admissao] [--duracao 20]
+#
+# Semana de prova no action server (run_actions.py, 1 worker): uma turma
+# chama a action_gerar_resposta_com_ia (a API falsa leva --lentidao s para
+# responder) a --taxa-ia chamadas/s, um aluno insistente repete a pergunta a
+# --taxa-insistente chamadas/s, e ao mesmo tempo outros alunos fazem uma
+# action barata (action_buscar_info_docente) a --taxa-barata chamadas/s.
+# Todas as chamadas saem a taxa fixa, esperando ou não as anteriores, como
+# mensagens de alunos diferentes.
+#
+# Variantes:
+#  - sem_admissao: ADMISSAO_ATIVA=0 (as actions rodam na thread do loop, uma
+#    de cada vez);
+#  - com_admissao: ADMISSAO_ATIVA=1 com os limites padrão de actions/admissao.py.
+#
+# Para a action da IA, cada resposta é contada como: respondida (a resposta da
+# API, depois do "Consultando Base de Dados..."), reserva (só a resposta guardada
+# da mesma pergunta), recusada (ADMISSAO_MENSAGEM) ou erro/timeout (--timeout s,
+# como o tempo que o Rasa espera o action server).
+
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import aiohttp
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASTA_RESULTADOS = os.path.join(RAIZ, "benchmarks", "resultados")
+
+VARIANTES = ["sem_admissao", "com_admissao"]
+PERGUNTAS_IA = [
+    "quando vai ser a prova de calculo",
+    "o que cai na prova de algoritmos",
+    "como funciona a recuperacao",
+    "qual o peso do trabalho final",
+    "posso fazer a prova substitutiva",
+]
+
+
+def _porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentil(valores: list[float], p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def _servir_api_falsa(porta: int, lentidao_s: float):
+    """API falsa: /ia/gerar-resposta demora `lentidao_s`; a lista de professores e o resto respondem na hora."""
+    corpos = {
+        "/professores/lista_professores/": [
+            {"nome_professor": "Ana", "sobrenome_professor": "Souza", "email_institucional": "ana@exemplo.edu"}],
+        "/coordenador/get_list_coordenador/": [],
+        "/disciplinas/lista_disciplina/": [],
+        "/aviso/get_lista_aviso/": [],
+    }
+    corpos = {caminho: json.dumps(dados).encode() for caminho, dados in corpos.items()}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def _responder(self):
+            tamanho = int(self.headers.get("Content-Length") or 0)
+            pedido = self.rfile.read(tamanho) if tamanho else b""
+            caminho = self.path.split("?")[0]
+            if caminho == "/ia/gerar-resposta":
+                time.sleep(lentidao_s)
+                pergunta = json.loads(pedido or b"{}").get("pergunta", "")
+                corpo = json.dumps({"resposta": f"Resposta da IA para: {pergunta}"}).encode()
+            else:
+                corpo = corpos.get(caminho, b"{}")
+            self.send_response(200 if caminho in corpos or self.command == "POST" else 404)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        do_GET = do_POST = _responder
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", porta), Handler)
+    servidor.daemon_threads = True
+    servidor.serve_forever()
+
+
+def _action_call(acao: str, remetente: str, texto: str, entidades: list[dict]) -> dict:
+    return {
+        "next_action": acao,
+        "sender_id": remetente,
+        "version": "3.6.21",
+        "domain": {},
+        "tracker": {
+            "sender_id": remetente,
+            "slots": {},
+            "latest_message": {"text": texto, "entities": entidades, "intent": {}},
+            "events": [],
+            "paused": False,
+            "followup_action": None,
+            "active_loop": {},
+            "latest_action_name": None,
+        },
+    }
+
+
+def _classificar_ia(textos: list[str], mensagem_recusa: str) -> str:
+    if textos == [mensagem_recusa]:
+        return "recusada"
+    if textos and textos[0] == "Consultando Base de Dados...":
+        return "respondida" if any(t.startswith("Resposta da IA") for t in textos) else "erro"
+    return "reserva" if len(textos) == 1 and textos[0].startswith("Resposta da IA") else "erro"
+
+
+async def gerar_carga(alvo: str, args) -> dict:
+    from actions.admissao import MENSAGEM_RECUSA
+
+    sorteio = random.Random(0)
+    baratas: list[float] = []
+    ia: dict[str, list[float]] = {"respondida": [], "reserva": [], "recusada": [], "erro": []}
+    erros_baratas = 0
+    alunos = itertools.count()
+
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=args.timeout)) as sessao:
+        async def chamar(corpo: dict) -> list[str] | None:
+            try:
+                async with sessao.post(f"{alvo}/webhook", json=corpo) as resposta:
+                    if resposta.status != 200:
+                        return None
+                    return [m.get("text") for m in (await resposta.json()).get("responses", [])]
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                return None
+
+        async def chamada_ia(remetente: str):
+            inicio = time.perf_counter()
+            textos = await chamar(_action_call("action_gerar_resposta_com_ia", remetente,
+                                               sorteio.choice(PERGUNTAS_IA), []))
+            tipo = "erro" if textos is None else _classificar_ia(textos, MENSAGEM_RECUSA)
+            ia[tipo].append((time.perf_counter() - inicio) * 1000)
+
+        async def chamada_barata():
+            nonlocal erros_baratas
+            inicio = time.perf_counter()
+            textos = await chamar(_action_call("action_buscar_info_docente", f"aluno-{next(alunos)}",
+                                               "qual o email da professora ana",
+                                               [{"entity": "nome_docente", "value": "ana"}]))
+            if textos and any("ana@exemplo.edu" in (t or "") for t in textos):
+                baratas.append((time.perf_counter() - inicio) * 1000)
+            else:
+                erros_baratas += 1
+
+        async def taxa_fixa(taxa: float, criar):
+            # A próxima chamada sai na hora marcada, mesmo com as anteriores pendentes
+            if taxa <= 0:
+                return
+            pendentes, proxima, fim = [], time.perf_counter(), time.perf_counter() + args.duracao
+            while proxima < fim:
+                pendentes.append(asyncio.create_task(criar()))
+                proxima += 1 / taxa
+                await asyncio.sleep(max(0.0, proxima - time.perf_counter()))
+            await asyncio.gather(*pendentes)
+
+        await chamar(_action_call("action_buscar_info_docente", "aquecimento", "email da ana",
+                                  [{"entity": "nome_docente", "value": "ana"}]))
+        turma = itertools.count()
+        inicio = time.perf_counter()
+        await asyncio.gather(
+            taxa_fixa(args.taxa_ia, lambda: chamada_ia(f"turma-{next(turma) % args.turma}")),
+            taxa_fixa(args.taxa_insistente, lambda: chamada_ia("insistente")),
+            taxa_fixa(args.taxa_barata, chamada_barata),
+        )
+        total = time.perf_counter() - inicio
+
+    resultado = {
+        "duracao_s": round(total, 1),
+        "baratas": len(baratas) + erros_baratas,
+        "baratas_p50_ms": round(_percentil(baratas, 50), 1) if baratas else None,
+        "baratas_p99_ms": round(_percentil(baratas, 99), 1) if baratas else None,
+        "baratas_erros": erros_baratas,
+    }
+    for tipo, latencias in ia.items():
+        resultado[f"ia_{tipo}"] = len(latencias)
+        resultado[f"ia_{tipo}_p99_ms"] = round(_percentil(latencias, 99), 1) if latencias else None
+    return resultado
+
+
+def _esperar_saude(alvo: str, processo: subprocess.Popen, limite_s: float = 120):
+    import requests
+    fim = time.monotonic() + limite_s
+    while time.monotonic() < fim:
+        if processo.poll() is not None:
+            raise RuntimeError(f"run_actions.py terminou com código {processo.returncode}")
+        try:
+            if requests.get(f"{alvo}/health", timeout=1).ok:
+                return
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"{alvo} não respondeu em {limite_s:.0f}s")
+
+
+def rodar(variante: str, porta_api: int, args) -> dict:
+    porta = _porta_livre()
+    ambiente = dict(os.environ, API_URL=f"http://127.0.0.1:{porta_api}",
+                    ADMISSAO_ATIVA="1" if variante == "com_admissao" else "0")
+    processo = subprocess.Popen(
+        [sys.executable, os.path.join(RAIZ, "run_actions.py"), "--workers", "1", "--port", str(porta),
+         "--host", "127.0.0.1"],
+        cwd=RAIZ, env=ambiente, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        alvo = f"http://127.0.0.1:{porta}"
+        _esperar_saude(alvo, processo)
+        resultado = asyncio.run(gerar_carga(alvo, args))
+    finally:
+        processo.terminate()
+        try:
+            processo.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            processo.kill()
+    return {"variante": variante, **resultado}
+
+
+def tabela_markdown(resultados: list[dict]) -> str:
+    def ms(valor):
+        return f"{valor:.0f}" if valor is not None else "-"
+
+    linhas = ["| Variante | Barata p50 (ms) | Barata p99 (ms) | Barata erros | IA respondida | IA reserva | "
+              "IA recusada | IA erro/timeout | IA respondida p99 (ms) |",
+              "|---|---|---|---|---|---|---|---|---|"]
+    for r in resultados:
+        linhas.append(f"| {r['variante']} | {ms(r['baratas_p50_ms'])} | {ms(r['baratas_p99_ms'])} | "
+                      f"{r['baratas_erros']}/{r['baratas']} | {r['ia_respondida']} | {r['ia_reserva']} | "
+                      f"{r['ia_recusada']} | {r['ia_erro']} | {ms(r['ia_respondida_p99_ms'])} |")
+    return "\n".join(linhas)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Action server com a action da IA sobrecarregada.")
+    parser.add_argument("--variantes", nargs="+", choices=VARIANTES, default=VARIANTES)
+    parser.add_argument("--duracao", type=float, default=20, help="Segundos gerando carga")
+    parser.add_argument("--lentidao", type=float, default=3, help="Segundos que a API leva para a IA responder")
+    parser.add_argument("--taxa-ia", type=float, default=2, help="Chamadas/s da IA vindas da turma")
+    parser.add_argument("--turma", type=int, default=40, help="Alunos diferentes da turma")
+    parser.add_argument("--taxa-insistente", type=float, default=1, help="Chamadas/s da IA de um aluno só")
+    parser.add_argument("--taxa-barata", type=float, default=5, help="Chamadas/s da action barata")
+    parser.add_argument("--timeout", type=float, default=60, help="Segundos até desistir de uma chamada")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, RAIZ)
+    porta_api = _porta_livre()
+    api = multiprocessing.Process(target=_servir_api_falsa, args=(porta_api, args.lentidao), daemon=True)
+    api.start()
+    resultados = []
+    try:
+        for variante in args.variantes:
+            print(f"INFO: === {variante} ===", flush=True)
+            resultados.append(rodar(variante, porta_api, args))
+            print(json.dumps(resultados[-1], ensure_ascii=False), flush=True)
+    finally:
+        api.terminate()
+
+    tabela = tabela_markdown(resultados)
+    print("\n" + tabela)
+    os.makedirs(PASTA_RESULTADOS, exist_ok=True)
+    nome = f"admissao_{datetime.now():%Y%m%d_%H%M%S}"
+    with open(os.path.join(PASTA_RESULTADOS, f"{nome}.json"), "w", encoding="utf-8") as f:
+        json.dump({"parametros": vars(args), "resultados": resultados}, f, ensure_ascii=False, indent=2)
+    with open(os.path.join(PASTA_RESULTADOS, f"{nome}.md"), "w", encoding="utf-8") as f:
+        f.write(tabela + "\n")
+    print(f"\nINFO: Resultados em benchmarks/resultados/{nome}.json e .md")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+# Arquivo: benchmarks/benchmark_balanceador.py
+# Uso: python benchmarks/benchmark_balanceador.py [--requisicoes 2000] [--threads 16]
+#
+# Sobe réplicas falsas da API em threads locais e dispara leituras e
+# escritas pelo actions/balanceador.py. As réplicas têm latências
+# diferentes, uma delas fica lenta no meio do teste e outra cai, para ver a
+# escolha por menos requisições em andamento, a ejeção passiva e o desvio
+# das escritas para o primário. A mesma carga roda também em rodízio simples
+# (round-robin), como referência.
+
+import argparse
+import itertools
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+os.environ.setdefault("API_LATENCIA_EJECAO_MS", "150")
+os.environ.setdefault("API_EJECAO_S", "2")
+os.environ.setdefault("API_HEALTH_INTERVALO", "0.5")
+
+
+class ReplicaFalsa:
+    """Servidor HTTP local com latência ajustável e opção de cair."""
+
+    def __init__(self, nome: str, latencia_ms: float):
+        self.nome = nome
+        self.latencia_ms = latencia_ms
+        self.fora = False
+        self.contagem = {"GET": 0, "POST": 0}
+        replica = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _responder(self):
+                tamanho = int(self.headers.get("Content-Length") or 0)
+                if tamanho:
+                    self.rfile.read(tamanho)
+                if replica.fora:
+                    self.send_response(503)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                time.sleep(replica.latencia_ms / 1000)
+                if not self.path.startswith("/docs"):
+                    replica.contagem[self.command] = replica.contagem.get(self.command, 0) + 1
+                corpo = json.dumps({"replica": replica.nome}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            do_GET = do_POST = _responder
+
+            def log_message(self, *args):
+                pass
+
+        self.servidor = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.servidor.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.servidor.server_address[1]}"
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+
+
+def _percentil(valores: list[float], p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def rodar_carga(enviar, requisicoes: int, threads: int, replicas: list[ReplicaFalsa]) -> dict:
+    """Leituras com 10% de escritas; na metade, a réplica 1 fica lenta e a 2 cai."""
+    latencias, erros = [], 0
+    lock = threading.Lock()
+    contador = itertools.count()
+
+    def uma(_):
+        nonlocal erros
+        indice = next(contador)
+        if indice == requisicoes // 2:
+            replicas[1].latencia_ms = 400
+            replicas[2].fora = True
+        metodo, caminho = ("POST", "/mensagens_aluno/") if indice % 10 == 0 else ("GET", "/aviso/get_lista_aviso/")
+        inicio = time.perf_counter()
+        try:
+            resposta = enviar(metodo, caminho)
+            ok = resposta.status_code < 500
+        except Exception:
+            ok = False
+        duracao = (time.perf_counter() - inicio) * 1000
+        with lock:
+            if ok:
+                latencias.append(duracao)
+            else:
+                erros += 1
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(uma, range(requisicoes)))
+    total = time.perf_counter() - inicio
+    return {
+        "vazao_rps": len(latencias) / total,
+        "p50_ms": statistics.median(latencias),
+        "p99_ms": _percentil(latencias, 99),
+        "erros": erros,
+        "por_replica": {r.nome: dict(r.contagem) for r in replicas},
+    }
+
+
+def criar_replicas() -> list[ReplicaFalsa]:
+    return [ReplicaFalsa("primario", 20), ReplicaFalsa("replica_1", 20), ReplicaFalsa("replica_2", 20),
+            ReplicaFalsa("replica_3", 40)]
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Balanceador da API contra réplicas falsas locais.")
+    parser.add_argument("--requisicoes", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=16)
+    args = parser.parse_args(argv)
+
+    import requests
+    from actions.balanceador import Balanceador
+
+    resultados = {}
+
+    replicas = criar_replicas()
+    sessao = requests.Session()
+    rodizio = itertools.cycle(replicas[1:])
+    lock_rodizio = threading.Lock()
+
+    def enviar_rodizio(metodo, caminho):
+        if metodo == "GET":
+            with lock_rodizio:
+                replica = next(rodizio)
+        else:
+            replica = replicas[0]
+        return sessao.request(metodo, replica.url + caminho, timeout=5)
+
+    print("INFO: === round-robin entre as réplicas de leitura ===")
+    resultados["round_robin"] = rodar_carga(enviar_rodizio, args.requisicoes, args.threads, replicas)
+
+    replicas = criar_replicas()
+    balanceador = Balanceador(replicas[0].url, [r.url for r in replicas[1:]], leitura_no_primario=False)
+    print("INFO: === balanceador (P2C + ejeção) ===")
+    resultados["balanceador"] = rodar_carga(
+        lambda metodo, caminho: balanceador.requisitar(metodo, caminho, timeout=5),
+        args.requisicoes, args.threads, replicas)
+    resultados["balanceador"]["estado_final"] = balanceador.estado()
+
+    print(json.dumps(resultados, ensure_ascii=False, indent=2))
+    print("\n| Estratégia | Vazão (req/s) | p50 (ms) | p99 (ms) | Erros |")
+    print("|---|---|---|---|---|")
+    for nome, r in resultados.items():
+        print(f"| {nome} | {r['vazao_rps']:.1f} | {r['p50_ms']:.1f} | {r['p99_ms']:.1f} | {r['erros']} |")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
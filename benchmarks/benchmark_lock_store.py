@@ -0,0 +1,145 @@
+# Arquivo: benchmarks/benchmark_lock_store.py
+# Uso: python benchmarks/benchmark_lock_store.py [--processos 3] [--conversas 5] [--mensagens 200]
+#
+# Disputa de locks entre processos, como entre os workers do run_rasa.py.
+# Cada processo roda --tarefas corrotinas. Cada uma pega uma conversa ao
+# acaso entre --conversas e faz `async with store.lock(conversa)`. Dentro do
+# lock, simula --trabalho ms de processamento da mensagem. Um contador
+# compartilhado por conversa confere a exclusão mútua: duas mensagens da
+# mesma conversa dentro do lock ao mesmo tempo contam como violação.
+#
+# Variantes:
+#  - memoria: InMemoryLockStore do Rasa, um por processo (o que acontece hoje
+#    com vários workers);
+#  - sqlite: SQLiteLockStore como no endpoints.yml;
+#  - sqlite_espera_1s: SQLiteLockStore consultando a cada 1 s, como o
+#    LockStore base do Rasa (redis).
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+PASTA_RESULTADOS = os.path.join(RAIZ, "benchmarks", "resultados")
+
+VARIANTES = ["memoria", "sqlite", "sqlite_espera_1s"]
+
+
+def criar_store(variante: str, db: str):
+    from rasa.core.lock_store import InMemoryLockStore
+    from extensoes_rasa.lock_store_sqlite import SQLiteLockStore
+
+    if variante == "memoria":
+        return InMemoryLockStore()
+    if variante == "sqlite":
+        return SQLiteLockStore(db=db)
+    if variante == "sqlite_espera_1s":
+        return SQLiteLockStore(db=db, espera_minima=1.0, espera_maxima=1.0)
+    raise ValueError(variante)
+
+
+def _percentil(valores: list[float], p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def processo(variante: str, db: str, indice: int, dentro, violacoes, fila, args):
+    store = criar_store(variante, db)
+    sorteio = random.Random(indice)
+    esperas = []
+
+    async def tarefa():
+        for _ in range(args.mensagens // args.tarefas):
+            conversa = sorteio.randrange(args.conversas)
+            inicio = time.perf_counter()
+            async with store.lock(f"conversa-{conversa}", wait_time_in_seconds=1):
+                esperas.append((time.perf_counter() - inicio) * 1000)
+                with dentro.get_lock():
+                    dentro[conversa] += 1
+                    if dentro[conversa] > 1:
+                        with violacoes.get_lock():
+                            violacoes.value += 1
+                await asyncio.sleep(args.trabalho / 1000)
+                with dentro.get_lock():
+                    dentro[conversa] -= 1
+
+    async def principal():
+        await asyncio.gather(*(tarefa() for _ in range(args.tarefas)))
+
+    asyncio.run(principal())
+    fila.put(esperas)
+
+
+def rodar(variante: str, pasta: str, args) -> dict:
+    db = os.path.join(pasta, f"{variante}.db")
+    criar_store(variante, db)  # Cria o esquema antes de os processos disputarem o arquivo
+    dentro = multiprocessing.Array("i", args.conversas)
+    violacoes = multiprocessing.Value("i", 0)
+    fila = multiprocessing.Queue()
+    processos = [multiprocessing.Process(target=processo, args=(variante, db, i, dentro, violacoes, fila, args))
+                 for i in range(args.processos)]
+    inicio = time.perf_counter()
+    for p in processos:
+        p.start()
+    esperas = [ms for _ in processos for ms in fila.get()]
+    for p in processos:
+        p.join()
+    total = time.perf_counter() - inicio
+    return {
+        "variante": variante,
+        "mensagens": len(esperas),
+        "vazao_msg_s": round(len(esperas) / total, 1),
+        "espera_p50_ms": round(_percentil(esperas, 50), 2),
+        "espera_p99_ms": round(_percentil(esperas, 99), 2),
+        "espera_media_ms": round(statistics.mean(esperas), 2),
+        "violacoes": violacoes.value,
+    }
+
+
+def tabela_markdown(resultados: list[dict]) -> str:
+    linhas = ["| Variante | Mensagens | Vazão (msg/s) | Espera p50 (ms) | Espera p99 (ms) | Violações |",
+              "|---|---|---|---|---|---|"]
+    for r in resultados:
+        linhas.append(f"| {r['variante']} | {r['mensagens']} | {r['vazao_msg_s']:.0f} | "
+                      f"{r['espera_p50_ms']:.1f} | {r['espera_p99_ms']:.1f} | {r['violacoes']} |")
+    return "\n".join(linhas)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Disputa do lock store entre processos.")
+    parser.add_argument("--variantes", nargs="+", choices=VARIANTES, default=VARIANTES)
+    parser.add_argument("--processos", type=int, default=3)
+    parser.add_argument("--tarefas", type=int, default=4, help="Corrotinas por processo")
+    parser.add_argument("--conversas", type=int, default=5, help="Poucas conversas = mais disputa")
+    parser.add_argument("--mensagens", type=int, default=200, help="Mensagens por processo")
+    parser.add_argument("--trabalho", type=float, default=5, help="ms dentro do lock")
+    args = parser.parse_args(argv)
+
+    resultados = []
+    with tempfile.TemporaryDirectory() as pasta:
+        for variante in args.variantes:
+            resultados.append(rodar(variante, pasta, args))
+            print(json.dumps(resultados[-1], ensure_ascii=False), flush=True)
+
+    tabela = tabela_markdown(resultados)
+    print("\n" + tabela)
+    os.makedirs(PASTA_RESULTADOS, exist_ok=True)
+    nome = f"lock_store_{datetime.now():%Y%m%d_%H%M%S}"
+    with open(os.path.join(PASTA_RESULTADOS, f"{nome}.json"), "w", encoding="utf-8") as f:
+        json.dump({"parametros": vars(args), "resultados": resultados}, f, ensure_ascii=False, indent=2)
+    with open(os.path.join(PASTA_RESULTADOS, f"{nome}.md"), "w", encoding="utf-8") as f:
+        f.write(tabela + "\n")
+    print(f"\nINFO: Resultados em benchmarks/resultados/{nome}.json e .md")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,271 @@
+# Arquivo: benchmarks/benchmark_nlu.py
+# Uso: python benchmarks/benchmark_nlu.py [--variantes atual lean sem_char_ngrams ...] [--repeticoes 3]
+#
+# Treina e avalia variantes do pipeline sobre data/nlu.yml, data/stories.yml e
+# data/rules.yml. Para cada variante mede: tempo de treino, tamanho do modelo,
+# memória do modelo carregado, latência do parse (p50/p90/p99) e F1 de intents
+# num conjunto de teste separado do treino (mesma divisão para todas).
+#
+# Treino e avaliação de cada variante rodam em processos separados, para que
+# a memória e o estado do TensorFlow de uma variante não contaminem a outra.
+
+import argparse
+import asyncio
+import copy
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+import yaml
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)  # Componentes customizados do config.yml (extensoes_rasa.*)
+PASTA_RESULTADOS = os.path.join(RAIZ, "benchmarks", "resultados")
+
+
+# ==============================================================================
+#  VARIANTES DO PIPELINE
+# ==============================================================================
+# Cada variante parte do config.yml e remove/troca uma peça, para isolar o
+# custo de cada componente. "lean" é o perfil config_lean.yml completo.
+
+def _e_componente(componente: dict, nome: str) -> bool:
+    """Casa "DIETClassifier" também com "extensoes_rasa.roteador_rapido.DIETClassifierRoteado"."""
+    return componente["name"] == nome or componente["name"].rsplit(".", 1)[-1].startswith(nome)
+
+
+def _sem_componente(config: dict, nome: str, secao: str = "pipeline", **filtros) -> dict:
+    config[secao] = [
+        c for c in config[secao]
+        if not (_e_componente(c, nome) and all(c.get(k) == v for k, v in filtros.items()))
+    ]
+    return config
+
+
+def _ajustar(config: dict, nome: str, **valores) -> dict:
+    for componente in config["pipeline"] + config["policies"]:
+        if _e_componente(componente, nome):
+            componente.update(valores)
+    return config
+
+
+def _epocas(config: dict, epocas: int) -> dict:
+    for componente in config["pipeline"] + config["policies"]:
+        if "epochs" in componente:
+            componente["epochs"] = epocas
+    return config
+
+
+VARIANTES = {
+    "atual": lambda c: c,
+    "lean": None,  # Lido de config_lean.yml
+    "sem_roteador": lambda c: _sem_componente(c, "RoteadorRapido"),
+    "sem_char_ngrams": lambda c: _sem_componente(c, "CountVectorsFeaturizer", analyzer="char_wb"),
+    "sem_response_selector": lambda c: _sem_componente(c, "ResponseSelector"),
+    "sem_unexpected_policy": lambda c: _sem_componente(c, "UnexpecTEDIntentPolicy", secao="policies"),
+    "diet_1_camada_128": lambda c: _ajustar(c, "DIETClassifier", number_of_transformer_layers=1,
+                                            transformer_size=128),
+    "epocas_50": lambda c: _epocas(c, 50),
+}
+
+
+def gerar_config(variante: str, pasta: str) -> str:
+    if variante == "lean":
+        return os.path.join(RAIZ, "config_lean.yml")
+    with open(os.path.join(RAIZ, "config.yml"), "r", encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+    config = VARIANTES[variante](copy.deepcopy(config))
+    caminho = os.path.join(pasta, f"config_{variante}.yml")
+    with open(caminho, "w", encoding="utf-8") as f:
+        yaml.safe_dump(config, f, allow_unicode=True, sort_keys=False)
+    return caminho
+
+
+# ==============================================================================
+#  DADOS: DIVISÃO TREINO / TESTE
+# ==============================================================================
+
+def dividir_dados(pasta: str, fracao_treino: float, semente: int) -> tuple[str, list[dict]]:
+    """
+    Separa os exemplos do data/nlu.yml em treino e teste (estratificado por intent).
+    Lookup tables, regex e sinônimos ficam todos no treino.
+    """
+    from rasa.shared.nlu.training_data.loading import load_data
+    from rasa.shared.utils.io import write_text_file
+
+    dados = load_data(os.path.join(RAIZ, "data", "nlu.yml"))
+    treino, teste = dados.train_test_split(train_frac=fracao_treino, random_seed=semente)
+    caminho_treino = os.path.join(pasta, "nlu_treino.yml")
+    write_text_file(treino.nlu_as_yaml(), caminho_treino)
+    exemplos_teste = [{"text": m.get("text"), "intent": m.get("intent")} for m in teste.intent_examples]
+    return caminho_treino, exemplos_teste
+
+
+# ==============================================================================
+#  TAREFAS EXECUTADAS EM SUBPROCESSOS
+# ==============================================================================
+
+def _rss_mb() -> float | None:
+    """Memória residente do processo atual em MB (None se não der para medir)."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1024 ** 2
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _tarefa_treinar(caminho_config: str, caminho_nlu: str, saida: str, nome: str) -> dict:
+    from rasa.api import train
+
+    inicio = time.perf_counter()
+    resultado = train(
+        domain=os.path.join(RAIZ, "domain.yml"),
+        config=caminho_config,
+        training_files=[caminho_nlu, os.path.join(RAIZ, "data", "stories.yml"),
+                        os.path.join(RAIZ, "data", "rules.yml")],
+        output=saida,
+        fixed_model_name=nome,
+        force_training=True,
+    )
+    if resultado.code != 0 or not resultado.model:
+        raise RuntimeError(f"Treino da variante '{nome}' falhou (código {resultado.code})")
+    return {"treino_s": time.perf_counter() - inicio, "modelo": resultado.model}
+
+
+def _tarefa_avaliar(caminho_modelo: str, exemplos: list[dict], repeticoes: int) -> dict:
+    from rasa.core.agent import Agent
+    from sklearn.metrics import accuracy_score, f1_score
+
+    try:
+        from extensoes_rasa.roteador_rapido import metricas
+    except ImportError:
+        metricas = None
+
+    rss_antes = _rss_mb()
+    agent = Agent.load(caminho_modelo)
+    rss_depois = _rss_mb()
+
+    async def avaliar():
+        # Aquecimento: primeira chamada compila o grafo do TF (frase fora do fast path, para chegar ao DIET)
+        await agent.parse_message("frase de aquecimento do benchmark")
+        latencias, previstas, roteadas = [], [], []
+        for rodada in range(repeticoes):
+            for exemplo in exemplos:
+                acertos_antes = metricas.acertos if metricas else 0
+                inicio = time.perf_counter()
+                resultado = await agent.parse_message(exemplo["text"])
+                latencias.append((time.perf_counter() - inicio) * 1000)
+                if rodada == 0:
+                    previstas.append((resultado.get("intent") or {}).get("name"))
+                    roteadas.append(bool(metricas) and metricas.acertos > acertos_antes)
+        return latencias, previstas, roteadas
+
+    latencias, previstas, roteadas = asyncio.run(avaliar())
+    fast_path = metricas.resumo() if metricas else {}
+    esperadas = [e["intent"] for e in exemplos]
+    quantis = statistics.quantiles(latencias, n=100) if len(latencias) > 1 else latencias * 99
+    return {
+        "memoria_modelo_mb": (rss_depois - rss_antes) if rss_antes is not None and rss_depois is not None else None,
+        "parse_p50_ms": quantis[49],
+        "parse_p90_ms": quantis[89],
+        "parse_p99_ms": quantis[98],
+        "intent_f1_macro": f1_score(esperadas, previstas, average="macro", zero_division=0),
+        "intent_f1_ponderado": f1_score(esperadas, previstas, average="weighted", zero_division=0),
+        "intent_acuracia": accuracy_score(esperadas, previstas),
+        "fallbacks": sum(1 for p in previstas if p == "nlu_fallback"),
+        "fast_path_taxa_acerto": fast_path.get("taxa_acerto"),
+        # Exemplos de teste que o roteador resolveu com a intent errada (sem passar pelo DIET)
+        "fast_path_erros": sum(1 for r, p, e in zip(roteadas, previstas, esperadas) if r and p != e),
+        # Custo médio (featurizers + DIET) das mensagens que NÃO passaram pelo fast path;
+        # a economia real do roteador aparece comparando o p50 com a variante sem_roteador
+        "custo_medio_pipeline_ms": fast_path.get("custo_medio_pipeline_ms"),
+    }
+
+
+def _em_processo_novo(funcao, *args):
+    contexto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=contexto) as executor:
+        return executor.submit(funcao, *args).result()
+
+
+# ==============================================================================
+#  RELATÓRIO
+# ==============================================================================
+
+COLUNAS = [
+    ("variante", "Variante", "{}"),
+    ("treino_s", "Treino (s)", "{:.1f}"),
+    ("modelo_mb", "Modelo (MB)", "{:.1f}"),
+    ("memoria_modelo_mb", "Memória (MB)", "{:.0f}"),
+    ("parse_p50_ms", "p50 (ms)", "{:.1f}"),
+    ("parse_p90_ms", "p90 (ms)", "{:.1f}"),
+    ("parse_p99_ms", "p99 (ms)", "{:.1f}"),
+    ("intent_f1_macro", "F1 macro", "{:.3f}"),
+    ("intent_f1_ponderado", "F1 ponderado", "{:.3f}"),
+    ("intent_acuracia", "Acurácia", "{:.3f}"),
+    ("fallbacks", "Fallbacks", "{}"),
+    ("fast_path_taxa_acerto", "Fast path (%)", "{:.0%}"),
+    ("fast_path_erros", "Erros no fast path", "{}"),
+]
+
+
+def tabela_markdown(resultados: list[dict]) -> str:
+    linhas = ["| " + " | ".join(titulo for _, titulo, _ in COLUNAS) + " |",
+              "|" + "---|" * len(COLUNAS)]
+    for r in resultados:
+        celulas = [fmt.format(r[chave]) if r.get(chave) is not None else "-" for chave, _, fmt in COLUNAS]
+        linhas.append("| " + " | ".join(celulas) + " |")
+    return "\n".join(linhas)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Benchmark de latência/acurácia das variantes do pipeline NLU.")
+    parser.add_argument("--variantes", nargs="+", default=list(VARIANTES), choices=list(VARIANTES))
+    parser.add_argument("--repeticoes", type=int, default=3, help="Vezes que o conjunto de teste é parseado")
+    parser.add_argument("--fracao-treino", type=float, default=0.8)
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    os.makedirs(PASTA_RESULTADOS, exist_ok=True)
+    resultados = []
+    with tempfile.TemporaryDirectory(prefix="benchmark_nlu_") as pasta:
+        caminho_nlu, exemplos = _em_processo_novo(dividir_dados, pasta, args.fracao_treino, args.semente)
+        print(f"INFO: {len(exemplos)} exemplo(s) de teste, {args.repeticoes} repetição(ões) por variante.")
+
+        for variante in args.variantes:
+            print(f"\nINFO: === Variante '{variante}' ===")
+            caminho_config = gerar_config(variante, pasta)
+            treino = _em_processo_novo(_tarefa_treinar, caminho_config, caminho_nlu, pasta, variante)
+            avaliacao = _em_processo_novo(_tarefa_avaliar, treino["modelo"], exemplos, args.repeticoes)
+            resultado = {
+                "variante": variante,
+                "treino_s": treino["treino_s"],
+                "modelo_mb": os.path.getsize(treino["modelo"]) / 1024 ** 2,
+                **avaliacao,
+            }
+            resultados.append(resultado)
+            print(json.dumps(resultado, ensure_ascii=False, indent=2))
+
+    tabela = tabela_markdown(resultados)
+    carimbo = time.strftime("%Y%m%d-%H%M%S")
+    with open(os.path.join(PASTA_RESULTADOS, f"nlu_{carimbo}.json"), "w", encoding="utf-8") as f:
+        json.dump({"parametros": vars(args), "exemplos_teste": len(exemplos), "resultados": resultados},
+                  f, ensure_ascii=False, indent=2)
+    with open(os.path.join(PASTA_RESULTADOS, f"nlu_{carimbo}.md"), "w", encoding="utf-8") as f:
+        f.write(tabela + "\n")
+    print("\n" + tabela)
+    print(f"\nINFO: Resultados salvos em {PASTA_RESULTADOS} (nlu_{carimbo}.json / .md)")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
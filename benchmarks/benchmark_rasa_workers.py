@@ -0,0 +1,255 @@
+# Arquivo: benchmarks/benchmark_rasa_workers.py
+# Uso: python benchmarks/benchmark_rasa_workers.py [--workers 1 2 4] [--modelo models] [--requisicoes 400]
+#
+# Memória e vazão do servidor Rasa com 1, 2, 4... workers (run_rasa.py
+# --workers, ver extensoes_rasa/workers.py). Cada rodada sobe o servidor com
+# um tracker store SQLite temporário, espera todos os workers ficarem
+# prontos, lê RSS/PSS/USS de cada processo em /proc/<pid>/smaps_rollup e
+# dispara POST /model/parse com os exemplos do data/nlu.yml (cache de parse
+# desligado).
+#
+# - RSS conta as páginas compartilhadas em todos os processos; PSS divide
+#   cada página compartilhada entre quem a usa (a soma do PSS é a memória de
+#   fato ocupada); USS é só o que é exclusivo do processo.
+# - "1 worker" é o servidor normal, sem fork: N vezes o PSS dele é quanto
+#   ocupariam N processos independentes.
+# - O gerador de carga roda na mesma máquina: para ver a escala por núcleo,
+#   use no máximo núcleos - 1 workers.
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import aiohttp
+import yaml
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASTA_RESULTADOS = os.path.join(RAIZ, "benchmarks", "resultados")
+
+
+def _porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentil(valores: list[float], p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def textos_nlu(caminho: str) -> list[str]:
+    """Exemplos do arquivo de NLU, sem as anotações de entidade ([texto](entidade))."""
+    import re
+    with open(caminho, encoding="utf-8") as f:
+        dados = yaml.safe_load(f) or {}
+    textos = []
+    for bloco in dados.get("nlu", []):
+        for linha in str(bloco.get("examples", "")).splitlines():
+            linha = linha.strip().lstrip("-").strip()
+            if linha:
+                textos.append(re.sub(r"\[([^\]]+)\]\([^)]*\)|\[([^\]]+)\]\{[^}]*\}", r"\1\2", linha))
+    return textos
+
+
+def memoria(pid: int) -> dict:
+    """RSS, PSS e USS (privado) do processo, em MB."""
+    campos = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for linha in f:
+            nome, _, valor = linha.partition(":")
+            if valor.strip().endswith("kB"):
+                campos[nome] = int(valor.split()[0]) / 1024
+    return {"rss": campos["Rss"], "pss": campos["Pss"],
+            "uss": campos.get("Private_Clean", 0) + campos.get("Private_Dirty", 0)}
+
+
+def _filhos(pid: int) -> list[int]:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+class Servidor:
+    """run_rasa.py num subprocesso, acompanhando a saída para saber quando os workers ficam prontos."""
+
+    def __init__(self, workers: int, modelo: str, pasta: str, limite_s: float):
+        self.workers = workers
+        self.porta = _porta_livre()
+        self.prontos = 0
+        ambiente = dict(os.environ, PARSE_CACHE_TAMANHO="0", PRONTIDAO_ACOES_ESPERA="0")
+        self.processo = subprocess.Popen(
+            [sys.executable, os.path.join(RAIZ, "run_rasa.py"), "--workers", str(workers), "-m", modelo,
+             "--credentials", os.path.join(pasta, "credentials.yml"),
+             "--endpoints", os.path.join(pasta, "endpoints.yml"), "--port", str(self.porta)],
+            cwd=RAIZ, env=ambiente, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        threading.Thread(target=self._ler_saida, daemon=True).start()
+        self._esperar_prontos(limite_s)
+
+    def _ler_saida(self):
+        for linha in self.processo.stdout:
+            if linha.startswith("INFO: Worker") and " pronto em " in linha:
+                self.prontos += 1
+
+    def _pronto(self) -> bool:
+        if self.workers > 1:
+            return self.prontos >= self.workers
+        import requests
+        try:
+            return requests.get(f"{self.alvo}/pronto", timeout=2).status_code == 200
+        except requests.exceptions.RequestException:
+            return False
+
+    @property
+    def alvo(self) -> str:
+        return f"http://127.0.0.1:{self.porta}"
+
+    def _esperar_prontos(self, limite_s: float):
+        fim = time.monotonic() + limite_s
+        while time.monotonic() < fim:
+            if self.processo.poll() is not None:
+                raise RuntimeError(f"run_rasa.py terminou com código {self.processo.returncode}")
+            if self._pronto():
+                return
+            time.sleep(1)
+        raise TimeoutError(f"{self.workers} worker(s) não ficaram prontos em {limite_s:.0f}s")
+
+    def medir_memoria(self) -> dict:
+        filhos = _filhos(self.processo.pid)
+        principal = memoria(self.processo.pid)
+        if not filhos:  # Servidor normal: o processo principal é o worker
+            return {"pss_total": principal["pss"], "workers": [principal], "principal": None}
+        workers = [memoria(pid) for pid in filhos]
+        return {"pss_total": principal["pss"] + sum(w["pss"] for w in workers), "workers": workers,
+                "principal": principal}
+
+    def encerrar(self):
+        self.processo.send_signal(signal.SIGTERM)
+        try:
+            self.processo.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            self.processo.kill()
+
+
+async def disparar(alvo: str, textos: list[str], requisicoes: int, concorrencia: int) -> dict:
+    sorteio = random.Random(0)
+    fila = iter([sorteio.choice(textos) for _ in range(requisicoes)])
+    latencias, erros = [], 0
+
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=120)) as sessao:
+        async def cliente():
+            nonlocal erros
+            for texto in fila:
+                inicio = time.perf_counter()
+                try:
+                    async with sessao.post(f"{alvo}/model/parse", json={"text": texto}) as resposta:
+                        await resposta.read()
+                        ok = resposta.status == 200
+                except aiohttp.ClientError:
+                    ok = False
+                if ok:
+                    latencias.append((time.perf_counter() - inicio) * 1000)
+                else:
+                    erros += 1
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(cliente() for _ in range(concorrencia)))
+        total = time.perf_counter() - inicio
+
+    return {
+        "vazao_rps": len(latencias) / total,
+        "p50_ms": statistics.median(latencias) if latencias else None,
+        "p99_ms": _percentil(latencias, 99) if latencias else None,
+        "erros": erros,
+    }
+
+
+def rodar(workers: int, pasta: str, textos: list[str], args) -> dict:
+    print(f"INFO: === {workers} worker(s) ===", flush=True)
+    inicio = time.perf_counter()
+    servidor = Servidor(workers, args.modelo, pasta, args.limite_partida)
+    try:
+        partida_s = time.perf_counter() - inicio
+        mem = servidor.medir_memoria()
+        carga = asyncio.run(disparar(servidor.alvo, textos, args.requisicoes, args.concorrencia))
+    finally:
+        servidor.encerrar()
+    por_worker = mem["workers"]
+    return {
+        "workers": workers,
+        "partida_s": round(partida_s, 1),
+        "pss_total_mb": round(mem["pss_total"], 1),
+        "rss_worker_mb": round(statistics.mean(w["rss"] for w in por_worker), 1),
+        "uss_worker_mb": round(statistics.mean(w["uss"] for w in por_worker), 1),
+        "principal": mem["principal"],
+        **carga,
+    }
+
+
+def tabela_markdown(resultados: list[dict]) -> str:
+    unico = next((r for r in resultados if r["workers"] == 1), None)
+    linhas = ["| Workers | Partida (s) | PSS total (MB) | N processos independentes (MB) | RSS/worker (MB) | "
+              "USS/worker (MB) | Vazão (req/s) | p50 (ms) | p99 (ms) | Erros |",
+              "|---|---|---|---|---|---|---|---|---|---|"]
+    for r in resultados:
+        independentes = f"{unico['pss_total_mb'] * r['workers']:.0f}" if unico else "-"
+        linhas.append(f"| {r['workers']} | {r['partida_s']:.0f} | {r['pss_total_mb']:.0f} | {independentes} | "
+                      f"{r['rss_worker_mb']:.0f} | {r['uss_worker_mb']:.0f} | {r['vazao_rps']:.1f} | "
+                      f"{r['p50_ms']:.0f} | {r['p99_ms']:.0f} | {r['erros']} |")
+    return "\n".join(linhas)
+
+
+def main(argv: list[str] | None = None):
+    nucleos = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Memória e vazão do servidor Rasa por número de workers.")
+    parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, 2, *(n for n in (4,) if n < nucleos)}))
+    parser.add_argument("--modelo", default=os.path.join(RAIZ, "models"))
+    parser.add_argument("--nlu", default=os.path.join(RAIZ, "data", "nlu.yml"))
+    parser.add_argument("--requisicoes", type=int, default=400)
+    parser.add_argument("--concorrencia", type=int, default=8)
+    parser.add_argument("--limite-partida", type=float, default=1800,
+                        help="Segundos esperando todos os workers ficarem prontos")
+    args = parser.parse_args(argv)
+
+    textos = textos_nlu(args.nlu)
+    resultados = []
+    with tempfile.TemporaryDirectory() as pasta:
+        with open(os.path.join(pasta, "credentials.yml"), "w") as f:
+            f.write("rest:\n")
+        with open(os.path.join(pasta, "endpoints.yml"), "w") as f:
+            f.write("tracker_store:\n"
+                    "  type: extensoes_rasa.tracker_store_sqlite.SQLiteTrackerStore\n"
+                    f"  db: {os.path.join(pasta, 'trackers.db')}\n"
+                    "  intervalo_gravacao: 0\n"
+                    "  verificar_versao: true\n")
+        for workers in args.workers:
+            resultados.append(rodar(workers, pasta, textos, args))
+            print(json.dumps(resultados[-1], ensure_ascii=False), flush=True)
+
+    tabela = tabela_markdown(resultados)
+    print("\n" + tabela)
+    os.makedirs(PASTA_RESULTADOS, exist_ok=True)
+    nome = f"rasa_workers_{datetime.now():%Y%m%d_%H%M%S}"
+    with open(os.path.join(PASTA_RESULTADOS, f"{nome}.json"), "w", encoding="utf-8") as f:
+        json.dump({"nucleos": nucleos, "parametros": vars(args), "resultados": resultados}, f,
+                  ensure_ascii=False, indent=2)
+    with open(os.path.join(PASTA_RESULTADOS, f"{nome}.md"), "w", encoding="utf-8") as f:
+        f.write(tabela + "\n")
+    print(f"\nINFO: Resultados em benchmarks/resultados/{nome}.json e .md")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
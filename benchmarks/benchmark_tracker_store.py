@@ -0,0 +1,152 @@
+# Arquivo: benchmarks/benchmark_tracker_store.py
+# Uso: python benchmarks/benchmark_tracker_store.py [--conversas 200] [--turnos 20]
+#
+# Compara a latência de retrieve() e save() do SQLiteTrackerStore com o
+# InMemoryTrackerStore do Rasa. Simula N conversas intercaladas, cada turno
+# fazendo o que o MessageProcessor faz: retrieve -> adiciona os eventos do
+# turno (usuário, ação, resposta, action_listen) -> save.
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+PASTA_RESULTADOS = os.path.join(RAIZ, "benchmarks", "resultados")
+
+
+# ==============================================================================
+#  VARIANTES
+# ==============================================================================
+
+def criar_store(variante: str, domain, pasta: str):
+    from rasa.core.tracker_store import InMemoryTrackerStore
+    from extensoes_rasa.tracker_store_sqlite import SQLiteTrackerStore
+
+    db = os.path.join(pasta, f"{variante}.db")
+    if variante == "memoria":
+        return InMemoryTrackerStore(domain)
+    if variante == "sqlite":
+        return SQLiteTrackerStore(domain, db=db)
+    if variante == "sqlite_sem_lru":
+        return SQLiteTrackerStore(domain, db=db, max_trackers_memoria=0)
+    if variante == "sqlite_sincrono":
+        return SQLiteTrackerStore(domain, db=db, intervalo_gravacao=0)
+    raise ValueError(variante)
+
+
+VARIANTES = ["memoria", "sqlite", "sqlite_sem_lru", "sqlite_sincrono"]
+
+
+def _percentil(valores: list[float], p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def _eventos_turno(turno: int) -> list:
+    from rasa.shared.core.events import ActionExecuted, BotUttered, UserUttered
+
+    return [
+        UserUttered(f"quando e a prova de sistemas distribuidos {turno}?",
+                    intent={"name": "buscar_data_avaliacao", "confidence": 0.97},
+                    entities=[{"entity": "disciplina", "value": "sistemas distribuidos", "start": 16, "end": 37}]),
+        ActionExecuted("action_buscar_data_avaliacao"),
+        BotUttered("A prova de Sistemas Distribuídos é dia 12/11.", metadata={"utter_action": "x"}),
+        ActionExecuted("action_listen"),
+    ]
+
+
+async def simular(store, domain, conversas: int, turnos: int) -> dict:
+    from rasa.shared.core.events import ActionExecuted, SessionStarted
+    from rasa.shared.core.constants import ACTION_SESSION_START_NAME
+
+    tempos_retrieve, tempos_save = [], []
+    for turno in range(turnos):
+        for conversa in range(conversas):
+            sender_id = f"usuario_{conversa}"
+            inicio = time.perf_counter()
+            tracker = await store.retrieve(sender_id)
+            tempos_retrieve.append((time.perf_counter() - inicio) * 1000)
+            if tracker is None:
+                tracker = store.init_tracker(sender_id)
+                tracker.update_with_events([ActionExecuted(ACTION_SESSION_START_NAME), SessionStarted(),
+                                            ActionExecuted("action_listen")], domain)
+            tracker.update_with_events(_eventos_turno(turno), domain)
+            inicio = time.perf_counter()
+            await store.save(tracker)
+            tempos_save.append((time.perf_counter() - inicio) * 1000)
+
+    resultado = {}
+    for nome, tempos in (("retrieve", tempos_retrieve), ("save", tempos_save)):
+        resultado[f"{nome}_p50_ms"] = statistics.median(tempos)
+        resultado[f"{nome}_p99_ms"] = _percentil(tempos, 99)
+        resultado[f"{nome}_media_ms"] = statistics.mean(tempos)
+    return resultado
+
+
+def medir(variante: str, conversas: int, turnos: int, pasta: str) -> dict:
+    from rasa.shared.core.domain import Domain
+
+    domain = Domain.load(os.path.join(RAIZ, "domain.yml"))
+    store = criar_store(variante, domain, pasta)
+    inicio = time.perf_counter()
+    resultado = asyncio.run(simular(store, domain, conversas, turnos))
+    resultado["total_s"] = time.perf_counter() - inicio
+    if hasattr(store, "fechar"):
+        store.fechar()
+        resultado["banco_kb"] = sum(
+            os.path.getsize(os.path.join(pasta, nome)) for nome in os.listdir(pasta)
+            if nome.startswith(f"{variante}.db")) / 1024
+        resultado["lru_taxa_acerto"] = store.metricas()["lru_taxa_acerto"]
+    return {"variante": variante, **resultado}
+
+
+COLUNAS = [
+    ("retrieve_p50_ms", "retrieve p50 (ms)", "{:.3f}"),
+    ("retrieve_p99_ms", "retrieve p99 (ms)", "{:.3f}"),
+    ("save_p50_ms", "save p50 (ms)", "{:.3f}"),
+    ("save_p99_ms", "save p99 (ms)", "{:.3f}"),
+    ("total_s", "Total (s)", "{:.2f}"),
+    ("banco_kb", "Banco (KB)", "{:.0f}"),
+    ("lru_taxa_acerto", "LRU (%)", "{:.0%}"),
+]
+
+
+def tabela_markdown(resultados: list[dict]) -> str:
+    linhas = ["| Variante | " + " | ".join(titulo for _, titulo, _ in COLUNAS) + " |",
+              "|---|" + "---|" * len(COLUNAS)]
+    for r in resultados:
+        celulas = [fmt.format(r[chave]) if r.get(chave) is not None else "-" for chave, _, fmt in COLUNAS]
+        linhas.append(f"| {r['variante']} | " + " | ".join(celulas) + " |")
+    return "\n".join(linhas)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Benchmark de latência dos tracker stores.")
+    parser.add_argument("--variantes", nargs="+", default=VARIANTES, choices=VARIANTES)
+    parser.add_argument("--conversas", type=int, default=200)
+    parser.add_argument("--turnos", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    os.makedirs(PASTA_RESULTADOS, exist_ok=True)
+    resultados = []
+    with tempfile.TemporaryDirectory(prefix="benchmark_tracker_") as pasta:
+        for variante in args.variantes:
+            print(f"INFO: === Variante '{variante}' ({args.conversas} conversas x {args.turnos} turnos) ===")
+            resultados.append(medir(variante, args.conversas, args.turnos, pasta))
+
+    tabela = tabela_markdown(resultados)
+    carimbo = time.strftime("%Y%m%d-%H%M%S")
+    with open(os.path.join(PASTA_RESULTADOS, f"tracker_store_{carimbo}.json"), "w", encoding="utf-8") as f:
+        json.dump({"parametros": vars(args), "resultados": resultados}, f, ensure_ascii=False, indent=2)
+    print("\n" + tabela)
+    print(f"\nINFO: Resultados salvos em {PASTA_RESULTADOS}/tracker_store_{carimbo}.json")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
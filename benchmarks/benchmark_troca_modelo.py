@@ -0,0 +1,258 @@
+# Arquivo: benchmarks/benchmark_troca_modelo.py
+# Uso: python benchmarks/benchmark_troca_modelo.py [--modelo models/x.tar.gz] [--modos pasta put]
+#
+# Latência do /model/parse enquanto o servidor troca de modelo. Cada modo sobe
+# o run_rasa.py com uma pasta de modelos temporária (só uma cópia do
+# --modelo), espera o /pronto e mantém tráfego de parse a uma taxa fixa
+# (--taxa req/s, cache de parse desligado). Depois de --antes segundos,
+# publica o modelo novo:
+#  - pasta: copia o modelo para a pasta com outro nome e espera a troca
+#    feita pelo extensoes_rasa/troca_modelo.py (GET /status muda de modelo);
+#  - put: o caminho padrão do Rasa, PUT /model com o mesmo arquivo (carrega
+#    dentro do loop de eventos; observação da pasta desligada).
+# Latências, erros e memória (RSS) são separados em antes, durante e depois
+# da troca.
+#
+# A taxa fixa (e não "o máximo possível") é de propósito: com a CPU saturada
+# pelo tráfego, qualquer carga em segundo plano disputa o mesmo núcleo, e a
+# de prioridade baixa quase não anda.
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import aiohttp
+import yaml
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASTA_RESULTADOS = os.path.join(RAIZ, "benchmarks", "resultados")
+
+
+def _porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentil(valores: list[float], p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def textos_nlu(caminho: str) -> list[str]:
+    """Exemplos do arquivo de NLU, sem as anotações de entidade ([texto](entidade))."""
+    import re
+    with open(caminho, encoding="utf-8") as f:
+        dados = yaml.safe_load(f) or {}
+    textos = []
+    for bloco in dados.get("nlu", []):
+        for linha in str(bloco.get("examples", "")).splitlines():
+            linha = linha.strip().lstrip("-").strip()
+            if linha:
+                textos.append(re.sub(r"\[([^\]]+)\]\([^)]*\)|\[([^\]]+)\]\{[^}]*\}", r"\1\2", linha))
+    return textos
+
+
+def rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for linha in f:
+            if linha.startswith("Rss:"):
+                return int(linha.split()[1]) / 1024
+    return 0.0
+
+
+def _modelo_mais_recente(caminho: str) -> str:
+    if os.path.isfile(caminho):
+        return caminho
+    modelos = [os.path.join(caminho, nome) for nome in os.listdir(caminho) if nome.endswith(".tar.gz")]
+    if not modelos:
+        raise SystemExit(f"ERRO: Nenhum modelo em {caminho}")
+    return max(modelos, key=os.path.getmtime)
+
+
+async def _esperar_pronto(alvo: str, processo: subprocess.Popen, limite_s: float):
+    fim = time.monotonic() + limite_s
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=2)) as sessao:
+        while time.monotonic() < fim:
+            if processo.poll() is not None:
+                raise RuntimeError(f"run_rasa.py terminou com código {processo.returncode}")
+            try:
+                async with sessao.get(f"{alvo}/pronto") as resposta:
+                    if resposta.status == 200:
+                        return
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                pass
+            await asyncio.sleep(1)
+    raise TimeoutError(f"Servidor não ficou pronto em {limite_s:.0f}s")
+
+
+async def _modelo_atual(sessao: aiohttp.ClientSession, alvo: str) -> str | None:
+    try:
+        async with sessao.get(f"{alvo}/status") as resposta:
+            return (await resposta.json()).get("model_file")
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+        return None
+
+
+def _resumo(amostras: list[tuple[float, float, bool]], inicio: float, fim: float) -> dict:
+    latencias = [ms for t, ms, ok in amostras if inicio <= t < fim and ok]
+    erros = sum(1 for t, _, ok in amostras if inicio <= t < fim and not ok)
+    return {
+        "requisicoes": len(latencias) + erros,
+        "p50_ms": round(_percentil(latencias, 50), 1) if latencias else None,
+        "p99_ms": round(_percentil(latencias, 99), 1) if latencias else None,
+        "max_ms": round(max(latencias), 1) if latencias else None,
+        "erros": erros,
+    }
+
+
+async def medir(modo: str, alvo: str, pid: int, pasta_modelos: str, modelo: str, textos: list[str], args) -> dict:
+    sorteio = random.Random(0)
+    amostras: list[tuple[float, float, bool]] = []  # (início, latência em ms, ok)
+    parar = asyncio.Event()
+
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=600)) as sessao:
+        async def requisicao(texto: str):
+            inicio = time.perf_counter()
+            try:
+                async with sessao.post(f"{alvo}/model/parse", json={"text": texto}) as r:
+                    await r.read()
+                    ok = r.status == 200
+            except aiohttp.ClientError:
+                ok = False
+            amostras.append((inicio, (time.perf_counter() - inicio) * 1000, ok))
+
+        async def gerador():
+            # Taxa fixa: a próxima requisição sai na hora marcada, mesmo com as anteriores pendentes
+            pendentes, proxima = set(), time.perf_counter()
+            while not parar.is_set():
+                tarefa = asyncio.create_task(requisicao(sorteio.choice(textos)))
+                pendentes.add(tarefa)
+                tarefa.add_done_callback(pendentes.discard)
+                proxima += 1 / args.taxa
+                await asyncio.sleep(max(0.0, proxima - time.perf_counter()))
+            await asyncio.gather(*pendentes)
+
+        trafego = asyncio.create_task(gerador())
+        await asyncio.sleep(args.antes)
+        anterior = await _modelo_atual(sessao, alvo)
+        rss_antes = rss_mb(pid)
+
+        novo = os.path.join(pasta_modelos, f"novo-{int(time.time())}.tar.gz")
+        inicio_troca = time.perf_counter()
+        if modo == "pasta":
+            shutil.copy(modelo, novo + ".parcial")
+            os.replace(novo + ".parcial", novo)
+            fim_limite = time.monotonic() + args.limite_partida
+            while await _modelo_atual(sessao, alvo) in (anterior, None):
+                if time.monotonic() > fim_limite:
+                    raise TimeoutError("O modelo novo não foi carregado")
+                await asyncio.sleep(0.2)
+        else:
+            shutil.copy(modelo, novo)
+            async with sessao.put(f"{alvo}/model", json={"model_file": novo}) as resposta:
+                if resposta.status != 204:
+                    raise RuntimeError(f"PUT /model respondeu {resposta.status}: {await resposta.text()}")
+        fim_troca = time.perf_counter()
+        atual = await _modelo_atual(sessao, alvo)
+
+        await asyncio.sleep(args.depois)
+        parar.set()
+        await trafego
+        rss_depois = rss_mb(pid)
+
+    return {
+        "modo": modo,
+        "modelo_anterior": anterior,
+        "modelo_novo": atual,
+        "troca_s": round(fim_troca - inicio_troca, 1),
+        "rss_antes_mb": round(rss_antes, 1),
+        "rss_depois_mb": round(rss_depois, 1),
+        "antes": _resumo(amostras, 0, inicio_troca),
+        "durante": _resumo(amostras, inicio_troca, fim_troca),
+        "depois": _resumo(amostras, fim_troca, float("inf")),
+    }
+
+
+def rodar(modo: str, textos: list[str], args) -> dict:
+    print(f"INFO: === {modo} ===", flush=True)
+    modelo = _modelo_mais_recente(args.modelo)
+    with tempfile.TemporaryDirectory() as pasta:
+        pasta_modelos = os.path.join(pasta, "models")
+        os.makedirs(pasta_modelos)
+        shutil.copy(modelo, os.path.join(pasta_modelos, os.path.basename(modelo)))
+        with open(os.path.join(pasta, "credentials.yml"), "w") as f:
+            f.write("rest:\n")
+        porta = _porta_livre()
+        ambiente = dict(os.environ, PARSE_CACHE_TAMANHO="0", PRONTIDAO_ACOES_ESPERA="0",
+                        MODELO_OBSERVAR="1" if modo == "pasta" else "0", MODELO_INTERVALO="2")
+        processo = subprocess.Popen(
+            [sys.executable, os.path.join(RAIZ, "run_rasa.py"), "-m", pasta_modelos,
+             "--credentials", os.path.join(pasta, "credentials.yml"), "--port", str(porta)],
+            cwd=RAIZ, env=ambiente, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        alvo = f"http://127.0.0.1:{porta}"
+        try:
+            asyncio.run(_esperar_pronto(alvo, processo, args.limite_partida))
+            return asyncio.run(medir(modo, alvo, processo.pid, pasta_modelos, modelo, textos, args))
+        finally:
+            processo.send_signal(signal.SIGTERM)
+            try:
+                processo.wait(timeout=60)
+            except subprocess.TimeoutExpired:
+                processo.kill()
+
+
+def tabela_markdown(resultados: list[dict]) -> str:
+    linhas = ["| Modo | Troca (s) | Fase | Requisições | p50 (ms) | p99 (ms) | Máx (ms) | Erros | RSS (MB) |",
+              "|---|---|---|---|---|---|---|---|---|"]
+    for r in resultados:
+        for fase in ("antes", "durante", "depois"):
+            f = r[fase]
+            rss = {"antes": r["rss_antes_mb"], "depois": r["rss_depois_mb"]}.get(fase)
+            valores = [f"{f[c]:.0f}" if f[c] is not None else "-" for c in ("p50_ms", "p99_ms", "max_ms")]
+            linhas.append(f"| {r['modo']} | {r['troca_s']:.0f} | {fase} | {f['requisicoes']} | "
+                          f"{' | '.join(valores)} | {f['erros']} | {f'{rss:.0f}' if rss else '-'} |")
+    return "\n".join(linhas)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Latência do servidor Rasa durante a troca de modelo.")
+    parser.add_argument("--modelo", default=os.path.join(RAIZ, "models"),
+                        help="Arquivo do modelo (ou pasta: usa o mais recente)")
+    parser.add_argument("--modos", nargs="+", choices=["pasta", "put"], default=["pasta", "put"])
+    parser.add_argument("--nlu", default=os.path.join(RAIZ, "data", "nlu.yml"))
+    parser.add_argument("--taxa", type=float, default=10, help="Requisições por segundo")
+    parser.add_argument("--antes", type=float, default=20, help="Segundos de tráfego antes da troca")
+    parser.add_argument("--depois", type=float, default=20, help="Segundos de tráfego depois da troca")
+    parser.add_argument("--limite-partida", type=float, default=900)
+    args = parser.parse_args(argv)
+
+    textos = textos_nlu(args.nlu)
+    resultados = []
+    for modo in args.modos:
+        resultados.append(rodar(modo, textos, args))
+        print(json.dumps(resultados[-1], ensure_ascii=False), flush=True)
+
+    tabela = tabela_markdown(resultados)
+    print("\n" + tabela)
+    os.makedirs(PASTA_RESULTADOS, exist_ok=True)
+    nome = f"troca_modelo_{datetime.now():%Y%m%d_%H%M%S}"
+    with open(os.path.join(PASTA_RESULTADOS, f"{nome}.json"), "w", encoding="utf-8") as f:
+        json.dump({"parametros": vars(args), "resultados": resultados}, f, ensure_ascii=False, indent=2)
+    with open(os.path.join(PASTA_RESULTADOS, f"{nome}.md"), "w", encoding="utf-8") as f:
+        f.write(tabela + "\n")
+    print(f"\nINFO: Resultados em benchmarks/resultados/{nome}.json e .md")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
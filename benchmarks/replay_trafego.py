@@ -0,0 +1,314 @@
+# Arquivo: benchmarks/replay_trafego.py
+# Uso: python benchmarks/replay_trafego.py captura.jsonl --alvo http://localhost:5055 [--alvo http://localhost:5056]
+#                                          [--velocidade 1] [--porta-stub 8765] [--espera-alvos 300]
+#
+# Reexecuta o tráfego gravado pelo servidor de ações (CAPTURA_TRAFEGO, ver
+# actions/captura_trafego.py) contra um ou mais builds, um de cada vez, e
+# compara latência e vazão entre eles.
+#
+# As respostas da API gravadas na captura são servidas por um stub HTTP
+# local, inclusive as das recargas feitas fora das ações (aquecimento,
+# índice BM25, calendário, feed de avisos). Cada build deve subir apontando
+# para ele, DEPOIS de iniciado o replay, para aquecer com os dados gravados;
+# o replay espera cada alvo responder em /health antes de começar:
+#   API_URL=http://127.0.0.1:8765 python run_actions.py --port 5056
+#
+# --velocidade 1 mantém os intervalos originais entre as chamadas, 10 deixa
+# 10x mais rápido e 0 dispara tudo o quanto antes (limitado por --concorrencia).
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import urllib.request
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import aiohttp
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASTA_RESULTADOS = os.path.join(RAIZ, "benchmarks", "resultados")
+
+
+def ler_captura(caminho: str) -> list[dict]:
+    registros = []
+    with open(caminho, "r", encoding="utf-8") as f:
+        for linha in f:
+            if linha.strip():
+                registros.append(json.loads(linha))
+    registros.sort(key=lambda r: r["ts"])
+    return registros
+
+
+# ==============================================================================
+#  STUB DA API
+# ==============================================================================
+
+def _chave(metodo: str, url: str) -> tuple[str, str]:
+    partes = urlsplit(url)
+    return metodo.upper(), partes.path + (f"?{partes.query}" if partes.query else "")
+
+
+class StubApi:
+    """
+    Serve as respostas gravadas por (método, caminho + query). Se a mesma URL
+    foi gravada mais de uma vez, as respostas se alternam em rodízio.
+    """
+
+    def __init__(self, registros: list[dict], porta: int):
+        self.respostas: dict[tuple[str, str], list[dict]] = defaultdict(list)
+        for registro in registros:
+            for chamada in registro.get("upstream") or []:
+                if chamada.get("status") is not None:
+                    self.respostas[_chave(chamada["metodo"], chamada["url"])].append(chamada)
+        self._proxima: dict[tuple[str, str], int] = defaultdict(int)
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.nao_gravadas: dict[str, int] = defaultdict(int)
+        self.servidor = ThreadingHTTPServer(("127.0.0.1", porta), self._criar_handler())
+        self.servidor.daemon_threads = True
+
+    def responder(self, metodo: str, caminho: str) -> dict | None:
+        chave = _chave(metodo, caminho)
+        with self._lock:
+            opcoes = self.respostas.get(chave)
+            if not opcoes:
+                self.nao_gravadas[f"{chave[0]} {chave[1]}"] += 1
+                return None
+            indice = self._proxima[chave] % len(opcoes)
+            self._proxima[chave] += 1
+            self.acertos += 1
+            return opcoes[indice]
+
+    def _criar_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _responder(self):
+                tamanho = int(self.headers.get("Content-Length") or 0)
+                if tamanho:
+                    self.rfile.read(tamanho)
+                chamada = stub.responder(self.command, self.path)
+                if chamada is None:
+                    status, tipo, corpo = 404, "application/json", b'{"detail":"nao gravado na captura"}'
+                else:
+                    status = chamada["status"]
+                    tipo = chamada.get("content_type") or "application/json"
+                    corpo = (chamada.get("conteudo") or "").encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", tipo)
+                self.send_header("Content-Length", str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            do_GET = do_POST = do_PUT = do_DELETE = _responder
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def iniciar(self):
+        threading.Thread(target=self.servidor.serve_forever, daemon=True, name="StubApi").start()
+
+    def parar(self):
+        self.servidor.shutdown()
+
+
+# ==============================================================================
+#  REPLAY
+# ==============================================================================
+
+def _raiz(alvo: str) -> str:
+    alvo = alvo.rstrip("/")
+    return alvo[:-len("/webhook")] if alvo.endswith("/webhook") else alvo
+
+
+def esperar_alvo(alvo: str, limite_s: float) -> bool:
+    """Espera o servidor de ações responder em /health (o aquecimento pode levar minutos)."""
+    prazo = time.monotonic() + limite_s
+    while True:
+        try:
+            with urllib.request.urlopen(_raiz(alvo) + "/health", timeout=5) as resposta:
+                if resposta.status == 200:
+                    return True
+        except OSError:
+            pass
+        if time.monotonic() >= prazo:
+            return False
+        time.sleep(1)
+
+
+def _sem_timestamps(valor):
+    if isinstance(valor, dict):
+        return {k: _sem_timestamps(v) for k, v in valor.items() if k != "timestamp"}
+    if isinstance(valor, list):
+        return [_sem_timestamps(v) for v in valor]
+    return valor
+
+
+def _percentil(valores: list[float], p: float) -> float | None:
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+async def reexecutar(alvo: str, registros: list[dict], velocidade: float, concorrencia: int) -> dict:
+    url = _raiz(alvo) + "/webhook"
+    limite = asyncio.Semaphore(concorrencia)
+    latencias: list[float] = []
+    por_acao: dict[str, list[float]] = defaultdict(list)
+    contagem = {"erros": 0, "divergencias": 0}
+    ts_inicial = registros[0]["ts"]
+
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=60)) as sessao:
+        async def enviar(registro: dict):
+            async with limite:
+                inicio = time.perf_counter()
+                try:
+                    async with sessao.post(url, json=registro["action_call"]) as resposta:
+                        corpo = await resposta.json(content_type=None)
+                        status = resposta.status
+                except Exception:
+                    contagem["erros"] += 1
+                    return
+                duracao = (time.perf_counter() - inicio) * 1000
+            if status != 200:
+                contagem["erros"] += 1
+                return
+            latencias.append(duracao)
+            por_acao[registro["acao"]].append(duracao)
+            if "resposta" in registro and _sem_timestamps(corpo) != _sem_timestamps(registro["resposta"]):
+                contagem["divergencias"] += 1
+
+        inicio_replay = time.perf_counter()
+        tarefas = []
+        for registro in registros:
+            if velocidade > 0:
+                atraso = (registro["ts"] - ts_inicial) / velocidade - (time.perf_counter() - inicio_replay)
+                if atraso > 0:
+                    await asyncio.sleep(atraso)
+            tarefas.append(asyncio.ensure_future(enviar(registro)))
+        await asyncio.gather(*tarefas)
+        duracao_total = time.perf_counter() - inicio_replay
+
+    return {
+        "alvo": alvo,
+        "chamadas": len(registros),
+        "ok": len(latencias),
+        **contagem,
+        "duracao_s": duracao_total,
+        "vazao_rps": len(latencias) / duracao_total if duracao_total else None,
+        "p50_ms": _percentil(latencias, 50),
+        "p90_ms": _percentil(latencias, 90),
+        "p99_ms": _percentil(latencias, 99),
+        "por_acao_p50_ms": {acao: statistics.median(v) for acao, v in sorted(por_acao.items())},
+    }
+
+
+COLUNAS = [
+    ("ok", "OK", "{}"),
+    ("erros", "Erros", "{}"),
+    ("divergencias", "Respostas diferentes", "{}"),
+    ("vazao_rps", "Vazão (req/s)", "{:.1f}"),
+    ("p50_ms", "p50 (ms)", "{:.1f}"),
+    ("p90_ms", "p90 (ms)", "{:.1f}"),
+    ("p99_ms", "p99 (ms)", "{:.1f}"),
+]
+
+
+def _delta(valor, base) -> str:
+    if valor is None or not base:
+        return ""
+    return f" ({(valor - base) / base:+.0%})"
+
+
+def tabela_markdown(resultados: list[dict]) -> str:
+    """Primeiro alvo é a referência; os demais mostram a diferença percentual."""
+    base = resultados[0]
+    linhas = ["| Alvo | " + " | ".join(titulo for _, titulo, _ in COLUNAS) + " |",
+              "|---|" + "---|" * len(COLUNAS)]
+    for r in resultados:
+        celulas = []
+        for chave, _, fmt in COLUNAS:
+            if r.get(chave) is None:
+                celulas.append("-")
+                continue
+            comparar = r is not base and chave in ("vazao_rps", "p50_ms", "p90_ms", "p99_ms")
+            celulas.append(fmt.format(r[chave]) + (_delta(r[chave], base.get(chave)) if comparar else ""))
+        linhas.append(f"| {r['alvo']} | " + " | ".join(celulas) + " |")
+    return "\n".join(linhas)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Replay do tráfego capturado no servidor de ações.")
+    parser.add_argument("captura", help="JSONL gravado com CAPTURA_TRAFEGO")
+    parser.add_argument("--alvo", action="append", help="URL do servidor de ações (repetível; padrão localhost:5055)")
+    parser.add_argument("--velocidade", type=float, default=1.0,
+                        help="1 = ritmo original, 10 = 10x mais rápido, 0 = sem espera")
+    parser.add_argument("--concorrencia", type=int, default=16, help="Máximo de chamadas simultâneas")
+    parser.add_argument("--porta-stub", type=int, default=8765)
+    parser.add_argument("--sem-stub", action="store_true", help="Não sobe o stub (builds usam a API real)")
+    parser.add_argument("--espera-alvos", type=float, default=300,
+                        help="Segundos esperando cada alvo subir (0 = não espera)")
+    args = parser.parse_args(argv)
+    alvos = args.alvo or ["http://localhost:5055"]
+
+    captura = ler_captura(args.captura)
+    registros = [r for r in captura if r.get("action_call")]
+    if not registros:
+        print("ERRO: Nenhuma chamada na captura.")
+        return 1
+    duracao_original = registros[-1]["ts"] - registros[0]["ts"]
+    recargas = [r for r in captura if r.get("origem")]
+    print(f"INFO: {len(registros)} chamada(s) gravada(s) em {duracao_original:.1f}s, "
+          f"{len(recargas)} recarga(s) em segundo plano.")
+    if not recargas and not args.sem_stub:
+        print("AVISO: Captura sem recargas em segundo plano (gravada antes do formato atual?): "
+              "os builds sobem com os índices locais vazios e as respostas podem divergir.")
+
+    stub = None
+    if not args.sem_stub:
+        stub = StubApi(captura, args.porta_stub)
+        stub.iniciar()
+        print(f"INFO: Stub da API em http://127.0.0.1:{args.porta_stub} "
+              f"({sum(len(v) for v in stub.respostas.values())} resposta(s) gravada(s)). "
+              f"Suba os builds com API_URL=http://127.0.0.1:{args.porta_stub}")
+
+    resultados = []
+    try:
+        for alvo in alvos:
+            if args.espera_alvos > 0 and not esperar_alvo(alvo, args.espera_alvos):
+                print(f"ERRO: {alvo} não respondeu em /health em {args.espera_alvos:.0f}s.")
+                return 1
+            print(f"INFO: Replay contra {alvo} (velocidade {args.velocidade or 'máxima'})...")
+            resultados.append(asyncio.run(reexecutar(alvo, registros, args.velocidade, args.concorrencia)))
+    finally:
+        if stub:
+            stub.parar()
+
+    tabela = tabela_markdown(resultados)
+    os.makedirs(PASTA_RESULTADOS, exist_ok=True)
+    carimbo = time.strftime("%Y%m%d-%H%M%S")
+    saida = os.path.join(PASTA_RESULTADOS, f"replay_{carimbo}.json")
+    with open(saida, "w", encoding="utf-8") as f:
+        json.dump({
+            "parametros": vars(args),
+            "stub_nao_gravadas": dict(stub.nao_gravadas) if stub else None,
+            "resultados": resultados,
+        }, f, ensure_ascii=False, indent=2)
+    print("\n" + tabela)
+    if stub and stub.nao_gravadas:
+        print(f"\nAVISO: {sum(stub.nao_gravadas.values())} chamada(s) à API sem resposta gravada "
+              f"(o stub respondeu 404). Detalhes em {saida}")
+    print(f"\nINFO: Resultados salvos em {saida}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+# ==============================================================================
+# SCRIPT: backfill_ingestao.py (CARGA EM LOTE DA BASE DE CONHECIMENTO)
+# FUNÇÃO: Percorre uma árvore de diretórios com material de curso e processa
+#         todos os arquivos de uma vez (IA + outbox), sem precisar copiar um
+#         por um para teams_mock_files/. Mantém um manifesto retomável dos
+#         arquivos concluídos e mostra progresso com ETA. O limite de
+#         requisições da IA (GEMINI_MAX_RPM) fica em GEMINI_LIMITE_ARQUIVO e é
+#         dividido com o watcher e o pipeline que estiverem rodando.
+# USO:    python connectors/backfill_ingestao.py <pasta> [--workers 4] [--modo processos]
+# AMBIENTE VIRTUAL: .venv_watcher
+# ==============================================================================
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+import local_file_watcher
+from local_file_watcher import GOOGLE_API_KEY, GEMINI_MAX_RPM, LimitadorTaxa, processar_arquivo_com_ia
+from outbox_ingestao import OutboxIngestao, TrabalhadorOutbox, gerar_chave_idempotencia, hash_conteudo
+from metadata_enricher import enviar_dados_ia
+from pipeline_ingestao import dividir_em_pedacos, juntar_respostas_ia
+
+# --- CONFIGURAÇÃO ---
+MANIFESTO_PADRAO = os.path.join('connectors', 'backfill_manifesto.jsonl')
+EXTENSOES_PADRAO = ".txt,.md"
+
+
+def calcular_hash_arquivo(caminho: str) -> str:
+    """Hash do conteúdo: identifica o arquivo mesmo se ele for movido de pasta."""
+    sha = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+
+def carregar_manifesto(caminho: str) -> set[str]:
+    """Lê os hashes dos arquivos já concluídos em execuções anteriores."""
+    concluidos = set()
+    if not os.path.exists(caminho):
+        return concluidos
+    with open(caminho, 'r', encoding='utf-8') as f:
+        for linha in f:
+            linha = linha.strip()
+            if not linha:
+                continue
+            try:
+                concluidos.add(json.loads(linha)["hash"])
+            except (json.JSONDecodeError, KeyError):
+                continue  # Linha parcial de uma execução interrompida
+    return concluidos
+
+
+def listar_arquivos(pasta: str, extensoes: tuple[str, ...]) -> list[str]:
+    arquivos = []
+    for raiz, _, nomes in os.walk(pasta):
+        for nome in sorted(nomes):
+            if nome.lower().endswith(extensoes):
+                arquivos.append(os.path.join(raiz, nome))
+    return arquivos
+
+
+def _iniciar_processo(rpm_por_processo: float):
+    """Sem o limite em arquivo (sem flock), cada processo recebe uma fatia do limite global da IA."""
+    local_file_watcher.limitador_ia = LimitadorTaxa(rpm_por_processo)
+
+
+def processar_arquivo(caminho: str) -> dict | None:
+    """Lê, divide e envia o arquivo para a IA. Retorna os dados no formato da ETAPA 1."""
+    with open(caminho, 'r', encoding='utf-8') as f:
+        conteudo = f.read()
+    respostas = []
+    for pedaco in dividir_em_pedacos(conteudo):
+        resposta = processar_arquivo_com_ia(pedaco)
+        if not resposta:
+            return None
+        respostas.append(resposta)
+    dados_ia = juntar_respostas_ia(respostas)
+    dados_ia['nome_arquivo_origem'] = os.path.basename(caminho)
+    dados_ia['hash_origem'] = hash_conteudo(conteudo)
+    return dados_ia
+
+
+def formatar_duracao(segundos: float) -> str:
+    segundos = int(segundos)
+    return f"{segundos // 3600:02d}:{segundos % 3600 // 60:02d}:{segundos % 60:02d}"
+
+
+def executar_backfill(pasta: str, workers: int, modo: str, manifesto: str, extensoes: tuple[str, ...]):
+    outbox = OutboxIngestao()
+    trabalhador = TrabalhadorOutbox(outbox, enviar_dados_ia)
+    trabalhador.start()
+
+    concluidos = carregar_manifesto(manifesto)
+    ja_concluidos = len(concluidos)
+    pendentes = []
+    for caminho in listar_arquivos(pasta, extensoes):
+        hash_arquivo = calcular_hash_arquivo(caminho)
+        if hash_arquivo not in concluidos:
+            pendentes.append((caminho, hash_arquivo))
+            concluidos.add(hash_arquivo)  # Cópias idênticas na árvore são processadas uma vez só
+    print(f"[Backfill] {len(pendentes)} arquivo(s) a processar ({ja_concluidos} já concluído(s)).")
+    if not pendentes:
+        return
+
+    compartilhado = local_file_watcher.limitador_ia.arquivo is not None
+    if not compartilhado:
+        print("⚠️ [Backfill] Limite da IA sem arquivo compartilhado: pare o local_file_watcher "
+              "e o pipeline_ingestao durante o backfill, senão o GEMINI_MAX_RPM é somado.")
+    if modo == "processos" and compartilhado:
+        # Cada processo importa o local_file_watcher e usa o mesmo arquivo de limite
+        executor = ProcessPoolExecutor(max_workers=workers)
+    elif modo == "processos":
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_iniciar_processo,
+                                       initargs=(GEMINI_MAX_RPM / workers,))
+    else:
+        executor = ThreadPoolExecutor(max_workers=workers)  # Threads compartilham o mesmo limitador
+
+    inicio = time.monotonic()
+    feitos = falhas = 0
+    with executor, open(manifesto, 'a', encoding='utf-8') as f_manifesto:
+        futuros = {executor.submit(processar_arquivo, caminho): (caminho, h) for caminho, h in pendentes}
+        for futuro in as_completed(futuros):
+            caminho, hash_arquivo = futuros[futuro]
+            try:
+                dados_ia = futuro.result()
+            except Exception as e:
+                dados_ia = None
+                print(f"🚨 [Backfill] Erro em '{caminho}': {e}")
+
+            if dados_ia:
+                outbox.enfileirar(dados_ia)
+                f_manifesto.write(json.dumps({
+                    "hash": hash_arquivo,
+                    "arquivo": caminho,
+                    "chave": gerar_chave_idempotencia(dados_ia),
+                    "concluido_em": time.time(),
+                }, ensure_ascii=False) + "\n")
+                f_manifesto.flush()
+                feitos += 1
+            else:
+                falhas += 1
+
+            total = feitos + falhas
+            decorrido = time.monotonic() - inicio
+            eta = decorrido / total * (len(pendentes) - total)
+            print(f"[Backfill] {total}/{len(pendentes)} ({total / len(pendentes):.1%}) "
+                  f"ok={feitos} falhas={falhas} decorrido={formatar_duracao(decorrido)} ETA={formatar_duracao(eta)}")
+
+    print(f"[Backfill] Processamento de IA concluído. Aguardando a outbox esvaziar: {outbox.estatisticas()}")
+    while outbox.estatisticas().get("pendente") or outbox.estatisticas().get("em_envio"):
+        time.sleep(5)
+    trabalhador.parar()
+    print(f"✅ [Backfill] Fim. Situação da outbox: {outbox.estatisticas()}")
+    if falhas:
+        print(f"   {falhas} arquivo(s) falharam e serão tentados de novo na próxima execução.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Carga em lote de material de curso na base de conhecimento.")
+    parser.add_argument("pasta", help="Diretório raiz com os arquivos (percorrido recursivamente)")
+    parser.add_argument("--workers", type=int, default=4, help="Número de workers em paralelo")
+    parser.add_argument("--modo", choices=["threads", "processos"], default="threads",
+                        help="threads (padrão, chamadas de IA são I/O) ou processos")
+    parser.add_argument("--manifesto", default=MANIFESTO_PADRAO, help="Arquivo JSONL com os arquivos concluídos")
+    parser.add_argument("--extensoes", default=EXTENSOES_PADRAO, help="Extensões aceitas, separadas por vírgula")
+    args = parser.parse_args()
+
+    if not GOOGLE_API_KEY:
+        print("🚨 ERRO CRÍTICO: GOOGLE_API_KEY não encontrada no .env.")
+    else:
+        extensoes = tuple(e.strip().lower() for e in args.extensoes.split(",") if e.strip())
+        executar_backfill(args.pasta, args.workers, args.modo, args.manifesto, extensoes)
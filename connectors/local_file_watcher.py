@@ -7,12 +7,19 @@
 
 import time
 import os
+import threading
 import google.generativeai as genai
+try:
+    import fcntl
+except ImportError:  # Windows: sem flock, o limite da IA vale só dentro de cada processo
+    fcntl = None
 import json
 from dotenv import load_dotenv
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 
+from outbox_ingestao import hash_conteudo
+
 # --- CONFIGURAÇÃO ---
 load_dotenv()
 WATCH_FOLDER = os.path.join('connectors', 'teams_mock_files')
@@ -20,6 +27,58 @@ OUTPUT_FOLDER = os.path.join('connectors', 'ia_processed_files')  # Nova pasta d
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 if GOOGLE_API_KEY:
     genai.configure(api_key=GOOGLE_API_KEY)
+GEMINI_MAX_RPM = float(os.getenv("GEMINI_MAX_RPM", "15"))  # Limite de requisições por minuto do plano do Gemini
+# Arquivo com a próxima liberação do limite: processos que usam o mesmo arquivo (watcher,
+# pipeline, backfill) dividem o GEMINI_MAX_RPM em vez de cada um usar o limite inteiro
+GEMINI_LIMITE_ARQUIVO = os.getenv("GEMINI_LIMITE_ARQUIVO", os.path.join('connectors', 'gemini_limite.estado'))
+
+
+class LimitadorTaxa:
+    """
+    Token bucket simples e thread-safe para respeitar o limite de requisições da IA.
+    Com `arquivo`, o horário da próxima liberação fica em disco, travado com flock,
+    e o limite passa a valer para todos os processos que usam o mesmo arquivo.
+    """
+
+    def __init__(self, requisicoes_por_minuto: float, arquivo: str | None = None):
+        self.intervalo = 60.0 / requisicoes_por_minuto if requisicoes_por_minuto > 0 else 0.0
+        self.arquivo = arquivo if fcntl is not None else None
+        self._proxima_liberacao = 0.0
+        self._lock = threading.Lock()
+
+    def _reservar_no_arquivo(self) -> float:
+        """Reserva a próxima vaga no arquivo compartilhado e devolve quanto esperar."""
+        fd = os.open(self.arquivo, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)  # Solto pelo os.close
+            try:
+                proxima = float(os.read(fd, 64) or 0)
+            except ValueError:
+                proxima = 0.0  # Arquivo corrompido: recomeça o limite
+            agora = time.time()  # Relógio de parede: o monotonic não é comparável entre máquinas/boots
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.ftruncate(fd, 0)
+            os.write(fd, repr(max(agora, proxima) + self.intervalo).encode('ascii'))
+            return proxima - agora
+        finally:
+            os.close(fd)
+
+    def aguardar(self):
+        """Bloqueia até a próxima requisição ser permitida."""
+        if not self.intervalo:
+            return
+        with self._lock:
+            if self.arquivo:
+                espera = self._reservar_no_arquivo()
+            else:
+                agora = time.monotonic()
+                espera = self._proxima_liberacao - agora
+                self._proxima_liberacao = max(agora, self._proxima_liberacao) + self.intervalo
+        if espera > 0:
+            time.sleep(espera)
+
+
+limitador_ia = LimitadorTaxa(GEMINI_MAX_RPM, GEMINI_LIMITE_ARQUIVO)
 
 
 def processar_arquivo_com_ia(conteudo_arquivo: str) -> dict | None:
@@ -37,6 +96,7 @@ def processar_arquivo_com_ia(conteudo_arquivo: str) -> dict | None:
 
     Retorne APENAS o objeto JSON, sem nenhum texto ou marcadores de código.
     """
+    limitador_ia.aguardar()
     try:
         model = genai.GenerativeModel('gemini-2.0-flash')
         response = model.generate_content(prompt_template)
@@ -67,8 +127,9 @@ class NewFileHandler(FileSystemEventHandler):
             dados_da_ia = processar_arquivo_com_ia(conteudo)
 
             if dados_da_ia:
-                # Adiciona o nome do arquivo original aos dados da IA
+                # Adiciona o nome e o hash do arquivo original (base da chave de idempotência)
                 dados_da_ia['nome_arquivo_origem'] = nome_arquivo_origem
+                dados_da_ia['hash_origem'] = hash_conteudo(conteudo)
 
                 # Salva o resultado em um novo arquivo JSON na pasta de saída
                 output_filename = f"{os.path.splitext(nome_arquivo_origem)[0]}.json"
@@ -1,52 +1,113 @@
 # ==============================================================================
 # SCRIPT: metadata_enricher.py (ETAPA 2 - ENRIQUECEDOR DE METADADOS)
-# FUNÇÃO: Monitora a pasta de JSONs processados pela IA, enriquece com
-#         metadados e envia para a API FastAPI para salvar no banco.
+# FUNÇÃO: Monitora a pasta de JSONs processados pela IA, grava cada um na
+#         outbox durável (SQLite) e um trabalhador em segundo plano enriquece
+#         com metadados e envia para a API FastAPI, com novas tentativas.
 # AMBIENTE VIRTUAL: .venv_watcher
 # ==============================================================================
 
 import time
 import os
+import sys
 import json
 import requests
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 
+from outbox_ingestao import OutboxIngestao, TrabalhadorOutbox, ErroDefinitivo, rescan_pasta
+
+# Balanceador compartilhado com as actions (API_URL / API_REPLICAS no .env)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from actions.balanceador import api_get, api_post
+
 # --- CONFIGURAÇÃO ---
 WATCH_FOLDER = os.path.join('connectors', 'ia_processed_files')  # Monitora a pasta de saída da IA
-API_FASTAPI_URL = "http://127.0.0.1:8000"
 
 
 def get_id_disciplina_por_nome(nome_disciplina: str) -> str | None:
-    """Busca o UUID de uma disciplina na API FastAPI usando seu nome."""
+    """
+    Busca o UUID de uma disciplina na API FastAPI usando seu nome.
+    Erros de conexão/timeout são propagados para que a outbox tente de novo,
+    em vez de salvar o conhecimento com a disciplina nula.
+    """
     print(f"   [Busca] 1.5. Procurando ID para a disciplina '{nome_disciplina}'...")
     try:
-        response = requests.get(f"{API_FASTAPI_URL}/disciplina/nome/{nome_disciplina}")
+        response = api_get(f"/disciplina/nome/{nome_disciplina}", timeout=10)
         response.raise_for_status()
         id_disciplina = response.json().get("id_disciplina")
         if id_disciplina:
             print(f"   [Busca] 1.6. ID encontrado: {id_disciplina}")
             return id_disciplina
         return None
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+        raise
     except requests.exceptions.RequestException:
         print(f"   [ERRO Busca] Disciplina '{nome_disciplina}' não encontrada na API.")
         return None
 
 
-def salvar_na_base_conhecimento(payload: dict) -> bool:
-    """Envia o payload final para a API FastAPI."""
+def salvar_na_base_conhecimento(payload: dict, chave_idempotencia: str | None = None):
+    """
+    Envia o payload final para a API FastAPI.
+    Levanta ErroDefinitivo para respostas 4xx (não adianta reenviar) e
+    RequestException para falhas temporárias (rede, 5xx).
+
+    A chave vai no cabeçalho Idempotency-Key, mas a API ainda não a usa:
+    um reenvio depois de um POST que chegou (timeout, processo caiu antes
+    de marcar_enviado) cria outra entrada na base de conhecimento.
+    """
     print(f"   [API] 3. Enviando payload final para a API FastAPI...")
-    try:
-        response = requests.post(f"{API_FASTAPI_URL}/baseconhecimento/", json=payload)
-        response.raise_for_status()
-        print(f"   [API] 3.1. Dados salvos com sucesso no Supabase! (ID: {response.json().get('id_conhecimento')})")
-        return True
-    except requests.exceptions.RequestException as e:
-        print(f"   [ERRO API] Falha ao salvar no Supabase: {e}")
-        return False
+    headers = {"Idempotency-Key": chave_idempotencia} if chave_idempotencia else {}
+    response = api_post("/baseconhecimento/", json=payload, headers=headers, timeout=30)
+    if 400 <= response.status_code < 500 and response.status_code not in (408, 429):
+        raise ErroDefinitivo(f"API recusou o payload ({response.status_code}): {response.text[:200]}")
+    response.raise_for_status()
+    print(f"   [API] 3.1. Dados salvos com sucesso no Supabase! (ID: {response.json().get('id_conhecimento')})")
+
+
+def montar_payload(dados_ia: dict) -> dict:
+    """Extrai os metadados do nome do arquivo e monta o payload da base de conhecimento."""
+    nome_arquivo_origem = dados_ia.get('nome_arquivo_origem')
+    if not nome_arquivo_origem:
+        raise ErroDefinitivo("JSON inválido, sem 'nome_arquivo_origem'.")
+
+    # Convenção: DISCIPLINA-CATEGORIA-NOME.ext
+    partes_nome = os.path.splitext(nome_arquivo_origem)[0].split('-')
+    if len(partes_nome) < 2:
+        print(f"   [ERRO] Nome do arquivo '{nome_arquivo_origem}' fora do padrão. Usando valores padrão.")
+        nome_disciplina_extraido = "desconhecida"
+        categoria_extraida = "Outros"
+    else:
+        nome_disciplina_extraido = partes_nome[0]
+        categoria_extraida = partes_nome[1] if len(partes_nome) > 1 else "Geral"
+
+    id_disciplina = get_id_disciplina_por_nome(nome_disciplina_extraido)
+    if not id_disciplina:
+        print("   [AVISO] ID da disciplina não encontrado. Será salvo como nulo.")
+
+    return {
+        "nome_arquivo_origem": nome_arquivo_origem,
+        "conteudo_processado": dados_ia.get("resumo"),
+        "palavras_chave": dados_ia.get("palavras_chave"),
+        "categoria": categoria_extraida.replace("_", " "),
+        "status": "publicado",
+        "id_disciplina": id_disciplina
+    }
+
+
+def enviar_dados_ia(dados_ia: dict, chave: str):
+    """Função executada pelo trabalhador da outbox para cada item."""
+    print(f"\n✔️  [ETAPA 2] Enviando '{dados_ia.get('nome_arquivo_origem')}' para a base de conhecimento...")
+    # O pipeline em processo único já entrega o payload enriquecido
+    payload_final = dados_ia.get('payload_final') or montar_payload(dados_ia)
+    salvar_na_base_conhecimento(payload_final, chave_idempotencia=chave)
 
 
 class NewJsonHandler(FileSystemEventHandler):
+    def __init__(self, outbox: OutboxIngestao):
+        super().__init__()
+        self.outbox = outbox
+
     def on_created(self, event):
         if event.is_directory or not event.src_path.endswith('.json'):
             return
@@ -60,48 +121,17 @@ class NewJsonHandler(FileSystemEventHandler):
             with open(json_path, 'r', encoding='utf-8') as f:
                 dados_ia = json.load(f)
 
-            nome_arquivo_origem = dados_ia.get('nome_arquivo_origem')
-            if not nome_arquivo_origem:
-                print("   [ERRO] JSON inválido, sem 'nome_arquivo_origem'.")
-                return
-
-            # 2. Extrair metadados do nome do arquivo
-            # Convenção: DISCIPLINA-CATEGORIA-NOME.ext
-            partes_nome = os.path.splitext(nome_arquivo_origem)[0].split('-')
-            if len(partes_nome) < 2:
-                print(f"   [ERRO] Nome do arquivo '{nome_arquivo_origem}' fora do padrão. Usando valores padrão.")
-                nome_disciplina_extraido = "desconhecida"
-                categoria_extraida = "Outros"
+            # 2. Gravar na outbox durável; o envio acontece no trabalhador
+            if self.outbox.enfileirar(dados_ia):
+                print(f"   [Outbox] '{os.path.basename(json_path)}' gravado na fila de envio.")
             else:
-                nome_disciplina_extraido = partes_nome[0]
-                categoria_extraida = partes_nome[1] if len(partes_nome) > 1 else "Geral"
-
-            # 3. Buscar ID da disciplina
-            id_disciplina = get_id_disciplina_por_nome(nome_disciplina_extraido)
-            if not id_disciplina:
-                print("   [AVISO] ID da disciplina não encontrado. Será salvo como nulo.")
-
-            # 4. Montar o payload final
-            payload_final = {
-                "nome_arquivo_origem": nome_arquivo_origem,
-                "conteudo_processado": dados_ia.get("resumo"),
-                "palavras_chave": dados_ia.get("palavras_chave"),
-                "categoria": categoria_extraida.replace("_", " "),
-                "status": "publicado",
-                "id_disciplina": id_disciplina
-            }
-
-            # 5. Salvar no banco de dados
-            sucesso = salvar_na_base_conhecimento(payload_final)
-
-            if sucesso:
-                print(f"✅ [ETAPA 2] Processamento completo para '{nome_arquivo_origem}'.")
-                os.remove(json_path)  # Limpa o arquivo JSON após o sucesso
-                print(f"   [Limpeza] Arquivo temporário '{os.path.basename(json_path)}' removido.")
-            else:
-                print(
-                    f"❌ [ETAPA 2] Falha no processamento de '{nome_arquivo_origem}'. O arquivo JSON será mantido para nova tentativa.")
+                print(f"   [Outbox] '{os.path.basename(json_path)}' já estava na fila (duplicata ignorada).")
+
+            os.remove(json_path)  # O JSON já está seguro na outbox
+            print(f"   [Limpeza] Arquivo temporário '{os.path.basename(json_path)}' removido.")
 
+        except FileNotFoundError:
+            print(f"   [Outbox] '{os.path.basename(json_path)}' já foi tratado pelo rescan inicial.")
         except Exception as e:
             print(f"🚨 Erro inesperado na ETAPA 2: {e}")
 
@@ -112,14 +142,26 @@ if __name__ == "__main__":
     print(f"Monitorando a pasta de JSONs: '{os.path.abspath(WATCH_FOLDER)}'")
     print("======================================================")
 
-    event_handler = NewJsonHandler()
+    outbox = OutboxIngestao()
+
+    trabalhador = TrabalhadorOutbox(outbox, enviar_dados_ia)
+    trabalhador.start()
+
+    # O observer liga antes do rescan: um arquivo que chegue durante o rescan não
+    # fica de fora; se os dois pegarem o mesmo, a chave de idempotência descarta um
+    event_handler = NewJsonHandler(outbox)
     observer = Observer()
     observer.schedule(event_handler, WATCH_FOLDER, recursive=False)
     observer.start()
+
+    # Arquivos que chegaram enquanto o processo estava parado
+    pendentes = rescan_pasta(outbox, WATCH_FOLDER)
+    print(f"[Outbox] Rescan inicial: {pendentes} arquivo(s) enfileirado(s). Situação: {outbox.estatisticas()}")
     try:
         while True:
             time.sleep(5)
     except KeyboardInterrupt:
         observer.stop()
+        trabalhador.parar()
     observer.join()
     print("\n👋 Enriquecedor de metadados encerrado.")
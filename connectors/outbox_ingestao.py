@@ -0,0 +1,332 @@
+# ==============================================================================
+# MÓDULO: outbox_ingestao.py (FILA DURÁVEL DA ETAPA 2)
+# FUNÇÃO: Guarda em SQLite os JSONs da IA que precisam ser enviados para a
+#         API FastAPI, com chave de idempotência, novas tentativas com
+#         backoff exponencial e tabela de "dead letter" para falhas definitivas.
+#         A fila tem um consumidor por vez: ao abrir, todo item que ficou
+#         "em_envio" volta para a fila, e o trabalhador devolve periodicamente
+#         as reservas vencidas.
+# ENTREGA: pelo menos uma vez. A API ainda ignora o cabeçalho Idempotency-Key;
+#         se o processo cair entre o POST e o marcar_enviado (ou a resposta se
+#         perder na rede), o item volta para a fila e o documento é enviado de
+#         novo, e a base de conhecimento pode ficar com uma entrada duplicada.
+#         As linhas "enviado" só evitam reenviar o que já foi confirmado, e
+#         são apagadas depois de OUTBOX_RETENCAO_DIAS (0 mantém para sempre):
+#         reprocessar o mesmo arquivo depois disso gera um novo envio.
+# AMBIENTE VIRTUAL: .venv_watcher
+# ==============================================================================
+
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+
+# --- CONFIGURAÇÃO ---
+OUTBOX_DB_PATH = os.getenv("OUTBOX_DB_PATH", os.path.join('connectors', 'outbox_ingestao.db'))
+MAX_TENTATIVAS = int(os.getenv("OUTBOX_MAX_TENTATIVAS", "8"))
+BACKOFF_BASE_SEGUNDOS = float(os.getenv("OUTBOX_BACKOFF_BASE", "2"))
+BACKOFF_MAX_SEGUNDOS = float(os.getenv("OUTBOX_BACKOFF_MAX", "600"))
+RETENCAO_ENVIADOS_DIAS = float(os.getenv("OUTBOX_RETENCAO_DIAS", "30"))
+TEMPO_RESERVA_SEGUNDOS = 120  # Tempo máximo que um item fica "em_envio" antes de voltar para a fila
+INTERVALO_RETENCAO_SEGUNDOS = 3600
+
+STATUS_PENDENTE = "pendente"
+STATUS_EM_ENVIO = "em_envio"
+STATUS_ENVIADO = "enviado"
+
+
+class ErroDefinitivo(Exception):
+    """Falha que não adianta tentar de novo (ex: payload rejeitado com 4xx)."""
+
+
+def hash_conteudo(conteudo: str) -> str:
+    """Hash do conteúdo do arquivo de origem (vai em dados_ia['hash_origem'])."""
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+
+def gerar_chave_idempotencia(dados_ia: dict) -> str:
+    """
+    Gera uma chave estável para os dados da IA: nome do arquivo de origem + hash
+    do conteúdo de origem. A resposta da IA muda a cada chamada para o mesmo
+    arquivo, então não entra na chave; reprocessar o arquivo cai na mesma chave,
+    o que evita entradas duplicadas na base de conhecimento.
+    """
+    if dados_ia.get('hash_origem'):
+        origem = f"{dados_ia.get('nome_arquivo_origem')}\n{dados_ia['hash_origem']}"
+        return hashlib.sha256(origem.encode('utf-8')).hexdigest()
+    # JSONs gerados antes do hash_origem: só os dados da IA identificam o item.
+    # O payload já enriquecido pode mudar entre tentativas, então fica fora da chave
+    dados_chave = {k: v for k, v in dados_ia.items() if k != 'payload_final'}
+    conteudo_canonico = json.dumps(dados_chave, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(conteudo_canonico.encode('utf-8')).hexdigest()
+
+
+def calcular_backoff(tentativas: int) -> float:
+    """Backoff exponencial com jitter: base * 2^(tentativas-1), limitado ao máximo."""
+    atraso = min(BACKOFF_MAX_SEGUNDOS, BACKOFF_BASE_SEGUNDOS * (2 ** max(0, tentativas - 1)))
+    return atraso * random.uniform(0.5, 1.0)
+
+
+class OutboxIngestao:
+    """Fila durável (SQLite) entre o JSON da IA e o POST na API FastAPI."""
+
+    def __init__(self, caminho_db: str = OUTBOX_DB_PATH, max_tentativas: int = MAX_TENTATIVAS):
+        self.caminho_db = caminho_db
+        self.max_tentativas = max_tentativas
+        self._lock = threading.Lock()
+        pasta = os.path.dirname(caminho_db)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        self._conn = sqlite3.connect(caminho_db, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._criar_tabelas()
+        # Um consumidor por vez: o que estava "em_envio" é de um processo que caiu
+        # (o POST pode ter chegado à API, então esses itens podem ser duplicados)
+        self.reservas_recuperadas = self.liberar_reservas(todas=True)
+
+    def _criar_tabelas(self):
+        with self._lock:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    chave TEXT PRIMARY KEY,
+                    nome_arquivo_origem TEXT,
+                    dados TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    tentativas INTEGER NOT NULL DEFAULT 0,
+                    proxima_tentativa REAL NOT NULL,
+                    reservado_ate REAL,
+                    ultimo_erro TEXT,
+                    criado_em REAL NOT NULL,
+                    atualizado_em REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_outbox_fila ON outbox (status, proxima_tentativa);
+                CREATE TABLE IF NOT EXISTS dead_letter (
+                    chave TEXT PRIMARY KEY,
+                    nome_arquivo_origem TEXT,
+                    dados TEXT NOT NULL,
+                    tentativas INTEGER NOT NULL,
+                    ultimo_erro TEXT,
+                    movido_em REAL NOT NULL
+                );
+            """)
+
+    def liberar_reservas(self, todas: bool = False) -> int:
+        """
+        Itens que ficaram 'em_envio' (ex: processo caiu no meio do POST) voltam para a fila.
+        Com `todas=False`, só os de reserva vencida. Retorna quantos voltaram.
+        """
+        with self._lock:
+            if todas:
+                cursor = self._conn.execute(
+                    "UPDATE outbox SET status = ?, reservado_ate = NULL WHERE status = ?",
+                    (STATUS_PENDENTE, STATUS_EM_ENVIO)
+                )
+            else:
+                cursor = self._conn.execute(
+                    "UPDATE outbox SET status = ?, reservado_ate = NULL WHERE status = ? "
+                    "AND (reservado_ate IS NULL OR reservado_ate < ?)",
+                    (STATUS_PENDENTE, STATUS_EM_ENVIO, time.time())
+                )
+        return cursor.rowcount or 0
+
+    def enfileirar(self, dados_ia: dict) -> bool:
+        """
+        Grava os dados na outbox. Retorna False se a mesma chave já existe
+        (pendente, enviada ou na dead letter), ou seja, é uma duplicata.
+        """
+        chave = gerar_chave_idempotencia(dados_ia)
+        agora = time.time()
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM dead_letter WHERE chave = ?", (chave,)).fetchone():
+                return False
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO outbox (chave, nome_arquivo_origem, dados, status, tentativas, "
+                "proxima_tentativa, criado_em, atualizado_em) VALUES (?, ?, ?, ?, 0, ?, ?, ?)",
+                (chave, dados_ia.get('nome_arquivo_origem'), json.dumps(dados_ia, ensure_ascii=False),
+                 STATUS_PENDENTE, agora, agora, agora)
+            )
+            return cursor.rowcount == 1
+
+    def reservar_proximos(self, limite: int = 10) -> list[tuple[str, dict, int]]:
+        """Reserva itens vencidos para envio. Retorna (chave, dados, tentativas)."""
+        agora = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                linhas = self._conn.execute(
+                    "SELECT chave, dados, tentativas FROM outbox WHERE status = ? AND proxima_tentativa <= ? "
+                    "ORDER BY proxima_tentativa LIMIT ?",
+                    (STATUS_PENDENTE, agora, limite)
+                ).fetchall()
+                for chave, _, _ in linhas:
+                    self._conn.execute(
+                        "UPDATE outbox SET status = ?, reservado_ate = ? WHERE chave = ?",
+                        (STATUS_EM_ENVIO, agora + TEMPO_RESERVA_SEGUNDOS, chave)
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [(chave, json.loads(dados), tentativas) for chave, dados, tentativas in linhas]
+
+    def marcar_enviado(self, chave: str):
+        """Mantém a linha como 'enviado' para que a mesma chave não seja reenviada (até a retenção apagá-la)."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE outbox SET status = ?, reservado_ate = NULL, ultimo_erro = NULL, atualizado_em = ? "
+                "WHERE chave = ?",
+                (STATUS_ENVIADO, time.time(), chave)
+            )
+
+    def limpar_enviados(self, dias: float = RETENCAO_ENVIADOS_DIAS) -> int:
+        """Apaga as linhas 'enviado' confirmadas há mais de `dias` dias. Retorna quantas saíram."""
+        if dias <= 0:
+            return 0
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM outbox WHERE status = ? AND atualizado_em < ?",
+                (STATUS_ENVIADO, time.time() - dias * 86400)
+            )
+        return cursor.rowcount or 0
+
+    def marcar_falha(self, chave: str, erro: str, definitivo: bool = False) -> bool:
+        """
+        Registra uma falha. Reagenda com backoff ou move para a dead letter
+        quando as tentativas acabam. Retorna True se foi para a dead letter.
+        """
+        agora = time.time()
+        with self._lock:
+            linha = self._conn.execute(
+                "SELECT nome_arquivo_origem, dados, tentativas FROM outbox WHERE chave = ?", (chave,)
+            ).fetchone()
+            if not linha:
+                return False
+            nome_arquivo, dados, tentativas = linha
+            tentativas += 1
+
+            if definitivo or tentativas >= self.max_tentativas:
+                self._conn.execute("BEGIN IMMEDIATE")
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO dead_letter (chave, nome_arquivo_origem, dados, tentativas, "
+                    "ultimo_erro, movido_em) VALUES (?, ?, ?, ?, ?, ?)",
+                    (chave, nome_arquivo, dados, tentativas, erro, agora)
+                )
+                self._conn.execute("DELETE FROM outbox WHERE chave = ?", (chave,))
+                self._conn.execute("COMMIT")
+                return True
+
+            self._conn.execute(
+                "UPDATE outbox SET status = ?, tentativas = ?, proxima_tentativa = ?, reservado_ate = NULL, "
+                "ultimo_erro = ?, atualizado_em = ? WHERE chave = ?",
+                (STATUS_PENDENTE, tentativas, agora + calcular_backoff(tentativas), erro, agora, chave)
+            )
+            return False
+
+    def reprocessar_dead_letter(self) -> int:
+        """Devolve todos os itens da dead letter para a fila (uso manual após corrigir a causa)."""
+        agora = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            linhas = self._conn.execute("SELECT chave, nome_arquivo_origem, dados FROM dead_letter").fetchall()
+            for chave, nome_arquivo, dados in linhas:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO outbox (chave, nome_arquivo_origem, dados, status, tentativas, "
+                    "proxima_tentativa, criado_em, atualizado_em) VALUES (?, ?, ?, ?, 0, ?, ?, ?)",
+                    (chave, nome_arquivo, dados, STATUS_PENDENTE, agora, agora, agora)
+                )
+            self._conn.execute("DELETE FROM dead_letter")
+            self._conn.execute("COMMIT")
+        return len(linhas)
+
+    def estatisticas(self) -> dict:
+        """Contagem de itens por status, incluindo a dead letter."""
+        with self._lock:
+            contagens = dict(self._conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+            contagens["dead_letter"] = self._conn.execute("SELECT COUNT(*) FROM dead_letter").fetchone()[0]
+        return contagens
+
+
+def rescan_pasta(outbox: OutboxIngestao, pasta: str) -> int:
+    """
+    Enfileira os JSONs que já estavam na pasta antes do watcher iniciar.
+    O arquivo só é removido depois que está gravado na outbox.
+    """
+    enfileirados = 0
+    if not os.path.isdir(pasta):
+        return 0
+    for nome in sorted(os.listdir(pasta)):
+        if not nome.endswith('.json'):
+            continue
+        caminho = os.path.join(pasta, nome)
+        try:
+            with open(caminho, 'r', encoding='utf-8') as f:
+                dados_ia = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"   [Outbox] Ignorando '{nome}' no rescan: {e}")
+            continue
+        if outbox.enfileirar(dados_ia):
+            enfileirados += 1
+        try:
+            os.remove(caminho)
+        except FileNotFoundError:
+            pass  # O watcher, já ligado, tratou o mesmo arquivo
+    return enfileirados
+
+
+class TrabalhadorOutbox(threading.Thread):
+    """
+    Thread que drena a outbox chamando `processar(dados_ia, chave)`.
+    A função deve levantar exceção em falha (ErroDefinitivo para não tentar de novo).
+    """
+
+    def __init__(self, outbox: OutboxIngestao, processar, intervalo: float = 1.0, lote: int = 10):
+        super().__init__(daemon=True, name="TrabalhadorOutbox")
+        self.outbox = outbox
+        self.processar = processar
+        self.intervalo = intervalo
+        self.lote = lote
+        self._parar = threading.Event()
+
+    def parar(self):
+        self._parar.set()
+
+    def run(self):
+        if self.outbox.reservas_recuperadas:
+            print(f"⚠️ [Outbox] {self.outbox.reservas_recuperadas} item(ns) estava(m) em envio quando o processo "
+                  f"parou e volta(m) para a fila: se o POST chegou à API, a base terá entrada duplicada.")
+        proxima_liberacao = time.monotonic() + TEMPO_RESERVA_SEGUNDOS
+        proxima_retencao = time.monotonic()
+        while not self._parar.is_set():
+            if time.monotonic() >= proxima_retencao:
+                apagados = self.outbox.limpar_enviados()
+                if apagados:
+                    print(f"   [Outbox] {apagados} item(ns) enviado(s) há mais de "
+                          f"{RETENCAO_ENVIADOS_DIAS:g} dia(s) removido(s).")
+                proxima_retencao = time.monotonic() + INTERVALO_RETENCAO_SEGUNDOS
+            if time.monotonic() >= proxima_liberacao:
+                # Entre dois lotes nada deste trabalhador está "em_envio"
+                liberados = self.outbox.liberar_reservas()
+                if liberados:
+                    print(f"   [Outbox] {liberados} reserva(s) vencida(s) devolvida(s) à fila.")
+                proxima_liberacao = time.monotonic() + TEMPO_RESERVA_SEGUNDOS
+            itens = self.outbox.reservar_proximos(self.lote)
+            for chave, dados_ia, tentativas in itens:
+                nome = dados_ia.get('nome_arquivo_origem', chave[:12])
+                try:
+                    self.processar(dados_ia, chave)
+                    self.outbox.marcar_enviado(chave)
+                    print(f"✅ [Outbox] '{nome}' enviado (tentativa {tentativas + 1}).")
+                except ErroDefinitivo as e:
+                    self.outbox.marcar_falha(chave, str(e), definitivo=True)
+                    print(f"☠️  [Outbox] '{nome}' movido para a dead letter: {e}")
+                except Exception as e:
+                    if self.outbox.marcar_falha(chave, str(e)):
+                        print(f"☠️  [Outbox] '{nome}' esgotou as tentativas e foi para a dead letter: {e}")
+                    else:
+                        print(f"⏳ [Outbox] Falha ao enviar '{nome}' (tentativa {tentativas + 1}), será reagendado: {e}")
+            if not itens:
+                self._parar.wait(self.intervalo)
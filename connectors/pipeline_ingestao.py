@@ -0,0 +1,353 @@
+# ==============================================================================
+# SCRIPT: pipeline_ingestao.py (ETAPAS 1 + 2 EM UM ÚNICO PROCESSO)
+# FUNÇÃO: Substitui a dupla local_file_watcher.py -> ia_processed_files/ ->
+#         metadata_enricher.py por um único processo com filas em memória:
+#         leitura -> divisão em pedaços -> IA -> enriquecimento -> persistência.
+#         As filas são limitadas (backpressure), cada etapa tem métricas e,
+#         opcionalmente, checkpoints em disco para recuperação após queda.
+#         Pedaços que a IA não processa são tentados de novo com backoff, e
+#         o encerramento esvazia as etapas em ordem, com tempo limite.
+# AMBIENTE VIRTUAL: .venv_watcher
+# ==============================================================================
+
+import json
+import os
+import queue
+import random
+import threading
+import time
+import requests
+from watchdog.observers import Observer
+from watchdog.events import FileSystemEventHandler
+
+from local_file_watcher import WATCH_FOLDER, GOOGLE_API_KEY, processar_arquivo_com_ia
+from metadata_enricher import montar_payload, enviar_dados_ia
+from outbox_ingestao import OutboxIngestao, TrabalhadorOutbox, ErroDefinitivo, hash_conteudo
+
+# --- CONFIGURAÇÃO ---
+TAMANHO_FILA = int(os.getenv("PIPELINE_TAMANHO_FILA", "16"))  # Itens por fila antes de bloquear a etapa anterior
+TAMANHO_PEDACO = int(os.getenv("PIPELINE_TAMANHO_PEDACO", "12000"))  # Caracteres por pedaço enviado à IA
+THREADS_IA = int(os.getenv("PIPELINE_THREADS_IA", "2"))
+TENTATIVAS_IA = max(1, int(os.getenv("PIPELINE_TENTATIVAS_IA", "4")))  # Chamadas à IA por pedaço antes de desistir
+ESPERA_PARADA = float(os.getenv("PIPELINE_ESPERA_PARADA", "30"))  # Segundos para esvaziar as filas ao encerrar
+CHECKPOINT_FOLDER = os.getenv("PIPELINE_CHECKPOINTS")  # Ex: connectors/pipeline_checkpoints (vazio = desligado)
+INTERVALO_METRICAS = 60  # segundos
+
+_FIM = object()  # Sentinela para encerrar as threads das etapas
+
+
+class MetricasEtapa:
+    """Contadores de uma etapa: itens processados, erros, tempo gasto e fila."""
+
+    def __init__(self, nome: str):
+        self.nome = nome
+        self.processados = 0
+        self.erros = 0
+        self.tempo_total = 0.0
+        self.tempo_max = 0.0
+        self.fila_max = 0
+        self._lock = threading.Lock()
+
+    def registrar(self, duracao: float, erro: bool, tamanho_fila: int):
+        with self._lock:
+            self.processados += 1
+            self.erros += int(erro)
+            self.tempo_total += duracao
+            self.tempo_max = max(self.tempo_max, duracao)
+            self.fila_max = max(self.fila_max, tamanho_fila)
+
+    def resumo(self, fila: queue.Queue) -> str:
+        with self._lock:
+            media_ms = (self.tempo_total / self.processados * 1000) if self.processados else 0.0
+            return (f"{self.nome:<16} ok={self.processados - self.erros:<5} erros={self.erros:<4} "
+                    f"media={media_ms:8.1f}ms max={self.tempo_max * 1000:8.1f}ms "
+                    f"fila={fila.qsize()}/{fila.maxsize} (pico {self.fila_max})")
+
+
+class Checkpoints:
+    """
+    Guarda em disco o estado de cada documento entre as etapas.
+    Só grava depois da leitura e depois da IA (a etapa cara); na retomada
+    o documento volta para a etapa seguinte ao último checkpoint.
+    """
+
+    def __init__(self, pasta: str | None):
+        self.pasta = pasta
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+
+    def _caminho(self, nome_arquivo: str) -> str:
+        return os.path.join(self.pasta, f"{nome_arquivo}.checkpoint.json")
+
+    def salvar(self, documento: dict, etapa: str):
+        if not self.pasta:
+            return
+        caminho = self._caminho(documento['nome'])
+        temporario = caminho + ".tmp"
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump({"etapa": etapa, "documento": documento}, f, ensure_ascii=False)
+        os.replace(temporario, caminho)
+
+    def remover(self, documento: dict):
+        if self.pasta:
+            try:
+                os.remove(self._caminho(documento['nome']))
+            except FileNotFoundError:
+                pass
+
+    def pendentes(self) -> list[tuple[str, dict]]:
+        if not self.pasta:
+            return []
+        retomar = []
+        for nome in sorted(os.listdir(self.pasta)):
+            if nome.endswith(".checkpoint.json"):
+                with open(os.path.join(self.pasta, nome), 'r', encoding='utf-8') as f:
+                    dados = json.load(f)
+                retomar.append((dados["etapa"], dados["documento"]))
+        return retomar
+
+
+def dividir_em_pedacos(conteudo: str, tamanho: int = TAMANHO_PEDACO) -> list[str]:
+    """Divide o texto em pedaços de até `tamanho` caracteres, preferindo quebras de parágrafo."""
+    if len(conteudo) <= tamanho:
+        return [conteudo]
+    pedacos = []
+    inicio = 0
+    while inicio < len(conteudo):
+        fim = min(len(conteudo), inicio + tamanho)
+        if fim < len(conteudo):
+            quebra = conteudo.rfind("\n\n", inicio, fim)
+            if quebra > inicio + tamanho // 2:
+                fim = quebra
+        pedacos.append(conteudo[inicio:fim])
+        inicio = fim
+    return pedacos
+
+
+def juntar_respostas_ia(respostas: list[dict]) -> dict:
+    """Une as respostas da IA de cada pedaço em um único resumo e lista de palavras-chave."""
+    if len(respostas) == 1:
+        return respostas[0]
+    palavras_chave = []
+    for resposta in respostas:
+        for palavra in resposta.get("palavras_chave") or []:
+            if palavra not in palavras_chave:
+                palavras_chave.append(palavra)
+    return {
+        "resumo": "\n\n".join(r.get("resumo", "") for r in respostas if r.get("resumo")),
+        "palavras_chave": palavras_chave[:7],
+    }
+
+
+class PipelineIngestao:
+    """Executa todas as etapas da ingestão em threads ligadas por filas limitadas."""
+
+    def __init__(self, outbox: OutboxIngestao, pasta_checkpoints: str | None = CHECKPOINT_FOLDER):
+        self.outbox = outbox
+        self.checkpoints = Checkpoints(pasta_checkpoints)
+        self.fila_leitura = queue.Queue(TAMANHO_FILA)
+        self.fila_pedacos = queue.Queue(TAMANHO_FILA)
+        self.fila_ia = queue.Queue(TAMANHO_FILA)
+        self.fila_enriquecimento = queue.Queue(TAMANHO_FILA)
+        self.fila_persistencia = queue.Queue(TAMANHO_FILA)
+        # (nome, função, fila de entrada, fila de saída, nº de threads)
+        self.etapas = [
+            ("leitura", self._ler, self.fila_leitura, self.fila_pedacos, 1),
+            ("divisao", self._dividir, self.fila_pedacos, self.fila_ia, 1),
+            ("ia", self._processar_ia, self.fila_ia, self.fila_enriquecimento, THREADS_IA),
+            ("enriquecimento", self._enriquecer, self.fila_enriquecimento, self.fila_persistencia, 1),
+            ("persistencia", self._persistir, self.fila_persistencia, None, 1),
+        ]
+        self.metricas = {nome: MetricasEtapa(nome) for nome, *_ in self.etapas}
+        self._threads = {nome: [] for nome, *_ in self.etapas}
+        self._parando = threading.Event()  # Libera as threads presas em filas ao encerrar
+
+    # --- ETAPAS ---
+    def _ler(self, documento: dict) -> dict:
+        caminho = documento['caminho']
+        # Espera o arquivo parar de crescer em vez de dormir 2s fixos
+        tamanho_anterior = -1
+        while os.path.getsize(caminho) != tamanho_anterior:
+            tamanho_anterior = os.path.getsize(caminho)
+            time.sleep(0.2)
+        with open(caminho, 'r', encoding='utf-8') as f:
+            documento['conteudo'] = f.read()
+        documento['hash_origem'] = hash_conteudo(documento['conteudo'])
+        self.checkpoints.salvar({k: v for k, v in documento.items() if k != 'conteudo'}, "recebido")
+        return documento
+
+    def _dividir(self, documento: dict) -> dict:
+        documento['pedacos'] = dividir_em_pedacos(documento.pop('conteudo'))
+        return documento
+
+    def _chamar_ia(self, nome: str, pedaco: str) -> dict:
+        """Chama a IA com backoff entre as tentativas (erro de rede, limite da API, JSON inválido)."""
+        for tentativa in range(1, TENTATIVAS_IA + 1):
+            resposta = processar_arquivo_com_ia(pedaco)
+            if resposta:
+                return resposta
+            if tentativa == TENTATIVAS_IA:
+                break
+            espera = min(60, 2 ** tentativa) * random.uniform(0.5, 1.0)
+            print(f"   [Pipeline] IA sem resposta para '{nome}' (tentativa {tentativa}/{TENTATIVAS_IA}); "
+                  f"nova tentativa em {espera:.1f}s.")
+            if self._parando.wait(espera):
+                break
+        raise RuntimeError(f"a IA não retornou dados para um dos pedaços após {tentativa} tentativa(s)")
+
+    def _processar_ia(self, documento: dict) -> dict | None:
+        respostas = [self._chamar_ia(documento['nome'], pedaco) for pedaco in documento['pedacos']]
+        del documento['pedacos']
+        dados_ia = juntar_respostas_ia(respostas)
+        dados_ia['nome_arquivo_origem'] = documento['nome']
+        dados_ia['hash_origem'] = documento['hash_origem']
+        documento['dados_ia'] = dados_ia
+        self.checkpoints.salvar(documento, "ia")
+        return documento
+
+    def _enriquecer(self, documento: dict) -> dict:
+        try:
+            documento['dados_ia']['payload_final'] = montar_payload(documento['dados_ia'])
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            # A API está fora: a outbox fará o enriquecimento quando ela voltar
+            print(f"   [Pipeline] Enriquecimento adiado para '{documento['nome']}': {e}")
+        return documento
+
+    def _persistir(self, documento: dict) -> None:
+        if self.outbox.enfileirar(documento['dados_ia']):
+            print(f"   [Pipeline] '{documento['nome']}' gravado na outbox.")
+        else:
+            print(f"   [Pipeline] '{documento['nome']}' já estava na outbox (duplicata ignorada).")
+        self.checkpoints.remover(documento)
+
+    # --- EXECUÇÃO ---
+    def _entregar(self, fila: queue.Queue, item) -> bool:
+        """put que desiste quando o pipeline está sendo encerrado à força."""
+        while not self._parando.is_set():
+            try:
+                fila.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _loop_etapa(self, nome: str, funcao, entrada: queue.Queue, saida: queue.Queue | None):
+        metricas = self.metricas[nome]
+        while not self._parando.is_set():
+            try:
+                documento = entrada.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if documento is _FIM:
+                self._entregar(entrada, _FIM)  # Repassa para as outras threads da mesma etapa
+                return
+            inicio = time.perf_counter()
+            erro = False
+            resultado = None
+            try:
+                resultado = funcao(documento)
+            except ErroDefinitivo as e:
+                erro = True
+                print(f"❌ [Pipeline:{nome}] '{documento.get('nome')}' descartado: {e}")
+                self.checkpoints.remover(documento)
+            except Exception as e:
+                erro = True
+                print(f"🚨 [Pipeline:{nome}] Erro em '{documento.get('nome')}': {e}")
+            metricas.registrar(time.perf_counter() - inicio, erro, entrada.qsize())
+            if resultado is not None and saida is not None:
+                self._entregar(saida, resultado)  # Bloqueia se a próxima etapa estiver atrasada (backpressure)
+
+    def iniciar(self):
+        for nome, funcao, entrada, saida, n_threads in self.etapas:
+            for i in range(n_threads):
+                t = threading.Thread(target=self._loop_etapa, args=(nome, funcao, entrada, saida),
+                                     daemon=True, name=f"pipeline-{nome}-{i}")
+                t.start()
+                self._threads[nome].append(t)
+        self._retomar_checkpoints()
+
+    def _retomar_checkpoints(self):
+        filas_retomada = {"recebido": self.fila_leitura, "ia": self.fila_enriquecimento}
+        for etapa, documento in self.checkpoints.pendentes():
+            print(f"   [Pipeline] Retomando '{documento['nome']}' a partir do checkpoint '{etapa}'.")
+            filas_retomada[etapa].put(documento)
+
+    def enviar(self, caminho: str):
+        """Entrada do pipeline; bloqueia quando a fila de leitura está cheia."""
+        self.fila_leitura.put({'caminho': caminho, 'nome': os.path.basename(caminho)})
+
+    def relatorio(self) -> str:
+        filas = {nome: entrada for nome, _, entrada, _, _ in self.etapas}
+        linhas = [self.metricas[nome].resumo(filas[nome]) for nome in self.metricas]
+        linhas.append(f"{'outbox':<16} {self.outbox.estatisticas()}")
+        return "\n".join(linhas)
+
+    def parar(self, espera_s: float = ESPERA_PARADA):
+        """
+        Encerra as etapas em ordem: cada uma termina o que já está na sua fila
+        antes de a seguinte receber o _FIM. Se o tempo acaba (IA lenta ou API
+        fora), as threads saem sem esvaziar o resto; com checkpoints, esses
+        documentos voltam na próxima execução.
+        """
+        limite = time.monotonic() + espera_s
+        for nome, _, entrada, _, _ in self.etapas:
+            try:
+                entrada.put(_FIM, timeout=max(0.0, limite - time.monotonic()))
+            except queue.Full:
+                pass
+            for t in self._threads[nome]:
+                t.join(max(0.0, limite - time.monotonic()))
+            if any(t.is_alive() for t in self._threads[nome]):
+                restantes = sum(fila.qsize() for _, _, fila, _, _ in self.etapas)
+                print(f"⚠️ [Pipeline] Etapa '{nome}' não terminou em {espera_s:.0f}s; "
+                      f"encerrando com {restantes} item(ns) nas filas.")
+                break
+        self._parando.set()
+
+
+class PipelineFileHandler(FileSystemEventHandler):
+    def __init__(self, pipeline: PipelineIngestao):
+        super().__init__()
+        self.pipeline = pipeline
+
+    def on_created(self, event):
+        if event.is_directory:
+            return
+        print(f"\n✔️  [Pipeline] Novo arquivo detectado: {os.path.basename(event.src_path)}")
+        self.pipeline.enviar(event.src_path)
+
+
+if __name__ == "__main__":
+    if not GOOGLE_API_KEY:
+        print("🚨 ERRO CRÍTICO: GOOGLE_API_KEY não encontrada no .env.")
+    else:
+        print("======================================================")
+        print("🤖 PIPELINE DE INGESTÃO (PROCESSO ÚNICO) INICIADO 🤖")
+        print(f"Monitorando a pasta de entrada: '{os.path.abspath(WATCH_FOLDER)}'")
+        print(f"Checkpoints: {CHECKPOINT_FOLDER or 'desligados'}")
+        print("======================================================")
+
+        outbox = OutboxIngestao()
+        trabalhador = TrabalhadorOutbox(outbox, enviar_dados_ia)
+        trabalhador.start()
+
+        pipeline = PipelineIngestao(outbox)
+        pipeline.iniciar()
+
+        observer = Observer()
+        observer.schedule(PipelineFileHandler(pipeline), WATCH_FOLDER, recursive=False)
+        observer.start()
+        try:
+            proximo_relatorio = time.time() + INTERVALO_METRICAS
+            while True:
+                time.sleep(5)
+                if time.time() >= proximo_relatorio:
+                    print(f"\n📊 [Pipeline] Métricas por etapa:\n{pipeline.relatorio()}")
+                    proximo_relatorio = time.time() + INTERVALO_METRICAS
+        except KeyboardInterrupt:
+            observer.stop()
+            pipeline.parar()
+            trabalhador.parar()
+        observer.join()
+        print(f"\n📊 [Pipeline] Métricas finais:\n{pipeline.relatorio()}")
+        print("\n👋 Pipeline de ingestão encerrado.")
@@ -0,0 +1,168 @@
+# ==============================================================================
+# MÓDULO: teams_downloader.py (DOWNLOAD DOS ANEXOS DO TEAMS)
+# FUNÇÃO: Baixa os anexos do Teams/Graph em paralelo (com limite de
+#         concorrência), gravando em disco em blocos e calculando o hash
+#         durante o download. Downloads interrompidos são retomados com
+#         HTTP Range, arquivos com hash já conhecido são descartados e o
+#         arquivo só aparece na pasta monitorada quando está completo. O nome
+#         final leva um sufixo derivado do id do anexo, para que anexos de
+#         mesmo nome em mensagens diferentes não se sobrescrevam.
+# AMBIENTE VIRTUAL: .venv_watcher
+# ==============================================================================
+
+import hashlib
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from teams_sync import ClienteGraph, WATCH_FOLDER
+
+# --- CONFIGURAÇÃO ---
+PASTA_PARCIAIS = os.path.join('connectors', 'downloads_parciais')  # Fora da pasta monitorada, mesmo disco
+INDICE_PATH = os.path.join('connectors', 'anexos_baixados.json')
+MAX_DOWNLOADS_PARALELOS = int(os.getenv("TEAMS_MAX_DOWNLOADS_PARALELOS", "4"))
+TAMANHO_BLOCO = 1024 * 1024  # 1 MB por bloco: o arquivo nunca fica inteiro em memória
+
+
+def _nome_seguro(texto: str) -> str:
+    return re.sub(r'[^\w.\-]', '_', texto)
+
+
+def nome_destino(anexo: dict) -> str:
+    """
+    "MAT-Lista-Exercicios.pdf" -> "MAT-Lista-Exercicios_3f9a1c2b.pdf". O sufixo vem do
+    id do anexo (sem '-', para não mexer na convenção DISCIPLINA-CATEGORIA-NOME).
+    """
+    raiz, extensao = os.path.splitext(os.path.basename(anexo['nome']))
+    sufixo = hashlib.sha1((anexo.get('id') or anexo['url']).encode('utf-8')).hexdigest()[:8]
+    return f"{raiz}_{sufixo}{extensao}"
+
+
+def _tamanho_total(response: requests.Response) -> int | None:
+    """Tamanho do recurso no Content-Range de um 416 ("bytes */12345")."""
+    match = re.search(r'/(\d+)\s*$', response.headers.get('Content-Range', ''))
+    return int(match.group(1)) if match else None
+
+
+class IndiceAnexos:
+    """Registro em JSON dos anexos já baixados (por id do anexo e por hash do conteúdo)."""
+
+    def __init__(self, caminho: str = INDICE_PATH):
+        self.caminho = caminho
+        self._lock = threading.Lock()
+        self._dados = {"ids": {}, "hashes": {}}
+        if os.path.exists(caminho):
+            with open(caminho, 'r', encoding='utf-8') as f:
+                self._dados = json.load(f)
+
+    def id_conhecido(self, id_anexo: str) -> bool:
+        with self._lock:
+            return id_anexo in self._dados["ids"]
+
+    def hash_conhecido(self, hash_conteudo: str) -> str | None:
+        with self._lock:
+            return self._dados["hashes"].get(hash_conteudo)
+
+    def registrar(self, id_anexo: str, hash_conteudo: str, nome: str):
+        with self._lock:
+            self._dados["ids"][id_anexo] = hash_conteudo
+            self._dados["hashes"].setdefault(hash_conteudo, nome)
+            temporario = self.caminho + ".tmp"
+            with open(temporario, 'w', encoding='utf-8') as f:
+                json.dump(self._dados, f, ensure_ascii=False)
+            os.replace(temporario, self.caminho)
+
+
+class BaixadorAnexos:
+    """Baixa uma lista de anexos com até `max_paralelo` downloads simultâneos."""
+
+    def __init__(self, cliente: ClienteGraph, pasta_destino: str = WATCH_FOLDER,
+                 pasta_parciais: str = PASTA_PARCIAIS, max_paralelo: int = MAX_DOWNLOADS_PARALELOS,
+                 indice: IndiceAnexos | None = None):
+        self.cliente = cliente
+        self.pasta_destino = pasta_destino
+        self.pasta_parciais = pasta_parciais
+        self.max_paralelo = max_paralelo
+        self.indice = indice or IndiceAnexos()
+        os.makedirs(pasta_parciais, exist_ok=True)
+
+    def __call__(self, anexos: list[dict]) -> list[str]:
+        return self.baixar_todos(anexos)
+
+    def baixar_todos(self, anexos: list[dict]) -> list[str]:
+        """Retorna o status de cada anexo: 'baixado', 'repetido', 'ja_baixado' ou 'erro'."""
+        with ThreadPoolExecutor(max_workers=self.max_paralelo) as executor:
+            return list(executor.map(self._baixar_seguro, anexos))
+
+    def _baixar_seguro(self, anexo: dict) -> str:
+        try:
+            return self.baixar(anexo)
+        except Exception as e:
+            print(f"   [ERRO Anexo] Falha ao baixar '{anexo['nome']}': {e} (será retomado na próxima rodada)")
+            return "erro"
+
+    def baixar(self, anexo: dict) -> str:
+        id_anexo = anexo.get('id') or anexo['url']
+        if self.indice.id_conhecido(id_anexo):
+            return "ja_baixado"
+
+        parcial = os.path.join(self.pasta_parciais, _nome_seguro(id_anexo) + ".part")
+        sha = hashlib.sha256()
+        ja_baixados = 0
+        if os.path.exists(parcial):
+            # Recalcula o hash do que já está em disco para continuar de onde parou
+            with open(parcial, 'rb') as f:
+                for bloco in iter(lambda: f.read(TAMANHO_BLOCO), b''):
+                    sha.update(bloco)
+                    ja_baixados += len(bloco)
+
+        headers = {'Range': f'bytes={ja_baixados}-'} if ja_baixados else {}
+        try:
+            response = self.cliente.requisitar(anexo['url'], stream=True, headers=headers)
+        except requests.exceptions.HTTPError as e:
+            if not ja_baixados or e.response is None or e.response.status_code != 416:
+                raise
+            # 416: o Range começa no fim do arquivo. Se o .part já tem o tamanho todo, o
+            # processo caiu entre o fim do download e o os.replace; senão, recomeça do zero.
+            e.response.close()
+            if _tamanho_total(e.response) == ja_baixados:
+                response = None
+            else:
+                print(f"   [Anexo] '{anexo['nome']}': parte baixada não confere com o servidor; recomeçando.")
+                response = self.cliente.requisitar(anexo['url'], stream=True)
+                sha = hashlib.sha256()
+                ja_baixados = 0
+        if response is not None:
+            if ja_baixados and response.status_code != 206:
+                # O servidor ignorou o Range: recomeça do zero
+                sha = hashlib.sha256()
+                ja_baixados = 0
+            modo = 'ab' if ja_baixados else 'wb'
+            if ja_baixados:
+                print(f"   [Anexo] Retomando '{anexo['nome']}' a partir de {ja_baixados} bytes.")
+
+            with open(parcial, modo) as f:
+                for bloco in response.iter_content(chunk_size=TAMANHO_BLOCO):
+                    f.write(bloco)
+                    sha.update(bloco)
+                f.flush()
+                os.fsync(f.fileno())
+        hash_conteudo = sha.hexdigest()
+
+        nome_existente = self.indice.hash_conhecido(hash_conteudo)
+        if nome_existente:
+            os.remove(parcial)
+            self.indice.registrar(id_anexo, hash_conteudo, nome_existente)
+            print(f"   [Anexo] '{anexo['nome']}' tem o mesmo conteúdo de '{nome_existente}'; ignorado.")
+            return "repetido"
+
+        nome = nome_destino(anexo)
+        destino = os.path.join(self.pasta_destino, nome)
+        os.replace(parcial, destino)  # Atômico: o watcher nunca vê o arquivo pela metade
+        self.indice.registrar(id_anexo, hash_conteudo, nome)
+        print(f"   [Anexo] '{anexo['nome']}' salvo em {destino} (sha256 {hash_conteudo[:12]}...)")
+        return "baixado"
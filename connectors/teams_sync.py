@@ -0,0 +1,248 @@
+# ==============================================================================
+# SCRIPT: teams_sync.py (SINCRONIZAÇÃO INCREMENTAL DO CANAL DO TEAMS)
+# FUNÇÃO: Lê as mensagens de um canal do Teams pelo Microsoft Graph usando a
+#         consulta delta: percorre todas as páginas (@odata.nextLink), guarda o
+#         @odata.deltaLink e nas próximas execuções busca só o que é novo ou
+#         alterado. Os anexos das mensagens são baixados para a pasta
+#         monitorada, entrando no pipeline de ingestão. Anexos cujo
+#         download falhou ficam no estado (anexos_pendentes) e são tentados
+#         de novo no começo da rodada seguinte, já que o deltaLink avança.
+# USO:    python connectors/teams_sync.py [--intervalo 300]
+# TESTE:  GRAPH_BASE_URL=http://127.0.0.1:9000 TEAMS_TOKEN_ESTATICO=teste
+#         aponta o conector para um mock local dos endpoints do Graph.
+# AMBIENTE VIRTUAL: .venv_watcher
+# ==============================================================================
+
+import argparse
+import base64
+import json
+import os
+import random
+import threading
+import time
+import requests
+from dotenv import load_dotenv
+
+# --- CONFIGURAÇÃO ---
+load_dotenv()
+TENANT_ID = os.getenv("TEAMS_TENANT_ID")  # ID DE DIRETORIO (LOCATARIO)
+CLIENT_ID = os.getenv("TEAMS_CLIENT_ID")  # ID DE APLICATIVO(CLIENTE)
+CLIENT_SECRET = os.getenv("TEAMS_CLIENT_SECRET")  # SEGREDO DE CLIENTE
+TEAM_ID = os.getenv("TEAMS_TEAM_ID")  # ID DA EQUIPE (sem o "&tenantId=..." do link do Teams)
+CHANNEL_ID = os.getenv("TEAMS_CHANNEL_ID")  # ID DO CANAL
+TOKEN_ESTATICO = os.getenv("TEAMS_TOKEN_ESTATICO")  # Usado só contra mocks locais
+
+GRAPH_BASE_URL = os.getenv("GRAPH_BASE_URL", "https://graph.microsoft.com/v1.0")
+SCOPE = ["https://graph.microsoft.com/.default"]
+WATCH_FOLDER = os.path.join('connectors', 'teams_mock_files')
+ESTADO_PATH = os.getenv("TEAMS_SYNC_ESTADO", os.path.join('connectors', 'teams_sync_estado.json'))
+MAX_TENTATIVAS = 6
+MARGEM_EXPIRACAO_TOKEN = 120  # segundos antes da expiração em que o token é renovado
+
+
+class ProvedorToken:
+    """Adquire o token do Graph via MSAL e reaproveita até perto de expirar."""
+
+    def __init__(self):
+        self._token = None
+        self._expira_em = 0.0
+        self._app = None
+        self._lock = threading.Lock()
+
+    def _criar_app(self):
+        import msal
+        return msal.ConfidentialClientApplication(
+            client_id=CLIENT_ID,
+            authority=f"https://login.microsoftonline.com/{TENANT_ID}",
+            client_credential=CLIENT_SECRET
+        )
+
+    def obter(self, forcar_renovacao: bool = False) -> str:
+        if TOKEN_ESTATICO:
+            return TOKEN_ESTATICO
+        with self._lock:
+            if self._token and not forcar_renovacao and time.time() < self._expira_em - MARGEM_EXPIRACAO_TOKEN:
+                return self._token
+            if self._app is None:
+                self._app = self._criar_app()
+            result = self._app.acquire_token_for_client(scopes=SCOPE)
+            if "access_token" not in result:
+                raise RuntimeError(f"Erro ao adquirir o token: {result.get('error')} - {result.get('error_description')}")
+            self._token = result["access_token"]
+            self._expira_em = time.time() + int(result.get("expires_in", 3600))
+            print(f"   [Token] Novo token adquirido (expira em {int(result.get('expires_in', 3600))}s).")
+            return self._token
+
+
+class ClienteGraph:
+    """GET no Graph com renovação de token e backoff para throttling (429/503/504)."""
+
+    def __init__(self, provedor_token: ProvedorToken | None = None):
+        self.provedor_token = provedor_token or ProvedorToken()
+        self.session = requests.Session()
+
+    def _cabecalhos(self, forcar_renovacao: bool = False) -> dict:
+        return {'Authorization': f'Bearer {self.provedor_token.obter(forcar_renovacao)}'}
+
+    def requisitar(self, url: str, **kwargs) -> requests.Response:
+        forcar_renovacao = renovado_apos_401 = False
+        headers_extras = kwargs.pop('headers', {})
+        for tentativa in range(1, MAX_TENTATIVAS + 1):
+            headers = {**headers_extras, **self._cabecalhos(forcar_renovacao)}
+            forcar_renovacao = False  # Só a tentativa seguinte ao 401 pede um token novo
+            try:
+                response = self.session.get(url, headers=headers, timeout=30, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                espera = min(60, 2 ** tentativa) * random.uniform(0.5, 1.0)
+                print(f"   [Graph] Falha de conexão ({e}); nova tentativa em {espera:.1f}s.")
+                time.sleep(espera)
+                continue
+
+            if response.status_code == 401 and not renovado_apos_401:
+                forcar_renovacao = renovado_apos_401 = True  # Token revogado/expirado antes do previsto
+                response.close()
+                continue
+            if response.status_code in (429, 503, 504):
+                retry_after = response.headers.get("Retry-After")
+                espera = float(retry_after) if retry_after and retry_after.isdigit() else min(60, 2 ** tentativa)
+                response.close()  # Com stream=True a conexão só volta ao pool depois de fechada
+                print(f"   [Graph] Throttling ({response.status_code}); aguardando {espera:.1f}s.")
+                time.sleep(espera)
+                continue
+            response.raise_for_status()
+            return response
+        raise RuntimeError(f"Graph não respondeu após {MAX_TENTATIVAS} tentativas: {url}")
+
+    def get_json(self, url: str) -> dict:
+        return self.requisitar(url).json()
+
+
+def carregar_estado() -> dict:
+    if os.path.exists(ESTADO_PATH):
+        with open(ESTADO_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+
+def salvar_estado(estado: dict):
+    """Grava o estado de forma atômica para não corromper o deltaLink se o processo cair."""
+    temporario = ESTADO_PATH + ".tmp"
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(estado, f, ensure_ascii=False, indent=2)
+    os.replace(temporario, ESTADO_PATH)
+
+
+def url_download_anexo(content_url: str) -> str:
+    """Converte o contentUrl (link do SharePoint) na URL de download do Graph (/shares)."""
+    codificado = base64.urlsafe_b64encode(content_url.encode('utf-8')).decode('ascii').rstrip('=')
+    return f"{GRAPH_BASE_URL}/shares/u!{codificado}/driveItem/content"
+
+
+def extrair_anexos(mensagem: dict) -> list[dict]:
+    """Retorna os anexos de arquivo da mensagem (os do tipo 'reference' apontam para o SharePoint/OneDrive)."""
+    anexos = []
+    for anexo in mensagem.get('attachments') or []:
+        if anexo.get('contentType') == 'reference' and anexo.get('contentUrl'):
+            anexos.append({
+                'id': anexo.get('id'),
+                'nome': anexo.get('name') or os.path.basename(anexo['contentUrl']),
+                'url': url_download_anexo(anexo['contentUrl']),
+                'id_mensagem': mensagem.get('id'),
+            })
+    return anexos
+
+
+def sincronizar_canal(cliente: ClienteGraph, processar_anexos=None) -> dict:
+    """
+    Executa uma rodada de sincronização do canal.
+    Na primeira execução percorre todo o histórico; depois usa o deltaLink salvo.
+    `processar_anexos(lista_de_anexos)` recebe os anexos de arquivo encontrados e
+    pode devolver o status de cada um; os que voltarem 'erro' são guardados no
+    estado junto com o deltaLink e reprocessados na próxima rodada.
+    """
+    if processar_anexos is None:
+        from teams_downloader import BaixadorAnexos  # Import local: teams_downloader importa este módulo
+        processar_anexos = BaixadorAnexos(cliente)
+
+    estado = carregar_estado()
+    chave_canal = f"{TEAM_ID}/{CHANNEL_ID}"
+    estado_canal = estado.get(chave_canal, {})
+    url = estado_canal.get("delta_link") or \
+        f"{GRAPH_BASE_URL}/teams/{TEAM_ID}/channels/{CHANNEL_ID}/messages/delta"
+
+    resumo = {"paginas": 0, "mensagens": 0, "removidas": 0, "anexos": 0, "retomados": 0, "falhas": 0}
+    falhas = []
+
+    def processar(anexos: list[dict]):
+        status = processar_anexos(anexos) or []
+        falhas.extend(anexo for anexo, situacao in zip(anexos, status) if situacao == "erro")
+
+    pendentes = estado_canal.get("anexos_pendentes") or []
+    if pendentes:
+        # O deltaLink já passou dessas mensagens: só o estado lembra dos anexos
+        print(f"   [Teams] Retomando {len(pendentes)} anexo(s) que falharam na rodada anterior.")
+        resumo["retomados"] = len(pendentes)
+        processar(pendentes)
+
+    while url:
+        pagina = cliente.get_json(url)
+        resumo["paginas"] += 1
+        anexos_pagina = []
+        for mensagem in pagina.get('value', []):
+            if '@removed' in mensagem or mensagem.get('deletedDateTime'):
+                resumo["removidas"] += 1
+                continue
+            resumo["mensagens"] += 1
+            anexos_pagina.extend(extrair_anexos(mensagem))
+        if anexos_pagina:
+            resumo["anexos"] += len(anexos_pagina)
+            processar(anexos_pagina)
+
+        if '@odata.nextLink' in pagina:
+            url = pagina['@odata.nextLink']
+        else:
+            # Última página: o deltaLink é o cursor da próxima execução
+            delta_link = pagina.get('@odata.deltaLink')
+            if delta_link:
+                # Um anexo que apareceu de novo na rodada e falhou outra vez entra uma vez só
+                falhas_unicas = list({(a.get('id') or a['url']): a for a in falhas}.values())
+                estado[chave_canal] = {"delta_link": delta_link, "sincronizado_em": time.time(),
+                                       "anexos_pendentes": falhas_unicas}
+                salvar_estado(estado)
+                resumo["falhas"] = len(falhas_unicas)
+            url = None
+    return resumo
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sincronização incremental de um canal do Teams.")
+    parser.add_argument("--intervalo", type=int, default=0,
+                        help="Segundos entre rodadas (0 = executa uma vez e sai)")
+    args = parser.parse_args()
+
+    if not (TEAM_ID and CHANNEL_ID and (TOKEN_ESTATICO or (TENANT_ID and CLIENT_ID and CLIENT_SECRET))):
+        print("🚨 ERRO CRÍTICO: configure TEAMS_TENANT_ID, TEAMS_CLIENT_ID, TEAMS_CLIENT_SECRET, "
+              "TEAMS_TEAM_ID e TEAMS_CHANNEL_ID no .env.")
+    else:
+        print("======================================================")
+        print("🤖 SINCRONIZAÇÃO DO TEAMS INICIADA 🤖")
+        print(f"Graph: {GRAPH_BASE_URL} | Destino dos anexos: '{os.path.abspath(WATCH_FOLDER)}'")
+        print("======================================================")
+        cliente = ClienteGraph()
+        try:
+            while True:
+                inicio = time.time()
+                try:
+                    resumo = sincronizar_canal(cliente)
+                    print(f"✅ [Teams] Rodada concluída em {time.time() - inicio:.1f}s: {resumo}")
+                except Exception as e:
+                    # Graph fora do ar, token recusado...: o deltaLink salvo continua valendo na próxima rodada
+                    if not args.intervalo:
+                        raise
+                    print(f"🚨 [Teams] Rodada falhou após {time.time() - inicio:.1f}s: {e}")
+                if not args.intervalo:
+                    break
+                time.sleep(args.intervalo)
+        except KeyboardInterrupt:
+            pass
+        print("\n👋 Sincronização do Teams encerrada.")
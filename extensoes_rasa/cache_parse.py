@@ -0,0 +1,160 @@
+import copy
+import logging
+import os
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ===================================================================
+# CACHE LRU DO PARSE NLU (SERVIDOR RASA)
+# ===================================================================
+# Mensagens idênticas ("oi", "quando e a prova de Sistemas Distribuidos?")
+# chegam o tempo todo e cada uma passaria de novo por featurizers + DIET.
+# O resultado do parse fica guardado por (id do modelo, texto normalizado);
+# quando um modelo novo é carregado o id muda e o cache é esvaziado.
+#
+# Configuração (.env):
+#   PARSE_CACHE_TAMANHO  - entradas no LRU (0 desativa; padrão 5000)
+#   PARSE_CACHE_TTL      - segundos de validade de cada entrada (padrão 3600)
+
+TAMANHO_PADRAO = int(os.getenv("PARSE_CACHE_TAMANHO", "5000"))
+TTL_PADRAO = float(os.getenv("PARSE_CACHE_TTL", "3600"))
+INTERVALO_LOG = 1000  # Loga as métricas a cada N consultas
+
+
+def normalizar_texto(texto: str) -> str:
+    """
+    Chave do cache: só NFC (mesmo texto com acentos compostos ou decompostos).
+    A caixa fica: o LexicalSyntacticFeaturizer (low/title/upper) e o
+    RegexFeaturizer diferenciam "NP1" de "np1".
+    """
+    return unicodedata.normalize("NFC", texto or "")
+
+
+class CacheParse:
+    """LRU com TTL por entrada e métricas de acerto."""
+
+    def __init__(self, tamanho: int = TAMANHO_PADRAO, ttl: float = TTL_PADRAO):
+        self.tamanho = tamanho
+        self.ttl = ttl
+        self._dados: "OrderedDict[Tuple[str, str], Tuple[float, Dict]]" = OrderedDict()
+        self._modelo_atual: Optional[str] = None
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+        self.expirados = 0
+        self.descartes = 0
+        self.invalidacoes = 0
+
+    def _verificar_modelo(self, id_modelo: str):
+        if id_modelo != self._modelo_atual:
+            if self._modelo_atual is not None:
+                self.invalidacoes += 1
+                logger.info(f"Cache de parse invalidado: modelo {self._modelo_atual} -> {id_modelo}")
+            self._dados.clear()
+            self._modelo_atual = id_modelo
+
+    def obter(self, id_modelo: str, texto: str) -> Optional[Dict]:
+        chave = (id_modelo, normalizar_texto(texto))
+        with self._lock:
+            self._verificar_modelo(id_modelo)
+            entrada = self._dados.get(chave)
+            if entrada and time.monotonic() - entrada[0] > self.ttl:
+                del self._dados[chave]
+                self.expirados += 1
+                entrada = None
+            # Mesmo texto normalizado mas comprimento diferente (ex.: NFD): offsets não batem
+            if entrada is None or len(entrada[1].get("text") or "") != len(texto):
+                self.falhas += 1
+                registrar_log = (self.acertos + self.falhas) % INTERVALO_LOG == 0
+                resultado = None
+            else:
+                self._dados.move_to_end(chave)
+                self.acertos += 1
+                registrar_log = (self.acertos + self.falhas) % INTERVALO_LOG == 0
+                resultado = entrada[1]
+        if registrar_log:
+            logger.info(f"Cache de parse: {self.metricas()}")
+        return self._adaptar(resultado, texto) if resultado is not None else None
+
+    def guardar(self, id_modelo: str, texto: str, parse_data: Dict):
+        chave = (id_modelo, normalizar_texto(texto))
+        with self._lock:
+            self._verificar_modelo(id_modelo)
+            self._dados[chave] = (time.monotonic(), copy.deepcopy(parse_data))
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.tamanho:
+                self._dados.popitem(last=False)
+                self.descartes += 1
+
+    @staticmethod
+    def _adaptar(parse_data: Dict, texto: str) -> Dict:
+        """
+        Cópia do resultado guardado com o texto da mensagem atual. Com a mesma
+        chave, os textos só diferem na composição Unicode: as entidades ficam
+        como foram extraídas (os offsets do texto decomposto não batem).
+        """
+        resultado = copy.deepcopy(parse_data)
+        resultado["text"] = texto
+        return resultado
+
+    def limpar(self):
+        with self._lock:
+            self._dados.clear()
+
+    def metricas(self) -> Dict[str, Any]:
+        consultas = self.acertos + self.falhas
+        return {
+            "entradas": len(self._dados),
+            "tamanho_maximo": self.tamanho,
+            "ttl_s": self.ttl,
+            "consultas": consultas,
+            "acertos": self.acertos,
+            "taxa_acerto": round(self.acertos / consultas, 4) if consultas else 0.0,
+            "expirados": self.expirados,
+            "descartes_lru": self.descartes,
+            "invalidacoes_modelo": self.invalidacoes,
+            "modelo": self._modelo_atual,
+        }
+
+
+cache = CacheParse()
+
+
+def instalar():
+    """
+    Envolve MessageProcessor.parse_message com o cache. Vale para o /model/parse
+    e para as mensagens dos canais (rest, telegram), que passam pelo mesmo método.
+    """
+    from rasa.core.processor import MessageProcessor
+
+    if cache.tamanho <= 0 or getattr(MessageProcessor.parse_message, "_com_cache", False):
+        return
+    parse_original = MessageProcessor.parse_message
+
+    async def parse_message(self, message, tracker=None, only_output_properties: bool = True):
+        if not only_output_properties or not message.text:
+            return await parse_original(self, message, tracker, only_output_properties)
+        id_modelo = self.model_metadata.model_id
+        resultado = cache.obter(id_modelo, message.text)
+        if resultado is None:
+            resultado = await parse_original(self, message, tracker, only_output_properties)
+            cache.guardar(id_modelo, message.text, resultado)
+        return resultado
+
+    parse_message._com_cache = True
+    MessageProcessor.parse_message = parse_message
+    logger.info(f"Cache de parse ativo: {cache.tamanho} entradas, TTL {cache.ttl:.0f}s")
+
+
+def registrar_rotas(app):
+    """GET /parse_cache devolve as métricas do cache do worker que atendeu."""
+    from sanic import response
+
+    @app.get("/parse_cache")
+    async def metricas_cache(request):
+        return response.json(cache.metricas())
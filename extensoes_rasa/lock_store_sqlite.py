@@ -0,0 +1,234 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional, Text
+
+from rasa.core.lock import Ticket, TicketLock
+from rasa.core.lock_store import LOCK_LIFETIME, LockError, LockStore
+from rasa.utils.endpoints import EndpointConfig
+
+logger = logging.getLogger(__name__)
+
+# ===================================================================
+# LOCK STORE LOCAL EM SQLITE (WAL)
+# ===================================================================
+# Com vários workers (run_rasa.py --workers), duas mensagens seguidas do
+# mesmo usuário podem cair em processos diferentes. O lock store garante que
+# sejam processadas na ordem de chegada; fora o de memória (um processo só),
+# o Rasa só traz o do redis. Este guarda os tickets num arquivo SQLite
+# compartilhado pelos processos da máquina:
+#  - cada ticket é uma linha (conversa, numero, expira); emitir um ticket é
+#    uma transação BEGIN IMMEDIATE (o SQLite serializa os processos), sem o
+#    ler-alterar-gravar do LockStore base, que no redis pode dar o mesmo
+#    número a duas mensagens;
+#  - a vez é do menor ticket não vencido da conversa; liberar é um DELETE;
+#  - quem espera no mesmo processo é acordado na hora em que o ticket anterior
+#    é liberado; de outro processo, consulta de novo com espera crescente
+#    (espera_minima até espera_maxima), em vez do 1 s fixo do LockStore base;
+#  - ticket de um worker que caiu vence depois de TICKET_LOCK_LIFETIME
+#    segundos (padrão do Rasa: 60) e deixa de bloquear a conversa.
+# Métricas de disputa por processo em GET /lock_store.
+#
+# endpoints.yml:
+#   lock_store:
+#     type: extensoes_rasa.lock_store_sqlite.SQLiteLockStore
+#     db: locks.db
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS tickets (
+    conversa TEXT NOT NULL,
+    numero INTEGER NOT NULL,
+    expira REAL NOT NULL,
+    PRIMARY KEY (conversa, numero)
+) WITHOUT ROWID;
+"""
+
+
+class SQLiteLockStore(LockStore):
+    """Lock store em um arquivo SQLite local (ver cabeçalho do módulo)."""
+
+    def __init__(
+        self,
+        endpoint_config: Optional[EndpointConfig] = None,
+        db: Text = "locks.db",
+        espera_minima: float = 0.002,
+        espera_maxima: float = 0.05,
+        **kwargs: Dict[Text, Any],
+    ) -> None:
+        # O Rasa cria lock stores customizados só com endpoint_config=...
+        opcoes = dict(endpoint_config.kwargs) if endpoint_config is not None else {}
+        self.caminho = opcoes.get("db", db)
+        self.espera_minima = float(opcoes.get("espera_minima", espera_minima))
+        self.espera_maxima = float(opcoes.get("espera_maxima", espera_maxima))
+
+        self._local = threading.local()
+        self._liberados: Dict[str, asyncio.Event] = {}
+        self.metricas_contadores = {
+            "aquisicoes": 0, "disputadas": 0, "vencidos": 0, "erros": 0,
+            "espera_total_ms": 0.0, "espera_max_ms": 0.0,
+        }
+
+        pasta = os.path.dirname(os.path.abspath(self.caminho))
+        os.makedirs(pasta, exist_ok=True)
+        conexao = self._conexao()
+        conexao.executescript(ESQUEMA)
+        # Tickets de processos que caíram antes de liberar
+        conexao.execute("DELETE FROM tickets WHERE expira < ?", (time.time(),))
+        super().__init__()
+
+    # ------------------------------------------------------------------
+    # Infraestrutura
+    # ------------------------------------------------------------------
+
+    def _conexao(self) -> sqlite3.Connection:
+        """Uma conexão por thread (e por processo, se houver fork depois da criação)."""
+        conexao = getattr(self._local, "conexao", None)
+        if conexao is None or getattr(self._local, "pid", None) != os.getpid():
+            conexao = sqlite3.connect(self.caminho, timeout=5, isolation_level=None)
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexao = conexao
+            self._local.pid = os.getpid()
+        return conexao
+
+    def _avisar_liberacao(self, conversation_id: Text):
+        evento = self._liberados.pop(conversation_id, None)
+        if evento is not None:
+            evento.set()
+
+    def metricas(self) -> Dict[str, Any]:
+        aquisicoes = self.metricas_contadores["aquisicoes"]
+        return {
+            **self.metricas_contadores,
+            "espera_total_ms": round(self.metricas_contadores["espera_total_ms"], 1),
+            "espera_max_ms": round(self.metricas_contadores["espera_max_ms"], 1),
+            "espera_media_ms": round(self.metricas_contadores["espera_total_ms"] / aquisicoes, 2)
+            if aquisicoes else 0.0,
+            "taxa_disputa": round(self.metricas_contadores["disputadas"] / aquisicoes, 4) if aquisicoes else 0.0,
+        }
+
+    # ------------------------------------------------------------------
+    # Tickets
+    # ------------------------------------------------------------------
+
+    def issue_ticket(self, conversation_id: Text, lock_lifetime: float = LOCK_LIFETIME) -> int:
+        """Emite o próximo ticket da conversa numa transação só."""
+        agora = time.time()
+        conexao = self._conexao()
+        try:
+            conexao.execute("BEGIN IMMEDIATE")
+            try:
+                # Numeração pelo maior ticket, vencido ou não: um número nunca volta
+                # enquanto o dono dele ainda pode estar processando
+                (ultimo,) = conexao.execute(
+                    "SELECT MAX(numero) FROM tickets WHERE conversa = ?", (conversation_id,)).fetchone()
+                vencidos = conexao.execute(
+                    "DELETE FROM tickets WHERE conversa = ? AND expira < ?", (conversation_id, agora)).rowcount
+                numero = 0 if ultimo is None else ultimo + 1
+                conexao.execute("INSERT INTO tickets VALUES (?, ?, ?)",
+                                (conversation_id, numero, agora + lock_lifetime))
+                conexao.execute("COMMIT")
+            except Exception:
+                conexao.execute("ROLLBACK")
+                raise
+        except Exception as e:
+            self.metricas_contadores["erros"] += 1
+            raise LockError(f"Error while acquiring lock. Error:\n{e}")
+        if vencidos:
+            self.metricas_contadores["vencidos"] += vencidos
+            logger.warning(f"Lock store SQLite: {vencidos} ticket(s) vencido(s) na conversa {conversation_id}")
+        return numero
+
+    async def _acquire_lock(
+        self, conversation_id: Text, ticket: int, wait_time_in_seconds: float
+    ) -> TicketLock:
+        inicio = time.perf_counter()
+        espera = self.espera_minima
+        disputou = False
+        while True:
+            primeiro, meu = self._conexao().execute(
+                "SELECT MIN(numero), SUM(numero = ?) FROM tickets WHERE conversa = ? AND expira >= ?",
+                (ticket, conversation_id, time.time())).fetchone()
+            if not meu:  # O próprio ticket venceu enquanto esperava
+                self.metricas_contadores["erros"] += 1
+                raise LockError(f"Could not acquire lock for conversation_id '{conversation_id}'.")
+            if primeiro == ticket:
+                break
+            disputou = True
+            evento = self._liberados.setdefault(conversation_id, asyncio.Event())
+            try:
+                await asyncio.wait_for(evento.wait(), espera)
+            except asyncio.TimeoutError:
+                # Quem está na frente é de outro processo (ou venceu): consulta de novo
+                espera = min(espera * 2, self.espera_maxima, wait_time_in_seconds)
+
+        espera_ms = (time.perf_counter() - inicio) * 1000
+        self.metricas_contadores["aquisicoes"] += 1
+        if disputou:
+            self.metricas_contadores["disputadas"] += 1
+            self.metricas_contadores["espera_total_ms"] += espera_ms
+            self.metricas_contadores["espera_max_ms"] = max(self.metricas_contadores["espera_max_ms"], espera_ms)
+        return self.get_lock(conversation_id) or TicketLock(conversation_id)
+
+    def cleanup(self, conversation_id: Text, ticket_number: int) -> None:
+        """Libera o ticket (e apaga os vencidos da conversa) com um DELETE só."""
+        self._conexao().execute(
+            "DELETE FROM tickets WHERE conversa = ? AND (numero = ? OR expira < ?)",
+            (conversation_id, ticket_number, time.time()))
+        self._avisar_liberacao(conversation_id)
+
+    # ------------------------------------------------------------------
+    # Interface do LockStore
+    # ------------------------------------------------------------------
+
+    def get_lock(self, conversation_id: Text) -> Optional[TicketLock]:
+        linhas = self._conexao().execute(
+            "SELECT numero, expira FROM tickets WHERE conversa = ? AND expira >= ? ORDER BY numero",
+            (conversation_id, time.time())).fetchall()
+        if not linhas:
+            return None
+        return TicketLock(conversation_id, deque(Ticket(numero, expira) for numero, expira in linhas))
+
+    def delete_lock(self, conversation_id: Text) -> None:
+        cursor = self._conexao().execute("DELETE FROM tickets WHERE conversa = ?", (conversation_id,))
+        self._log_deletion(conversation_id, cursor.rowcount > 0)
+        self._avisar_liberacao(conversation_id)
+
+    def save_lock(self, lock: TicketLock) -> None:
+        conexao = self._conexao()
+        conexao.execute("BEGIN IMMEDIATE")
+        try:
+            conexao.execute("DELETE FROM tickets WHERE conversa = ?", (lock.conversation_id,))
+            conexao.executemany("INSERT INTO tickets VALUES (?, ?, ?)",
+                                [(lock.conversation_id, t.number, t.expires) for t in lock.tickets])
+            conexao.execute("COMMIT")
+        except Exception:
+            conexao.execute("ROLLBACK")
+            raise
+        self._avisar_liberacao(lock.conversation_id)
+
+    def finish_serving(self, conversation_id: Text, ticket_number: int) -> None:
+        self._conexao().execute(
+            "DELETE FROM tickets WHERE conversa = ? AND numero = ?", (conversation_id, ticket_number))
+        self._avisar_liberacao(conversation_id)
+
+    def is_someone_waiting(self, conversation_id: Text) -> bool:
+        return self._conexao().execute(
+            "SELECT 1 FROM tickets WHERE conversa = ? AND expira >= ? LIMIT 1",
+            (conversation_id, time.time())).fetchone() is not None
+
+
+def registrar_rotas(app):
+    """GET /lock_store devolve as métricas de disputa do worker que atendeu."""
+    from sanic import response
+
+    @app.get("/lock_store")
+    async def metricas_lock_store(request):
+        lock_store = getattr(getattr(app.ctx, "agent", None), "lock_store", None)
+        if not isinstance(lock_store, SQLiteLockStore):
+            return response.json({"erro": "lock store SQLite não configurado"}, status=404)
+        return response.json(lock_store.metricas())
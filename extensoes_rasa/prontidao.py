@@ -0,0 +1,277 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# ===================================================================
+# AQUECIMENTO E PRONTIDÃO DO SERVIDOR RASA
+# ===================================================================
+# Sem isso, as primeiras mensagens depois do start pagam a inicialização
+# preguiçosa do grafo e do TensorFlow, e o dyno web recebe tráfego antes de
+# estar pronto de fato.
+#
+# O `rasa run` só abre a porta depois de carregar o modelo (listener
+# before_server_start), e aí não há o que consultar durante a carga. Com o
+# bloqueio ligado, a carga passa para segundo plano: a porta abre na hora e
+# o /pronto responde 503 enquanto isso. Depois que o modelo carrega:
+#  1. parse de uma amostra dos exemplos do data/nlu.yml (um por intent,
+#     sem passar pelo cache de parse);
+#  2. uma previsão de próxima ação com um tracker em memória (aquece as policies);
+#  3. ida e volta ao /health do action server configurado no endpoints.yml.
+# Só então GET /pronto passa a responder 200; até lá responde 503, e as
+# demais rotas (canais, /model/parse...) também, com Retry-After.
+# O tempo de cada fase vai para o log e para a resposta do /pronto.
+#
+# Configuração (.env):
+#   PRONTIDAO_EXEMPLOS      - parses de aquecimento (padrão 20; 0 pula)
+#   PRONTIDAO_NLU           - arquivo com os exemplos (padrão data/nlu.yml)
+#   PRONTIDAO_ACOES_ESPERA  - segundos esperando o action server responder (padrão 30)
+#   PRONTIDAO_EXIGIR_ACOES  - 1 só fica pronto com o action server no ar (padrão 0)
+#   PRONTIDAO_BLOQUEAR      - 1 responde 503 nas outras rotas até ficar pronto e carrega o
+#                             modelo em segundo plano (padrão 1)
+
+EXEMPLOS_AQUECIMENTO = int(os.getenv("PRONTIDAO_EXEMPLOS", "20"))
+CAMINHO_NLU = os.getenv("PRONTIDAO_NLU", os.path.join("data", "nlu.yml"))
+ESPERA_ACOES_S = float(os.getenv("PRONTIDAO_ACOES_ESPERA", "30"))
+EXIGIR_ACOES = os.getenv("PRONTIDAO_EXIGIR_ACOES", "0") == "1"
+BLOQUEAR_ATE_PRONTO = os.getenv("PRONTIDAO_BLOQUEAR", "1") == "1"
+
+# Rotas que respondem mesmo antes de ficar pronto
+ROTAS_LIVRES = {"/", "/pronto", "/version", "/status", "/parse_cache", "/lock_store"}
+
+
+class EstadoProntidao:
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.pronto = False
+        self.fase = "iniciando"
+        self.fases_ms: Dict[str, float] = {}
+        self.erros: Dict[str, str] = {}
+        self._inicio_fase: Optional[float] = None
+
+    def comecar(self, fase: str):
+        self.fase = fase
+        self._inicio_fase = time.perf_counter()
+
+    def terminar(self, fase: str, inicio: Optional[float] = None):
+        inicio = inicio if inicio is not None else self._inicio_fase
+        self.fases_ms[fase] = round((time.perf_counter() - inicio) * 1000, 1)
+        logger.info(f"Partida a frio: {fase} em {self.fases_ms[fase]:.0f}ms")
+
+    def resumo(self) -> Dict:
+        return {"pronto": self.pronto, "fase": self.fase, "fases_ms": self.fases_ms, "erros": self.erros}
+
+
+estado = EstadoProntidao()
+
+
+def marcar_inicio(inicio: float):
+    """Início do processo (perf_counter), para a fase de importação entrar na conta."""
+    estado.inicio = inicio
+
+
+def exemplos_de_aquecimento(caminho: str = CAMINHO_NLU, quantidade: int = EXEMPLOS_AQUECIMENTO) -> List[str]:
+    """Um exemplo por intent (até `quantidade`), sem as anotações de entidade."""
+    if quantidade <= 0 or not os.path.exists(caminho):
+        return []
+    from rasa.shared.nlu.training_data.loading import load_data
+
+    por_intent: Dict[str, List[str]] = {}
+    for exemplo in load_data(caminho).intent_examples:
+        if exemplo.get("text"):
+            por_intent.setdefault(exemplo.get("intent"), []).append(exemplo.get("text"))
+    sorteio = random.Random(0)
+    textos = [sorteio.choice(lista) for lista in por_intent.values()]
+    sorteio.shuffle(textos)
+    return textos[:quantidade]
+
+
+# ===================================================================
+# FASES DO AQUECIMENTO
+# ===================================================================
+
+async def aquecer_nlu(processor, textos: List[str]) -> Optional[Dict]:
+    from rasa.core.channels.channel import UserMessage
+
+    ultimo = None
+    for texto in textos:
+        # only_output_properties=False passa direto pelo cache de parse
+        ultimo = await processor.parse_message(UserMessage(texto), only_output_properties=False)
+    return ultimo
+
+
+def aquecer_core(processor, parse_data: Optional[Dict]):
+    from rasa.shared.core.events import ActionExecuted, SessionStarted, UserUttered
+    from rasa.shared.core.trackers import DialogueStateTracker
+
+    parse_data = parse_data or {"intent": {"name": None}, "entities": []}
+    eventos = [
+        ActionExecuted("action_session_start"),
+        SessionStarted(),
+        ActionExecuted("action_listen"),
+        UserUttered(parse_data.get("text"), parse_data.get("intent"), parse_data.get("entities"), parse_data),
+    ]
+    # Tracker só em memória: nada é gravado no tracker store
+    tracker = DialogueStateTracker.from_events("aquecimento", eventos, domain=processor.domain)
+    processor.predict_next_with_tracker(tracker)
+
+
+async def _verificar_acoes(agent) -> bool:
+    import aiohttp
+
+    endpoint = getattr(agent, "action_endpoint", None)
+    if endpoint is None or not endpoint.url:
+        logger.info("Aquecimento: nenhum action server configurado")
+        return True
+    url = endpoint.url.rsplit("/webhook", 1)[0] + "/health"
+    limite = time.monotonic() + ESPERA_ACOES_S
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=5)) as sessao:
+        while True:
+            try:
+                async with sessao.get(url) as resposta:
+                    if resposta.status == 200:
+                        return True
+                    motivo = f"status {resposta.status}"
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                motivo = str(e) or type(e).__name__
+            if time.monotonic() >= limite:
+                estado.erros["acoes"] = f"{url}: {motivo}"
+                return False
+            await asyncio.sleep(1)
+
+
+async def aquecer(app):
+    carregamento = getattr(app.ctx, "carregamento_modelo", None)
+    if carregamento is not None:
+        try:
+            await carregamento
+        except Exception as e:
+            estado.erros["modelo"] = str(e)
+            logger.error(f"Erro ao carregar o modelo: {e}")
+            return  # Continua fora do ar (503) e o erro aparece no /pronto
+    estado.terminar("carregamento_modelo")
+
+    agent = getattr(app.ctx, "agent", None)
+    processor = getattr(agent, "processor", None)
+    if processor is None:
+        estado.erros["modelo"] = "nenhum modelo carregado"
+        logger.warning("Aquecimento: nenhum modelo carregado; o servidor fica pronto sem aquecer")
+    else:
+        try:
+            estado.comecar("aquecimento_nlu")
+            textos = exemplos_de_aquecimento()
+            parse_data = await aquecer_nlu(processor, textos)
+            estado.terminar("aquecimento_nlu")
+
+            estado.comecar("aquecimento_core")
+            aquecer_core(processor, parse_data)
+            estado.terminar("aquecimento_core")
+        except Exception as e:
+            estado.erros[estado.fase] = str(e)
+            logger.error(f"Erro no aquecimento ({estado.fase}): {e}")
+
+    estado.comecar("acoes")
+    acoes_no_ar = await _verificar_acoes(agent)
+    estado.terminar("acoes")
+    if not acoes_no_ar:
+        logger.warning(f"Aquecimento: action server sem resposta ({estado.erros.get('acoes')})")
+        if EXIGIR_ACOES:
+            estado.fase = "aguardando_acoes"
+            while not await _verificar_acoes(agent):
+                pass
+            estado.erros.pop("acoes", None)
+
+    estado.fases_ms["total"] = round((time.perf_counter() - estado.inicio) * 1000, 1)
+    estado.fase = "pronto"
+    estado.pronto = True
+    logger.info(f"Servidor pronto em {estado.fases_ms['total'] / 1000:.1f}s: {estado.fases_ms}")
+
+
+# ===================================================================
+# ROTAS E LISTENERS
+# ===================================================================
+
+def registrar(app):
+    """Registra o aquecimento, a rota GET /pronto e o bloqueio até ficar pronto."""
+    from sanic import response
+
+    estado.terminar("importacao", estado.inicio)
+
+    @app.listener("before_server_start")
+    async def _inicio_carregamento(app, loop):
+        # Registrado antes do load_agent_on_start do Rasa: roda primeiro
+        estado.comecar("carregamento_modelo")
+
+    @app.listener("after_server_start")
+    async def _iniciar_aquecimento(app, loop):
+        if not estado.pronto:  # Com instalar(segundo_plano=False) o aquecimento já rodou
+            app.add_task(aquecer(app))
+
+    @app.get("/pronto")
+    async def pronto(request):
+        return response.json(estado.resumo(), status=200 if estado.pronto else 503)
+
+    if BLOQUEAR_ATE_PRONTO:
+        @app.middleware("request")
+        async def _bloquear_ate_pronto(request):
+            if not estado.pronto and request.path not in ROTAS_LIVRES:
+                return response.json({"erro": "servidor aquecendo", **estado.resumo()}, status=503,
+                                     headers={"Retry-After": "5"})
+
+
+async def _carregar_modelo(agent, model_path):
+    """Carga do modelo numa thread: o loop continua respondendo o /pronto."""
+    from rasa.exceptions import ModelNotFound
+
+    if not model_path or not os.path.exists(model_path):
+        logger.warning(f"Modelo nao encontrado em {model_path}; servidor sem modelo")
+        return
+    try:
+        await asyncio.to_thread(agent.load_model, model_path)
+        logger.info("Rasa server is up and running.")
+    except ModelNotFound:
+        logger.warning(f"Nenhum modelo valido em {model_path}; servidor sem modelo")
+
+
+def instalar(segundo_plano: bool = BLOQUEAR_ATE_PRONTO, exigir_modelo: bool = False):
+    """
+    Troca o load_agent_on_start do `rasa run`. Com `segundo_plano` (padrão:
+    PRONTIDAO_BLOQUEAR), cria o agent sem modelo e só agenda a carga do
+    modelo, para a porta abrir sem esperar; modelo remoto (model server,
+    remote storage) segue o caminho normal do Rasa. Sem `segundo_plano`, o
+    aquecimento roda logo depois da carga, antes de o servidor aceitar
+    conexões (workers do extensoes_rasa/workers.py: enquanto um aquece, os
+    outros atendem). Com `exigir_modelo`, um modelo que não carrega derruba o
+    servidor em vez de deixá-lo pronto sem modelo (o supervisor dos workers
+    percebe a falha). Chamar antes de iniciar o Rasa; o registrar() continua
+    necessário.
+    """
+    import warnings
+
+    import rasa.core.run
+
+    if getattr(rasa.core.run.load_agent_on_start, "_prontidao", False):
+        return
+    load_original = rasa.core.run.load_agent_on_start
+
+    async def load_agent_on_start(model_path, endpoints, remote_storage, app, loop):
+        if not segundo_plano:
+            agent = await load_original(model_path, endpoints, remote_storage, app, loop)
+            if exigir_modelo and getattr(agent, "processor", None) is None:
+                raise RuntimeError(f"Nao foi possivel carregar o modelo em {model_path}")
+            await aquecer(app)
+            return agent
+        if remote_storage or (endpoints and endpoints.model):
+            return await load_original(model_path, endpoints, remote_storage, app, loop)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")  # "Agent loaded with no model!": o modelo vem logo depois
+            agent = await load_original(None, endpoints, remote_storage, app, loop)
+        app.ctx.carregamento_modelo = loop.create_task(_carregar_modelo(agent, model_path))
+        return agent
+
+    load_agent_on_start._prontidao = True
+    rasa.core.run.load_agent_on_start = load_agent_on_start
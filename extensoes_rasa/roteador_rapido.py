@@ -0,0 +1,369 @@
+from __future__ import annotations
+
+import logging
+import re
+import threading
+import time
+import unicodedata
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Set, Text, Tuple
+
+from rasa.engine.graph import ExecutionContext, GraphComponent
+from rasa.engine.recipes.default_recipe import DefaultV1Recipe
+from rasa.engine.storage.resource import Resource
+from rasa.engine.storage.storage import ModelStorage
+from rasa.nlu.classifiers.diet_classifier import DIETClassifier
+from rasa.nlu.featurizers.sparse_featurizer.count_vectors_featurizer import CountVectorsFeaturizer
+from rasa.nlu.featurizers.sparse_featurizer.lexical_syntactic_featurizer import LexicalSyntacticFeaturizer
+from rasa.nlu.featurizers.sparse_featurizer.regex_featurizer import RegexFeaturizer
+from rasa.nlu.selectors.response_selector import ResponseSelector
+from rasa.shared.nlu.constants import ENTITIES, INTENT, INTENT_RANKING_KEY, TEXT
+from rasa.shared.nlu.training_data.message import Message
+from rasa.shared.nlu.training_data.training_data import TrainingData
+import rasa.shared.utils.io
+
+logger = logging.getLogger(__name__)
+
+# ===================================================================
+# ROTEADOR RÁPIDO (FAST PATH) DO PIPELINE NLU
+# ===================================================================
+# Frases quase fixas ("oi", "obrigado", "quais sao as provas", "quando e a
+# aula de <disciplina>") são reconhecidas por padrões compilados dos exemplos
+# anotados do data/nlu.yml, sobre o texto sem acentos. Cada padrão com
+# entidade só aceita os valores anotados na própria intent (e os sinônimos
+# deles): "o que e <atividade_academica>" aprendido com "o que e TCC" não
+# casa "o que e APS". A confiança vem do número de exemplos por trás do
+# padrão (n / (n + 1)), então o FallbackClassifier continua valendo.
+# Quando casa, o roteador define intent e entidades e marca a mensagem; as subclasses
+# "...Roteado" dos featurizers, do DIET e do ResponseSelector pulam as
+# mensagens marcadas. O que não casa segue pelo pipeline normal.
+#
+# No config.yml o roteador fica logo depois do tokenizer:
+#   - name: extensoes_rasa.roteador_rapido.RoteadorRapido
+#   - name: extensoes_rasa.roteador_rapido.CountVectorsFeaturizerRoteado
+#   ...
+
+MENSAGEM_ROTEADA = "roteador_rapido"  # Propriedade interna da Message (não vai para a saída)
+ARQUIVO_PADROES = "padroes_roteador.json"
+
+
+@lru_cache(maxsize=4096)
+def _normalizar_caractere(c: str) -> str:
+    base = ''.join(x for x in unicodedata.normalize('NFD', c) if not unicodedata.combining(x)).lower()
+    return base if len(base) == 1 else c
+
+
+def normalizar(texto: str) -> str:
+    """Sem acentos e em minúsculas, com o MESMO comprimento do texto original (offsets valem nos dois)."""
+    return ''.join(_normalizar_caractere(c) for c in texto)
+
+
+def _palavras(texto_normalizado: str) -> List[str]:
+    return re.findall(r'\w+', texto_normalizado)
+
+
+# ===================================================================
+# MÉTRICAS
+# ===================================================================
+
+class MetricasRoteador:
+    """
+    Taxa de acerto do fast path e estimativa da latência economizada:
+    acertos x custo médio (featurizers + DIET) das mensagens que seguiram pelo pipeline.
+    """
+
+    def __init__(self, intervalo_log: int = 500):
+        self.intervalo_log = intervalo_log
+        self._lock = threading.Lock()
+        self.mensagens = 0
+        self.acertos = 0
+        self.custo_pipeline_s = 0.0
+        self.tempo_roteador_s = 0.0
+
+    def registrar_mensagens(self, total: int, acertos: int, tempo_s: float):
+        with self._lock:
+            antes = self.mensagens
+            self.mensagens += total
+            self.acertos += acertos
+            self.tempo_roteador_s += tempo_s
+            registrar_log = self.mensagens // self.intervalo_log != antes // self.intervalo_log
+        if registrar_log:
+            logger.info(f"Roteador rapido: {self.resumo()}")
+
+    def registrar_custo_pipeline(self, tempo_s: float):
+        with self._lock:
+            self.custo_pipeline_s += tempo_s
+
+    def resumo(self) -> Dict[str, Any]:
+        with self._lock:
+            pelo_pipeline = self.mensagens - self.acertos
+            custo_medio_ms = (self.custo_pipeline_s / pelo_pipeline * 1000) if pelo_pipeline else 0.0
+            return {
+                "mensagens": self.mensagens,
+                "acertos": self.acertos,
+                "taxa_acerto": round(self.acertos / self.mensagens, 4) if self.mensagens else 0.0,
+                "custo_medio_pipeline_ms": round(custo_medio_ms, 3),
+                "custo_medio_roteador_ms": round(self.tempo_roteador_s / self.mensagens * 1000, 3)
+                if self.mensagens else 0.0,
+                "latencia_economizada_s": round(self.acertos * custo_medio_ms / 1000, 3),
+            }
+
+
+metricas = MetricasRoteador()
+
+
+# ===================================================================
+# COMPONENTE
+# ===================================================================
+
+@DefaultV1Recipe.register(
+    [DefaultV1Recipe.ComponentType.INTENT_CLASSIFIER, DefaultV1Recipe.ComponentType.ENTITY_EXTRACTOR],
+    is_trainable=True,
+)
+class RoteadorRapido(GraphComponent):
+    """
+    Classificador por padrões exatos. Só gera padrões sem ambiguidade:
+    um mesmo "esqueleto" de frase que aparece em mais de uma intent é descartado.
+    """
+
+    @staticmethod
+    def get_default_config() -> Dict[Text, Any]:
+        return {
+            "intents": None,  # Lista de intents permitidas no fast path (None = todas)
+            "confianca": 0.95,  # Teto da confiança; a de cada padrão é n / (n + 1) para n exemplos
+            "confianca_minima": 0.5,  # Padrões abaixo disso não são usados (1 exemplo = 0.5)
+            "min_caracteres_entidade": 2,
+        }
+
+    def __init__(self, config: Dict[Text, Any], model_storage: ModelStorage, resource: Resource,
+                 execution_context: ExecutionContext, padroes: Optional[Dict[Text, Any]] = None) -> None:
+        self.component_config = config
+        self._model_storage = model_storage
+        self._resource = resource
+        self._execution_context = execution_context
+        self.padroes = padroes or {"exatos": {}, "modelos": []}
+        self._compilar()
+
+    @classmethod
+    def create(cls, config: Dict[Text, Any], model_storage: ModelStorage, resource: Resource,
+               execution_context: ExecutionContext) -> RoteadorRapido:
+        return cls(config, model_storage, resource, execution_context)
+
+    def _compilar(self):
+        teto = self.component_config["confianca"]
+        minima = self.component_config.get("confianca_minima", 0.0)
+        self._exatos: Dict[str, Tuple[str, float]] = {}
+        for frase, valor in self.padroes["exatos"].items():
+            intent, confianca = (valor, teto) if isinstance(valor, str) else valor  # Modelos antigos: só a intent
+            if min(confianca, teto) >= minima:
+                self._exatos[frase] = (intent, min(confianca, teto))
+        self._modelos = [
+            (re.compile(m["regex"]), m["intent"], m["entidades"], min(m.get("confianca", teto), teto))
+            for m in self.padroes["modelos"] if min(m.get("confianca", teto), teto) >= minima
+        ]
+
+    # ------------------------------------------------------------------
+    # Treino
+    # ------------------------------------------------------------------
+
+    def _valores_por_intent(self, training_data: TrainingData) -> Dict[str, Dict[str, Set[str]]]:
+        """
+        Valores de cada entidade anotados em cada intent, mais os sinônimos deles.
+        Lookup tables ficam de fora: juntariam valores que separam intents
+        (TCC, APS, estágio) num mesmo padrão.
+        """
+        minimo = self.component_config["min_caracteres_entidade"]
+        valores: Dict[str, Dict[str, Set[str]]] = {}
+        for exemplo in training_data.intent_examples:
+            texto = exemplo.get(TEXT)
+            for entidade in exemplo.get(ENTITIES) or []:
+                valores.setdefault(exemplo.get(INTENT), {}).setdefault(entidade["entity"], set()).add(
+                    texto[entidade["start"]:entidade["end"]])
+        for por_tipo in valores.values():
+            for conhecidos in por_tipo.values():
+                normalizados = {normalizar(v) for v in conhecidos}
+                for sinonimo, canonico in training_data.entity_synonyms.items():
+                    if normalizar(canonico) in normalizados or normalizar(sinonimo) in normalizados:
+                        conhecidos.update((sinonimo, canonico))
+        return {
+            intent: {
+                tipo: {' '.join(_palavras(normalizar(v))) for v in conhecidos if len(v.strip()) >= minimo}
+                for tipo, conhecidos in por_tipo.items()
+            }
+            for intent, por_tipo in valores.items()
+        }
+
+    @staticmethod
+    def _esqueleto(texto: str, entidades: List[Dict]) -> Optional[Tuple[str, ...]]:
+        """Palavras literais do exemplo, com cada entidade trocada por '<tipo>'."""
+        if any(e.get("role") or e.get("group") for e in entidades):
+            return None
+        partes: List[str] = []
+        posicao = 0
+        for entidade in sorted(entidades, key=lambda e: e["start"]):
+            partes.extend(_palavras(normalizar(texto[posicao:entidade["start"]])))
+            partes.append(f"<{entidade['entity']}>")
+            posicao = entidade["end"]
+        partes.extend(_palavras(normalizar(texto[posicao:])))
+        return tuple(partes)
+
+    @staticmethod
+    def _regex_do_esqueleto(esqueleto: Tuple[str, ...], valores: Dict[str, Set[str]]) -> Tuple[str, List]:
+        pedacos, entidades = [], []
+        for parte in esqueleto:
+            if parte.startswith("<"):
+                tipo = parte[1:-1]
+                grupo = f"e{len(entidades)}"
+                alternativas = sorted(valores.get(tipo, ()), key=len, reverse=True)
+                alternativas = [r'\W+'.join(re.escape(p) for p in v.split()) for v in alternativas if v]
+                pedacos.append(f"(?P<{grupo}>{'|'.join(alternativas)})")
+                entidades.append([grupo, tipo])
+            else:
+                pedacos.append(re.escape(parte))
+        return r'^\W*' + r'\W+'.join(pedacos) + r'\W*$', entidades
+
+    def train(self, training_data: TrainingData) -> Resource:
+        intents_permitidas = self.component_config.get("intents")
+        valores_por_intent = self._valores_por_intent(training_data)
+
+        intents_por_esqueleto: Dict[Tuple[str, ...], Set[str]] = {}
+        suporte: Dict[Tuple[str, ...], int] = {}
+        for exemplo in training_data.intent_examples:
+            esqueleto = self._esqueleto(exemplo.get(TEXT), exemplo.get(ENTITIES) or [])
+            if esqueleto:
+                intents_por_esqueleto.setdefault(esqueleto, set()).add(exemplo.get(INTENT))
+                suporte[esqueleto] = suporte.get(esqueleto, 0) + 1
+
+        exatos: Dict[str, List] = {}
+        modelos: List[Dict] = []
+        for esqueleto, intents in intents_por_esqueleto.items():
+            if len(intents) != 1:
+                continue  # Mesma frase em intents diferentes: fica para o DIET decidir
+            intent = next(iter(intents))
+            if intents_permitidas and intent not in intents_permitidas:
+                continue
+            confianca = round(suporte[esqueleto] / (suporte[esqueleto] + 1), 4)
+            if any(p.startswith("<") for p in esqueleto):
+                valores = valores_por_intent.get(intent, {})
+                if all(valores.get(p[1:-1]) for p in esqueleto if p.startswith("<")):
+                    regex, entidades = self._regex_do_esqueleto(esqueleto, valores)
+                    modelos.append({"regex": regex, "intent": intent, "entidades": entidades,
+                                    "confianca": confianca})
+            else:
+                exatos[' '.join(esqueleto)] = [intent, confianca]
+
+        # Uma frase exata que também casa com o modelo de outra intent é ambígua: descarta os dois
+        compilados = [(re.compile(m["regex"]), m) for m in modelos]
+        ambiguos = set()
+        for frase, (intent, _) in list(exatos.items()):
+            for regex, modelo in compilados:
+                if modelo["intent"] != intent and regex.match(frase):
+                    exatos.pop(frase, None)
+                    ambiguos.add(id(modelo))
+        modelos = [m for m in modelos if id(m) not in ambiguos]
+
+        self.padroes = {"exatos": exatos, "modelos": modelos}
+        self._compilar()
+        logger.info(f"Roteador rapido: {len(exatos)} frase(s) exata(s) e {len(modelos)} modelo(s) com entidades")
+        self.persist()
+        return self._resource
+
+    # ------------------------------------------------------------------
+    # Predição
+    # ------------------------------------------------------------------
+
+    def _casar(self, texto: str) -> Optional[Tuple[str, float, List[Dict]]]:
+        normalizado = normalizar(texto)
+        exato = self._exatos.get(' '.join(_palavras(normalizado)))
+        if exato:
+            return exato[0], exato[1], []
+        for regex, intent, grupos, confianca in self._modelos:
+            resultado = regex.match(normalizado)
+            if resultado:
+                return intent, confianca, [
+                    {"entity": tipo, "start": resultado.start(grupo), "end": resultado.end(grupo),
+                     "value": texto[resultado.start(grupo):resultado.end(grupo)]}
+                    for grupo, tipo in grupos
+                ]
+        return None
+
+    def process(self, messages: List[Message]) -> List[Message]:
+        inicio = time.perf_counter()
+        acertos = 0
+        for message in messages:
+            resultado = self._casar(message.get(TEXT) or "")
+            if not resultado:
+                continue
+            intent, confianca, entidades = resultado
+            for entidade in entidades:
+                entidade.update({"confidence_entity": confianca, "extractor": self.__class__.__name__})
+            message.set(INTENT, {"name": intent, "confidence": confianca}, add_to_output=True)
+            message.set(INTENT_RANKING_KEY, [{"name": intent, "confidence": confianca}], add_to_output=True)
+            message.set(ENTITIES, (message.get(ENTITIES) or []) + entidades, add_to_output=True)
+            message.set(MENSAGEM_ROTEADA, True)
+            acertos += 1
+        metricas.registrar_mensagens(len(messages), acertos, time.perf_counter() - inicio)
+        return messages
+
+    # ------------------------------------------------------------------
+    # Persistência
+    # ------------------------------------------------------------------
+
+    def persist(self) -> None:
+        with self._model_storage.write_to(self._resource) as pasta:
+            rasa.shared.utils.io.dump_obj_as_json_to_file(pasta / ARQUIVO_PADROES, self.padroes)
+
+    @classmethod
+    def load(cls, config: Dict[Text, Any], model_storage: ModelStorage, resource: Resource,
+             execution_context: ExecutionContext, **kwargs: Any) -> RoteadorRapido:
+        try:
+            with model_storage.read_from(resource) as pasta:
+                padroes = rasa.shared.utils.io.read_json_file(pasta / ARQUIVO_PADROES)
+        except ValueError:
+            logger.warning(f"Padroes do roteador rapido nao encontrados em '{resource.name}'; fast path desativado")
+            padroes = None
+        return cls(config, model_storage, resource, execution_context, padroes)
+
+
+# ===================================================================
+# COMPONENTES QUE PULAM AS MENSAGENS ROTEADAS
+# ===================================================================
+
+class _PulaMensagensRoteadas:
+    """Roda o process() original só nas mensagens que o roteador não resolveu."""
+
+    def process(self, messages: List[Message]) -> List[Message]:
+        pendentes = [m for m in messages if not m.get(MENSAGEM_ROTEADA)]
+        if pendentes:
+            inicio = time.perf_counter()
+            super().process(pendentes)  # Os componentes do Rasa alteram as mensagens no lugar
+            metricas.registrar_custo_pipeline(time.perf_counter() - inicio)
+        return messages
+
+
+@DefaultV1Recipe.register(DefaultV1Recipe.ComponentType.MESSAGE_FEATURIZER, is_trainable=True)
+class RegexFeaturizerRoteado(_PulaMensagensRoteadas, RegexFeaturizer):
+    pass
+
+
+@DefaultV1Recipe.register(DefaultV1Recipe.ComponentType.MESSAGE_FEATURIZER, is_trainable=True)
+class LexicalSyntacticFeaturizerRoteado(_PulaMensagensRoteadas, LexicalSyntacticFeaturizer):
+    pass
+
+
+@DefaultV1Recipe.register(DefaultV1Recipe.ComponentType.MESSAGE_FEATURIZER, is_trainable=True)
+class CountVectorsFeaturizerRoteado(_PulaMensagensRoteadas, CountVectorsFeaturizer):
+    pass
+
+
+@DefaultV1Recipe.register(
+    [DefaultV1Recipe.ComponentType.INTENT_CLASSIFIER, DefaultV1Recipe.ComponentType.ENTITY_EXTRACTOR],
+    is_trainable=True,
+)
+class DIETClassifierRoteado(_PulaMensagensRoteadas, DIETClassifier):
+    pass
+
+
+@DefaultV1Recipe.register(DefaultV1Recipe.ComponentType.INTENT_CLASSIFIER, is_trainable=True)
+class ResponseSelectorRoteado(_PulaMensagensRoteadas, ResponseSelector):
+    pass
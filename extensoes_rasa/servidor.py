@@ -0,0 +1,39 @@
+import logging
+from typing import Callable, List
+
+logger = logging.getLogger(__name__)
+
+# ===================================================================
+# GANCHO NA CRIAÇÃO DO APP SANIC DO SERVIDOR RASA
+# ===================================================================
+# O `rasa run` monta o app em rasa.core.run.configure_app. As extensões
+# registram aqui funções que recebem o app já configurado (para adicionar
+# rotas e listeners); o run_rasa.py chama instalar() antes de iniciar o Rasa.
+
+_ao_configurar: List[Callable] = []
+_instalado = False
+
+
+def ao_configurar_app(funcao: Callable) -> Callable:
+    """Registra `funcao(app)` para rodar logo depois que o app Sanic for criado."""
+    if funcao not in _ao_configurar:
+        _ao_configurar.append(funcao)
+    return funcao
+
+
+def instalar():
+    global _instalado
+    if _instalado:
+        return
+    import rasa.core.run
+
+    configure_app_original = rasa.core.run.configure_app
+
+    def configure_app(*args, **kwargs):
+        app = configure_app_original(*args, **kwargs)
+        for funcao in _ao_configurar:
+            funcao(app)
+        return app
+
+    rasa.core.run.configure_app = configure_app
+    _instalado = True
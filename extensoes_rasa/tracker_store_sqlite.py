@@ -0,0 +1,351 @@
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Text, Tuple
+
+from rasa.core.brokers.broker import EventBroker
+from rasa.core.tracker_store import SerializedTrackerAsText, TrackerStore
+from rasa.shared.core.constants import ACTION_SESSION_START_NAME
+from rasa.shared.core.domain import Domain
+from rasa.shared.core.trackers import DialogueStateTracker
+
+logger = logging.getLogger(__name__)
+
+# ===================================================================
+# TRACKER STORE LOCAL EM SQLITE (WAL) COM GRAVAÇÃO EM LOTE
+# ===================================================================
+# Alternativa local ao redis/mongo para instalações pequenas:
+#  - eventos gravados em lote por uma thread (write-behind), a cada
+#    `intervalo_gravacao` segundos, numa única transação;
+#  - cada evento é JSON compacto comprimido com zlib, numa tabela
+#    WITHOUT ROWID ordenada por (sender_id, seq);
+#  - só a sessão atual é lida no retrieve(); sessões antigas mais velhas
+#    que a janela de sessão (session_expiration_time) são apagadas pela
+#    mesma thread a cada `intervalo_limpeza` segundos, com ou sem o
+#    write-behind (intervalo_gravacao: 0 grava na hora e só limpa);
+#  - LRU em memória com a sessão atual das conversas ativas.
+#
+# endpoints.yml:
+#   tracker_store:
+#     type: extensoes_rasa.tracker_store_sqlite.SQLiteTrackerStore
+#     db: trackers.db
+#
+# Com vários processos (workers do Sanic) use intervalo_gravacao: 0 e
+# verificar_versao: true, para que um processo não sirva do LRU uma
+# conversa alterada por outro.
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS eventos (
+    sender_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    tipo TEXT NOT NULL,
+    timestamp REAL,
+    dados BLOB NOT NULL,
+    PRIMARY KEY (sender_id, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS conversas (
+    sender_id TEXT PRIMARY KEY,
+    seq_inicio_sessao INTEGER NOT NULL,
+    proximo_seq INTEGER NOT NULL,
+    atualizado_em REAL NOT NULL
+);
+"""
+
+
+def _comprimir(evento: Dict) -> bytes:
+    return zlib.compress(json.dumps(evento, separators=(',', ':'), ensure_ascii=False).encode('utf-8'))
+
+
+def _descomprimir(dados: bytes) -> Dict:
+    return json.loads(zlib.decompress(dados))
+
+
+def _inicio_ultima_sessao(eventos: List[Dict]) -> int:
+    """Índice do último action_session_start (mesma divisão de get_trackers_for_conversation_sessions)."""
+    for indice in range(len(eventos) - 1, -1, -1):
+        evento = eventos[indice]
+        if evento.get("event") == "action" and evento.get("name") == ACTION_SESSION_START_NAME:
+            return indice
+    return 0
+
+
+class _SessaoEmMemoria:
+    """Sessão atual de uma conversa: eventos como dicts e posição deles no banco."""
+    __slots__ = ("eventos", "seq_inicio_sessao", "proximo_seq")
+
+    def __init__(self, eventos: List[Dict], seq_inicio_sessao: int, proximo_seq: int):
+        self.eventos = eventos
+        self.seq_inicio_sessao = seq_inicio_sessao
+        self.proximo_seq = proximo_seq
+
+
+class SQLiteTrackerStore(TrackerStore, SerializedTrackerAsText):
+    """Tracker store em um arquivo SQLite local (ver cabeçalho do módulo)."""
+
+    def __init__(
+        self,
+        domain: Optional[Domain] = None,
+        host: Optional[Text] = None,
+        event_broker: Optional[EventBroker] = None,
+        db: Text = "trackers.db",
+        intervalo_gravacao: float = 0.5,
+        max_trackers_memoria: int = 1000,
+        retencao_minutos: Optional[float] = None,
+        intervalo_limpeza: float = 300,
+        verificar_versao: bool = False,
+        **kwargs: Dict[Text, Any],
+    ) -> None:
+        super().__init__(domain, event_broker, **kwargs)
+        self.caminho = db
+        self.intervalo_gravacao = float(intervalo_gravacao)
+        self.max_trackers_memoria = int(max_trackers_memoria)
+        self.intervalo_limpeza = float(intervalo_limpeza)
+        self.verificar_versao = bool(verificar_versao)
+        self._retencao_minutos = retencao_minutos
+
+        self._local = threading.local()
+        self._lru: "OrderedDict[str, _SessaoEmMemoria]" = OrderedDict()
+        self._pendentes: List[Tuple] = []  # (sender_id, seq, tipo, timestamp, dados)
+        self._conversas_pendentes: Dict[str, Tuple[int, int, float]] = {}
+        self._lock_pendentes = threading.Lock()
+        self._lock_gravacao = threading.Lock()
+        self._parar = threading.Event()
+        self.metricas_contadores = {
+            "lru_acertos": 0, "lru_falhas": 0, "lotes_gravados": 0, "eventos_gravados": 0,
+            "eventos_removidos": 0,
+        }
+
+        pasta = os.path.dirname(os.path.abspath(db))
+        os.makedirs(pasta, exist_ok=True)
+        self._conexao().executescript(ESQUEMA)
+
+        # A thread roda mesmo com intervalo_gravacao: 0, só para a limpeza
+        self._thread = threading.Thread(target=self._loop_gravacao, daemon=True, name="TrackerStoreSQLite")
+        self._thread.start()
+        atexit.register(self.fechar)
+
+    # ------------------------------------------------------------------
+    # Infraestrutura
+    # ------------------------------------------------------------------
+
+    def _conexao(self) -> sqlite3.Connection:
+        """Uma conexão por thread (e por processo, se houver fork depois da criação)."""
+        conexao = getattr(self._local, "conexao", None)
+        if conexao is None or getattr(self._local, "pid", None) != os.getpid():
+            conexao = sqlite3.connect(self.caminho, timeout=30, isolation_level=None)
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexao = conexao
+            self._local.pid = os.getpid()
+        return conexao
+
+    @property
+    def retencao_segundos(self) -> float:
+        if self._retencao_minutos is not None:
+            return float(self._retencao_minutos) * 60
+        return float(self.domain.session_config.session_expiration_time or 60) * 60
+
+    def _loop_gravacao(self):
+        ultima_limpeza = time.monotonic()
+        espera = self.intervalo_gravacao if self.intervalo_gravacao > 0 else self.intervalo_limpeza
+        while not self._parar.wait(espera):
+            try:
+                if self.intervalo_gravacao > 0:
+                    self.gravar_pendentes()
+                if time.monotonic() - ultima_limpeza >= self.intervalo_limpeza:
+                    self.limpar_sessoes_antigas()
+                    ultima_limpeza = time.monotonic()
+            except Exception as e:
+                logger.error(f"Erro ao gravar eventos no tracker store SQLite: {e}")
+
+    def gravar_pendentes(self):
+        """Grava todos os eventos pendentes numa única transação."""
+        with self._lock_gravacao:
+            self._gravar_pendentes_com_trava()
+
+    def _gravar_pendentes_com_trava(self):
+        """
+        Corpo do gravar_pendentes; quem chama segura `_lock_gravacao`. Entre tirar
+        os pendentes da fila e o COMMIT, os eventos não estão nem na fila nem no
+        banco: quem lê o banco precisa segurar a mesma trava.
+        """
+        with self._lock_pendentes:
+            pendentes, self._pendentes = self._pendentes, []
+            conversas, self._conversas_pendentes = self._conversas_pendentes, {}
+        if not pendentes and not conversas:
+            return
+        conexao = self._conexao()
+        conexao.execute("BEGIN IMMEDIATE")
+        try:
+            conexao.executemany("INSERT OR REPLACE INTO eventos VALUES (?, ?, ?, ?, ?)", pendentes)
+            conexao.executemany(
+                "INSERT OR REPLACE INTO conversas VALUES (?, ?, ?, ?)",
+                [(sender_id, *valores) for sender_id, valores in conversas.items()],
+            )
+            conexao.execute("COMMIT")
+        except Exception:
+            conexao.execute("ROLLBACK")
+            with self._lock_pendentes:  # Devolve para a próxima tentativa, na ordem original
+                self._pendentes[:0] = pendentes
+                for sender_id, valores in conversas.items():
+                    self._conversas_pendentes.setdefault(sender_id, valores)
+            raise
+        self.metricas_contadores["lotes_gravados"] += 1
+        self.metricas_contadores["eventos_gravados"] += len(pendentes)
+
+    def limpar_sessoes_antigas(self) -> int:
+        """Apaga eventos de sessões anteriores à atual que já passaram da janela de sessão."""
+        limite = time.time() - self.retencao_segundos
+        with self._lock_gravacao:
+            cursor = self._conexao().execute(
+                "DELETE FROM eventos WHERE timestamp < ? AND seq < "
+                "(SELECT c.seq_inicio_sessao FROM conversas c WHERE c.sender_id = eventos.sender_id)",
+                (limite,),
+            )
+        removidos = cursor.rowcount or 0
+        self.metricas_contadores["eventos_removidos"] += removidos
+        if removidos:
+            logger.info(f"Tracker store SQLite: {removidos} evento(s) de sessoes antigas removido(s). "
+                        f"{self.metricas()}")
+        return removidos
+
+    def fechar(self):
+        self._parar.set()
+        try:
+            self.gravar_pendentes()
+        except Exception as e:
+            logger.error(f"Erro ao gravar os eventos pendentes ao encerrar: {e}")
+
+    def metricas(self) -> Dict[str, Any]:
+        consultas = self.metricas_contadores["lru_acertos"] + self.metricas_contadores["lru_falhas"]
+        return {
+            **self.metricas_contadores,
+            "lru_taxa_acerto": round(self.metricas_contadores["lru_acertos"] / consultas, 4) if consultas else 0.0,
+            "trackers_em_memoria": len(self._lru),
+            "eventos_pendentes": len(self._pendentes),
+        }
+
+    # ------------------------------------------------------------------
+    # LRU
+    # ------------------------------------------------------------------
+
+    def _lembrar(self, sender_id: str, sessao: _SessaoEmMemoria):
+        if self.max_trackers_memoria <= 0:
+            return
+        self._lru[sender_id] = sessao
+        self._lru.move_to_end(sender_id)
+        while len(self._lru) > self.max_trackers_memoria:
+            self._lru.popitem(last=False)
+
+    def _sessao_atual(self, sender_id: str) -> Optional[_SessaoEmMemoria]:
+        sessao = self._lru.get(sender_id)
+        if sessao is not None and self.verificar_versao:
+            linha = self._conexao().execute(
+                "SELECT proximo_seq FROM conversas WHERE sender_id = ?", (sender_id,)).fetchone()
+            if linha and linha[0] != sessao.proximo_seq:
+                sessao = None  # Outro processo gravou eventos nesta conversa
+        if sessao is not None:
+            self._lru.move_to_end(sender_id)
+            self.metricas_contadores["lru_acertos"] += 1
+            return sessao
+
+        self.metricas_contadores["lru_falhas"] += 1
+        # Com a trava, um lote já tirado da fila mas ainda sem COMMIT termina antes da
+        # leitura; sem ela, o proximo_seq lido seria o antigo e o próximo save
+        # sobrescreveria (INSERT OR REPLACE) os eventos desse lote.
+        with self._lock_gravacao:
+            if sender_id in self._conversas_pendentes:
+                self._gravar_pendentes_com_trava()  # A leitura do banco precisa enxergar a fila
+            conexao = self._conexao()
+            linha = conexao.execute(
+                "SELECT seq_inicio_sessao, proximo_seq FROM conversas WHERE sender_id = ?", (sender_id,)).fetchone()
+            if not linha:
+                return None
+            seq_inicio, proximo_seq = linha
+            eventos = [_descomprimir(dados) for (dados,) in conexao.execute(
+                "SELECT dados FROM eventos WHERE sender_id = ? AND seq >= ? ORDER BY seq", (sender_id, seq_inicio))]
+        sessao = _SessaoEmMemoria(eventos, seq_inicio, proximo_seq)
+        self._lembrar(sender_id, sessao)
+        return sessao
+
+    # ------------------------------------------------------------------
+    # Interface do TrackerStore
+    # ------------------------------------------------------------------
+
+    async def save(self, tracker: DialogueStateTracker) -> None:
+        await self.stream_events(tracker)
+        sender_id = tracker.sender_id
+        sessao = self._sessao_atual(sender_id) or _SessaoEmMemoria([], 0, 0)
+        eventos_tracker = [evento.as_dict() for evento in tracker.events]
+        novos = self._eventos_novos(eventos_tracker, sessao.eventos)
+        if not novos:
+            return
+
+        agora = time.time()
+        linhas = []
+        for deslocamento, evento in enumerate(novos):
+            linhas.append((sender_id, sessao.proximo_seq + deslocamento, evento.get("event") or "",
+                           evento.get("timestamp"), _comprimir(evento)))
+
+        eventos_sessao = sessao.eventos + novos
+        corte = _inicio_ultima_sessao(eventos_sessao)
+        nova_sessao = _SessaoEmMemoria(eventos_sessao[corte:], sessao.seq_inicio_sessao + corte,
+                                       sessao.proximo_seq + len(novos))
+        self._lembrar(sender_id, nova_sessao)
+
+        with self._lock_pendentes:
+            self._pendentes.extend(linhas)
+            self._conversas_pendentes[sender_id] = (nova_sessao.seq_inicio_sessao, nova_sessao.proximo_seq, agora)
+        if self.intervalo_gravacao <= 0:
+            self.gravar_pendentes()
+
+    @staticmethod
+    def _eventos_novos(eventos_tracker: List[Dict], eventos_sessao: List[Dict]) -> List[Dict]:
+        """
+        Eventos do tracker que ainda não estão gravados. O tracker pode conter só a
+        sessão atual (retrieve) ou todas as sessões (retrieve_full_tracker).
+        """
+        if not eventos_sessao:
+            return eventos_tracker
+        primeiro = eventos_sessao[0]
+        for indice in range(len(eventos_tracker) - 1, -1, -1):
+            evento = eventos_tracker[indice]
+            if evento.get("timestamp") == primeiro.get("timestamp") and evento.get("event") == primeiro.get("event"):
+                return eventos_tracker[indice + len(eventos_sessao):]
+        ultimo_timestamp = eventos_sessao[-1].get("timestamp") or 0
+        return [e for e in eventos_tracker if (e.get("timestamp") or 0) > ultimo_timestamp]
+
+    async def retrieve(self, sender_id: Text) -> Optional[DialogueStateTracker]:
+        sessao = self._sessao_atual(sender_id)
+        if sessao is None or not sessao.eventos:
+            return None
+        return DialogueStateTracker.from_dict(sender_id, sessao.eventos, self.domain.slots)
+
+    async def retrieve_full_tracker(self, conversation_id: Text) -> Optional[DialogueStateTracker]:
+        """Todas as sessões ainda guardadas (as antigas são apagadas após a janela de sessão)."""
+        with self._lock_gravacao:
+            if conversation_id in self._conversas_pendentes:
+                self._gravar_pendentes_com_trava()
+            eventos = [_descomprimir(dados) for (dados,) in self._conexao().execute(
+                "SELECT dados FROM eventos WHERE sender_id = ? ORDER BY seq", (conversation_id,))]
+        if not eventos:
+            return None
+        return DialogueStateTracker.from_dict(conversation_id, eventos, self.domain.slots)
+
+    async def exists(self, conversation_id: Text) -> bool:
+        if conversation_id in self._lru or conversation_id in self._conversas_pendentes:
+            return True
+        return self._conexao().execute(
+            "SELECT 1 FROM conversas WHERE sender_id = ?", (conversation_id,)).fetchone() is not None
+
+    async def keys(self) -> Iterable[Text]:
+        chaves = {sender_id for (sender_id,) in self._conexao().execute("SELECT sender_id FROM conversas")}
+        with self._lock_pendentes:
+            chaves.update(self._conversas_pendentes)
+        return chaves
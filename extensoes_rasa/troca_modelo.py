@@ -0,0 +1,245 @@
+import asyncio
+import ctypes
+import gc
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ===================================================================
+# TROCA DE MODELO SEM PARADA (SERVIDOR RASA)
+# ===================================================================
+# Publicar um modelo retreinado não exige reiniciar o run_rasa.py. Uma tarefa
+# no loop do servidor verifica, a cada MODELO_INTERVALO segundos, se o .tar.gz
+# mais recente da pasta de modelos (-m models) mudou. O model server
+# (`models:` no endpoints.yml) usa o mesmo caminho: o pull do Rasa continua,
+# mas o modelo baixado não é mais carregado dentro do loop de eventos. Com um
+# modelo novo:
+#  1. o modelo carrega numa thread de prioridade baixa, enquanto o antigo
+#     continua atendendo (a carga do TensorFlow solta o GIL boa parte do tempo);
+#  2. na mesma thread, o modelo novo é aquecido como na partida (prontidao.py);
+#  3. a troca é uma atribuição só (agent.processor): requisições em andamento
+#     terminam com o modelo antigo, as seguintes já usam o novo. O cache de
+#     parse é separado por id do modelo e não devolve resultados antigos;
+#  4. o modelo antigo é solto (gc.collect + malloc_trim devolvem a memória ao SO).
+# Arquivo que falha ao carregar não é tentado de novo até mudar.
+#
+# Com workers (run_rasa.py --workers), quem observa a pasta é o processo
+# principal, que troca os workers um a um (como no SIGHUP); cada worker novo
+# carrega o modelo mais recente.
+#
+# Configuração (.env):
+#   MODELO_OBSERVAR   - 1 observa a pasta de modelos (padrão 1)
+#   MODELO_INTERVALO  - segundos entre verificações (padrão 10)
+
+OBSERVAR = os.getenv("MODELO_OBSERVAR", "1") == "1"
+INTERVALO_S = float(os.getenv("MODELO_INTERVALO", "10"))
+
+try:
+    _libc = ctypes.CDLL("libc.so.6")
+except OSError:  # Fora do Linux/glibc a memória só volta ao SO quando o alocador quiser
+    _libc = None
+
+
+def devolver_memoria():
+    gc.collect()
+    if _libc is not None:
+        _libc.malloc_trim(0)
+
+
+def _assinatura(caminho: str) -> Optional[Tuple[str, int, float]]:
+    try:
+        info = os.stat(caminho)
+    except OSError:
+        return None
+    return os.path.abspath(caminho), info.st_size, info.st_mtime
+
+
+class ObservadorPasta:
+    """
+    Acha o modelo mais recente de uma pasta (ou um arquivo de modelo trocado no
+    lugar). Só o devolve depois de duas verificações seguidas com o mesmo
+    tamanho e data, para não pegar um arquivo ainda sendo gravado.
+    """
+
+    def __init__(self, caminho: str, atual: Optional[str] = None):
+        # Sem `atual`, o mais recente de agora conta como já carregado
+        self.caminho = caminho
+        atual = atual or self.mais_recente()
+        self.carregado = _assinatura(atual) if atual else None
+        self._visto: Optional[Tuple[str, int, float]] = None
+        self.falhou: Optional[Tuple[str, int, float]] = None
+
+    def mais_recente(self) -> Optional[str]:
+        if os.path.isfile(self.caminho):
+            return self.caminho
+        from rasa.model import get_latest_model
+
+        return get_latest_model(self.caminho)
+
+    def verificar(self) -> Optional[str]:
+        """Caminho do modelo novo e estável, ou None."""
+        caminho = self.mais_recente()
+        assinatura = _assinatura(caminho) if caminho else None
+        if assinatura is None or assinatura in (self.carregado, self.falhou):
+            self._visto = None
+            return None
+        estavel = assinatura == self._visto
+        self._visto = assinatura
+        return caminho if estavel else None
+
+    def marcar(self, caminho: str, sucesso: bool):
+        assinatura = _assinatura(caminho)
+        if sucesso:
+            self.carregado = assinatura
+        else:
+            self.falhou = assinatura
+        self._visto = None
+
+
+def _carregar_e_aquecer(agent, caminho: str):
+    """Roda numa thread: monta o MessageProcessor do modelo novo e o aquece."""
+    from rasa.core.processor import MessageProcessor
+
+    from extensoes_rasa import prontidao
+
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+    except (AttributeError, OSError):
+        pass
+    processor = MessageProcessor(
+        model_path=caminho,
+        tracker_store=agent.tracker_store,
+        lock_store=agent.lock_store,
+        action_endpoint=agent.action_endpoint,
+        generator=agent.nlg,
+        http_interpreter=agent.http_interpreter,
+    )
+    parse_data = asyncio.run(prontidao.aquecer_nlu(processor, prontidao.exemplos_de_aquecimento()))
+    prontidao.aquecer_core(processor, parse_data)
+    return processor
+
+
+def _em_thread(func, *args) -> asyncio.Future:
+    """
+    Roda `func` numa thread própria e daemon: a prioridade baixa não fica no
+    executor padrão do loop, e um SIGTERM no meio da carga não espera ela
+    terminar (as threads de executor são esperadas na saída do interpretador).
+    """
+    loop = asyncio.get_running_loop()
+    futuro = loop.create_future()
+
+    def concluir(resultado, erro):
+        if futuro.done():
+            return
+        if erro is not None:
+            futuro.set_exception(erro)
+        else:
+            futuro.set_result(resultado)
+
+    def alvo():
+        try:
+            resultado, erro = func(*args), None
+        except BaseException as e:
+            resultado, erro = None, e
+        try:
+            loop.call_soon_threadsafe(concluir, resultado, erro)
+        except RuntimeError:  # Loop já fechado: o servidor parou durante a carga
+            pass
+
+    threading.Thread(target=alvo, name="TrocaModelo", daemon=True).start()
+    return futuro
+
+
+def trocar_processor(agent, processor, fingerprint: Optional[str] = None):
+    """Os mesmos passos do Agent.load_model, com o processor já carregado."""
+    from rasa.core.nlg import TemplatedNaturalLanguageGenerator
+
+    agent.processor = processor
+    agent.domain = processor.domain
+    agent._set_fingerprint(fingerprint)
+    agent.tracker_store.domain = processor.domain
+    if isinstance(agent.nlg, TemplatedNaturalLanguageGenerator):
+        agent.nlg.responses = processor.domain.responses if processor.domain else {}
+
+
+async def trocar_modelo(agent, caminho: str, fingerprint: Optional[str] = None) -> Dict:
+    """Carrega e aquece `caminho` fora do loop e troca o modelo do agent. Devolve os tempos."""
+    inicio = time.perf_counter()
+    antigo = agent.processor.model_filename if agent.processor else None
+    logger.info(f"Troca de modelo: carregando {caminho} (atual: {antigo})")
+    processor = await _em_thread(_carregar_e_aquecer, agent, caminho)
+    carga_s = time.perf_counter() - inicio
+    trocar_processor(agent, processor, fingerprint)
+    del processor
+    await asyncio.to_thread(devolver_memoria)
+    resultado = {"modelo": agent.processor.model_filename, "anterior": antigo,
+                 "carga_s": round(carga_s, 1), "total_s": round(time.perf_counter() - inicio, 1)}
+    logger.info(f"Troca de modelo concluida: {resultado}")
+    return resultado
+
+
+async def observar(app):
+    """Tarefa do servidor: verifica a pasta de modelos e troca quando aparece um novo."""
+    from extensoes_rasa import prontidao
+
+    observador = None
+    while True:
+        await asyncio.sleep(INTERVALO_S)
+        agent = getattr(app.ctx, "agent", None)
+        if not prontidao.estado.pronto or agent is None or agent.processor is None or agent.model_server:
+            continue
+        if observador is None:
+            pasta = str(agent.processor.model_path)
+            atual = pasta if os.path.isfile(pasta) else os.path.join(pasta, agent.processor.model_filename)
+            observador = ObservadorPasta(pasta, atual)
+        caminho = await asyncio.to_thread(observador.verificar)
+        if caminho is None:
+            continue
+        try:
+            await trocar_modelo(agent, caminho)
+            observador.marcar(caminho, True)
+        except Exception as e:
+            observador.marcar(caminho, False)
+            logger.error(f"Troca de modelo: falha ao carregar {caminho}; o modelo atual continua: {e}")
+
+
+async def _update_model_from_server(model_server, agent):
+    """Substitui o do rasa.core.agent: baixa como o Rasa, mas carrega com trocar_modelo()."""
+    import aiohttp
+    from rasa.core.agent import _pull_model_and_fingerprint
+    from rasa.utils.common import TempDirectoryPath, get_temp_dir_name
+    from rasa.nlu.utils import is_url
+
+    if not is_url(model_server.url):
+        raise aiohttp.InvalidURL(model_server.url)
+
+    with TempDirectoryPath(get_temp_dir_name()) as pasta:
+        try:
+            fingerprint = await _pull_model_and_fingerprint(model_server, agent.fingerprint, pasta)
+            if fingerprint:
+                await trocar_modelo(agent, pasta, fingerprint)
+            else:
+                logger.debug(f"No new model found at URL {model_server.url}")
+        except Exception:
+            logger.exception("Failed to update model. The previous model will stay loaded instead.")
+
+
+def registrar(app):
+    """Inicia a observação da pasta de modelos depois que o servidor sobe."""
+    if not OBSERVAR:
+        return
+
+    @app.listener("after_server_start")
+    async def _iniciar_observacao(app, loop):
+        app.add_task(observar(app))
+
+
+def instalar():
+    """Troca o carregamento do pull do model server pelo carregamento em segundo plano."""
+    import rasa.core.agent
+
+    rasa.core.agent._update_model_from_server = _update_model_from_server
@@ -0,0 +1,197 @@
+import functools
+import importlib
+import logging
+import os
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# ===================================================================
+# SERVIDOR RASA COM VÁRIOS WORKERS (PRE-FORK)
+# ===================================================================
+# "python run_rasa.py --workers N": o `rasa run` segue o caminho normal até
+# o app.run(); ali, em vez de servir, o processo principal:
+#  1. importa o Rasa, o TensorFlow e os componentes do config.yml (mais de
+#     500 MB que nenhum worker precisa repetir) e congela o heap;
+#  2. abre o socket de escuta e cria os workers com fork (o Supervisor do
+#     run_actions.py): os módulos importados ficam compartilhados por
+#     copy-on-write e todos aceitam conexões no mesmo socket;
+#  3. supervisiona os workers como o action server: batimento por worker,
+#     recriação de quem cai ou trava, SIGHUP troca um a um, SIGTERM drena;
+#  4. observa a pasta de modelos: com um modelo novo, troca os workers um a um
+#     (ver troca_modelo.py). O modelo só conta como carregado quando o primeiro
+#     worker novo fica pronto com ele; se esse não sobe, a troca é cancelada,
+#     os workers atuais continuam e o arquivo não é tentado de novo até mudar.
+#
+# O modelo (pesos e funções do TensorFlow) não pode ser carregado antes do
+# fork: o runtime do TensorFlow cria pools de threads na primeira operação,
+# e um filho criado depois disso trava na primeira inferência, porque essas
+# threads não existem nele. Cada worker carrega o modelo e aquece antes de
+# aceitar conexões (prontidao.instalar(segundo_plano=False)), e os workers
+# sobem um de cada vez: o pico de CPU e memória da carga não se soma, e quem
+# já está pronto continua atendendo enquanto o próximo carrega.
+#
+# Requisitos para vários processos (verificados ao subir):
+#  - tracker store compartilhado: com o InMemoryTrackerStore cada worker teria
+#    as próprias conversas, então o servidor volta para um processo só;
+#  - com o SQLiteTrackerStore, use intervalo_gravacao: 0 e verificar_versao: true;
+#  - lock store compartilhado (SQLiteLockStore ou redis): com o de memória,
+#    duas mensagens seguidas do mesmo usuário podem ser processadas em
+#    paralelo por workers diferentes.
+#
+# Configuração (.env):
+#   RASA_WORKERS           - número de workers (padrão 1: servidor normal, sem fork)
+#   RASA_LIMITE_BATIMENTO  - segundos sem batimento até o worker ser recriado (padrão 60)
+#   RASA_LIMITE_PARTIDA    - segundos para um worker carregar o modelo e aquecer (padrão 600)
+
+WORKERS_PADRAO = int(os.getenv("RASA_WORKERS", "1"))
+LIMITE_BATIMENTO_S = float(os.getenv("RASA_LIMITE_BATIMENTO", "60"))
+LIMITE_PARTIDA_S = float(os.getenv("RASA_LIMITE_PARTIDA", "600"))
+
+_endpoints = None  # AvailableEndpoints recebidos pelo serve_application
+_modelo: Optional[str] = None  # Caminho do modelo (-m) recebido pelo serve_application
+
+
+def importar_componentes(config: str = "config.yml"):
+    """Importa no processo principal tudo o que o worker importaria ao carregar o modelo."""
+    import rasa.engine.recipes.default_components  # noqa: F401 - DIET, TED etc. (e o TensorFlow)
+    from rasa.shared.utils.io import read_yaml_file
+
+    try:
+        dados = read_yaml_file(config) or {}
+    except Exception as e:
+        logger.warning(f"Nao foi possivel ler {config} para importar os componentes: {e}")
+        return
+    for item in (dados.get("pipeline") or []) + (dados.get("policies") or []):
+        nome = item.get("name", "") if isinstance(item, dict) else ""
+        if "." in nome:
+            importlib.import_module(nome.rsplit(".", 1)[0])
+
+
+def _threads_do_processo() -> int:
+    try:
+        return len(os.listdir("/proc/self/task"))
+    except OSError:
+        return 1
+
+
+def multiprocesso_permitido(endpoints) -> bool:
+    """Avisa sobre tracker/lock store que não funcionam com vários processos; False se não dá."""
+    config_tracker = getattr(endpoints, "tracker_store", None)
+    tipo = getattr(config_tracker, "type", None) or ""
+    if tipo in ("", "memory", "in_memory"):
+        print("AVISO: Tracker store em memoria: cada worker teria as proprias conversas. "
+              "Usando um processo so", flush=True)
+        return False
+    if tipo.endswith("SQLiteTrackerStore"):
+        kwargs = config_tracker.kwargs
+        if float(kwargs.get("intervalo_gravacao", 0.5)) > 0 or not kwargs.get("verificar_versao", False):
+            print("AVISO: Com varios workers, configure o SQLiteTrackerStore com intervalo_gravacao: 0 "
+                  "e verificar_versao: true (endpoints.yml)", flush=True)
+
+    config_lock = getattr(endpoints, "lock_store", None)
+    if (getattr(config_lock, "type", None) or "in_memory") == "in_memory":
+        print("AVISO: Lock store em memoria: mensagens seguidas do mesmo usuario podem ser processadas "
+              "em paralelo por workers diferentes. Use o SQLiteLockStore (endpoints.yml)", flush=True)
+    return True
+
+
+def _criar_supervisor():
+    from run_actions import Supervisor
+
+    from extensoes_rasa.troca_modelo import INTERVALO_S, OBSERVAR, ObservadorPasta
+
+    class SupervisorRasa(Supervisor):
+        """Supervisor que também troca os workers quando aparece um modelo novo na pasta."""
+
+        def __init__(self, *args, modelo: Optional[str] = None, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.observador = None
+            if OBSERVAR and modelo and os.path.exists(modelo):
+                self.observador = ObservadorPasta(modelo)
+            self.proxima_verificacao = time.monotonic() + INTERVALO_S
+            self.modelo_em_troca: Optional[str] = None  # Modelo novo que nenhum worker carregou ainda
+
+        def verificar_saude(self):
+            super().verificar_saude()
+            if self.observador is None or self.trocar or self.modelo_em_troca \
+                    or time.monotonic() < self.proxima_verificacao:
+                return
+            self.proxima_verificacao = time.monotonic() + INTERVALO_S
+            caminho = self.observador.verificar()
+            if caminho:
+                print(f"INFO: Modelo novo em {caminho}", flush=True)
+                self.modelo_em_troca = caminho
+                self.trocar = True
+
+        def _ao_substituir(self, pid_novo: int, subiu: bool) -> bool:
+            # O primeiro substituto é quem prova o modelo novo: só depois dele o
+            # modelo conta como carregado; se não subir, os outros nem são trocados
+            caminho, self.modelo_em_troca = self.modelo_em_troca, None
+            if caminho is None:
+                return True
+            self.observador.marcar(caminho, subiu)
+            if not subiu:
+                print(f"ERRO: O modelo {caminho} nao subiu no primeiro worker; "
+                      f"mantendo os workers atuais", flush=True)
+            return subiu
+
+    return SupervisorRasa
+
+
+def _servir_com_workers(app, run_original, workers: int, drenagem_s: float, host: Optional[str] = None,
+                        port: Optional[int] = None, *, ssl=None, backlog: int = 100, **kwargs):
+    from run_actions import criar_socket
+
+    from extensoes_rasa import prontidao
+
+    if not multiprocesso_permitido(_endpoints):
+        return run_original(app, host, port, ssl=ssl, backlog=backlog, **kwargs)
+
+    inicio = time.perf_counter()
+    importar_componentes()
+    threads = _threads_do_processo()
+    if threads > 1:
+        print(f"AVISO: {threads} threads no processo principal antes do fork; "
+              f"os workers herdam o estado delas sem as threads", flush=True)
+    print(f"INFO: Componentes importados em {time.perf_counter() - inicio:.1f}s; "
+          f"iniciando {workers} workers um de cada vez", flush=True)
+
+    # Cada worker mede a própria partida (carga do modelo + aquecimento)
+    os.register_at_fork(after_in_child=lambda: setattr(prontidao, "estado", prontidao.EstadoProntidao()))
+
+    sock = criar_socket(host or "0.0.0.0", port or 5005, backlog)
+    print(f"INFO: Servidor Rasa em http://{host}:{port} com {workers} worker(s)", flush=True)
+    _criar_supervisor()(app, sock, workers, drenagem_s, limite_batimento_s=LIMITE_BATIMENTO_S,
+                        limite_partida_s=LIMITE_PARTIDA_S, pronto=lambda: prontidao.estado.pronto,
+                        escalonar=True, opcoes_run={"ssl": ssl}, modelo=_modelo).rodar()
+
+
+def instalar(workers: int = WORKERS_PADRAO, drenagem_s: float = 15.0):
+    """
+    Com mais de um worker, troca o app.run() do `rasa run` pelo servidor
+    pre-fork. Chamar antes de iniciar o Rasa.
+    """
+    if workers <= 1 or not hasattr(os, "fork"):
+        return
+    import rasa.core.run
+    from sanic import Sanic
+
+    serve_original = rasa.core.run.serve_application
+    run_original = Sanic.run
+
+    @functools.wraps(serve_original)  # O rasa.api.run filtra os argumentos pela assinatura
+    def serve_application(*args, **kwargs):
+        global _endpoints, _modelo
+        _endpoints = kwargs.get("endpoints")
+        _modelo = args[0] if args else kwargs.get("model_path")
+        return serve_original(*args, **kwargs)
+
+    def run(app, *args, **kwargs):
+        Sanic.run = run_original  # Os workers chamam o run de verdade
+        kwargs.pop("workers", None)
+        return _servir_com_workers(app, run_original, workers, drenagem_s, *args, **kwargs)
+
+    rasa.core.run.serve_application = serve_application
+    Sanic.run = run
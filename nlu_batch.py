@@ -0,0 +1,185 @@
+# Arquivo: nlu_batch.py
+# Uso: python run_rasa.py batch perguntas.jsonl --saida resultado.jsonl [--lote 64] [--processos 2]
+#
+# Classifica perguntas em lote com o modelo treinado, sem passar pelo
+# servidor HTTP. O modelo é carregado uma vez (por processo) e as mensagens
+# passam pelo grafo de NLU em lotes, em vez de uma requisição por pergunta.
+#
+# Com --processos > 1, o caminho do modelo é resolvido antes de subir o Pool
+# e o processo principal espera a carga por no máximo --espera-carga
+# segundos. Se um processo não consegue carregar o modelo, ele rompe a
+# barreira e o lote inteiro é abortado (o Pool recriaria o processo sem fim).
+
+import argparse
+import csv
+import itertools
+import json
+import multiprocessing
+import sys
+import threading
+import time
+
+_processador = None  # MessageProcessor carregado em cada processo
+
+
+def carregar_processador(caminho_modelo: str):
+    """Carrega o modelo (uma vez por processo) e guarda o MessageProcessor."""
+    global _processador
+    from rasa.core.agent import Agent
+    from rasa.model import get_local_model
+
+    arquivo_modelo = get_local_model(caminho_modelo)
+    print(f"INFO: Carregando o modelo {arquivo_modelo}...", file=sys.stderr)
+    _processador = Agent.load(arquivo_modelo).processor
+    return _processador
+
+
+def _iniciar_processo(caminho_modelo: str, barreira, espera_s: float):
+    """Initializer do Pool: carrega e aquece o modelo, depois avisa o processo principal."""
+    try:
+        carregar_processador(caminho_modelo)
+        classificar_lote(["oi"])  # Primeira inferência do TensorFlow é bem mais lenta
+    except BaseException:
+        barreira.abort()  # Acorda o processo principal, que encerra o Pool
+        raise
+    try:
+        barreira.wait(espera_s)
+    except threading.BrokenBarrierError:
+        pass  # Partida abortada, ou processo recriado depois dela: ninguém mais espera
+
+
+def classificar_lote(textos: list[str]) -> list[dict]:
+    """Roda o grafo de NLU uma única vez para todas as mensagens do lote."""
+    from rasa.core.channels.channel import UserMessage
+    from rasa.engine.constants import PLACEHOLDER_MESSAGE, PLACEHOLDER_TRACKER
+
+    alvo = _processador.model_metadata.nlu_target
+    # O grafo recebe UserMessage (o nlu_message_converter converte em Message)
+    mensagens = [UserMessage(text=texto) for texto in textos]
+    resultados = _processador.graph_runner.run(
+        inputs={PLACEHOLDER_MESSAGE: mensagens, PLACEHOLDER_TRACKER: None},
+        targets=[alvo],
+    )
+    saida = []
+    for mensagem in resultados[alvo]:
+        dados = mensagem.as_dict(only_output_properties=True)
+        intent = dados.get("intent") or {}
+        saida.append({
+            "intent": intent.get("name"),
+            "confidence": intent.get("confidence", 0.0),
+            "entities": [
+                {chave: ent.get(chave) for chave in ("entity", "value", "start", "end", "confidence_entity")}
+                for ent in dados.get("entities", [])
+            ],
+            "intent_ranking": dados.get("intent_ranking", [])[:3],
+        })
+    return saida
+
+
+def _classificar_registros(registros: list[dict], campo: str) -> list[dict]:
+    textos = [str(r.get(campo) or "") for r in registros]
+    return [{**registro, **resultado} for registro, resultado in zip(registros, classificar_lote(textos))]
+
+
+def ler_registros(caminho: str, campo: str):
+    """Lê JSONL ou CSV de forma incremental (o arquivo nunca é carregado inteiro)."""
+    with open(caminho, "r", encoding="utf-8", newline="") as f:
+        if caminho.lower().endswith(".csv"):
+            for linha in csv.DictReader(f):
+                yield linha
+        else:
+            for linha in f:
+                linha = linha.strip()
+                if not linha:
+                    continue
+                registro = json.loads(linha)
+                yield registro if isinstance(registro, dict) else {campo: registro}
+
+
+def em_lotes(iteravel, tamanho: int):
+    iterador = iter(iteravel)
+    while True:
+        lote = list(itertools.islice(iterador, tamanho))
+        if not lote:
+            return
+        yield lote
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(prog="run_rasa.py batch",
+                                     description="Classificação em lote de perguntas com o modelo treinado.")
+    parser.add_argument("entrada", help="Arquivo .jsonl ou .csv com as perguntas")
+    parser.add_argument("--saida", default="nlu_batch_saida.jsonl", help="Arquivo JSONL de saída")
+    parser.add_argument("-m", "--modelo", default="models", help="Arquivo do modelo ou pasta de modelos")
+    parser.add_argument("--campo", default="text", help="Campo/coluna com o texto da pergunta")
+    parser.add_argument("--lote", type=int, default=64, help="Mensagens por lote")
+    parser.add_argument("--processos", type=int, default=1, help="Processos paralelos (cada um carrega o modelo; use no máximo o número de núcleos)")
+    parser.add_argument("--espera-carga", type=float, default=600,
+                        help="Segundos máximos para os processos carregarem o modelo (com --processos > 1)")
+    args = parser.parse_args(argv)
+
+    lotes = em_lotes(ler_registros(args.entrada, args.campo), args.lote)
+    total = 0
+    inicio = time.perf_counter()
+    pool = None
+    try:
+        if args.processos > 1:
+            from rasa.model import get_local_model
+            from rasa.exceptions import ModelNotFound
+
+            try:
+                arquivo_modelo = get_local_model(args.modelo)  # Falha aqui, antes de subir os processos
+            except ModelNotFound as e:
+                print(f"ERRO: Modelo não encontrado em '{args.modelo}': {e}", file=sys.stderr)
+                return 1
+            contexto = multiprocessing.get_context("spawn")
+            barreira = contexto.Barrier(args.processos + 1)
+            pool = contexto.Pool(args.processos, initializer=_iniciar_processo,
+                                 initargs=(arquivo_modelo, barreira, args.espera_carga))
+            try:
+                barreira.wait(args.espera_carga)  # Só mede a vazão depois que todos carregaram o modelo
+            except threading.BrokenBarrierError:
+                print(f"ERRO: Os processos não carregaram o modelo {arquivo_modelo} "
+                      f"(falha ou mais de {args.espera_carga:.0f}s); lote abortado.", file=sys.stderr)
+                pool.terminate()
+                pool = None
+                return 1
+            resultados = pool.imap(_ClassificadorPool(args.campo), lotes)  # imap mantém a ordem de entrada
+        else:
+            carregar_processador(args.modelo)
+            classificar_lote(["oi"])  # Primeira inferência do TensorFlow é bem mais lenta
+            resultados = (_classificar_registros(lote, args.campo) for lote in lotes)
+
+        inicio = time.perf_counter()  # Não conta o tempo de carregar o modelo
+        with open(args.saida, "w", encoding="utf-8") as f_saida:
+            for lote_classificado in resultados:
+                for registro in lote_classificado:
+                    f_saida.write(json.dumps(registro, ensure_ascii=False) + "\n")
+                total += len(lote_classificado)
+                decorrido = time.perf_counter() - inicio
+                print(f"INFO: {total} pergunta(s) classificada(s) - {total / decorrido:.1f} perguntas/s",
+                      file=sys.stderr)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    decorrido = time.perf_counter() - inicio
+    vazao = total / decorrido if decorrido else 0.0
+    print(f"INFO: Concluído: {total} pergunta(s) em {decorrido:.1f}s ({vazao:.1f} perguntas/s). "
+          f"Saída em {args.saida}")
+    return 0
+
+
+class _ClassificadorPool:
+    """Função serializável para o Pool (lambdas não funcionam com 'spawn')."""
+
+    def __init__(self, campo: str):
+        self.campo = campo
+
+    def __call__(self, registros: list[dict]) -> list[dict]:
+        return _classificar_registros(registros, self.campo)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
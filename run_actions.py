@@ -0,0 +1,369 @@
+# Arquivo: run_actions.py
+# Uso: python run_actions.py [--workers N] [--port 5055] [--sem-aquecimento]
+#
+# Action server com vários processos ("pre-fork"), no lugar de
+# "rasa run actions", que roda um processo só e fica preso a um núcleo pelo GIL:
+#  1. o processo principal importa as actions e aquece os dados de referência
+#     (índice BM25/vetorial, calendário de avaliações, feed de avisos, listas de
+#     docentes), congela o heap com gc.freeze() e abre o socket de escuta;
+#  2. cria N workers com fork. Todos aceitam conexões no mesmo socket e herdam
+#     os dados já carregados, compartilhados por copy-on-write;
+#  3. supervisiona os workers: quem morre é recriado (com espera crescente se
+#     morrer logo ao subir). Cada worker bate o ponto a cada segundo numa área
+#     de memória compartilhada, pelo próprio loop de eventos; quem fica mais de
+#     --limite-batimento segundos sem bater (loop travado) é derrubado e recriado;
+#  4. SIGTERM/SIGINT: cada worker para de aceitar conexões e termina as que
+#     estão em andamento (até --drenagem segundos) antes de sair;
+#  5. SIGHUP: reaquece os dados e troca os workers um a um (sobe o novo antes
+#     de drenar o antigo), sem recusar conexões.
+#
+# Configuração (.env):
+#   ACTIONS_WORKERS - número de workers (padrão: WEB_CONCURRENCY, ou 2). Não usa o
+#                     número de núcleos: num dyno de PaaS ele é o da máquina
+#                     inteira, e cada worker tem as suas threads de recarga e a
+#                     sua cópia dos dados que mudam
+#   ACTIONS_PORT    - porta (padrão 5055, a mesma do "rasa run actions")
+#
+# Sem fork (Windows), cai no servidor de um processo do rasa_sdk.
+
+import argparse
+import asyncio
+import gc
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Callable, Optional
+
+ESPERA_MAXIMA_RECRIACAO_S = 30
+VIDA_MINIMA_S = 5  # Worker que morre antes disso conta como falha ao subir
+INTERVALO_BATIMENTO_S = 1.0
+WORKERS_PADRAO = 2
+
+
+def aquecer(modulo) -> None:
+    """
+    Carrega no processo principal os dados que todos os workers vão usar.
+    Chama as sincronizações diretamente, sem as threads de recarga: nenhuma
+    thread pode estar rodando no processo principal na hora do fork.
+    """
+    from actions.balanceador import balanceador
+    from actions.captura_trafego import em_segundo_plano
+    checagem_ativa, balanceador.checagem_ativa = balanceador.checagem_ativa, False
+    etapas = [
+        ("indice BM25 / vetorial", modulo.base_conhecimento_local.sincronizar),
+        ("indice vetorial (memmap)", lambda: modulo.indice_vetorial.buscar_lote([])),
+        ("calendario de avaliacoes", modulo.calendario_avaliacoes.sincronizar),
+        ("feed de avisos", lambda: modulo.feed_avisos.atualizar(completo=True)),
+        ("professores", modulo.CacheHelper.get_lista_professores),
+        ("coordenadores", modulo.CacheHelper.get_lista_coordenadores),
+    ]
+    for nome, etapa in etapas:
+        inicio = time.perf_counter()
+        try:
+            with em_segundo_plano(f"aquecimento: {nome}"):
+                etapa()
+            print(f"INFO: Aquecimento: {nome} em {(time.perf_counter() - inicio) * 1000:.0f}ms", flush=True)
+        except Exception as e:
+            # O worker carrega sob demanda na primeira pergunta, como no servidor simples
+            print(f"AVISO: Aquecimento de {nome} falhou ({e}); sera carregado sob demanda", flush=True)
+    balanceador.checagem_ativa = checagem_ativa  # Cada worker inicia a sua
+
+
+def criar_socket(host: str, porta: int, backlog: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, porta))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class Supervisor:
+    """
+    Cria, recria e encerra os workers que atendem no socket compartilhado.
+
+    `pronto` roda no worker e diz se ele já pode atender; com `escalonar`, um
+    worker só é criado (ou, na troca, o antigo só é encerrado) depois que os
+    outros ficaram prontos.
+    """
+
+    def __init__(self, app, sock: socket.socket, workers: int, drenagem_s: float, modulo=None,
+                 limite_batimento_s: float = 60.0, limite_partida_s: float = 120.0,
+                 pronto: Callable[[], bool] = lambda: True, escalonar: bool = False,
+                 opcoes_run: Optional[dict] = None):
+        self.app = app
+        self.sock = sock
+        self.quantidade = workers
+        self.drenagem_s = drenagem_s
+        self.modulo = modulo
+        self.limite_batimento_s = limite_batimento_s
+        self.limite_partida_s = limite_partida_s
+        self.pronto = pronto
+        self.escalonar = escalonar
+        self.opcoes_run = opcoes_run or {}
+        self.workers = {}  # pid -> (índice, início)
+        self.falhas_seguidas = {}  # índice -> falhas ao subir
+        self.terminados = []  # (pid, índice, código, segundos de vida) ainda não tratados
+        self.substituidos = set()  # pids encerrados de propósito na troca: não são recriados
+        self.pendentes = []  # índices esperando a vez de subir
+        self.encerrando = False
+        self.trocar = False
+
+        # Memória compartilhada com os workers, por vaga (o dobro de workers: na
+        # troca, o novo e o antigo rodam juntos): último batimento e se está pronto
+        self.batimentos = multiprocessing.RawArray("d", 2 * workers)
+        self.prontos = multiprocessing.RawArray("b", 2 * workers)
+        self.vagas = {}  # pid -> vaga
+        self.anunciados = set()  # pids já registrados no log como prontos
+        self.derrubados = set()  # pids mortos por falta de batimento
+
+    # ------------------------------------------------------------------
+    # Workers
+    # ------------------------------------------------------------------
+
+    async def _bater_ponto(self, vaga: int):
+        while True:
+            self.batimentos[vaga] = time.monotonic()
+            self.prontos[vaga] = 1 if self.pronto() else 0
+            await asyncio.sleep(INTERVALO_BATIMENTO_S)
+
+    def _rodar_worker(self, indice: int, vaga: int):
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)  # O Sanic instala os dele em seguida
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)  # A troca dos workers é feita pelo principal
+        codigo = 0
+        try:
+            self.app.add_task(self._bater_ponto(vaga))
+            self.app.run(sock=self.sock, workers=1, access_log=False, motd=False, register_sys_signals=True,
+                         **self.opcoes_run)
+        except BaseException as e:
+            print(f"ERRO: Worker {indice} (pid {os.getpid()}) caiu: {e}", flush=True)
+            codigo = 1
+        finally:
+            os._exit(codigo)
+
+    def iniciar_worker(self, indice: int) -> int:
+        vaga = min(set(range(len(self.batimentos))) - set(self.vagas.values()))
+        self.batimentos[vaga] = 0
+        self.prontos[vaga] = 0
+        pid = os.fork()
+        if pid == 0:
+            self._rodar_worker(indice, vaga)
+        self.workers[pid] = (indice, time.monotonic())
+        self.vagas[pid] = vaga
+        print(f"INFO: Worker {indice} iniciado (pid {pid})", flush=True)
+        return pid
+
+    def esta_pronto(self, pid: int) -> bool:
+        return pid in self.vagas and bool(self.prontos[self.vagas[pid]])
+
+    def verificar_saude(self):
+        """Registra os workers que ficaram prontos e derruba os que pararam de bater o ponto."""
+        agora = time.monotonic()
+        for pid, (indice, inicio) in list(self.workers.items()):
+            if pid in self.derrubados:
+                continue
+            if pid not in self.anunciados and self.esta_pronto(pid):
+                self.anunciados.add(pid)
+                print(f"INFO: Worker {indice} (pid {pid}) pronto em {agora - inicio:.1f}s", flush=True)
+            ultimo = self.batimentos[self.vagas[pid]]
+            if ultimo:
+                parado, limite = agora - ultimo, self.limite_batimento_s
+            else:
+                parado, limite = agora - inicio, self.limite_partida_s
+            if parado > limite:
+                print(f"AVISO: Worker {indice} (pid {pid}) sem batimento ha {parado:.0f}s; derrubando", flush=True)
+                self.derrubados.add(pid)
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+
+    def _iniciar_pendentes(self):
+        while self.pendentes and not self.encerrando:
+            if self.escalonar and not all(self.esta_pronto(pid) for pid in self.workers):
+                return
+            self.iniciar_worker(self.pendentes.pop(0))
+
+    def _preparar_fork(self):
+        """Estado que não pode ser herdado pelos workers."""
+        balanceador = getattr(sys.modules.get("actions.balanceador"), "balanceador", None)
+        if balanceador is not None:
+            balanceador.sessao.close()  # Conexões abertas no aquecimento seriam compartilhadas entre processos
+        gc.collect()
+        gc.freeze()  # Objetos já carregados saem do GC: a coleta não suja as páginas compartilhadas
+
+    def _sinal_encerrar(self, sinal, _frame):
+        if not self.encerrando:
+            print(f"INFO: {signal.Signals(sinal).name} recebido; drenando {len(self.workers)} worker(s)", flush=True)
+        self.encerrando = True
+
+    def _sinal_trocar(self, _sinal, _frame):
+        self.trocar = True
+
+    # ------------------------------------------------------------------
+    # Laço de supervisão
+    # ------------------------------------------------------------------
+
+    def _recolher(self):
+        """Recolhe os workers que terminaram; os inesperados vão para self.terminados."""
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            if pid not in self.workers:
+                continue
+            indice, inicio = self.workers.pop(pid)
+            self.vagas.pop(pid, None)
+            self.anunciados.discard(pid)
+            self.derrubados.discard(pid)
+            if pid in self.substituidos:
+                self.substituidos.discard(pid)
+                continue
+            self.terminados.append((pid, indice, os.waitstatus_to_exitcode(status), time.monotonic() - inicio))
+
+    def _troca_gradual(self):
+        """Reaquece os dados e substitui cada worker, sempre com os demais atendendo."""
+        self.trocar = False
+        print("INFO: Trocando os workers um a um", flush=True)
+        if self.modulo is not None:
+            gc.unfreeze()
+            aquecer(self.modulo)
+        self._preparar_fork()
+        for pid_antigo, (indice, _) in list(self.workers.items()):
+            if self.encerrando:
+                return
+            pid_novo = self.iniciar_worker(indice)
+            while self.escalonar and not self.encerrando:
+                self._recolher()
+                self.verificar_saude()
+                if pid_novo not in self.workers or self.esta_pronto(pid_novo):
+                    break
+                time.sleep(0.2)
+            subiu = pid_novo in self.workers
+            if not self._ao_substituir(pid_novo, subiu):
+                if subiu:  # Troca cancelada: o novo sai e o antigo continua atendendo
+                    self.substituidos.add(pid_novo)
+                    os.kill(pid_novo, signal.SIGTERM)
+                else:
+                    self.terminados = [t for t in self.terminados if t[0] != pid_novo]
+                print("AVISO: Troca dos workers cancelada", flush=True)
+                return
+            if not subiu:
+                # Não subiu: o antigo continua atendendo e o novo não é recriado
+                self.terminados = [t for t in self.terminados if t[0] != pid_novo]
+                print(f"AVISO: Worker {indice} substituto nao subiu; mantendo o pid {pid_antigo}", flush=True)
+                continue
+            if pid_antigo not in self.workers:  # Caiu enquanto o novo subia: o novo já o substitui
+                self.terminados = [t for t in self.terminados if t[0] != pid_antigo]
+                continue
+            self.substituidos.add(pid_antigo)
+            os.kill(pid_antigo, signal.SIGTERM)
+            limite = time.monotonic() + self.drenagem_s + 5
+            while pid_antigo in self.workers and time.monotonic() < limite:
+                self._recolher()
+                time.sleep(0.1)
+            if pid_antigo in self.workers:
+                os.kill(pid_antigo, signal.SIGKILL)
+
+    def _ao_substituir(self, pid_novo: int, subiu: bool) -> bool:
+        """Chamado quando cada substituto fica pronto (ou não sobe); False cancela o resto da troca."""
+        return True
+
+    def rodar(self):
+        signal.signal(signal.SIGTERM, self._sinal_encerrar)
+        signal.signal(signal.SIGINT, self._sinal_encerrar)
+        signal.signal(signal.SIGHUP, self._sinal_trocar)
+        self._preparar_fork()
+        self.pendentes = list(range(self.quantidade))
+
+        recriar_em = {}  # índice -> instante em que pode ser recriado
+        while not self.encerrando:
+            if self.trocar:
+                self._troca_gradual()
+            self._iniciar_pendentes()
+            self._recolher()
+            self.verificar_saude()
+            while self.terminados and not self.encerrando:
+                pid, indice, codigo, vida = self.terminados.pop(0)
+                falhas = self.falhas_seguidas.get(indice, 0) + 1 if vida < VIDA_MINIMA_S else 0
+                self.falhas_seguidas[indice] = falhas
+                espera = min(2 ** falhas, ESPERA_MAXIMA_RECRIACAO_S) if falhas else 0
+                print(f"AVISO: Worker {indice} (pid {pid}) terminou com codigo {codigo} apos {vida:.0f}s; "
+                      f"recriando em {espera}s", flush=True)
+                recriar_em[indice] = time.monotonic() + espera
+            for indice, instante in list(recriar_em.items()):
+                if time.monotonic() >= instante and not self.encerrando:
+                    del recriar_em[indice]
+                    self.pendentes.append(indice)
+            time.sleep(0.2)
+
+        self.encerrar()
+
+    def encerrar(self):
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        limite = time.monotonic() + self.drenagem_s + 5
+        while self.workers and time.monotonic() < limite:
+            self._recolher()
+            time.sleep(0.1)
+        for pid in list(self.workers):
+            print(f"AVISO: Worker pid {pid} nao terminou a drenagem a tempo; encerrando a forca", flush=True)
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        print("INFO: Servidor encerrado", flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Action server com workers pre-fork e dados aquecidos.")
+    parser.add_argument("--workers", type=int,
+                        default=int(os.getenv("ACTIONS_WORKERS") or os.getenv("WEB_CONCURRENCY") or WORKERS_PADRAO))
+    parser.add_argument("--host", default=os.getenv("SANIC_HOST", "0.0.0.0"))
+    parser.add_argument("--port", "-p", type=int, default=int(os.getenv("ACTIONS_PORT", "5055")))
+    parser.add_argument("--actions", default="actions", help="Pacote das actions (padrão: actions)")
+    parser.add_argument("--drenagem", type=float, default=15.0,
+                        help="Segundos para terminar as requisições em andamento ao encerrar")
+    parser.add_argument("--backlog", type=int, default=1024)
+    parser.add_argument("--limite-batimento", type=float, default=60.0,
+                        help="Segundos sem batimento (loop de eventos travado) até o worker ser recriado")
+    parser.add_argument("--sem-aquecimento", action="store_true", help="Não carrega os dados antes do fork")
+    args = parser.parse_args(argv)
+
+    from rasa_sdk import endpoint
+
+    if not hasattr(os, "fork"):
+        print("AVISO: fork indisponivel nesta plataforma; usando um processo so", flush=True)
+        endpoint.run(args.actions, port=args.port)
+        return
+
+    from rasa_sdk.plugin import plugin_manager
+
+    # Importa as actions (e os objetos globais delas) uma vez, antes do fork
+    app = endpoint.create_app(args.actions)
+    plugin_manager().hook.attach_sanic_app_extensions(app=app)
+    app.config.GRACEFUL_SHUTDOWN_TIMEOUT = args.drenagem
+
+    modulo = sys.modules.get(f"{args.actions}.actions")
+    if args.sem_aquecimento:
+        modulo = None
+    if modulo is not None:
+        inicio = time.perf_counter()
+        aquecer(modulo)
+        print(f"INFO: Aquecimento concluido em {time.perf_counter() - inicio:.1f}s", flush=True)
+
+    sock = criar_socket(args.host, args.port, args.backlog)
+    print(f"INFO: Action server em http://{args.host}:{args.port} com {args.workers} worker(s)", flush=True)
+    Supervisor(app, sock, args.workers, args.drenagem, modulo, limite_batimento_s=args.limite_batimento).rodar()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,9 @@
 # Arquivo: run_rasa.py
 
+import time
+INICIO_PROCESSO = time.perf_counter()  # Antes dos imports do Rasa: a importação entra no tempo de partida
+
+import argparse
 import asyncio
 import platform
 import sys
@@ -16,15 +20,50 @@ if platform.system() == "Windows":
 # ==============================================================================
 
 if __name__ == '__main__':
+    # Modo lote: "python run_rasa.py batch perguntas.jsonl --saida resultado.jsonl"
+    # classifica um arquivo inteiro sem subir o servidor (ver nlu_batch.py)
+    if sys.argv[1:2] == ["batch"]:
+        from nlu_batch import main as main_batch
+        sys.exit(main_batch(sys.argv[2:]))
+
+    # Vários workers: "python run_rasa.py --workers 3 ..." (ou RASA_WORKERS); as
+    # demais opções seguem para o "rasa run" (ver extensoes_rasa/workers.py)
+    from extensoes_rasa import workers
+    opcoes = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+    opcoes.add_argument("--workers", type=int, default=workers.WORKERS_PADRAO)
+    opcoes.add_argument("--drenagem", type=float, default=15.0)
+    opcoes_workers, argumentos_rasa = opcoes.parse_known_args(sys.argv[1:])
+    workers.instalar(opcoes_workers.workers, opcoes_workers.drenagem)
+
+    # Extensões do servidor (ver extensoes_rasa/): cache do parse NLU + rota /parse_cache,
+    # aquecimento do modelo + rota /pronto (503 até o aquecimento terminar; com
+    # workers, cada um aquece antes de aceitar conexões) e troca de modelo sem
+    # parada quando aparece um novo na pasta de modelos ou no model server;
+    # GET /lock_store com a disputa do lock store SQLite (endpoints.yml)
+    from extensoes_rasa import cache_parse, lock_store_sqlite, prontidao, servidor, troca_modelo
+    cache_parse.instalar()
+    prontidao.marcar_inicio(INICIO_PROCESSO)
+    prontidao.instalar(segundo_plano=prontidao.BLOQUEAR_ATE_PRONTO and opcoes_workers.workers <= 1,
+                       exigir_modelo=opcoes_workers.workers > 1)
+    troca_modelo.instalar()
+    servidor.ao_configurar_app(cache_parse.registrar_rotas)
+    servidor.ao_configurar_app(lock_store_sqlite.registrar_rotas)
+    servidor.ao_configurar_app(prontidao.registrar)
+    if opcoes_workers.workers <= 1:  # Com workers, quem observa a pasta é o processo principal
+        servidor.ao_configurar_app(troca_modelo.registrar)
+    servidor.instalar()
+
     # Simula a execução do comando "rasa run" a partir da linha de comando
-    # Adicione ou remova argumentos conforme necessário
-    sys.argv.extend([
+    # Adicione ou remova argumentos conforme necessário. Argumentos passados na
+    # linha de comando (ex.: "--port 5006" no Procfile) vêm depois e têm prioridade.
+    sys.argv = [
+        sys.argv[0],
         "run",
         "-m", "models",
         "--enable-api",
         "--cors", "*",
-        "--credentials", "credentials.yml"
-    ])
+        "--credentials", "credentials.yml",
+        *argumentos_rasa,
+    ]
     print(f"INFO: Iniciando o servidor Rasa com os argumentos: {sys.argv}")
     main()
-
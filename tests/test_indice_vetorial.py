@@ -0,0 +1,21 @@
+from actions.indice_vetorial import IndiceVetorial, construir_indice
+
+
+def _documentos(*textos):
+    return [{"id": str(i), "texto": texto, "url_documento": f"https://docs/{i}"} for i, texto in enumerate(textos)]
+
+
+def test_so_vetoriza_documentos_novos_ou_alterados(tmp_path):
+    pasta = str(tmp_path)
+    assert construir_indice(_documentos("regras do TCC", "calendario de provas"), pasta) == 2
+
+    indice = IndiceVetorial(pasta)
+    indice.buscar("tcc")
+    mtime = indice._mtime
+    assert construir_indice(_documentos("regras do TCC", "calendario de provas"), pasta) == 0
+    indice.buscar("tcc")
+    assert indice._mtime == mtime  # Nada foi publicado: o worker continua com o mesmo memmap
+
+    assert construir_indice(_documentos("regras do TCC", "horario de atendimento"), pasta) == 1
+    assert indice.buscar("atendimento", 1)[0][1]["url_documento"] == "https://docs/1"
+    assert indice.buscar("regras tcc", 1)[0][1]["url_documento"] == "https://docs/0"
@@ -0,0 +1,53 @@
+from rasa.engine.graph import ExecutionContext, GraphSchema
+from rasa.engine.storage.local_model_storage import LocalModelStorage
+from rasa.engine.storage.resource import Resource
+from rasa.shared.nlu.training_data.message import Message
+from rasa.shared.nlu.training_data.training_data import TrainingData
+
+from extensoes_rasa.roteador_rapido import RoteadorRapido
+
+
+def _exemplo(texto, intent, entidades=()):
+    entidades = [
+        {"entity": tipo, "start": texto.index(valor), "end": texto.index(valor) + len(valor), "value": valor}
+        for tipo, valor in entidades
+    ]
+    return Message(data={"text": texto, "intent": intent, "entities": entidades})
+
+
+def _treinar(tmp_path, exemplos):
+    roteador = RoteadorRapido(RoteadorRapido.get_default_config(), LocalModelStorage(tmp_path),
+                              Resource("roteador"), ExecutionContext(GraphSchema({}), "teste"))
+    roteador.train(TrainingData(training_examples=exemplos))
+    return roteador
+
+
+def _rotear(roteador, texto):
+    mensagem = Message(data={"text": texto})
+    roteador.process([mensagem])
+    return mensagem.get("intent") if mensagem.get("roteador_rapido") else None
+
+
+def test_modelo_so_aceita_valores_anotados_na_propria_intent(tmp_path):
+    roteador = _treinar(tmp_path, [
+        _exemplo("o que e TCC", "consultar_regras_tcc", [("atividade_academica", "TCC")]),
+        _exemplo("regras do APS", "consultar_regras_aps", [("atividade_academica", "APS")]),
+        _exemplo("regras do trabalho em grupo", "consultar_regras_aps",
+                 [("atividade_academica", "trabalho em grupo")]),
+    ])
+
+    assert _rotear(roteador, "o que e tcc")["name"] == "consultar_regras_tcc"
+    assert _rotear(roteador, "o que e APS") is None  # Segue para o DIET
+    assert _rotear(roteador, "regras do TCC") is None
+
+
+def test_confianca_cresce_com_os_exemplos_e_nao_chega_a_1(tmp_path):
+    roteador = _treinar(tmp_path, [
+        _exemplo("oi", "saudar"),
+        _exemplo("tchau", "despedir"),
+        _exemplo("Tchau", "despedir"),
+        _exemplo("tchau!", "despedir"),
+    ])
+
+    assert _rotear(roteador, "Oi!")["confidence"] == 0.5
+    assert _rotear(roteador, "tchau")["confidence"] == 0.75
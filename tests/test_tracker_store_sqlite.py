@@ -0,0 +1,75 @@
+import asyncio
+import threading
+import time
+
+from rasa.shared.core.domain import Domain
+from rasa.shared.core.events import ActionExecuted, UserUttered
+from rasa.shared.core.trackers import DialogueStateTracker
+
+from extensoes_rasa.tracker_store_sqlite import SQLiteTrackerStore
+
+
+def _tracker(sender_id, textos):
+    eventos = []
+    for texto in textos:
+        eventos += [UserUttered(texto), ActionExecuted("action_listen")]
+    return DialogueStateTracker.from_events(sender_id, eventos)
+
+
+def test_leitura_durante_gravacao_em_lote_nao_sobrescreve_eventos(tmp_path):
+    # Sem LRU, todo acesso lê o banco; o lote só é gravado quando o teste manda
+    store = SQLiteTrackerStore(Domain.empty(), db=str(tmp_path / "trackers.db"),
+                               intervalo_gravacao=3600, max_trackers_memoria=0)
+    tracker = _tracker("aluno", ["oi"])
+    asyncio.run(store.save(tracker))
+
+    # Segura o gravar_pendentes entre tirar o lote da fila e o COMMIT
+    lote_fora_da_fila, continuar = threading.Event(), threading.Event()
+    conexao_original = store._conexao
+
+    def conexao_que_espera():
+        if threading.current_thread().name == "gravacao":
+            lote_fora_da_fila.set()
+            continuar.wait(5)
+        return conexao_original()
+
+    store._conexao = conexao_que_espera
+    gravacao = threading.Thread(target=store.gravar_pendentes, name="gravacao")
+    gravacao.start()
+    assert lote_fora_da_fila.wait(5)
+
+    lidas = []
+    leitura = threading.Thread(target=lambda: lidas.append(store._sessao_atual("aluno")))
+    leitura.start()
+    time.sleep(0.2)
+    continuar.set()
+    gravacao.join(5)
+    leitura.join(5)
+    store._conexao = conexao_original
+
+    assert lidas[0] is not None and lidas[0].proximo_seq == 2
+
+    # O save seguinte continua a numeração em vez de reaproveitar o seq 0 e 1
+    tracker.update(UserUttered("tudo bem?"))
+    asyncio.run(store.save(tracker))
+    store.gravar_pendentes()
+    completo = asyncio.run(store.retrieve_full_tracker("aluno"))
+    assert [e.text for e in completo.events if isinstance(e, UserUttered)] == ["oi", "tudo bem?"]
+    store.fechar()
+
+
+def test_limpeza_roda_sem_gravacao_em_lote(tmp_path):
+    # intervalo_gravacao: 0 é o do endpoints.yml; a limpeza não pode depender do write-behind
+    store = SQLiteTrackerStore(Domain.empty(), db=str(tmp_path / "trackers.db"), intervalo_gravacao=0,
+                               retencao_minutos=0, intervalo_limpeza=0.1)
+    antigo = time.time() - 3600
+    eventos = [UserUttered("oi", timestamp=antigo), ActionExecuted("action_listen", timestamp=antigo),
+               ActionExecuted("action_session_start"), UserUttered("de novo")]
+    asyncio.run(store.save(DialogueStateTracker.from_events("aluno", eventos)))
+
+    contar = lambda: store._conexao().execute("SELECT COUNT(*) FROM eventos").fetchone()[0]
+    limite = time.monotonic() + 5
+    while contar() > 2 and time.monotonic() < limite:
+        time.sleep(0.05)
+    assert contar() == 2  # Só a sessão atual ficou
+    store.fechar()